@@ -3,6 +3,7 @@ import asm3.al
 import asm3.audit
 import asm3.utils
 import asm3.movement
+import asm3.searchindex
 
 from asm3.i18n import _, python2display
 from asm3.typehints import Database, PostedData, Results
@@ -54,6 +55,10 @@ MOVEMENT_IN = '22, 23, 24, 25, 26, 27, 28, 29, 30'
 PERSON_IN = "1, 7, 8, 31"
 WAITINGLIST_IN = "13, 14, 15"
 
+# The maximum number of link IDs to put in an IN clause when
+# getting the additional fields for a set of rows
+IDS_CHUNK_SIZE = 1000
+
 # Movement mapping 
 
 MOVEMENT_MAPPING = {
@@ -145,24 +150,34 @@ def get_additional_fields(dbo: Database, linkid: int, linktype: str = "animal",
         "WHERE af.LinkType IN (%s) " \
         "ORDER BY af.DisplayIndex" % ( dbo.sql_cast_char("animal.ID"), dbo.sql_cast_char("owner.ID"), linkid, inclause ))
 
-def get_additional_fields_ids(dbo: Database, rows: Results, linktype: str = "animal") -> Results:
+def get_additional_fields_ids(dbo: Database, rows: Results, linktype: str = "animal", chunksize: int = IDS_CHUNK_SIZE) -> Results:
     """
     Returns a list of additional fields for the linktype and for
     every single ID field in rows. Useful for getting additional
-    fields for lists of animals
+    fields for lists of animals.
+    The IDs are queried chunksize at a time to avoid sending enormous IN clauses.
     """
     inclause = clause_for_linktype(linktype)
     links = []
+    seen = set()
     for r in rows:
+        if r.id in seen: continue
+        seen.add(r.id)
         links.append(str(r.id))
     if len(links) == 0:
         links.append("0")
-    return dbo.query("SELECT af.*, a.LinkID, a.Value, " \
-        "CASE WHEN af.FieldType = 8 AND a.Value <> '' AND a.Value <> '0' THEN (SELECT AnimalName FROM animal WHERE %s = a.Value) ELSE '' END AS AnimalName, " \
-        "CASE WHEN af.FieldType IN (9, 11, 12) AND a.Value <> '' AND a.Value <> '0' THEN (SELECT OwnerName FROM owner WHERE %s = a.Value) ELSE '' END AS OwnerName " \
-        "FROM additional a INNER JOIN additionalfield af ON af.ID = a.AdditionalFieldID " \
-        "WHERE a.LinkType IN (%s) AND a.LinkID IN (%s) " \
-        "ORDER BY af.DisplayIndex" % ( dbo.sql_cast_char("animal.ID"), dbo.sql_cast_char("owner.ID"), inclause, ",".join(links)))
+    results = []
+    for i in range(0, len(links), chunksize):
+        results.extend(dbo.query("SELECT af.*, a.LinkID, a.Value, " \
+            "CASE WHEN af.FieldType = 8 AND a.Value <> '' AND a.Value <> '0' THEN (SELECT AnimalName FROM animal WHERE %s = a.Value) ELSE '' END AS AnimalName, " \
+            "CASE WHEN af.FieldType IN (9, 11, 12) AND a.Value <> '' AND a.Value <> '0' THEN (SELECT OwnerName FROM owner WHERE %s = a.Value) ELSE '' END AS OwnerName " \
+            "FROM additional a INNER JOIN additionalfield af ON af.ID = a.AdditionalFieldID " \
+            "WHERE a.LinkType IN (%s) AND a.LinkID IN (%s) " \
+            "ORDER BY af.DisplayIndex" % ( dbo.sql_cast_char("animal.ID"), dbo.sql_cast_char("owner.ID"), inclause, ",".join(links[i:i+chunksize]))))
+    if len(links) > chunksize:
+        # Each chunk is sorted, put the whole list back into display order (sort is stable)
+        results.sort(key=lambda x: x.DISPLAYINDEX)
+    return results
 
 def get_additional_fields_dict(dbo: Database, post: PostedData, linktype: str) -> dict:
     """
@@ -217,10 +232,13 @@ def append_to_results(dbo: Database, rows: Results, linktype: str = "animal") ->
     Goes through each row in rows and adds any additional fields to the resultset.
     Requires an ID column in the rows.
     """
-    add = get_additional_fields_ids(dbo, rows, linktype)
+    # Group the field values by the record they belong to so that
+    # each row only has to look at its own
+    bylink = {}
+    for af in get_additional_fields_ids(dbo, rows, linktype):
+        bylink.setdefault(af.LINKID, []).append(af)
     for r in rows:
-        for af in add:
-            if af.LINKID != r.ID: continue
+        for af in bylink.get(r.ID, []):
             tn = af.FIELDNAME.upper()
             if tn.find("&") != -1:
                 # We've got unicode chars for the tag name - not allowed
@@ -333,12 +351,14 @@ def insert_additional(dbo: Database, linktype: int, linkid: int, additionalfield
     """ Inserts an additional field record """
     try:
         dbo.delete("additional", "LinkType=%s AND LinkID=%s AND AdditionalFieldID=%s" % (linktype, linkid, additionalfieldid))
-        return dbo.insert("additional", {
+        iid = dbo.insert("additional", {
             "LinkType":             linktype,
             "LinkID":               linkid,
             "AdditionalFieldID":    additionalfieldid,
             "Value":                value
         }, generateID=False, writeAudit=False)
+        asm3.searchindex.refresh(dbo, asm3.searchindex.get_additional_subjects(linktype, linkid))
+        return iid
     except Exception as err:
         asm3.al.error("Failed saving additional field: %s" % err, "additional.insert_additional", dbo, sys.exc_info())
 
@@ -5,21 +5,26 @@ import asm3.animalname
 import asm3.asynctask
 import asm3.audit
 import asm3.configuration
+import asm3.dashboard
 import asm3.diary
 import asm3.dbfs
+import asm3.dbms.base
 import asm3.financial
 import asm3.log
 import asm3.lookups
 import asm3.media
 import asm3.movement
 import asm3.publishers.base
+import asm3.timeline
 import asm3.utils
 import asm3.users
 
 from asm3.i18n import _, date_diff, date_diff_days, format_diff, display2python, python2display, remove_time, subtract_years, subtract_months
 from asm3.i18n import add_days, subtract_days, monday_of_week, first_of_month, last_of_month, first_of_year
-from asm3.typehints import Database, List, PostedData, ResultRow, Results, Tuple
+from asm3.sitedefs import DASHBOARD_COUNTERS
+from asm3.typehints import Callable, Database, Dict, List, PostedData, ResultRow, Results, Tuple
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from random import choice
 
@@ -1158,16 +1163,7 @@ def get_animal_find_simple(dbo: Database, query: str, classfilter: str = "all",
         sql = f"{sql} WHERE a.Archived=0 {locationfilter} ORDER BY a.AnimalName"
         return calc_ages(dbo, dbo.query(sql, limit=limit, distincton="ID"))
     ss = asm3.utils.SimpleSearchBuilder(dbo, query)
-    ss.add_fields([ "a.AnimalName", "a.ShelterCode", "a.ShortCode", "a.AcceptanceNumber", "a.BreedName",
-        "a.IdentichipNumber", "a.Identichip2Number", "a.TattooNumber", "a.RabiesTag", "il.LocationName", 
-        "a.ShelterLocationUnit", "a.PickupAddress" ])
-    ss.add_clause("EXISTS(SELECT ad.Value FROM additional ad " \
-        "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
-        "WHERE ad.LinkID=a.ID AND ad.LinkType IN (%s) AND LOWER(ad.Value) LIKE ?)" % asm3.additional.ANIMAL_IN)
-    ss.add_large_text_fields([ "a.Markings", "a.HiddenAnimalDetails", "a.AnimalComments", "a.ReasonNO", 
-       "a.HealthProblems", "a.PTSReason" ])
-    if asm3.utils.is_numeric(query) and len(query) > 4:
-        ss.add_clause("EXISTS(SELECT ID FROM animalvaccination av WHERE av.AnimalID = a.ID AND av.RabiesTag LIKE ?)")
+    ss.add_search_index("animal", "a.ID")
     if classfilter == "shelter":
         classfilter = "a.Archived = 0 AND "
     elif classfilter == "female":
@@ -1178,9 +1174,8 @@ def get_animal_find_simple(dbo: Database, query: str, classfilter: str = "all",
     if lf is not None: locationfilter = lf.clause(tablequalifier="a", andsuffix=True)
     # run the query to retrieve the list of rows with matching IDs
     ors = " OR ".join(ss.ors)
-    idsql = 'SELECT DISTINCT a.ID FROM animal a LEFT OUTER JOIN internallocation il ON il.ID = ShelterLocation WHERE ' \
-        f"{classfilter} {locationfilter} ({ors})"
-    idrows = dbo.query_list(idsql, ss.values, limit=limit)
+    idsql = f"SELECT a.ID FROM animal a LEFT OUTER JOIN internallocation il ON il.ID = a.ShelterLocation " \
+        f"WHERE {classfilter} {locationfilter} ({ors})"
     idrows = [ "0" ] + dbo.query_list(idsql, ss.values, limit=limit)
     idin = ",".join([ str(x) for x in idrows ])
     # then get them
@@ -1544,9 +1539,10 @@ def get_animals_stray(dbo: Database, lf: LocationFilter = None) -> Results:
     sql = f"{query} WHERE a.EntryTypeID=2 AND a.Archived=0 {locationfilter} ORDER BY DateBroughtIn"
     return dbo.query(sql)
 
-def get_alerts(dbo: Database, lf: LocationFilter = None, age: int = 120) -> Results:
+def get_alert_counters(dbo: Database, lf: LocationFilter = None) -> List[Tuple[str, Tuple, str]]:
     """
-    Returns the alert totals for the main screen.
+    Returns the alert counters for the main screen as a list of
+    (name, tables read, subquery) tuples.
     """
     futuremonth = dbo.sql_date(dbo.today(offset=31))
     oneyear = dbo.sql_date(dbo.today(offset=-365))
@@ -1565,101 +1561,158 @@ def get_alerts(dbo: Database, lf: LocationFilter = None, age: int = 120) -> Resu
     alertrabies = asm3.configuration.alert_species_rabies(dbo)
     if not asm3.configuration.include_off_shelter_medical(dbo):
         shelterfilter = " AND (Archived = 0 OR ActiveMovementType = 2)"
-    sql = "SELECT " \
+    counters = [
+        ("duevacc", ("animalvaccination", "animal"),
         "(SELECT COUNT(*) FROM animalvaccination INNER JOIN animal ON animal.ID = animalvaccination.AnimalID " \
             "LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation WHERE " \
             "DateOfVaccination Is Null AND DeceasedDate Is Null %(shelterfilter)s AND " \
-            "DateRequired  >= %(oneyear)s AND DateRequired <= %(today)s %(locfilter)s) AS duevacc," \
+            "DateRequired  >= %(oneyear)s AND DateRequired <= %(today)s %(locfilter)s)"),
+        ("expvacc", ("animalvaccination", "animal"),
         "(SELECT COUNT(*) FROM animalvaccination av1 INNER JOIN animal ON animal.ID = av1.AnimalID " \
             "LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation WHERE " \
             "av1.DateOfVaccination Is Not Null AND DeceasedDate Is Null %(shelterfilter)s AND " \
             "av1.DateExpires  >= %(oneyear)s AND av1.DateExpires <= %(today)s %(locfilter)s AND " \
             "0 = (SELECT COUNT(*) FROM animalvaccination av2 WHERE av2.AnimalID = av1.AnimalID AND " \
-            "av2.ID <> av1.ID AND av2.DateRequired >= av1.DateOfVaccination AND av2.VaccinationID = av1.VaccinationID)) AS expvacc," \
+            "av2.ID <> av1.ID AND av2.DateRequired >= av1.DateOfVaccination AND av2.VaccinationID = av1.VaccinationID))"),
+        ("nevervacc", ("animalvaccination", "animal"),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
             "WHERE Archived=0 %(locfilter)s AND SpeciesID IN ( %(alertnevervacc)s ) AND " \
-            "NOT EXISTS(SELECT ID FROM animalvaccination WHERE AnimalID=animal.ID AND DateOfVaccination Is Not Null)) AS nevervacc," \
+            "NOT EXISTS(SELECT ID FROM animalvaccination WHERE AnimalID=animal.ID AND DateOfVaccination Is Not Null))"),
+        ("duetest", ("animaltest", "animal"),
         "(SELECT COUNT(*) FROM animaltest INNER JOIN animal ON animal.ID = animaltest.AnimalID " \
             "LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation WHERE " \
             "DateOfTest Is Null AND DeceasedDate Is Null %(shelterfilter)s AND " \
-            "DateRequired >= %(oneyear)s AND DateRequired <= %(today)s %(locfilter)s) AS duetest," \
+            "DateRequired >= %(oneyear)s AND DateRequired <= %(today)s %(locfilter)s)"),
+        ("duemed", ("animalmedicaltreatment", "animalmedical", "animal"),
         "(SELECT COUNT(*) FROM animalmedicaltreatment INNER JOIN animal ON animal.ID = animalmedicaltreatment.AnimalID " \
             "INNER JOIN animalmedical ON animalmedicaltreatment.AnimalMedicalID = animalmedical.ID " \
             "LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation WHERE " \
             "DateGiven Is Null AND DeceasedDate Is Null %(shelterfilter)s AND " \
-            "Status = 0 AND DateRequired  >= %(oneyear)s AND DateRequired <= %(today)s %(locfilter)s) AS duemed," \
-        "(SELECT COUNT(*) FROM animalboarding WHERE InDateTime >= %(today)s AND InDateTime < %(tomorrow)s) AS boardintoday, " \
-        "(SELECT COUNT(*) FROM animalboarding WHERE OutDateTime >= %(today)s AND OutDateTime < %(tomorrow)s) AS boardouttoday, " \
-        "(SELECT COUNT(*) FROM clinicappointment WHERE DateTime >= %(today)s AND DateTime < %(tomorrow)s) AS dueclinic," \
+            "Status = 0 AND DateRequired  >= %(oneyear)s AND DateRequired <= %(today)s %(locfilter)s)"),
+        ("boardintoday", ("animalboarding",),
+        "(SELECT COUNT(*) FROM animalboarding WHERE InDateTime >= %(today)s AND InDateTime < %(tomorrow)s)"),
+        ("boardouttoday", ("animalboarding",),
+        "(SELECT COUNT(*) FROM animalboarding WHERE OutDateTime >= %(today)s AND OutDateTime < %(tomorrow)s)"),
+        ("dueclinic", ("clinicappointment",),
+        "(SELECT COUNT(*) FROM clinicappointment WHERE DateTime >= %(today)s AND DateTime < %(tomorrow)s)"),
+        ("urgentwl", ("animalwaitinglist", "owner"),
         "(SELECT COUNT(*) FROM animalwaitinglist INNER JOIN owner ON owner.ID = animalwaitinglist.OwnerID " \
-            "WHERE Urgency = 1 AND DateRemovedFromList Is Null) AS urgentwl," \
+            "WHERE Urgency = 1 AND DateRemovedFromList Is Null)"),
+        ("rsvhck", ("adoption", "owner"),
         "(SELECT COUNT(*) FROM adoption INNER JOIN owner ON owner.ID = adoption.OwnerID WHERE " \
-            "MovementType = 0 AND ReservationDate Is Not Null AND ReservationCancelledDate Is Null AND IDCheck = 0) AS rsvhck," \
-        "(SELECT COUNT(DISTINCT OwnerID) FROM ownerdonation WHERE DateDue <= %(today)s AND Date Is Null) AS duedon," \
+            "MovementType = 0 AND ReservationDate Is Not Null AND ReservationCancelledDate Is Null AND IDCheck = 0)"),
+        ("duedon", ("ownerdonation",),
+        "(SELECT COUNT(DISTINCT OwnerID) FROM ownerdonation WHERE DateDue <= %(today)s AND Date Is Null)"),
+        ("endtrial", ("adoption", "animal"),
         "(SELECT COUNT(*) FROM adoption INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "DeceasedDate Is Null AND IsTrial = 1 AND ReturnDate Is Null AND MovementType = 1 AND TrialEndDate <= %(today)s) AS endtrial," \
-        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(onemonth)s AND Comments LIKE 'ES01%%') - " \
-        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(onemonth)s AND Comments LIKE 'ES02%%') AS docunsigned, " \
-        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(oneweek)s AND Comments LIKE 'ES02%%') AS docsigned, " \
-        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(oneweek)s AND Comments LIKE 'AC01%%') - " \
-        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(oneweek)s AND Comments LIKE 'AC02%%') AS opencheckout, " \
+            "DeceasedDate Is Null AND IsTrial = 1 AND ReturnDate Is Null AND MovementType = 1 AND TrialEndDate <= %(today)s)"),
+        ("docunsigned", ("log",),
+        "((SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(onemonth)s AND Comments LIKE 'ES01%%') - " \
+        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(onemonth)s AND Comments LIKE 'ES02%%'))"),
+        ("docsigned", ("log",),
+        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(oneweek)s AND Comments LIKE 'ES02%%')"),
+        ("opencheckout", ("log",),
+        "((SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(oneweek)s AND Comments LIKE 'AC01%%') - " \
+        "(SELECT COUNT(*) FROM log WHERE LinkType IN (0,1) AND Date >= %(oneweek)s AND Comments LIKE 'AC02%%'))"),
+        ("longrsv", ("adoption", "animal"),
         "(SELECT COUNT(*) FROM adoption INNER JOIN animal ON adoption.AnimalID = animal.ID WHERE " \
             "Archived = 0 AND DeceasedDate Is Null AND ReservationDate Is Not Null AND ReservationDate <= %(oneweek)s " \
-            "AND ReservationCancelledDate Is Null AND MovementType = 0 AND MovementDate Is Null) AS longrsv," \
+            "AND ReservationCancelledDate Is Null AND MovementType = 0 AND MovementDate Is Null)"),
+        ("notneu", ("animal",),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
             "WHERE Neutered = 0 AND ActiveMovementType = 1 AND " \
-            "ActiveMovementDate > %(onemonth)s %(locfilter)s AND SpeciesID IN ( %(alertneuter)s ) ) AS notneu," \
+            "ActiveMovementDate > %(onemonth)s %(locfilter)s AND SpeciesID IN ( %(alertneuter)s ) )"),
+        ("notrab", ("animal",),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
-            "WHERE Archived = 0 %(locfilter)s AND RabiesTag = '' AND SpeciesID IN ( %(alertrabies)s ) ) AS notrab," \
+            "WHERE Archived = 0 %(locfilter)s AND RabiesTag = '' AND SpeciesID IN ( %(alertrabies)s ) )"),
+        ("notchip", ("animal",),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
-            "WHERE Identichipped = 0 AND Archived = 0 %(locfilter)s AND SpeciesID IN ( %(alertchip)s ) ) AS notchip, " \
+            "WHERE Identichipped = 0 AND Archived = 0 %(locfilter)s AND SpeciesID IN ( %(alertchip)s ) )"),
+        ("notadopt", ("animal",),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
-            "WHERE Archived = 0 AND IsNotAvailableForAdoption = 1 %(locfilter)s) AS notadopt, " \
+            "WHERE Archived = 0 AND IsNotAvailableForAdoption = 1 %(locfilter)s)"),
+        ("holdtoday", ("animal",),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
-            "WHERE Archived = 0 %(locfilter)s AND IsHold = 1 AND HoldUntilDate = %(tomorrow)s) AS holdtoday, " \
-        "(SELECT COUNT(DISTINCT CollationID) FROM onlineformincoming) AS inform, " \
-        "(SELECT COUNT(*) FROM ownercitation WHERE FineDueDate Is Not Null AND FineDueDate <= %(today)s AND FinePaidDate Is Null) AS acunfine, " \
-        "(SELECT COUNT(*) FROM animalcontrol WHERE CompletedDate Is Null AND DispatchDateTime Is Null AND CallDateTime Is Not Null) AS acundisp, " \
-        "(SELECT COUNT(*) FROM animalcontrol WHERE CompletedDate Is Null) AS acuncomp, " \
+            "WHERE Archived = 0 %(locfilter)s AND IsHold = 1 AND HoldUntilDate = %(tomorrow)s)"),
+        ("inform", ("onlineformincoming",),
+        "(SELECT COUNT(DISTINCT CollationID) FROM onlineformincoming)"),
+        ("acunfine", ("ownercitation",),
+        "(SELECT COUNT(*) FROM ownercitation WHERE FineDueDate Is Not Null AND FineDueDate <= %(today)s AND FinePaidDate Is Null)"),
+        ("acundisp", ("animalcontrol",),
+        "(SELECT COUNT(*) FROM animalcontrol WHERE CompletedDate Is Null AND DispatchDateTime Is Null AND CallDateTime Is Not Null)"),
+        ("acuncomp", ("animalcontrol",),
+        "(SELECT COUNT(*) FROM animalcontrol WHERE CompletedDate Is Null)"),
+        ("acfoll", ("animalcontrol",),
         "(SELECT COUNT(*) FROM animalcontrol WHERE (" \
             "(FollowupDateTime Is Not Null AND FollowupDateTime <= %(endoftoday)s AND NOT FollowupComplete = 1) OR " \
             "(FollowupDateTime2 Is Not Null AND FollowupDateTime2 <= %(endoftoday)s AND NOT FollowupComplete2 = 1) OR " \
-            "(FollowupDateTime3 Is Not Null AND FollowupDateTime3 <= %(endoftoday)s) AND NOT FollowupComplete3 = 1)) AS acfoll, " \
-        "(SELECT COUNT(*) FROM ownertraploan WHERE ReturnDueDate Is Not Null AND ReturnDueDate <= %(today)s AND ReturnDate Is Null) AS tlover, " \
-        "(SELECT COUNT(*) FROM stocklevel WHERE Balance > 0 AND Expiry Is Not Null AND Expiry > %(today)s AND Expiry <= %(futuremonth)s) AS stexpsoon, " \
-        "(SELECT COUNT(*) FROM stocklevel WHERE Balance > 0 AND Expiry Is Not Null AND Expiry <= %(today)s) AS stexp, " \
-        "(SELECT COUNT(*) FROM stocklevel WHERE Balance < Low) AS stlowbal, " \
-        "(SELECT COUNT(*) FROM product WHERE (SELECT SUM(stocklevel.Balance) FROM stocklevel WHERE stocklevel.ProductID = product.ID) <= product.GlobalMinimum) AS globallows, " \
-        "(SELECT COUNT(*) FROM animaltransport WHERE (DriverOwnerID = 0 OR DriverOwnerID Is Null) AND Status < 10) AS trnodrv, " \
+            "(FollowupDateTime3 Is Not Null AND FollowupDateTime3 <= %(endoftoday)s) AND NOT FollowupComplete3 = 1))"),
+        ("tlover", ("ownertraploan",),
+        "(SELECT COUNT(*) FROM ownertraploan WHERE ReturnDueDate Is Not Null AND ReturnDueDate <= %(today)s AND ReturnDate Is Null)"),
+        ("stexpsoon", ("stocklevel",),
+        "(SELECT COUNT(*) FROM stocklevel WHERE Balance > 0 AND Expiry Is Not Null AND Expiry > %(today)s AND Expiry <= %(futuremonth)s)"),
+        ("stexp", ("stocklevel",),
+        "(SELECT COUNT(*) FROM stocklevel WHERE Balance > 0 AND Expiry Is Not Null AND Expiry <= %(today)s)"),
+        ("stlowbal", ("stocklevel",),
+        "(SELECT COUNT(*) FROM stocklevel WHERE Balance < Low)"),
+        ("globallows", ("product", "stocklevel"),
+        "(SELECT COUNT(*) FROM product WHERE (SELECT SUM(stocklevel.Balance) FROM stocklevel WHERE stocklevel.ProductID = product.ID) <= product.GlobalMinimum)"),
+        ("trnodrv", ("animaltransport",),
+        "(SELECT COUNT(*) FROM animaltransport WHERE (DriverOwnerID = 0 OR DriverOwnerID Is Null) AND Status < 10)"),
+        ("lngterm", ("animal",),
         "(SELECT COUNT(*) FROM animal LEFT OUTER JOIN internallocation il ON il.ID = animal.ShelterLocation " \
-            "WHERE Archived = 0 AND HasPermanentFoster = 0 AND DaysOnShelter > %(longterm)s %(locfilter)s) AS lngterm, " \
-        "(SELECT COUNT(*) FROM publishlog WHERE Alerts > 0 AND PublishDateTime >= %(today)s) AS publish " \
-        "FROM lksmovementtype WHERE ID=1" \
-            % { "today": today, "endoftoday": endoftoday, "tomorrow": tomorrow, 
-                "oneweek": oneweek, "oneyear": oneyear, "onemonth": onemonth, 
-                "futuremonth": futuremonth, "locfilter": locationfilter, "shelterfilter": shelterfilter, 
-                "alertchip": alertchip, "longterm": longterm, "alertneuter": alertneuter, 
-                "alertnevervacc": alertnevervacc, "alertrabies": alertrabies }
+            "WHERE Archived = 0 AND HasPermanentFoster = 0 AND DaysOnShelter > %(longterm)s %(locfilter)s)"),
+        ("publish", ("publishlog",),
+        "(SELECT COUNT(*) FROM publishlog WHERE Alerts > 0 AND PublishDateTime >= %(today)s)")
+    ]
+    params = { "today": today, "endoftoday": endoftoday, "tomorrow": tomorrow,
+        "oneweek": oneweek, "oneyear": oneyear, "onemonth": onemonth,
+        "futuremonth": futuremonth, "locfilter": locationfilter, "shelterfilter": shelterfilter,
+        "alertchip": alertchip, "longterm": longterm, "alertneuter": alertneuter,
+        "alertnevervacc": alertnevervacc, "alertrabies": alertrabies }
+    return [ (name, tables, sql % params) for name, tables, sql in counters ]
+
+def get_alerts(dbo: Database, lf: LocationFilter = None, age: int = 120) -> Results:
+    """
+    Returns the alert totals for the main screen.
+    If the user does not have a location filter, the precomputed dashboard
+    counters are used, otherwise the query is cached for age seconds.
+    """
+    counters = get_alert_counters(dbo, lf)
+    if DASHBOARD_COUNTERS and (lf is None or lf.clause() == ""):
+        return [ asm3.dbms.base.ResultRow(asm3.dashboard.get(dbo, "alerts", counters)) ]
+    sql = "SELECT %s FROM lksmovementtype WHERE ID=1" % ", ".join([ "%s AS %s" % (s, name) for name, tables, s in counters ])
     return dbo.query_cache(sql, age=age)
 
+def get_overview_counters(dbo: Database) -> List[Tuple[str, Tuple, str]]:
+    """
+    Returns the overview counters for the main screen as a list of
+    (name, tables read, subquery) tuples.
+    """
+    return [
+        ("OnShelter", ("animal",), "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND (ActiveMovementType Is Null OR ActiveMovementType = 0))"),
+        ("OnFoster", ("animal",), "(SELECT COUNT(*) FROM animal WHERE ActiveMovementType=2 AND DeceasedDate Is Null)"),
+        ("OnHold", ("animal",), "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND IsHold=1)"),
+        ("Reserved", ("animal",), "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND HasActiveReserve=1)"),
+        ("Retailer", ("animal",), "(SELECT COUNT(*) FROM animal WHERE ActiveMovementType=8 AND DeceasedDate Is Null)"),
+        ("TrialAdoption", ("animal",), "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND HasTrialAdoption=1)"),
+        ("Adoptable", ("animal",), "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND Adoptable=1)")
+    ]
+
 def get_overview(dbo: Database, age: int = 120) -> Results:
     """
     Returns the overview figures for the main screen.
     """
-    sql = "SELECT " \
-        "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND (ActiveMovementType Is Null OR ActiveMovementType = 0)) AS OnShelter, " \
-        "(SELECT COUNT(*) FROM animal WHERE ActiveMovementType=2 AND DeceasedDate Is Null) AS OnFoster, " \
-        "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND IsHold=1) AS OnHold, " \
-        "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND HasActiveReserve=1) AS Reserved, " \
-        "(SELECT COUNT(*) FROM animal WHERE ActiveMovementType=8 AND DeceasedDate Is Null) AS Retailer, " \
-        "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND HasTrialAdoption=1) AS TrialAdoption, " \
-        "(SELECT COUNT(*) FROM animal WHERE Archived=0 AND Adoptable=1) AS Adoptable " \
-        "FROM lksmovementtype WHERE ID=1"
+    counters = get_overview_counters(dbo)
+    if DASHBOARD_COUNTERS:
+        return asm3.dbms.base.ResultRow(asm3.dashboard.get(dbo, "overview", counters))
+    sql = "SELECT %s FROM lksmovementtype WHERE ID=1" % ", ".join([ "%s AS %s" % (s, name) for name, tables, s in counters ])
     return dbo.first_row(dbo.query_cache(sql, age=age))
 
-def get_stats(dbo: Database, age: int = 120) -> Results:
+def get_stats_counters(dbo: Database) -> List[Tuple[str, Tuple, str]]:
     """
-    Returns the stats figures for the main screen.
+    Returns the stats counters for the main screen as a list of
+    (name, tables read, subquery) tuples.
     """
     statperiod = asm3.configuration.show_stats_home_page(dbo)
     statdate = dbo.today() # defaulting to today
@@ -1667,30 +1720,51 @@ def get_stats(dbo: Database, age: int = 120) -> Results:
     if statperiod == "thismonth": statdate = first_of_month(statdate)
     if statperiod == "thisyear": statdate = first_of_year(statdate)
     if statperiod == "alltime": statdate = datetime(1900, 1, 1)
-    return dbo.query_named_params("SELECT " \
-        "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND MostRecentEntryDate >= :from) AS Entered," \
-        "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= :from AND MovementType = 1) AS Adopted," \
-        "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= :from AND MovementType = 5) AS Reclaimed, " \
-        "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= :from AND MovementType = 3) AS Transferred, " \
-        "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= :from AND MovementType IN (1,3,5,7)) AS LiveRelease, " \
-        "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= :from AND MovementType IN (4,6)) AS LostStolen, " \
-        "(SELECT COUNT(*) FROM adoption INNER JOIN animal ON animal.ID=adoption.AnimalID WHERE SpeciesID NOT IN (1,2) AND MovementDate >= :from AND MovementType = 7) AS Released, " \
-        "(SELECT COUNT(*) FROM adoption INNER JOIN animal ON animal.ID=adoption.AnimalID WHERE SpeciesID IN (1,2) AND MovementDate >= :from AND MovementType = 7) AS TNR, " \
-        "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND DeceasedDate >= :from AND PutToSleep = 1) AS PTS, " \
-        "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND DeceasedDate >= :from AND PutToSleep = 0 AND IsDOA = 0) AS Died, " \
-        "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND DeceasedDate >= :from AND PutToSleep = 0 AND IsDOA = 1) AS DOA, " \
-        "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND IsDOA = 0 AND DateBroughtIn < :from AND " \
-            "NOT EXISTS(SELECT MovementDate FROM adoption WHERE MovementDate < :from AND " \
-            "(ReturnDate Is Null OR ReturnDate >= :from) AND MovementType NOT IN (2,8) AND AnimalID = animal.ID)) AS BeginCount, " \
-        "(SELECT SUM(Donation) - COALESCE(SUM(VATAmount), 0) - COALESCE(SUM(Fee), 0) FROM ownerdonation WHERE Date >= :from) AS Donations, " \
-        "(SELECT SUM(CostAmount) FROM animalcost WHERE CostDate >= :from) + " \
-            "(SELECT SUM(Cost) FROM animalvaccination WHERE DateOfVaccination >= :from) + " \
-            "(SELECT SUM(Cost) FROM animaltest WHERE DateOfTest >= :from) + " \
-            "(SELECT SUM(Cost) FROM animalmedical WHERE StartDate >= :from) + " \
-            "(SELECT SUM(Cost) FROM animaltransport WHERE PickupDateTime >= :from) AS Costs " \
-        "FROM lksmovementtype WHERE ID=1", 
-        { "from": statdate },
-        age=age)
+    counters = [
+        ("Entered", ("animal",), "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND MostRecentEntryDate >= %(from)s)"),
+        ("Adopted", ("adoption",), "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= %(from)s AND MovementType = 1)"),
+        ("Reclaimed", ("adoption",), "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= %(from)s AND MovementType = 5)"),
+        ("Transferred", ("adoption",), "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= %(from)s AND MovementType = 3)"),
+        ("LiveRelease", ("adoption",), "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= %(from)s AND MovementType IN (1,3,5,7))"),
+        ("LostStolen", ("adoption",), "(SELECT COUNT(*) FROM adoption WHERE MovementDate >= %(from)s AND MovementType IN (4,6))"),
+        ("Released", ("adoption", "animal"), "(SELECT COUNT(*) FROM adoption INNER JOIN animal ON animal.ID=adoption.AnimalID WHERE SpeciesID NOT IN (1,2) AND MovementDate >= %(from)s AND MovementType = 7)"),
+        ("TNR", ("adoption", "animal"), "(SELECT COUNT(*) FROM adoption INNER JOIN animal ON animal.ID=adoption.AnimalID WHERE SpeciesID IN (1,2) AND MovementDate >= %(from)s AND MovementType = 7)"),
+        ("PTS", ("animal",), "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND DeceasedDate >= %(from)s AND PutToSleep = 1)"),
+        ("Died", ("animal",), "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND DeceasedDate >= %(from)s AND PutToSleep = 0 AND IsDOA = 0)"),
+        ("DOA", ("animal",), "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND DeceasedDate >= %(from)s AND PutToSleep = 0 AND IsDOA = 1)"),
+        ("BeginCount", ("animal", "adoption"), "(SELECT COUNT(*) FROM animal WHERE NonShelterAnimal = 0 AND IsDOA = 0 AND DateBroughtIn < %(from)s AND " \
+            "NOT EXISTS(SELECT MovementDate FROM adoption WHERE MovementDate < %(from)s AND " \
+            "(ReturnDate Is Null OR ReturnDate >= %(from)s) AND MovementType NOT IN (2,8) AND AnimalID = animal.ID))"),
+        ("Donations", ("ownerdonation",), "(SELECT SUM(Donation) - COALESCE(SUM(VATAmount), 0) - COALESCE(SUM(Fee), 0) FROM ownerdonation WHERE Date >= %(from)s)"),
+        ("Costs", ("animalcost", "animalvaccination", "animaltest", "animalmedical", "animaltransport"),
+            "((SELECT SUM(CostAmount) FROM animalcost WHERE CostDate >= %(from)s) + " \
+            "(SELECT SUM(Cost) FROM animalvaccination WHERE DateOfVaccination >= %(from)s) + " \
+            "(SELECT SUM(Cost) FROM animaltest WHERE DateOfTest >= %(from)s) + " \
+            "(SELECT SUM(Cost) FROM animalmedical WHERE StartDate >= %(from)s) + " \
+            "(SELECT SUM(Cost) FROM animaltransport WHERE PickupDateTime >= %(from)s))")
+    ]
+    params = { "from": dbo.sql_date(statdate) }
+    return [ (name, tables, sql % params) for name, tables, sql in counters ]
+
+def get_stats(dbo: Database, age: int = 120) -> Results:
+    """
+    Returns the stats figures for the main screen.
+    """
+    counters = get_stats_counters(dbo)
+    if DASHBOARD_COUNTERS:
+        return [ asm3.dbms.base.ResultRow(asm3.dashboard.get(dbo, "stats", counters)) ]
+    sql = "SELECT %s FROM lksmovementtype WHERE ID=1" % ", ".join([ "%s AS %s" % (s, name) for name, tables, s in counters ])
+    return dbo.query_cache(sql, age=age)
+
+def update_dashboard_counters(dbo: Database) -> None:
+    """
+    Recalculates all of the precomputed counters for the main screen.
+    Called by the daily batch to pick up any changes made outside of the application.
+    """
+    if not DASHBOARD_COUNTERS: return
+    asm3.dashboard.get(dbo, "alerts", get_alert_counters(dbo), reconcile=True)
+    asm3.dashboard.get(dbo, "overview", get_overview_counters(dbo), reconcile=True)
+    asm3.dashboard.get(dbo, "stats", get_stats_counters(dbo), reconcile=True)
 
 def embellish_timeline(l: str, rows: Results) -> Results:
     """
@@ -1745,214 +1819,7 @@ def get_timeline(dbo: Database, limit: int = 500, age: int = 120) -> Results:
     """
     Returns a list of recent events at the shelter.
     """
-    queries = [
-        "SELECT 'animal' AS LinkTarget, 'ENTERED' AS Category, DateBroughtIn AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 " \
-            "ORDER BY DateBroughtIn DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'MICROCHIP' AS Category, IdentichipDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND IdentichipDate Is Not Null " \
-            "ORDER BY IdentichipDate DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'NEUTERED' AS Category, NeuteredDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND NeuteredDate Is Not Null " \
-            "ORDER BY NeuteredDate DESC, ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'RESERVED' AS Category, ReservationDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Null AND ReservationDate Is Not Null " \
-            "ORDER BY ReservationDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'CANCRESERVE' AS Category, ReservationCancelledDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Null AND ReservationDate Is Not Null AND ReservationCancelledDate Is Not Null " \
-            "ORDER BY ReservationCancelledDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'ADOPTED' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 1 AND IsTrial = 0 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'TRIALSTART' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 1 AND IsTrial = 1 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'TRIALEND' AS Category, TrialEndDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND TrialEndDate Is Not Null AND MovementType = 1 AND IsTrial = 1 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'FOSTERED' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 2 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'TRANSFER' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 3 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'ESCAPED' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 4 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'RECLAIMED' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 5 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'STOLEN' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 6 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'RELEASED' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 7 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'RETAILER' AS Category, MovementDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 8 " \
-            "ORDER BY MovementDate DESC, animal.ID",
-        "SELECT 'animal_movements' AS LinkTarget, 'RETURNED' AS Category, ReturnDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
-            "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
-            "LEFT OUTER JOIN owner ON adoption.OwnerID = owner.ID " \
-            "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND ReturnDate Is Not Null " \
-            "ORDER BY ReturnDate DESC, animal.ID",
-        "SELECT 'animal' AS LinkTarget, 'DIED' AS Category, DeceasedDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, ReasonName AS Text3, animal.LastChangedBy FROM animal " \
-            "INNER JOIN deathreason ON animal.PTSReasonID = deathreason.ID " \
-            "WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND PutToSleep = 0 AND DeceasedDate Is Not Null " \
-            "ORDER BY DeceasedDate DESC, animal.ID",
-        "SELECT 'animal' AS LinkTarget, 'EUTHANISED' AS Category, DeceasedDate AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, ReasonName AS Text3, animal.LastChangedBy FROM animal " \
-            "INNER JOIN deathreason ON animal.PTSReasonID = deathreason.ID " \
-            "WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND PutToSleep = 1 AND DeceasedDate Is Not Null " \
-            "ORDER BY DeceasedDate DESC, animal.ID",
-        "SELECT 'animal' AS LinkTarget, 'FIVP' AS Category, CombiTestDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND CombiTested = 1 AND CombiTestDate Is Not Null AND CombiTestResult = 2 " \
-            "ORDER BY CombiTestDate DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'FLVP' AS Category, CombiTestDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND CombiTested = 1 AND CombiTestDate Is Not Null AND FLVResult = 2 " \
-            "ORDER BY CombiTestDate DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'HWP' AS Category, CombiTestDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND HeartwormTested = 1 AND HeartwormTestDate Is Not Null AND HeartwormTestResult = 2 " \
-            "ORDER BY HeartwormTestDate DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'QUARANTINE' AS Category, LastChangedDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND IsQuarantine = 1 " \
-            "ORDER BY LastChangedDate DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'HOLDON' AS Category, DateBroughtIn AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND IsHold = 1 " \
-            "ORDER BY DateBroughtIn DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'HOLDOFF' AS Category, HoldUntilDate AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND HoldUntilDate Is Not Null " \
-            "ORDER BY DateBroughtIn DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'NOTADOPT' AS Category, DateBroughtIn AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND IsNotAvailableForAdoption = 1 " \
-            "ORDER BY DateBroughtIn DESC, ID",
-        "SELECT 'animal' AS LinkTarget, 'AVAILABLE' AS Category, ActiveMovementReturn AS EventDate, ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
-            "WHERE NonShelterAnimal = 0 AND ActiveMovementReturn Is Not Null AND IsNotAvailableForAdoption = 0 " \
-            "ORDER BY ActiveMovementReturn DESC, ID",
-        "SELECT 'animal_vaccination' AS LinkTarget, 'VACC' AS Category, DateOfVaccination AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, VaccinationType AS Text3, animalvaccination.LastChangedBy FROM animal " \
-            "INNER JOIN animalvaccination ON animalvaccination.AnimalID = animal.ID " \
-            "INNER JOIN vaccinationtype ON vaccinationtype.ID = animalvaccination.VaccinationID " \
-            "WHERE NonShelterAnimal = 0 AND DateOfVaccination Is Not Null " \
-            "ORDER BY DateOfVaccination DESC, animal.ID",
-        "SELECT 'animal_test' AS LinkTarget, 'TEST' AS Category, DateOfTest AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, TestName AS Text3, animaltest.LastChangedBy FROM animal " \
-            "INNER JOIN animaltest ON animaltest.AnimalID = animal.ID " \
-            "INNER JOIN testtype ON testtype.ID = animaltest.TestTypeID " \
-            "WHERE NonShelterAnimal = 0 AND DateOfTest Is Not Null " \
-            "ORDER BY DateOfTest DESC, animal.ID",
-        "SELECT 'animal_medical' AS LinkTarget, 'MEDICAL' AS Category, DateGiven AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, TreatmentName AS Text3, animalmedicaltreatment.LastChangedBy FROM animal " \
-            "INNER JOIN animalmedicaltreatment ON animalmedicaltreatment.AnimalID = animal.ID " \
-            "INNER JOIN animalmedical ON animalmedicaltreatment.AnimalMedicalID = animalmedical.ID " \
-            "WHERE NonShelterAnimal = 0 AND DateGiven Is Not Null " \
-            "ORDER BY DateGiven DESC, animal.ID",
-        "SELECT 'animal_boarding' AS LinkTarget, 'BOARDIN' AS Category, InDateTime AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, BoardingName AS Text3, animalboarding.LastChangedBy FROM animalboarding " \
-            "INNER JOIN lkboardingtype ON lkboardingtype.ID = animalboarding.BoardingTypeID " \
-            "INNER JOIN animal ON animalboarding.AnimalID = animal.ID " \
-            "ORDER BY InDateTime DESC, animal.ID",
-        "SELECT 'animal_boarding' AS LinkTarget, 'BOARDOUT' AS Category, OutDateTime AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, BoardingName AS Text3, animalboarding.LastChangedBy FROM animalboarding " \
-            "INNER JOIN lkboardingtype ON lkboardingtype.ID = animalboarding.BoardingTypeID " \
-            "INNER JOIN animal ON animalboarding.AnimalID = animal.ID " \
-            "ORDER BY OutDateTime DESC, animal.ID",
-        "SELECT 'incident' AS LinkTarget, 'INCIDENTOPEN' AS Category, IncidentDateTime AS EventDate, animalcontrol.ID, " \
-            "IncidentName AS Text1, DispatchAddress AS Text2, '' AS Text3, LastChangedBy FROM animalcontrol " \
-            "INNER JOIN incidenttype ON incidenttype.ID = animalcontrol.IncidentTypeID " \
-            "ORDER BY IncidentDateTime DESC, animalcontrol.ID",
-        "SELECT 'incident' AS LinkTarget, 'INCIDENTCLOSE' AS Category, CompletedDate AS EventDate, animalcontrol.ID, " \
-            "IncidentName AS Text1, DispatchAddress AS Text2, CompletedName AS Text3, LastChangedBy FROM animalcontrol " \
-            "INNER JOIN incidenttype ON incidenttype.ID = animalcontrol.IncidentTypeID " \
-            "INNER JOIN incidentcompleted ON incidentcompleted.ID = animalcontrol.IncidentCompletedID " \
-            "ORDER BY CompletedDate DESC, animalcontrol.ID",
-        "SELECT 'animal_transport' AS LinkTarget, 'TRANSPORT' AS Category, PickupDateTime AS EventDate, animal.ID, " \
-            "ShelterCode AS Text1, AnimalName AS Text2, TransportTypeName AS Text3, animaltransport.LastChangedBy FROM animaltransport " \
-            "INNER JOIN transporttype ON transporttype.ID = animaltransport.TransportTypeID " \
-            "INNER JOIN animal ON animaltransport.AnimalID = animal.ID " \
-            "ORDER BY PickupDateTime DESC, animal.ID",
-        "SELECT 'lostanimal' AS LinkTarget, 'LOST' AS Category, DateLost AS EventDate, animallost.ID, " \
-            "DistFeat AS Text1, AreaLost AS Text2, SpeciesName AS Text3, LastChangedBy FROM animallost " \
-            "INNER JOIN species ON animallost.AnimalTypeID = species.ID " \
-            "ORDER BY DateLost DESC, animallost.ID",
-        "SELECT 'foundanimal' AS LinkTarget, 'FOUND' AS Category, DateFound AS EventDate, animalfound.ID, " \
-            "DistFeat AS Text1, AreaFound AS Text2, SpeciesName AS Text3, LastChangedBy FROM animalfound " \
-            "INNER JOIN species ON animalfound.AnimalTypeID = species.ID " \
-            "ORDER BY DateFound DESC, animalfound.ID",
-        "SELECT 'waitinglist' AS LinkTarget, 'WAITINGLIST' AS Category, DatePutOnList AS EventDate, animalwaitinglist.ID, " \
-            "AnimalDescription AS Text1, lkurgency.Urgency AS Text2, '' AS Text3, LastChangedBy FROM animalwaitinglist " \
-            "INNER JOIN lkurgency ON lkurgency.ID = animalwaitinglist.Urgency " \
-            "ORDER BY DatePutOnList DESC, animalwaitinglist.ID"
-    ]
-    if dbo.dbtype == "SQLITE":
-        # SQLITE can't support UNION with subqueries so construct a regular UNION
-        # query and order/limit at the end (much less efficient with larger datasets)
-        sql = ""
-        for i, q in enumerate(queries):
-            q = q[0:q.find("ORDER BY")]
-            if i > 0 and i < len(queries): sql += " UNION ALL "
-            sql += q
-        sql += " ORDER BY EventDate DESC, ID " + dbo.sql_limit(limit)
-        rows = dbo.query_cache(sql, age=age)
-        return embellish_timeline(dbo.locale, [x for x in rows if x.EVENTDATE <= dbo.today(settime="23:59:59")])
-    else:
-        # Use nested subqueries with their own order by and limits for dbs that can support it
-        # (performs better as the server is only having to collate smaller result sets)
-        sql = "SELECT * FROM ("
-        for i, q in enumerate(queries):
-            q = "(%s %s)" % (q, dbo.sql_limit(limit))
-            if i > 0 and i < len(queries): sql += " UNION ALL "
-            sql += q
-        sql += ") dummy WHERE EventDate <= ? ORDER BY EventDate DESC, ID " + dbo.sql_limit(limit)
-        # We use end of today rather than now() for 2 reasons - 
-        # 1. so it picks up all items for today and 2. now() would invalidate query_cache
-        return embellish_timeline(dbo.locale, dbo.query_cache(sql, [dbo.today(settime="23:59:59")], age=age))
+    return embellish_timeline(dbo.locale, asm3.timeline.get_events(dbo, limit, age))
 
 def calc_time_on_shelter(dbo: Database, animalid: int, a: ResultRow = None) -> str:
     """
@@ -3675,81 +3542,88 @@ def update_animals_from_form(dbo: Database, username: str, post: PostedData) ->
     """
     if len(post.integer_list("animals")) == 0: return 0
     aud = []
+    values = {}
     if post["litterid"] != "":
-        dbo.execute("UPDATE animal SET AcceptanceNumber = %s WHERE ID IN (%s)" % (dbo.sql_value(post["litterid"]), post["animals"]))
+        values["AcceptanceNumber"] = post["litterid"]
         aud.append("LitterID = %s" % post["litterid"])
     if post.integer("animaltype") != -1:
-        dbo.execute("UPDATE animal SET AnimalTypeID = %d WHERE ID IN (%s)" % (post.integer("animaltype"), post["animals"]))
+        values["AnimalTypeID"] = post.integer("animaltype")
         aud.append("AnimalTypeID = %s" % post["animaltype"])
     if post.integer("location") != -1 and post["unit"] != "-1":
         for animalid in post.integer_list("animals"):
             update_location_unit(dbo, username, animalid, post.integer("location"), post["unit"])
     elif post.integer("location") != -1:
-        dbo.execute("UPDATE animal SET ShelterLocation = %d WHERE ID IN (%s)" % (post.integer("location"), post["animals"]))
+        values["ShelterLocation"] = post.integer("location")
         aud.append("ShelterLocation = %s" % post["location"])
     elif post["unit"] != "-1":
-        dbo.execute("UPDATE animal SET ShelterLocationUnit = %s WHERE ID IN (%s)" % (dbo.sql_value(post["unit"]), post["animals"]))
+        values["ShelterLocationUnit"] = post["unit"]
         aud.append("ShelterLocationUnit = %s" % post["unit"])
     if post.integer("entryreason") != -1:
-        dbo.execute("UPDATE animal SET EntryReasonID = %d WHERE ID IN (%s)" % (post.integer("entryreason"), post["animals"]))
+        values["EntryReasonID"] = post.integer("entryreason")
         aud.append("EntryReasonID = %s" % post["entryreason"])
     if post.integer("fee") > 0:
-        dbo.execute("UPDATE animal SET Fee = %d WHERE ID IN (%s)" % (post.integer("fee"), post["animals"]))
+        values["Fee"] = post.integer("fee")
         aud.append("Fee = %s" % post["fee"])
     if post.integer("boardingcost") > 0:
-        dbo.execute("UPDATE animal SET DailyBoardingCost = %d WHERE ID IN (%s)" % (post.integer("boardingcost"), post["animals"]))
+        values["DailyBoardingCost"] = post.integer("boardingcost")
         aud.append("DailyBoardingCost = %s" % post["boardingcost"])
     if post.integer("notforadoption") != -1:
-        dbo.execute("UPDATE animal SET IsNotAvailableForAdoption = %d WHERE ID IN (%s)" % (post.integer("notforadoption"), post["animals"]))
+        values["IsNotAvailableForAdoption"] = post.integer("notforadoption")
         aud.append("IsNotAvailableForAdoption = %s" % post["notforadoption"])
     if post.integer("notforregistration") != -1:
-        dbo.execute("UPDATE animal SET IsNotForRegistration = %d WHERE ID IN (%s)" % (post.integer("notforregistration"), post["animals"]))
+        values["IsNotForRegistration"] = post.integer("notforregistration")
         aud.append("IsNotForRegistration = %s" % post["notforregistration"])
     if post["holduntil"] != "":
-        dbo.execute("UPDATE animal SET IsHold = 1, HoldUntilDate = %s WHERE ID IN (%s)" % (dbo.sql_date(post.date("holduntil")), post["animals"]))
+        values["IsHold"] = 1
+        values["HoldUntilDate"] = post.date("holduntil")
         aud.append("HoldUntilDate = %s" % post["holduntil"])
     if post.integer("goodwithcats") != -1:
-        dbo.execute("UPDATE animal SET IsGoodWithCats = %d WHERE ID IN (%s)" % (post.integer("goodwithcats"), post["animals"]))
+        values["IsGoodWithCats"] = post.integer("goodwithcats")
         aud.append("IsGoodWithCats = %s" % post["goodwithcats"])
     if post.integer("goodwithdogs") != -1:
-        dbo.execute("UPDATE animal SET IsGoodWithDogs = %d WHERE ID IN (%s)" % (post.integer("goodwithdogs"), post["animals"]))
+        values["IsGoodWithDogs"] = post.integer("goodwithdogs")
         aud.append("IsGoodWithDogs = %s" % post["goodwithdogs"])
     if post.integer("goodwithkids") != -1:
-        dbo.execute("UPDATE animal SET IsGoodWithChildren = %d WHERE ID IN (%s)" % (post.integer("goodwithkids"), post["animals"]))
+        values["IsGoodWithChildren"] = post.integer("goodwithkids")
         aud.append("IsGoodWithChildren = %s" % post["goodwithkids"])
     if post.integer("goodwithelderly") != -1:
-        dbo.execute("UPDATE animal SET IsGoodWithElderly = %d WHERE ID IN (%s)" % (post.integer("goodwithelderly"), post["animals"]))
+        values["IsGoodWithElderly"] = post.integer("goodwithelderly")
         aud.append("IsGoodWithElderly = %s" % post["goodwithelderly"])
     if post.integer("goodonlead") != -1:
-        dbo.execute("UPDATE animal SET IsGoodOnLead = %d WHERE ID IN (%s)" % (post.integer("goodonlead"), post["animals"]))
+        values["IsGoodOnLead"] = post.integer("goodonlead")
         aud.append("IsGoodOnLead = %s" % post["goodonlead"])
     if post.integer("goodtraveller") != -1:
-        dbo.execute("UPDATE animal SET IsGoodTraveller = %d WHERE ID IN (%s)" % (post.integer("goodtraveller"), post["animals"]))
+        values["IsGoodTraveller"] = post.integer("goodtraveller")
         aud.append("IsGoodTraveller = %s" % post["goodtraveller"])
     if post.integer("housetrained") != -1:
-        dbo.execute("UPDATE animal SET IsHouseTrained = %d WHERE ID IN (%s)" % (post.integer("housetrained"), post["animals"]))
+        values["IsHouseTrained"] = post.integer("housetrained")
         aud.append("IsHouseTrained = %s" % post["housetrained"])
     if post.integer("cratetrained") != -1:
-        dbo.execute("UPDATE animal SET IsCrateTrained = %d WHERE ID IN (%s)" % (post.integer("cratetrained"), post["animals"]))
+        values["IsCrateTrained"] = post.integer("cratetrained")
         aud.append("IsCrateTrained = %s" % post["cratetrained"])
     if post.integer("energylevel") != -1:
-        dbo.execute("UPDATE animal SET EnergyLevel = %d WHERE ID IN (%s)" % (post.integer("energylevel"), post["animals"]))
+        values["EnergyLevel"] = post.integer("energylevel")
         aud.append("EnergyLevel = %s" % post["energylevel"])
     if post["neutereddate"] != "":
-        dbo.execute("UPDATE animal SET Neutered = 1, NeuteredDate = %s WHERE ID IN (%s)" % (dbo.sql_date(post.date("neutereddate")), post["animals"]))
+        values["Neutered"] = 1
+        values["NeuteredDate"] = post.date("neutereddate")
         aud.append("NeuteredDate = %s" % post["neutereddate"])
     if post["neuteringvet"] != "" and post["neuteringvet"] != "0":
-        dbo.execute("UPDATE animal SET NeuteredByVetID = %d WHERE ID IN (%s)" % (post.integer("neuteringvet"), post["animals"]))
+        values["NeuteredByVetID"] = post.integer("neuteringvet")
         aud.append("NeuteredByVetID = %s" % post["neuteringvet"])
     if post["currentvet"] != "" and post["currentvet"] != "0":
-        dbo.execute("UPDATE animal SET CurrentVetID = %d WHERE ID IN (%s)" % (post.integer("currentvet"), post["animals"]))
+        values["CurrentVetID"] = post.integer("currentvet")
         aud.append("CurrentVetID = %s" % post["currentvet"])
     if post["ownersvet"] != "" and post["ownersvet"] != "0":
-        dbo.execute("UPDATE animal SET OwnersVetID = %d WHERE ID IN (%s)" % (post.integer("ownersvet"), post["animals"]))
+        values["OwnersVetID"] = post.integer("ownersvet")
         aud.append("OwnersVetID = %s" % post["ownersvet"])
     if post["coordinator"] != "" and post["coordinator"] != "0":
-        dbo.execute("UPDATE animal SET AdoptionCoordinatorID = %d WHERE ID IN (%s)" % (post.integer("coordinator"), post["animals"]))
+        values["AdoptionCoordinatorID"] = post.integer("coordinator")
         aud.append("AdoptionCoordinatorID = %s" % post["coordinator"])
+    if len(values) > 0:
+        # Set all of the chosen fields for all of the animals with one query
+        values = dbo.encode_str_before_write(values)
+        dbo.execute("UPDATE animal SET %s WHERE ID IN (%s)" % (",".join("%s=?" % k for k in values.keys()), post["animals"]), list(values.values()))
     if post["addflag"] != "":
         animals = dbo.query("SELECT ID, AdditionalFlags FROM animal WHERE ID IN (%s)" % post["animals"])
         for a in animals:
@@ -3804,8 +3678,7 @@ def update_animals_from_form(dbo: Database, username: str, post: PostedData) ->
     # Record the user as making the last change to this record and create audit records for the changes
     dbo.execute("UPDATE animal SET LastChangedBy = %s, LastChangedDate = %s WHERE ID IN (%s)" % (dbo.sql_value(username), dbo.sql_now(), post["animals"]))
     if len(aud) > 0:
-        for animalid in post.integer_list("animals"):
-            asm3.audit.edit(dbo, username, "animal", animalid, "", ", ".join(aud))
+        asm3.audit.action_many(dbo, asm3.audit.EDIT, username, "animal", [ (animalid, "", ", ".join(aud)) for animalid in post.integer_list("animals") ])
     return len(post.integer_list("animals"))
 
 def update_deceased_from_form(dbo: Database, username: str, post: PostedData) -> None:
@@ -4855,6 +4728,21 @@ def update_animal_breeds(dbo: Database, breedid: int = 0) -> str:
     asm3.al.debug(f"breedid={breedid}: updated breeds for {len(batch)} animal records", "update_animal_breeds", dbo)
     return "OK %d" % len(batch)
 
+def group_movements_by_animal(movements: Results) -> Dict[int, Results]:
+    """
+    Groups a list of movements for many animals into a dictionary of AnimalID to
+    a list of that animal's movements (retaining the original order) so that bulk
+    update routines can pass each animal only its own movements instead of having
+    every animal scan the full list.
+    """
+    groups = {}
+    for m in movements:
+        if m.animalid in groups:
+            groups[m.animalid].append(m)
+        else:
+            groups[m.animalid] = [m]
+    return groups
+
 def update_variable_animal_data(dbo: Database, animalid: int, a: ResultRow = None, animalupdatebatch: List[Tuple] = None, bands: List[Tuple[str, float]] = None, movements: Results = None) -> None:
     """
     Updates the variable data animal fields,
@@ -4910,15 +4798,16 @@ def update_all_variable_animal_data(dbo: Database) -> str:
     animals = dbo.query("SELECT ID, DateBroughtIn, DeceasedDate, DiedOffShelter, Archived, ActiveMovementDate, " \
         "MostRecentEntryDate, DateOfBirth FROM animal")
 
-    # Get a single lookup of movement histories for our animals
-    movements = dbo.query("SELECT AnimalID, MovementDate, ReturnDate FROM adoption " \
+    # Get a single lookup of movement histories for our animals, grouped by animal
+    movements = group_movements_by_animal(dbo.query("SELECT AnimalID, MovementDate, ReturnDate FROM adoption " \
         "WHERE MovementType NOT IN (2,8) AND MovementDate Is Not Null AND ReturnDate Is Not Null " \
-        "ORDER BY AnimalID")
+        "ORDER BY AnimalID"))
 
-    asm3.asynctask.set_progress_max(dbo, len(animals))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(animals))
     for a in animals:
-        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements)
-        asm3.asynctask.increment_progress_value(dbo)
+        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements.get(a.id, []))
+        progress.increment()
+    progress.finish()
 
     dbo.execute_many("UPDATE animal SET " \
         "TimeOnShelter = ?, " \
@@ -4949,16 +4838,16 @@ def update_foster_variable_animal_data(dbo: Database) -> str:
     animals = dbo.query("SELECT ID, DateBroughtIn, DeceasedDate, DiedOffShelter, Archived, ActiveMovementDate, " \
         "MostRecentEntryDate, DateOfBirth FROM animal WHERE Archived = 1 AND ActiveMovementType = 2")
 
-    # Get a single lookup of movement histories for our on shelter animals
-    movements = dbo.query("SELECT ad.AnimalID, ad.MovementDate, ad.ReturnDate " \
+    # Get a single lookup of movement histories for our on shelter animals, grouped by animal
+    movements = group_movements_by_animal(dbo.query("SELECT ad.AnimalID, ad.MovementDate, ad.ReturnDate " \
         "FROM animal a " \
         "INNER JOIN adoption ad ON a.ID = ad.AnimalID " \
         "WHERE a.Archived = 0 AND ad.MovementType NOT IN (2,8) " \
         "AND ad.MovementDate Is Not Null AND ad.ReturnDate Is Not Null " \
-        "ORDER BY a.ID")
+        "ORDER BY a.ID"))
 
     for a in animals:
-        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements)
+        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements.get(a.id, []))
 
     dbo.execute_many("UPDATE animal SET " \
         "TimeOnShelter = ?, " \
@@ -4988,16 +4877,16 @@ def update_on_shelter_variable_animal_data(dbo: Database) -> str:
     animals = dbo.query("SELECT ID, DateBroughtIn, DeceasedDate, DiedOffShelter, Archived, ActiveMovementDate, " \
         "MostRecentEntryDate, DateOfBirth FROM animal WHERE Archived = 0")
 
-    # Get a single lookup of movement histories for our on shelter animals
-    movements = dbo.query("SELECT ad.AnimalID, ad.MovementDate, ad.ReturnDate " \
+    # Get a single lookup of movement histories for our on shelter animals, grouped by animal
+    movements = group_movements_by_animal(dbo.query("SELECT ad.AnimalID, ad.MovementDate, ad.ReturnDate " \
         "FROM animal a " \
         "INNER JOIN adoption ad ON a.ID = ad.AnimalID " \
         "WHERE a.Archived = 0 AND ad.MovementType NOT IN (2,8) " \
         "AND ad.MovementDate Is Not Null AND ad.ReturnDate Is Not Null " \
-        "ORDER BY a.ID")
+        "ORDER BY a.ID"))
 
     for a in animals:
-        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements)
+        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements.get(a.id, []))
 
     dbo.execute_many("UPDATE animal SET " \
         "TimeOnShelter = ?, " \
@@ -5031,16 +4920,16 @@ def update_offshelter_young_variable_animal_data(dbo: Database) -> str:
     animals = dbo.query("SELECT ID, DateBroughtIn, DeceasedDate, DiedOffShelter, Archived, ActiveMovementDate, " \
         "MostRecentEntryDate, DateOfBirth FROM animal WHERE DateOfBirth > ? AND DeceasedDate Is Null AND Archived = 1", [ dbo.today(offset=-274) ])
 
-    # Get a single lookup of movement histories for our on shelter animals
-    movements = dbo.query("SELECT ad.AnimalID, ad.MovementDate, ad.ReturnDate " \
+    # Get a single lookup of movement histories for our on shelter animals, grouped by animal
+    movements = group_movements_by_animal(dbo.query("SELECT ad.AnimalID, ad.MovementDate, ad.ReturnDate " \
         "FROM animal a " \
         "INNER JOIN adoption ad ON a.ID = ad.AnimalID " \
         "WHERE a.Archived = 0 AND ad.MovementType NOT IN (2,8) " \
         "AND ad.MovementDate Is Not Null AND ad.ReturnDate Is Not Null " \
-        "ORDER BY a.ID")
+        "ORDER BY a.ID"))
 
     for a in animals:
-        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements)
+        update_variable_animal_data(dbo, a.id, a, animalupdatebatch, bands, movements.get(a.id, []))
 
     dbo.execute_many("UPDATE animal SET " \
         "TimeOnShelter = ?, " \
@@ -5060,14 +4949,15 @@ def update_all_animal_statuses(dbo: Database) -> str:
     Updates statuses for all animals
     """
     animals = dbo.query(get_animal_status_query(dbo))
-    movements = dbo.query(get_animal_movement_status_query(dbo) + " ORDER BY MovementDate DESC")
+    movements = group_movements_by_animal(dbo.query(get_animal_movement_status_query(dbo) + " ORDER BY MovementDate DESC"))
     animalupdatebatch = []
     diaryupdatebatch = []
 
-    asm3.asynctask.set_progress_max(dbo, len(animals))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(animals))
     for a in animals:
-        update_animal_status(dbo, a.id, a, movements, animalupdatebatch, diaryupdatebatch)
-        asm3.asynctask.increment_progress_value(dbo)
+        update_animal_status(dbo, a.id, a, movements.get(a.id, []), animalupdatebatch, diaryupdatebatch)
+        progress.increment()
+    progress.finish()
 
     aff = dbo.execute_many("UPDATE animal SET " \
         "Archived = ?, " \
@@ -5094,14 +4984,15 @@ def update_boarding_animal_statuses(dbo: Database) -> str:
     """
     animals = dbo.query(get_animal_status_query(dbo) + \
         " WHERE a.ID IN (SELECT AnimalID FROM animalboarding WHERE InDateTime <= ? AND OutDateTime >= ?)", ( dbo.today(), dbo.today() ))
-    movements = dbo.query(get_animal_movement_status_query(dbo) + " WHERE m.AnimalID IN " \
-        "(SELECT AnimalID FROM animalboarding WHERE InDateTime <= ? AND OutDateTime >= ?) ORDER BY MovementDate DESC", ( dbo.today(), dbo.today() ))
+    movements = group_movements_by_animal(dbo.query(get_animal_movement_status_query(dbo) + " WHERE m.AnimalID IN " \
+        "(SELECT AnimalID FROM animalboarding WHERE InDateTime <= ? AND OutDateTime >= ?) ORDER BY MovementDate DESC", ( dbo.today(), dbo.today() )))
     animalupdatebatch = []
     diaryupdatebatch = []
-    asm3.asynctask.set_progress_max(dbo, len(animals))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(animals))
     for a in animals:
-        update_animal_status(dbo, a.id, a, movements, animalupdatebatch, diaryupdatebatch)
-        asm3.asynctask.increment_progress_value(dbo)
+        update_animal_status(dbo, a.id, a, movements.get(a.id, []), animalupdatebatch, diaryupdatebatch)
+        progress.increment()
+    progress.finish()
 
     aff = dbo.execute_many("UPDATE animal SET " \
         "Archived = ?, " \
@@ -5130,13 +5021,13 @@ def update_foster_animal_statuses(dbo: Database) -> str:
     To counter that, this function only considers fosters/off shelter
     """
     animals = dbo.query(get_animal_status_query(dbo) + " WHERE a.ActiveMovementType = 2 AND a.Archived = 1")
-    movements = dbo.query(get_animal_movement_status_query(dbo) + \
-        " WHERE AnimalID IN (SELECT ID FROM animal WHERE ActiveMovementType = 2) ORDER BY MovementDate DESC")
+    movements = group_movements_by_animal(dbo.query(get_animal_movement_status_query(dbo) + \
+        " WHERE AnimalID IN (SELECT ID FROM animal WHERE ActiveMovementType = 2) ORDER BY MovementDate DESC"))
     animalupdatebatch = []
     diaryupdatebatch = []
 
     for a in animals:
-        update_animal_status(dbo, a.id, a, movements, animalupdatebatch, diaryupdatebatch)
+        update_animal_status(dbo, a.id, a, movements.get(a.id, []), animalupdatebatch, diaryupdatebatch)
 
     aff = dbo.execute_many("UPDATE animal SET " \
         "Archived = ?, " \
@@ -5164,14 +5055,15 @@ def update_on_shelter_animal_statuses(dbo: Database) -> str:
     """
     cutoff = dbo.today(offset=-1)
     animals = dbo.query(get_animal_status_query(dbo) + " WHERE a.Archived = 0 OR (a.Archived = 1 AND a.ActiveMovementReturn > ?)", [cutoff])
-    movements = dbo.query(get_animal_movement_status_query(dbo) + \
-        " WHERE AnimalID IN (SELECT ID FROM animal WHERE Archived = 0 OR (Archived = 1 AND ActiveMovementReturn > ?)) ORDER BY MovementDate DESC", [cutoff])
+    movements = group_movements_by_animal(dbo.query(get_animal_movement_status_query(dbo) + \
+        " WHERE AnimalID IN (SELECT ID FROM animal WHERE Archived = 0 OR (Archived = 1 AND ActiveMovementReturn > ?)) ORDER BY MovementDate DESC", [cutoff]))
     animalupdatebatch = []
     diaryupdatebatch = []
-    asm3.asynctask.set_progress_max(dbo, len(animals))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(animals))
     for a in animals:
-        update_animal_status(dbo, a.id, a, movements, animalupdatebatch, diaryupdatebatch)
-        asm3.asynctask.increment_progress_value(dbo)
+        update_animal_status(dbo, a.id, a, movements.get(a.id, []), animalupdatebatch, diaryupdatebatch)
+        progress.increment()
+    progress.finish()
 
     aff = dbo.execute_many("UPDATE animal SET " \
         "Archived = ?, " \
@@ -5517,6 +5409,138 @@ def get_number_animals_on_foster(dbo: Database, date: datetime, speciesid: int =
     sql += " AND (ReturnDate > %s OR ReturnDate Is Null))" % sdate
     return dbo.query_int(sql)
 
+def _merge_spans(spans: List[Tuple[int, int]]) -> List[List[int]]:
+    """ Merges a list of (start, end) index spans into a sorted list of
+        non-overlapping spans, dropping any that are empty """
+    merged = []
+    for lo, hi in sorted(x for x in spans if x[0] < x[1]):
+        if len(merged) > 0 and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+def _sweep_spans(n: int, groupspans: List[Tuple[int, int, int]]) -> Dict[int, List[int]]:
+    """ Takes a list of (group, start, end) index spans and sweeps them
+        to return a dictionary of group to a list of n counts """
+    deltas = {}
+    for group, lo, hi in groupspans:
+        if lo >= hi: continue
+        if group not in deltas: deltas[group] = [0] * (n + 1)
+        deltas[group][lo] += 1
+        deltas[group][hi] -= 1
+    counts = {}
+    for group, d in deltas.items():
+        c = []
+        total = 0
+        for i in range(n):
+            total += d[i]
+            c.append(total)
+        counts[group] = c
+    return counts
+
+def get_number_animals_on_shelter_days(dbo: Database, dates: List[datetime], groupby: str = "SpeciesID", startofday: bool = False) -> Dict[int, List[int]]:
+    """
+    Returns the number of animals on shelter at each of a list of dates, grouped by
+    a column of the animal table (eg: SpeciesID, AnimalTypeID, ShelterLocation).
+    The counts are the same as get_number_animals_on_shelter gives for each date and group,
+    but the animals and movements that overlap the dates are read in one go and
+    the counts are calculated by sweeping over the dates they cover.
+
+    dates: The dates to calculate the inventory for, in ascending order
+    groupby: The animal column to group the counts by
+    startofday: True to calculate at the start of each day (intake and outcomes on that day don't count)
+
+    Returns a dictionary of group value to a list of counts, one for each date.
+    Groups with no animals on shelter at any of the dates are not included.
+    """
+    n = len(dates)
+    if n == 0: return {}
+    if startofday:
+        points = [ datetime(d.year, d.month, d.day) for d in dates ]
+        # intakes, deaths, movements and returns on the day are all excluded
+        first, last = bisect_right, bisect_left
+    else:
+        points = [ datetime(d.year, d.month, d.day, 23, 59, 59) for d in dates ]
+        first, last = bisect_left, bisect_right
+    animalclause = "a.NonShelterAnimal = 0 AND a.DateBroughtIn <= %s " \
+        "AND (a.DeceasedDate Is Null OR a.DeceasedDate >= %s)" % (dbo.sql_date(points[-1]), dbo.sql_date(points[0]))
+    animals = dbo.query("SELECT a.ID, a.%s AS GroupID, a.DateBroughtIn, a.DeceasedDate FROM animal a " \
+        "WHERE %s" % (groupby, animalclause))
+    movements = {}
+    for m in dbo.query("SELECT m.AnimalID, m.MovementDate, m.ReturnDate FROM adoption m " \
+        "INNER JOIN animal a ON a.ID = m.AnimalID " \
+        "WHERE m.MovementType > 0 AND m.MovementDate Is Not Null AND m.MovementDate <= %s " \
+        "AND (m.ReturnDate Is Null OR m.ReturnDate >= %s) AND %s" % (dbo.sql_date(points[-1]), dbo.sql_date(points[0]), animalclause)):
+        hi = n
+        if m.returndate is not None: hi = last(points, m.returndate)
+        movements.setdefault(m.animalid, []).append((first(points, m.movementdate), hi))
+    spans = []
+    for a in animals:
+        lo = first(points, a.datebroughtin)
+        hi = n
+        if a.deceaseddate is not None: hi = last(points, a.deceaseddate)
+        # Remove the dates where the animal was off the shelter on a movement
+        for mlo, mhi in _merge_spans(movements.get(a.id, [])):
+            if mlo > lo: spans.append((a.groupid, lo, min(mlo, hi)))
+            lo = max(lo, mhi)
+            if lo >= hi: break
+        spans.append((a.groupid, lo, hi))
+    return _sweep_spans(n, spans)
+
+def get_number_animals_on_foster_days(dbo: Database, dates: List[datetime], groupby: str = "SpeciesID") -> Dict[int, List[int]]:
+    """
+    Returns the number of animals on foster at each of a list of dates (in ascending
+    order), grouped by a column of the animal table. The counts are the same as
+    get_number_animals_on_foster gives for each date and group.
+    Returns a dictionary of group value to a list of counts, one for each date.
+    """
+    n = len(dates)
+    if n == 0: return {}
+    points = [ datetime(d.year, d.month, d.day) for d in dates ]
+    animalclause = "a.NonShelterAnimal = 0 AND a.DateBroughtIn <= %s " \
+        "AND (a.DeceasedDate Is Null OR a.DeceasedDate > %s)" % (dbo.sql_date(points[-1]), dbo.sql_date(points[0]))
+    animals = {}
+    for a in dbo.query("SELECT a.ID, a.%s AS GroupID, a.DateBroughtIn, a.DeceasedDate FROM animal a " \
+        "WHERE %s" % (groupby, animalclause)):
+        animals[a.id] = a
+    fosters = {}
+    for m in dbo.query("SELECT m.AnimalID, m.MovementDate, m.ReturnDate FROM adoption m " \
+        "INNER JOIN animal a ON a.ID = m.AnimalID " \
+        "WHERE m.MovementType = %d AND m.MovementDate <= %s " \
+        "AND (m.ReturnDate Is Null OR m.ReturnDate > %s) AND %s" % (asm3.movement.FOSTER, dbo.sql_date(points[-1]), dbo.sql_date(points[0]), animalclause)):
+        hi = n
+        if m.returndate is not None: hi = bisect_left(points, m.returndate)
+        fosters.setdefault(m.animalid, []).append((bisect_left(points, m.movementdate), hi))
+    spans = []
+    for animalid, fspans in fosters.items():
+        a = animals[animalid]
+        lo = bisect_left(points, a.datebroughtin)
+        hi = n
+        if a.deceaseddate is not None: hi = bisect_left(points, a.deceaseddate)
+        # Only the dates the animal was in the shelter's care and out on foster count
+        for flo, fhi in _merge_spans(fspans):
+            spans.append((a.groupid, max(lo, flo), min(hi, fhi)))
+    return _sweep_spans(n, spans)
+
+def get_number_litters_on_shelter_days(dbo: Database, dates: List[datetime]) -> Dict[int, List[int]]:
+    """
+    Returns the number of active litters at each of a list of dates (in ascending
+    order), grouped by species. The counts are the same as get_number_litters_on_shelter
+    gives for each date and species.
+    Returns a dictionary of species to a list of counts, one for each date.
+    """
+    n = len(dates)
+    if n == 0: return {}
+    points = [ datetime(d.year, d.month, d.day) for d in dates ]
+    spans = []
+    for l in dbo.query("SELECT SpeciesID, Date, InvalidDate FROM animallitter " \
+        "WHERE Date <= %s AND (InvalidDate Is Null OR InvalidDate > %s)" % (dbo.sql_date(points[-1]), dbo.sql_date(points[0]))):
+        hi = n
+        if l.invaliddate is not None: hi = bisect_left(points, l.invaliddate)
+        spans.append((l.speciesid, bisect_left(points, l.date), hi))
+    return _sweep_spans(n, spans)
+
 def update_animal_figures(dbo: Database, month: int = 0, year: int = 0) -> str:
     """
     Updates the animal figures table for the month and year given.
@@ -5527,16 +5551,24 @@ def update_animal_figures(dbo: Database, month: int = 0, year: int = 0) -> str:
     batch = []
     nid = dbo.get_id_max("animalfigures")
 
-    def sql_days(sql: str) -> dict:
-        """ Returns a query with THEDATE and TOTAL as a dictionary for add_row """
+    def event_days(rows: Results, datefield: str, match: Callable) -> dict:
+        """ Counts the rows that match by the day of datefield as a dictionary for add_row """
         d = {}
         for i in range(1, 32):
             d["D%d" % i] = 0
-        rows = dbo.query(sql)
         for r in rows:
-            dk = "D%d" % r["THEDATE"].day
-            if dk not in d: d[dk] = 0
-            d[dk] += int(r["TOTAL"])
+            if match(r):
+                d["D%d" % r[datefield].day] += 1
+        return d
+
+    def counts_days(counts: List[int]) -> dict:
+        """ Returns a list of counts for each day of the month as a dictionary for add_row """
+        d = {}
+        for i in range(1, 32):
+            d["D%d" % i] = 0
+        if counts is not None:
+            for i, c in enumerate(counts):
+                d["D%d" % (i + 1)] = c
         return d
 
     def add_days(listdays: List[dict]) -> dict:
@@ -5668,199 +5700,134 @@ def update_animal_figures(dbo: Database, month: int = 0, year: int = 0) -> str:
     daysinmonth = lom.day
     loopdays = daysinmonth + 1
 
-    # Species =====================================
-    allspecies = asm3.lookups.get_species(dbo)
-    for sp in allspecies:
-
-        speciesid = int(sp["ID"])
-
-        # If we never had anything for this species, skip it
-        if 0 == dbo.query_int("SELECT COUNT(*) FROM animal WHERE SpeciesID = ?", [speciesid]):
-            continue
-
-        # On Shelter
-        onshelter = {}
-        for i in range(1, loopdays):
-            d = datetime(year, month, i)
-            dk = "D%d" % i
-            onshelter[dk] = get_number_animals_on_shelter(dbo, d, speciesid)
-        add_row(1, "SP_ONSHELTER", 0, speciesid, daysinmonth, _("On Shelter", l), 0, False, onshelter)
-
-        # On Foster
-        onfoster = {}
-        for i in range(1, loopdays):
-            d = datetime(year, month, i)
-            dk = "D%d" % i
-            onfoster[dk] = get_number_animals_on_foster(dbo, d, speciesid)
-        add_row(2, "SP_ONFOSTER", 0, speciesid, daysinmonth, _("On Foster", l), 0, False, onfoster)
-        # NOTE: On Foster counts are not added to the day counts deliberately.
-        # Start/End of day counts only track on shelter animals.
-        # If fosters were added, then fosters moving in and out of the shelter would be double counted.
-        #sheltertotal = add_days((onshelter, onfoster))
-        sheltertotal = onshelter
-
-        # Litters
-        litters = {}
-        for i in range(1, loopdays):
-            d = datetime(year, month, i)
-            dk = "D%d" % i
-            litters[dk] = get_number_litters_on_shelter(dbo, d, speciesid)
-        add_row(3, "SP_LITTERS", 0, speciesid, daysinmonth, _("Litters", l), 0, False, litters)
+    # Read the month's events and calculate the daily inventories in one go,
+    # everything else is counted from them in memory
+    days = [ datetime(year, month, i) for i in range(1, loopdays) ]
+    intakes = dbo.query("SELECT SpeciesID, AnimalTypeID, EntryReasonID, IsTransfer, DateBroughtIn FROM animal " \
+        "WHERE DateBroughtIn >= %s AND DateBroughtIn <= %s AND NonShelterAnimal = 0" % (firstofmonth, lastofmonth))
+    deaths = dbo.query("SELECT SpeciesID, AnimalTypeID, PutToSleep, DeceasedDate FROM animal " \
+        "WHERE DeceasedDate >= %s AND DeceasedDate <= %s AND DiedOffShelter = 0 AND NonShelterAnimal = 0" % (firstofmonth, lastofmonth))
+    movements = dbo.query("SELECT a.SpeciesID, a.AnimalTypeID, m.MovementType, m.MovementDate FROM adoption m " \
+        "INNER JOIN animal a ON a.ID = m.AnimalID " \
+        "WHERE m.MovementDate >= %s AND m.MovementDate <= %s" % (firstofmonth, lastofmonth))
+    returns = dbo.query("SELECT a.SpeciesID, a.AnimalTypeID, m.MovementType, m.ReturnDate FROM adoption m " \
+        "INNER JOIN animal a ON a.ID = m.AnimalID " \
+        "WHERE m.ReturnDate >= %s AND m.ReturnDate <= %s" % (firstofmonth, lastofmonth))
+    usedspecies = set(dbo.query_list("SELECT DISTINCT SpeciesID FROM animal"))
+    usedtypes = set(dbo.query_list("SELECT DISTINCT AnimalTypeID FROM animal"))
+    splitentryreason = asm3.configuration.animal_figures_split_entryreason(dbo)
+    reasons = asm3.lookups.get_entryreasons(dbo)
+
+    def add_movement_rows(prefix: str, col: str, gid: int, animaltypeid: int, speciesid: int, orderindex: int, intotalname: str, outtotalname: str, sheltertotal: dict) -> None:
+        """ Adds the intake, outcome and total rows for a species or type.
+            prefix: SP or AT, col: The column the rows are for, gid: The species or type ID
+            orderindex: The order index of the returned row, the rows that follow it are numbered from there """
 
         # Start of day total - handled at the end.
 
         # Brought In
         # If the config option is on, output a row for each entry
         # category or a single line for brought in.
-        if asm3.configuration.animal_figures_split_entryreason(dbo):
-            reasons = asm3.lookups.get_entryreasons(dbo)
+        if splitentryreason:
             idx = 5
             broughtin = {}
             for er in reasons:
-                erline = sql_days("SELECT DateBroughtIn AS TheDate, COUNT(ID) AS Total FROM animal WHERE " \
-                    "SpeciesID = %d AND DateBroughtIn >= %s AND DateBroughtIn <= %s " \
-                    "AND IsTransfer = 0 AND NonShelterAnimal = 0 AND EntryReasonID = %d " \
-                    "GROUP BY DateBroughtIn" % (speciesid, firstofmonth, lastofmonth, er["ID"]))
+                erline = event_days(intakes, "DATEBROUGHTIN", lambda r: r[col] == gid and r.istransfer == 0 and r.entryreasonid == er["ID"])
                 if not is_zero_days(erline):
-                    add_row(idx, "SP_ER_%d" % er["ID"], 0, speciesid, daysinmonth, er["REASONNAME"], 0, True, erline)
+                    add_row(idx, "%s_ER_%d" % (prefix, er["ID"]), animaltypeid, speciesid, daysinmonth, er["REASONNAME"], 0, True, erline)
                     idx += 1
                     broughtin = add_days((broughtin, erline))
         else:
-            broughtin = sql_days("SELECT DateBroughtIn AS TheDate, COUNT(ID) AS Total FROM animal WHERE " \
-                "SpeciesID = %d AND DateBroughtIn >= %s AND DateBroughtIn <= %s " \
-                "AND IsTransfer = 0 AND NonShelterAnimal = 0 " \
-                "GROUP BY DateBroughtIn" % (speciesid, firstofmonth, lastofmonth))
-            add_row(5, "SP_BROUGHTIN", 0, speciesid, daysinmonth, _("Incoming", l), 0, True, broughtin)
+            broughtin = event_days(intakes, "DATEBROUGHTIN", lambda r: r[col] == gid and r.istransfer == 0)
+            add_row(5, "%s_BROUGHTIN" % prefix, animaltypeid, speciesid, daysinmonth, _("Incoming", l), 0, True, broughtin)
 
         # Returned
-        returned = sql_days("SELECT ReturnDate AS TheDate, COUNT(animal.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON adoption.AnimalID = animal.ID " \
-            "WHERE SpeciesID = %d AND ReturnDate >= %s AND ReturnDate <= %s " \
-            "AND MovementType = %d " \
-            "GROUP BY ReturnDate" % (speciesid, firstofmonth, lastofmonth, asm3.movement.ADOPTION))
-        add_row(106, "SP_RETURNED", 0, speciesid, daysinmonth, _("Returned", l), 0, True, returned)
+        returned = event_days(returns, "RETURNDATE", lambda r: r[col] == gid and r.movementtype == asm3.movement.ADOPTION)
+        add_row(orderindex, "%s_RETURNED" % prefix, animaltypeid, speciesid, daysinmonth, _("Returned", l), 0, True, returned)
 
         # Transferred In
-        transferin = sql_days("SELECT DateBroughtIn AS TheDate, COUNT(ID) AS Total FROM animal WHERE " \
-            "SpeciesID = %d AND DateBroughtIn >= %s AND DateBroughtIn <= %s " \
-            "AND IsTransfer <> 0 AND NonShelterAnimal = 0 " \
-            "GROUP BY DateBroughtIn" % (speciesid, firstofmonth, lastofmonth))
-        add_row(107, "SP_TRANSFERIN", 0, speciesid, daysinmonth, _("Transferred In", l), 0, True, transferin)
+        transferin = event_days(intakes, "DATEBROUGHTIN", lambda r: r[col] == gid and r.istransfer != 0)
+        add_row(orderindex+1, "%s_TRANSFERIN" % prefix, animaltypeid, speciesid, daysinmonth, _("Transferred In", l), 0, True, transferin)
 
         # Returned From Fostering
-        returnedfoster = sql_days("SELECT ReturnDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND ReturnDate >= %s AND ReturnDate <= %s " \
-            "GROUP BY ReturnDate" % (speciesid, asm3.movement.FOSTER, firstofmonth, lastofmonth))
-        add_row(108, "SP_RETURNEDFOSTER", 0, speciesid, daysinmonth, _("From Fostering", l), 0, True, returnedfoster)
+        returnedfoster = event_days(returns, "RETURNDATE", lambda r: r[col] == gid and r.movementtype == asm3.movement.FOSTER)
+        add_row(orderindex+2, "%s_RETURNEDFOSTER" % prefix, animaltypeid, speciesid, daysinmonth, _("From Fostering", l), 0, True, returnedfoster)
 
         # Returned From Other
-        returnedother = sql_days("SELECT ReturnDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType <> %d AND MovementType <> %d " \
-            "AND ReturnDate >= %s AND ReturnDate <= %s " \
-            "GROUP BY ReturnDate" % (speciesid, asm3.movement.FOSTER, asm3.movement.ADOPTION, firstofmonth, lastofmonth))
-        add_row(109, "SP_RETURNEDOTHER", 0, speciesid, daysinmonth, _("From Other", l), 0, True, returnedother)
+        returnedother = event_days(returns, "RETURNDATE", lambda r: r[col] == gid and r.movementtype not in (asm3.movement.FOSTER, asm3.movement.ADOPTION))
+        add_row(orderindex+3, "%s_RETURNEDOTHER" % prefix, animaltypeid, speciesid, daysinmonth, _("From Other", l), 0, True, returnedother)
 
         # In subtotal
         insubtotal = add_days((broughtin, returned, transferin, returnedfoster, returnedother))
-        add_row(110, "SP_INTOTAL", 0, speciesid, daysinmonth, _("In SubTotal", l), 1, False, insubtotal)
-
-        # Adopted
-        adopted = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.ADOPTION, firstofmonth, lastofmonth))
-        add_row(111, "SP_ADOPTED", 0, speciesid, daysinmonth, _("Adopted", l), 0, True, adopted)
-
-        # Reclaimed
-        reclaimed = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.RECLAIMED, firstofmonth, lastofmonth))
-        add_row(112, "SP_RECLAIMED", 0, speciesid, daysinmonth, _("Returned To Owner", l), 0, True, reclaimed)
-
-        # Escaped
-        escaped = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.ESCAPED, firstofmonth, lastofmonth))
-        add_row(113, "SP_ESCAPED", 0, speciesid, daysinmonth, _("Escaped", l), 0, True, escaped)
-
-        # Stolen
-        stolen = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.STOLEN, firstofmonth, lastofmonth))
-        add_row(114, "SP_STOLEN", 0, speciesid, daysinmonth, _("Stolen", l), 0, True, stolen)
-
-        # Released
-        released = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.RELEASED, firstofmonth, lastofmonth))
-        add_row(115, "SP_RELEASED", 0, speciesid, daysinmonth, _("Released To Wild", l), 0, True, released)
-
-        # Transferred
-        transferred = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.TRANSFER, firstofmonth, lastofmonth))
-        add_row(116, "SP_TRANSFERRED", 0, speciesid, daysinmonth, _("Transferred Out", l), 0, True, transferred)
-
-        # Fostered
-        fostered = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.FOSTER, firstofmonth, lastofmonth))
-        add_row(117, "SP_FOSTERED", 0, speciesid, daysinmonth, _("To Fostering", l), 0, True, fostered)
-
-        # Retailer
-        retailer = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, asm3.movement.RETAILER, firstofmonth, lastofmonth))
-        add_row(118, "SP_RETAILER", 0, speciesid, daysinmonth, _("To Retailer", l), 0, True, retailer)
+        add_row(orderindex+4, "%s_INTOTAL" % prefix, animaltypeid, speciesid, daysinmonth, intotalname, 1, False, insubtotal)
+
+        # Outcomes, one row for each movement type
+        outcomes = []
+        for i, (code, movementtype, heading) in enumerate((
+            ("ADOPTED", asm3.movement.ADOPTION, _("Adopted", l)),
+            ("RECLAIMED", asm3.movement.RECLAIMED, _("Returned To Owner", l)),
+            ("ESCAPED", asm3.movement.ESCAPED, _("Escaped", l)),
+            ("STOLEN", asm3.movement.STOLEN, _("Stolen", l)),
+            ("RELEASED", asm3.movement.RELEASED, _("Released To Wild", l)),
+            ("TRANSFERRED", asm3.movement.TRANSFER, _("Transferred Out", l)),
+            ("FOSTERED", asm3.movement.FOSTER, _("To Fostering", l)),
+            ("RETAILER", asm3.movement.RETAILER, _("To Retailer", l)) )):
+            moved = event_days(movements, "MOVEMENTDATE", lambda r: r[col] == gid and r.movementtype == movementtype)
+            add_row(orderindex+5+i, "%s_%s" % (prefix, code), animaltypeid, speciesid, daysinmonth, heading, 0, True, moved)
+            outcomes.append(moved)
 
         # Died
-        died = sql_days("SELECT DeceasedDate AS TheDate, COUNT(animal.ID) AS Total FROM animal WHERE " \
-            "SpeciesID = %d AND DeceasedDate >= %s AND DeceasedDate <= %s " \
-            "AND PutToSleep = 0 AND DiedOffShelter = 0 AND NonShelterAnimal = 0 " \
-            "GROUP BY DeceasedDate" % (speciesid, firstofmonth, lastofmonth))
-        add_row(119, "SP_DIED", 0, speciesid, daysinmonth, _("Died", l), 0, True, died)
+        died = event_days(deaths, "DECEASEDDATE", lambda r: r[col] == gid and r.puttosleep == 0)
+        add_row(orderindex+13, "%s_DIED" % prefix, animaltypeid, speciesid, daysinmonth, _("Died", l), 0, True, died)
 
         # PTS
-        pts = sql_days("SELECT DeceasedDate AS TheDate, COUNT(animal.ID) AS Total FROM animal WHERE " \
-            "SpeciesID = %d AND DeceasedDate >= %s AND DeceasedDate <= %s " \
-            "AND PutToSleep <> 0 AND DiedOffShelter = 0 AND NonShelterAnimal = 0 " \
-            "GROUP BY DeceasedDate" % (speciesid, firstofmonth, lastofmonth))
-        add_row(120, "SP_PTS", 0, speciesid, daysinmonth, _("Euthanized", l), 0, True, pts)
+        pts = event_days(deaths, "DECEASEDDATE", lambda r: r[col] == gid and r.puttosleep != 0)
+        add_row(orderindex+14, "%s_PTS" % prefix, animaltypeid, speciesid, daysinmonth, _("Euthanized", l), 0, True, pts)
 
         # Other
-        toother = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "SpeciesID = %d AND MovementType NOT IN (1, 2, 3, 4, 5, 6, 7, 8) " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (speciesid, firstofmonth, lastofmonth))
-        add_row(121, "SP_OUTOTHER", 0, speciesid, daysinmonth, _("To Other", l), 0, True, toother)
+        toother = event_days(movements, "MOVEMENTDATE", lambda r: r[col] == gid and r.movementtype not in (1, 2, 3, 4, 5, 6, 7, 8))
+        add_row(orderindex+15, "%s_OUTOTHER" % prefix, animaltypeid, speciesid, daysinmonth, _("To Other", l), 0, True, toother)
 
         # Out subtotal
-        outsubtotal = add_days((adopted, reclaimed, escaped, stolen, released, transferred, fostered, retailer, died, pts, toother))
-        add_row(122, "SP_OUTTOTAL", 0, speciesid, daysinmonth, _("Out SubTotal", l), 1, False, outsubtotal)
+        outsubtotal = add_days(outcomes + [ died, pts, toother ])
+        add_row(orderindex+16, "%s_OUTTOTAL" % prefix, animaltypeid, speciesid, daysinmonth, outtotalname, 1, False, outsubtotal)
 
         # Start of day total
         starttotal = sub_days(sheltertotal, insubtotal)
         starttotal = add_days((starttotal, outsubtotal))
-        add_row(4, "SP_STARTTOTAL", 0, speciesid, daysinmonth, _("Start Of Day", l), 1, False, starttotal)
+        add_row(4, "%s_STARTTOTAL" % prefix, animaltypeid, speciesid, daysinmonth, _("Start Of Day", l), 1, False, starttotal)
+
+    # Species =====================================
+    allspecies = asm3.lookups.get_species(dbo)
+    onshelterspecies = get_number_animals_on_shelter_days(dbo, days, "SpeciesID")
+    onfosterspecies = get_number_animals_on_foster_days(dbo, days, "SpeciesID")
+    litterspecies = get_number_litters_on_shelter_days(dbo, days)
+    for sp in allspecies:
+
+        speciesid = int(sp["ID"])
+
+        # If we never had anything for this species, skip it
+        if speciesid not in usedspecies:
+            continue
+
+        # On Shelter
+        onshelter = counts_days(onshelterspecies.get(speciesid))
+        add_row(1, "SP_ONSHELTER", 0, speciesid, daysinmonth, _("On Shelter", l), 0, False, onshelter)
+
+        # On Foster
+        onfoster = counts_days(onfosterspecies.get(speciesid))
+        add_row(2, "SP_ONFOSTER", 0, speciesid, daysinmonth, _("On Foster", l), 0, False, onfoster)
+        # NOTE: On Foster counts are not added to the day counts deliberately.
+        # Start/End of day counts only track on shelter animals.
+        # If fosters were added, then fosters moving in and out of the shelter would be double counted.
+        #sheltertotal = add_days((onshelter, onfoster))
+        sheltertotal = onshelter
+
+        # Litters
+        litters = counts_days(litterspecies.get(speciesid))
+        add_row(3, "SP_LITTERS", 0, speciesid, daysinmonth, _("Litters", l), 0, False, litters)
+
+        add_movement_rows("SP", "SPECIESID", speciesid, 0, speciesid, 106, _("In SubTotal", l), _("Out SubTotal", l), sheltertotal)
 
         # End of day
         add_row(123, "SP_TOTAL", 0, speciesid, daysinmonth, _("End Of Day", l), 1, False, sheltertotal)
@@ -5869,187 +5836,27 @@ def update_animal_figures(dbo: Database, month: int = 0, year: int = 0) -> str:
 
     # Animal Types =====================================
     alltypes = asm3.lookups.get_animal_types(dbo)
+    onsheltertypes = get_number_animals_on_shelter_days(dbo, days, "AnimalTypeID")
+    onfostertypes = get_number_animals_on_foster_days(dbo, days, "AnimalTypeID")
     for at in alltypes:
 
         typeid = at.id
 
         # If we never had anything for this type, skip it
-        if 0 == dbo.query_int("SELECT COUNT(*) FROM animal WHERE AnimalTypeID = ?", [typeid]):
+        if typeid not in usedtypes:
             continue
 
         # On Shelter
-        onshelter = {}
-        for i in range(1, loopdays):
-            d = datetime(year, month, i)
-            dk = "D%d" % i
-            onshelter[dk] = get_number_animals_on_shelter(dbo, d, 0, typeid)
+        onshelter = counts_days(onsheltertypes.get(typeid))
         add_row(1, "AT_ONSHELTER", typeid, 0, daysinmonth, _("On Shelter", l), 0, False, onshelter)
 
         # On Foster
-        onfoster = {}
-        for i in range(1, loopdays):
-            d = datetime(year, month, i)
-            dk = "D%d" % i
-            onfoster[dk] = get_number_animals_on_foster(dbo, d, 0, typeid)
+        onfoster = counts_days(onfostertypes.get(typeid))
         add_row(2, "AT_ONFOSTER", typeid, 0, daysinmonth, _("On Foster", l), 0, False, onfoster)
         #sheltertotal = add_days((onshelter, onfoster))
         sheltertotal = onshelter
 
-        # Start of day - handled later
-
-        # Brought In
-        # If the config option is on, output a row for each entry
-        # category or a single line for brought in.
-        if asm3.configuration.animal_figures_split_entryreason(dbo):
-            reasons = asm3.lookups.get_entryreasons(dbo)
-            broughtin = {}
-            idx = 5
-            for er in reasons:
-                erline = sql_days("SELECT DateBroughtIn AS TheDate, COUNT(ID) AS Total FROM animal WHERE " \
-                    "AnimalTypeID = %d AND DateBroughtIn >= %s AND DateBroughtIn <= %s " \
-                    "AND IsTransfer = 0 AND NonShelterAnimal = 0 AND EntryReasonID = %d " \
-                    "GROUP BY DateBroughtIn" % (typeid, firstofmonth, lastofmonth, er["ID"]))
-                if not is_zero_days(erline):
-                    add_row(idx, "AT_ER_%d" % er["ID"], typeid, 0, daysinmonth, er["REASONNAME"], 0, True, erline)
-                    broughtin = add_days((broughtin, erline))
-                    idx += 1
-        else:
-            # Brought In
-            broughtin = sql_days("SELECT DateBroughtIn AS TheDate, COUNT(ID) AS Total FROM animal WHERE " \
-                "AnimalTypeID = %d AND DateBroughtIn >= %s AND DateBroughtIn <= %s " \
-                "AND IsTransfer = 0 AND NonShelterAnimal = 0 " \
-                "GROUP BY DateBroughtIn" % (typeid, firstofmonth, lastofmonth))
-            add_row(5, "AT_BROUGHTIN", typeid, 0, daysinmonth, _("Incoming", l), 0, True, broughtin)
-
-        # Returned
-        returned = sql_days("SELECT ReturnDate AS TheDate, COUNT(animal.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON adoption.AnimalID = animal.ID " \
-            "WHERE AnimalTypeID = %d AND ReturnDate >= %s AND ReturnDate <= %s " \
-            "AND MovementType = %d " \
-            "GROUP BY ReturnDate" % (typeid, firstofmonth, lastofmonth, asm3.movement.ADOPTION))
-        add_row(6, "AT_RETURNED", typeid, 0, daysinmonth, _("Returned", l), 0, True, returned)
-
-        # Transferred In
-        transferin = sql_days("SELECT DateBroughtIn AS TheDate, COUNT(ID) AS Total FROM animal WHERE " \
-            "AnimalTypeID = %d AND DateBroughtIn >= %s AND DateBroughtIn <= %s " \
-            "AND IsTransfer <> 0 AND NonShelterAnimal = 0 " \
-            "GROUP BY DateBroughtIn" % (typeid, firstofmonth, lastofmonth))
-        add_row(7, "AT_TRANSFERIN", typeid, 0, daysinmonth, _("Transferred In", l), 0, True, transferin)
-
-        # Returned From Fostering
-        returnedfoster = sql_days("SELECT ReturnDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND ReturnDate >= %s AND ReturnDate <= %s " \
-            "GROUP BY ReturnDate" % (typeid, asm3.movement.FOSTER, firstofmonth, lastofmonth))
-        add_row(8, "AT_RETURNEDFOSTER", typeid, 0, daysinmonth, _("From Fostering", l), 0, True, returnedfoster)
-
-        # Returned From Other
-        returnedother = sql_days("SELECT ReturnDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType <> %d AND MovementType <> %d " \
-            "AND ReturnDate >= %s AND ReturnDate <= %s " \
-            "GROUP BY ReturnDate" % (typeid, asm3.movement.FOSTER, asm3.movement.ADOPTION, firstofmonth, lastofmonth))
-        add_row(9, "AT_RETURNEDOTHER", typeid, 0, daysinmonth, _("From Other", l), 0, True, returnedother)
-
-        # In subtotal
-        insubtotal = add_days((broughtin, returned, transferin, returnedfoster, returnedother))
-        add_row(10, "AT_INTOTAL", typeid, 0, daysinmonth, _("SubTotal", l), 1, False, insubtotal)
-
-        # Adopted
-        adopted = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.ADOPTION, firstofmonth, lastofmonth))
-        add_row(11, "AT_ADOPTED", typeid, 0, daysinmonth, _("Adopted", l), 0, True, adopted)
-
-        # Reclaimed
-        reclaimed = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.RECLAIMED, firstofmonth, lastofmonth))
-        add_row(12, "AT_RECLAIMED", typeid, 0, daysinmonth, _("Returned To Owner", l), 0, True, reclaimed)
-
-        # Escaped
-        escaped = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.ESCAPED, firstofmonth, lastofmonth))
-        add_row(13, "AT_ESCAPED", typeid, 0, daysinmonth, _("Escaped", l), 0, True, escaped)
-
-        # Stolen
-        stolen = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.STOLEN, firstofmonth, lastofmonth))
-        add_row(14, "AT_STOLEN", typeid, 0, daysinmonth, _("Stolen", l), 0, True, stolen)
-
-        # Released
-        released = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.RELEASED, firstofmonth, lastofmonth))
-        add_row(15, "AT_RELEASED", typeid, 0, daysinmonth, _("Released To Wild", l), 0, True, released)
-
-        # Transferred
-        transferred = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.TRANSFER, firstofmonth, lastofmonth))
-        add_row(16, "AT_TRANSFERRED", typeid, 0, daysinmonth, _("Transferred Out", l), 0, True, transferred)
-
-        # Fostered
-        fostered = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.FOSTER, firstofmonth, lastofmonth))
-        add_row(17, "AT_FOSTERED", typeid, 0, daysinmonth, _("To Fostering", l), 0, True, fostered)
-
-        # Retailer
-        retailer = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType = %d " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, asm3.movement.RETAILER, firstofmonth, lastofmonth))
-        add_row(18, "AT_RETAILER", typeid, 0, daysinmonth, _("To Retailer", l), 0, True, retailer)
-
-        # Died
-        died = sql_days("SELECT DeceasedDate AS TheDate, COUNT(animal.ID) AS Total FROM animal WHERE " \
-            "AnimalTypeID = %d AND DeceasedDate >= %s AND DeceasedDate <= %s " \
-            "AND PutToSleep = 0 AND DiedOffShelter = 0 AND NonShelterAnimal = 0 " \
-            "GROUP BY DeceasedDate" % (typeid, firstofmonth, lastofmonth))
-        add_row(19, "AT_DIED", typeid, 0, daysinmonth, _("Died", l), 0, True, died)
-
-        # PTS
-        pts = sql_days("SELECT DeceasedDate AS TheDate, COUNT(animal.ID) AS Total FROM animal WHERE " \
-            "AnimalTypeID = %d AND DeceasedDate >= %s AND DeceasedDate <= %s " \
-            "AND PutToSleep <> 0 AND DiedOffShelter = 0 AND NonShelterAnimal = 0 " \
-            "GROUP BY DeceasedDate" % (typeid, firstofmonth, lastofmonth))
-        add_row(20, "AT_PTS", typeid, 0, daysinmonth, _("Euthanized", l), 0, True, pts)
-
-        # Other
-        toother = sql_days("SELECT MovementDate AS TheDate, COUNT(adoption.ID) AS Total FROM adoption " \
-            "INNER JOIN animal ON animal.ID = adoption.AnimalID WHERE " \
-            "AnimalTypeID = %d AND MovementType NOT IN (1, 2, 3, 4, 5, 6, 7, 8) " \
-            "AND MovementDate >= %s AND MovementDate <= %s " \
-            "GROUP BY MovementDate" % (typeid, firstofmonth, lastofmonth))
-        add_row(21, "AT_OUTOTHER", typeid, 0, daysinmonth, _("To Other", l), 0, True, toother)
-
-        # Out subtotal
-        outsubtotal = add_days((adopted, reclaimed, escaped, stolen, released, transferred, fostered, retailer, died, pts, toother))
-        add_row(22, "AT_OUTTOTAL", typeid, 0, daysinmonth, _("SubTotal", l), 1, False, outsubtotal)
-
-        # Start of day total
-        starttotal = sub_days(sheltertotal, insubtotal)
-        starttotal = add_days((starttotal, outsubtotal))
-        add_row(4, "AT_STARTTOTAL", typeid, 0, daysinmonth, _("Start Of Day", l), 1, False, starttotal)
+        add_movement_rows("AT", "ANIMALTYPEID", typeid, typeid, 0, 6, _("SubTotal", l), _("SubTotal", l), sheltertotal)
 
         # End of day
         add_row(50, "AT_TOTAL", typeid, 0, daysinmonth, _("End Of Day", l), 1, False, sheltertotal)
@@ -170,12 +170,7 @@ def get_animalcontrol_find_simple(dbo: Database, query: str = "", username: str
         ss.ors.append("ac.IncidentDateTime > %s AND ac.CompletedDate Is Null %s" % (dbo.sql_date(dbo.today(offset=-30)), sitefilter))
     else:
         if asm3.utils.is_numeric(query): ss.add_field_value("ac.ID", asm3.utils.cint(query))
-        ss.add_fields([ "ac.IncidentCode", "co.OwnerName", "ti.IncidentName", "ac.DispatchAddress", "ac.DispatchPostcode", 
-            "o1.OwnerName", "o2.OwnerName", "o3.OwnerName", "vo.OwnerName" ])
-        ss.add_clause(u"EXISTS(SELECT ad.Value FROM additional ad " \
-            "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
-            "WHERE ad.LinkID=ac.ID AND ad.LinkType IN (%s) AND LOWER(ad.Value) LIKE ?)" % (asm3.additional.INCIDENT_IN))
-        ss.add_large_text_fields([ "ac.CallNotes", "ac.AnimalDescription" ])
+        ss.add_search_index("animalcontrol", "ac.ID")
 
     sql = "%s WHERE ac.ID > 0 %s AND (%s) ORDER BY ac.ID" % ( get_animalcontrol_query(dbo), sitefilter, " OR ".join(ss.ors))
     return reduce_find_results(dbo, username, dbo.query(sql, ss.values, limit=limit, distincton="ID"))
@@ -6,6 +6,9 @@ Only allows one async task per database to be run at a time.
 For many tasks, it should be as simple as calling their function as
 an argument to function_task, and having the function code call 
 async.set_progress_value(>100) or async.increment_progress_value()
+
+Loops over many records should use a ProgressTracker instead, which
+only writes the progress value to the cache every so often.
 """
 
 import asm3.cachedisk
@@ -13,6 +16,12 @@ import asm3.cachedisk
 from asm3.typehints import Any, Callable, Database
 
 import threading
+import time
+
+# ProgressTracker writes the progress value to the cache at most every
+# this many items or milliseconds, whichever comes first.
+PROGRESS_FLUSH_ITEMS = 50
+PROGRESS_FLUSH_MS = 1000
 
 lc = {}
 
@@ -114,6 +123,68 @@ def set_last_error(dbo: Database, e: str) -> None:
     """ Set the last error message """
     put(dbo, "tasklasterror", e)
 
+class ProgressTracker(object):
+    """ Tracks progress through a loop in memory and only writes the progress
+        value to the cache (and checks whether the task has been cancelled)
+        every flushitems items or flushms milliseconds, eg:
+
+        p = asm3.asynctask.ProgressTracker(dbo, len(rows))
+        for r in rows:
+            p.increment()
+            if p.is_cancelled(): break
+            ...
+        p.finish()
+
+        As with increment_progress_value, nothing is written if there is 
+        no task running for the database.
+    """
+    def __init__(self, dbo: Database, progressmax: int, flushitems: int = PROGRESS_FLUSH_ITEMS, flushms: int = PROGRESS_FLUSH_MS):
+        self.dbo = dbo
+        self.flushitems = flushitems
+        self.flushms = flushms
+        set_progress_max(dbo, progressmax)
+        self.value = get_progress_value(dbo)
+        self.active = self.value is not None
+        self.cancelled = get_cancel(dbo)
+        self.pending = 0
+        self.lastflush = time.monotonic()
+
+    def set_max(self, progressmax: int) -> None:
+        """ Changes the maximum progress value, eg: when the number of items is only known part way through """
+        set_progress_max(self.dbo, progressmax)
+
+    def increment(self, n: int = 1) -> None:
+        """ Adds n to the progress value """
+        if not self.active: return
+        self.value += n
+        self.pending += n
+        if self.pending >= self.flushitems or (time.monotonic() - self.lastflush) * 1000 >= self.flushms:
+            self.flush()
+
+    def set_value(self, v: int) -> None:
+        """ Sets the progress value """
+        if not self.active: return
+        self.pending += abs(v - self.value)
+        self.value = v
+        if self.pending >= self.flushitems or (time.monotonic() - self.lastflush) * 1000 >= self.flushms:
+            self.flush()
+
+    def is_cancelled(self) -> bool:
+        """ Returns whether the running task should stop as of the last time progress was written """
+        return self.cancelled
+
+    def flush(self) -> None:
+        """ Writes the progress value to the cache and checks for cancellation """
+        if self.active and self.pending > 0:
+            set_progress_value(self.dbo, self.value)
+        self.pending = 0
+        self.lastflush = time.monotonic()
+        self.cancelled = get_cancel(self.dbo)
+
+    def finish(self) -> None:
+        """ Writes any remaining progress to the cache, call at the end of the loop """
+        self.flush()
+
 class FuncThread(threading.Thread):
     """ Class that wraps calling a function in a new thread.
         Calls our reset method after the task is done, 
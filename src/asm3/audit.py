@@ -1,8 +1,13 @@
 
 import asm3.al
+import asm3.utils
+
+import contextlib
+import datetime
+import threading
 
 from asm3.sitedefs import DB_RETAIN_AUDIT_DAYS
-from asm3.typehints import Database, List, ResultRow, Results
+from asm3.typehints import Any, Database, Dict, Generator, List, ResultRow, Results, Tuple
 
 ADD = 0
 EDIT = 1
@@ -34,6 +39,9 @@ READABLE_FIELDS = {
     "users":        [ "USERNAME", "REALNAME" ]
 }
 
+# Audit records waiting to be written by the batch the current thread is in
+queued = threading.local()
+
 def get_audit_for_link(dbo: Database, tablename: str, linkid: int) -> Results:
     """ Returns the audit records for a particular link and table """
     parentlinks = "%%%s=%s %%" % (tablename, linkid)
@@ -107,6 +115,34 @@ def map_diff(row1: ResultRow, row2: ResultRow, ref: List[str] = []) -> str:
             s += k + " removed, "
     return s
 
+def apply_values(dbo: Database, row: ResultRow, values: Dict) -> ResultRow:
+    """
+    Returns a copy of row (read before an update) with the values written by the
+    update applied, so that the row after an update can be diffed without reading 
+    it back. values should have already been through encode_str_before_write.
+    Values are converted to the types they would come back from the database as
+    so that map_diff only shows the columns that really changed.
+    """
+    after = row.copy()
+    for k, v in values.items():
+        k = k.upper()
+        before = row.get(k)
+        if isinstance(v, bool):
+            v = int(v)
+        elif asm3.utils.is_str(v):
+            v = dbo.encode_str_after_read(v)
+            if isinstance(before, (int, float)) and not isinstance(before, bool):
+                try:
+                    v = type(before)(v)
+                except ValueError:
+                    pass
+        elif isinstance(v, datetime.date) and not isinstance(v, datetime.datetime):
+            v = datetime.datetime(v.year, v.month, v.day)
+        elif isinstance(v, int) and isinstance(before, float):
+            v = float(v)
+        after[k] = v
+    return after
+
 def dump_row(dbo: Database, tablename: str, rowid: int) -> str:
     return dump_rows(dbo, tablename, "ID = %s" % rowid)
 
@@ -211,7 +247,7 @@ def action(dbo: Database, action: str, username: str, tablename: str, linkid: in
     if len(description) > 16384:
         description = description[0:16384]
 
-    dbo.insert("audittrail", {
+    values = {
         "Action":       action,
         "AuditDate":    dbo.now(),
         "UserName":     username,
@@ -219,7 +255,69 @@ def action(dbo: Database, action: str, username: str, tablename: str, linkid: in
         "LinkID":       linkid,
         "ParentLinks":  parentlinks,
         "Description":  description
-    }, generateID=False, writeAudit=False)
+    }
+    # If we're inside a batch, the record is written when it ends
+    q = getattr(queued, "records", None)
+    if q is not None:
+        q.append( (dbo, values) )
+        return
+    dbo.insert("audittrail", values, generateID=False, writeAudit=False)
+
+def action_many(dbo: Database, action: str, username: str, tablename: str, items: List[Tuple[int, str, str]]) -> None:
+    """
+    Adds a batch of audit records with one multi-row insert.
+    items: A list of (linkid, parentlinks, description) tuples
+    """
+    now = dbo.now()
+    dbo.insert_many("audittrail", [ {
+        "Action":       action,
+        "AuditDate":    now,
+        "UserName":     username,
+        "TableName":    tablename,
+        "LinkID":       linkid,
+        "ParentLinks":  parentlinks,
+        "Description":  description[0:16384]
+    } for linkid, parentlinks, description in items ], generateID=False, writeAudit=False)
+
+@contextlib.contextmanager
+def batch() -> Generator[None, None, None]:
+    """
+    Context manager that holds back the audit records written by the current 
+    thread inside the block and then writes them with one insert per database
+    when the block ends. Nested batches are written by the outermost one.
+    """
+    if getattr(queued, "records", None) is not None:
+        yield
+        return
+    queued.records = []
+    try:
+        yield
+    finally:
+        records = queued.records
+        queued.records = None
+        flush(records)
+
+def flush(records: List[Tuple[Database, Dict[str, Any]]]) -> None:
+    """
+    Writes a list of (dbo, values) audit records queued by batch
+    """
+    bydb = {}
+    for dbo, values in records:
+        bydb.setdefault(id(dbo), (dbo, []))[1].append(values)
+    for dbo, rows in bydb.values():
+        try:
+            dbo.insert_many("audittrail", rows, generateID=False, writeAudit=False)
+        except Exception as err:
+            asm3.al.error("failed writing %d audit records: %s" % (len(rows), err), "audit.flush", dbo)
+
+def create_rows(dbo: Database, username: str, tablename: str, ids: List[int]) -> None:
+    """
+    Adds audit records for a batch of newly inserted rows
+    """
+    items = []
+    for r in dbo.query("SELECT * FROM %s WHERE ID IN (%s) ORDER BY ID" % (tablename, ",".join(str(int(x)) for x in ids))):
+        items.append( (r.ID, get_parent_links(r, tablename), str([r])) )
+    action_many(dbo, ADD, username, tablename, items)
 
 def clean(dbo: Database) -> None:
     """
@@ -2,20 +2,56 @@
 """
 Implements a python disk cache in a similar way to memcache,
 uses md5sums of the key as filenames.
+
+Entries for each path (namespace) are sharded into subdirectories by the 
+first two characters of the hash, eg: DISK_CACHE/path/ab/abcdef...
+Each shard has an append-only expiry index (.expires) of expiry times and 
+filenames so that remove_expired does not have to unpickle every entry.
+Each path has a byte budget of DISK_CACHE_MAX_SIZE, when it is exceeded the 
+least recently used entries are removed. The last access time of an entry 
+is kept in the atime of its file.
+
+Each entry file starts with a fixed size header containing its expiry time,
+followed by the pickled value. Entries are written to a temporary file and
+renamed over the old one, so readers always see a complete entry and do not
+need to take any locks.
 """
 
 import asm3.al
 
-import fcntl
 import hashlib
 import os
 import pickle
 import re
+import struct
 import threading
 import time
 
-from asm3.sitedefs import DISK_CACHE
-from asm3.typehints import Any
+from asm3.sitedefs import DISK_CACHE, DISK_CACHE_MAX_SIZE
+from asm3.typehints import Any, Dict, List, Tuple
+
+# The header at the start of each entry file, a magic number and the expiry time
+HEADER = struct.Struct(">4sd")
+HEADER_MAGIC = b"ASC1"
+
+# Temporary files older than this many seconds are left over from a failed
+# write and can be removed
+TEMP_MAX_AGE = 3600
+
+# The name of the expiry index file in each shard
+EXPIRY_INDEX = ".expires"
+
+# When evicting, remove entries until the path is this fraction of the budget
+# so that we are not walking the cache again on the next put
+EVICT_TO = 0.9
+
+# Only record the access time of an entry when it is read if it
+# has not been recorded for this many seconds
+TOUCH_INTERVAL = 60
+
+# Approximate number of bytes in use for each path in this process
+totals = {}
+totalslock = threading.Lock()
 
 def _sanitise_path(path: str) -> str:
     """
@@ -31,48 +67,151 @@ def _is_hex(s: str) -> bool:
     except:
         return False
 
-threadlock = threading.Lock()
+def _read(fname: str, headeronly: bool = False) -> Tuple[float, Any]:
+    """ Reads a cache entry file and returns a tuple of its expiry time and value.
+        If headeronly is True, the value is not unpickled and None is returned for it.
+        Raises FileNotFoundError if there is no entry. """
+    with open(fname, "rb") as fd:
+        header = fd.read(HEADER.size)
+        if len(header) == HEADER.size:
+            magic, expires = HEADER.unpack(header)
+            if magic == HEADER_MAGIC:
+                if headeronly: return (expires, None)
+                return (expires, pickle.load(fd))
+        # An entry written before we had a header, a pickled dictionary
+        fd.seek(0)
+        o = pickle.load(fd)
+        return (o["expires"], o["value"])
+
+def _write(fname: str, expires: float, value: Any) -> None:
+    """ Writes a cache entry file with the expiry time and value given.
+        The entry is written to a temporary file and renamed into place so that
+        the write is atomic. """
+    tmpname = os.path.join(os.path.dirname(fname), ".%s.%d.%d.tmp" % (os.path.basename(fname), os.getpid(), threading.get_ident()))
+    try:
+        with open(tmpname, "wb") as fd:
+            fd.write(HEADER.pack(HEADER_MAGIC, expires))
+            pickle.dump(value, fd, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, fname)
+    except Exception as err:
+        try:
+            os.unlink(tmpname)
+        except:
+            pass
+        raise err
 
-def _lrunpickle(fname: str) -> None:
-    """ Reads a file and returns the unpickled contents, using flock to lock the file """
-    with threadlock:
-        with open(fname, "rb") as fd:
-            fcntl.flock(fd, fcntl.LOCK_EX)
-            return pickle.load(fd)
+def _gethash(key: str) -> str:
+    """
+    Calculates the hash for a key (md5)
+    """
+    # Is the key already a hash? ie. 32 or 40 chars and hex?
+    # If so, don't waste time hashing it again.
+    if (len(key) == 32 or len(key) == 40) and _is_hex(key):
+        return key.lower()
+    m = hashlib.md5()
+    if isinstance(key, str): key = key.encode("utf-8") # turn str keys into bytes
+    m.update(key)
+    return m.hexdigest()
 
-def _lwpickle(fname: str, o: Any) -> None:
-    """ Pickles and writes o to fname, using flock to lock the file """
-    with threadlock:
-        with open(fname, "wb") as fd:
-            fcntl.flock(fd, fcntl.LOCK_EX)
-            pickle.dump(o, fd)
+def _getpath(path: str) -> str:
+    """
+    Returns the directory for a cache path (namespace)
+    """
+    if path != "":
+        return os.path.join(DISK_CACHE, _sanitise_path(path))
+    return DISK_CACHE
 
 def _getfilename(key: str, path: str, mkpath: bool = False) -> str:
     """
     Calculates the filename from the key
-    (md5 hash)
+    (md5 hash, sharded by the first two characters)
     If mkpath is True, creates any missing path directories.
     """
-    # Is the key already a hash? ie. 32 or 40 chars and hex?
-    # If so, don't waste time hashing it again.
-    if (len(key) == 32 or len(key) == 40) and _is_hex(key):
+    key = _gethash(key)
+    shard = os.path.join(_getpath(path), key[0:2])
+    if mkpath and not os.path.exists(shard):
+        os.makedirs(shard, exist_ok=True)
+    return os.path.join(shard, key)
+
+def _index_expiry(fname: str, expires: float) -> None:
+    """
+    Records the expiry time of fname in the expiry index for its shard.
+    Lines are short and appended in a single write, so concurrent writers do
+    not interleave. The last entry for a file is the one that counts.
+    """
+    with open(os.path.join(os.path.dirname(fname), EXPIRY_INDEX), "a") as f:
+        f.write("%d %s\n" % (expires, os.path.basename(fname)))
+
+def _read_index(shard: str) -> Dict[str, float]:
+    """
+    Reads the expiry index for a shard and returns a dictionary of filename to expiry time
+    """
+    index = {}
+    try:
+        with open(os.path.join(shard, EXPIRY_INDEX), "r") as f:
+            for line in f:
+                try:
+                    expires, name = line.split()
+                    index[name] = float(expires)
+                except:
+                    pass # partial line
+    except FileNotFoundError:
         pass
-    else:
-        m = hashlib.md5()
-        if isinstance(key, str): key = key.encode("utf-8") # turn str keys into bytes
-        m.update(key)
-        key = m.hexdigest()
-    if not os.path.exists(DISK_CACHE):
-        os.mkdir(DISK_CACHE)
-    if path != "":
-        path = _sanitise_path(path)
-        path = os.path.join(DISK_CACHE, path)
-        if mkpath and not os.path.exists(path):
-            os.mkdir(path)
-    else:
-        path = DISK_CACHE
-    fname = os.path.join(path, key)
-    return fname
+    return index
+
+def _write_index(shard: str, index: Dict[str, float]) -> None:
+    """
+    Replaces the expiry index for a shard
+    """
+    fname = os.path.join(shard, EXPIRY_INDEX)
+    tmpname = "%s.%d.%d" % (fname, os.getpid(), threading.get_ident())
+    with open(tmpname, "w") as f:
+        f.write("".join([ "%d %s\n" % (v, k) for k, v in index.items() ]))
+    os.replace(tmpname, fname)
+
+def _scan(path: str) -> List[Tuple[float, int, str]]:
+    """
+    Returns a list of (last access, size, filename) for all entries in a cache path
+    """
+    files = []
+    for root, dummy, names in os.walk(_getpath(path)):
+        for name in names:
+            if name.startswith("."): continue
+            try:
+                fname = os.path.join(root, name)
+                st = os.stat(fname)
+                files.append( (st.st_atime, st.st_size, fname) )
+            except:
+                pass # removed by another process
+    return files
+
+def _accessed(fname: str) -> None:
+    """
+    Records an access of fname for LRU eviction. The atime is set explicitly
+    as filesystems are often mounted with noatime/relatime. The mtime (last
+    written) is left alone.
+    """
+    try:
+        st = os.stat(fname)
+        now = time.time()
+        if now - st.st_atime > TOUCH_INTERVAL:
+            os.utime(fname, (now, st.st_mtime))
+    except:
+        pass
+
+def _added(path: str, size: int) -> None:
+    """
+    Adds size bytes to the running total for path and evicts entries if
+    that takes it over budget
+    """
+    if DISK_CACHE_MAX_SIZE <= 0: return
+    with totalslock:
+        if path not in totals:
+            totals[path] = sum(x[1] for x in _scan(path))
+        else:
+            totals[path] += size
+        over = totals[path] > DISK_CACHE_MAX_SIZE
+    if over: evict(path)
 
 def delete(key: str, path: str) -> None:
     """
@@ -91,6 +230,16 @@ def exists(key: str, path: str) -> bool:
     fname = _getfilename(key, path)
     return os.path.exists(fname)
 
+def modified(key: str, path: str) -> float:
+    """
+    Returns the time a key was last written to the cache as a unix timestamp, 
+    or 0 if it does not exist (does not unpack and check expiry)
+    """
+    try:
+        return os.stat(_getfilename(key, path)).st_mtime
+    except:
+        return 0
+
 def increment(key: str, path: str, ttl: int) -> int:
     """
     Retrieves a value from our disk cache, increments it and returns the value
@@ -103,6 +252,8 @@ def increment(key: str, path: str, ttl: int) -> int:
 def get(key: str, path: str, expectedtype: Any = None) -> Any:
     """
     Retrieves a value from our disk cache. Returns None if the value is not found or has expired.
+    Expired entries are left for remove_expired or the next put to clear up, so that
+    we never remove a value another process has just written.
     expectedtype: A type if one is expected. This was added due to an MD5 collision
     that caused an image to be read as a config dictionary, which wiped out someone's
     config and caused all the database updates to be re-run.
@@ -110,22 +261,23 @@ def get(key: str, path: str, expectedtype: Any = None) -> Any:
     try:
         fname = _getfilename(key, path)
 
-        # No cache entry found, bail
-        if not os.path.exists(fname): return None
+        # Has the entry expired? We only need the header to tell
+        expires, dummy = _read(fname, headeronly=True)
+        if expires < time.time():
+            return None
 
         # Pull the entry out
-        o = _lrunpickle(fname)
-
-        # Has the entry expired?
-        if o["expires"] < time.time():
-            delete(key, path)
-            return None
+        expires, value = _read(fname)
 
         # Is the value of the type we're expecting?
-        if expectedtype is not None and not isinstance(o["value"], expectedtype):
+        if expectedtype is not None and not isinstance(value, expectedtype):
             return None
 
-        return o["value"]
+        _accessed(fname)
+        return value
+    except FileNotFoundError:
+        # No cache entry found
+        return None
     except Exception as err:
         asm3.al.error("%s/%s: %s" % (path, key, err), "cachedisk.get")
 
@@ -136,14 +288,12 @@ def put(key: str, path: str, value: Any, ttl: int) -> None:
     """
     try:
         fname = _getfilename(key, path, mkpath=True)
-
-        o = {
-            "expires": time.time() + ttl,
-            "value": value
-        }
+        expires = time.time() + ttl
 
         # Write the entry
-        _lwpickle(fname, o)
+        _write(fname, expires, value)
+        _index_expiry(fname, expires)
+        _added(path, os.path.getsize(fname))
     except Exception as err:
         asm3.al.error("%s/%s: %s" % (path, key, err), "cachedisk.put")
 
@@ -156,46 +306,100 @@ def touch(key: str, path: str, newttl: int = 0) -> None:
     try:
         fname = _getfilename(key, path)
 
-        # No cache entry found, bail
-        if not os.path.exists(fname): return None
-
-        # Pull the entry out
-        o = _lrunpickle(fname)
-
         # Has the entry expired?
         now = time.time()
-        if o["expires"] < now:
-            delete(key, path)
+        expires, dummy = _read(fname, headeronly=True)
+        if expires < now:
             return None
 
+        # Pull the entry out
+        expires, value = _read(fname)
+
         # Reset the ttl
-        o["expires"] = now + newttl
-        _lwpickle(fname, o)
+        expires = now + newttl
+        _write(fname, expires, value)
+        _index_expiry(fname, expires)
 
-        return o["value"]
+        return value
+    except FileNotFoundError:
+        # No cache entry found
+        return None
     except Exception as err:
         asm3.al.error("%s/%s: %s" % (path, key, err), "cachedisk.touch")
 
 def remove_expired(path: str) -> None:
     """
     Runs through the cache and deletes any files that have expired
-    for cache/path
+    for cache/path. Expiry times are read from the shard expiry indexes,
+    only entries missing from an index (eg: written before sharding) are
+    opened to read the expiry time from their header. The indexes are 
+    compacted as we go.
     """
     if DISK_CACHE == "": return
-    cache_path = os.path.join(DISK_CACHE, path)
+    cache_path = _getpath(path)
     checked = 0
     removed = 0
+    now = time.time()
     for root, dummy, files in os.walk(cache_path):
+        index = _read_index(root)
+        live = {}
         for name in files:
+            if name.startswith(".") and name.endswith(".tmp"):
+                # Remove any temp files left behind by failed writes
+                try:
+                    fpath = os.path.join(root, name)
+                    if os.stat(fpath).st_mtime < now - TEMP_MAX_AGE: os.unlink(fpath)
+                except:
+                    pass
             if name.startswith("."): continue
             checked += 1
             try:
                 fpath = os.path.join(root, name)
-                o = _lrunpickle(fpath)
-                if o["expires"] < time.time():
+                expires = index.get(name)
+                if expires is None:
+                    expires = _read(fpath, headeronly=True)[0]
+                if expires < now:
                     os.unlink(fpath)
                     removed += 1
+                else:
+                    live[name] = expires
             except:
                 # Move to the next entry if there are problems
                 pass
+        try:
+            if root != cache_path and (len(index) > 0 or len(live) > 0):
+                # Entries written since we read the index are re-read, 
+                # so that we don't lose them by replacing it
+                for k, v in _read_index(root).items():
+                    if k not in index or v > index[k]: live[k] = v
+                _write_index(root, live)
+        except Exception as err:
+            asm3.al.error("%s: %s" % (root, err), "cachedisk.remove_expired")
+    with totalslock:
+        totals.pop(path, None)
     asm3.al.debug("removed %s expired disk cache entries for '%s' (%s checked)" % (removed, path, checked), "cachedisk.remove_expired")
+
+def evict(path: str, maxsize: int = DISK_CACHE_MAX_SIZE) -> None:
+    """
+    Removes the least recently used entries in cache/path until it is 
+    within its budget. Their expiry index lines are removed by the next 
+    remove_expired.
+    """
+    if DISK_CACHE == "" or maxsize <= 0: return
+    files = _scan(path)
+    total = sum(x[1] for x in files)
+    removed = 0
+    if total > maxsize:
+        target = maxsize * EVICT_TO
+        for dummy, size, fname in sorted(files):
+            if total <= target: break
+            try:
+                os.unlink(fname)
+                total -= size
+                removed += 1
+            except:
+                pass
+    with totalslock:
+        totals[path] = total
+    if removed > 0:
+        asm3.al.debug("evicted %s disk cache entries for '%s' (%s bytes remaining)" % (removed, path, total), "cachedisk.evict")
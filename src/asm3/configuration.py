@@ -1,10 +1,12 @@
 import asm3.al
 import asm3.audit
 import asm3.cachedisk
+import asm3.cachemem
 import asm3.geo
 import asm3.i18n
 
 import os
+import time
 
 from asm3.sitedefs import LOCALE, TIMEZONE, WATERMARK_FONT_BASEDIRECTORY
 from asm3.typehints import Any, Database, Dict, List, PostedData, Tuple
@@ -571,19 +573,64 @@ def csave(dbo: Database, username: str, post: PostedData) -> None:
     asm3.audit.edit(dbo, username, "configuration", 0, "", str(post))
     invalidate_config_cache(dbo)
 
+# In-process snapshots of the config map for each database, dbname: [ generation, modified, checked, cmap ]
+# Each process keeps its own snapshot and only checks it is still current every 
+# SNAPSHOT_CHECK seconds, against a generation number in the memory cache (shared 
+# between processes and servers when memcached is in use) and the time the disk 
+# cache entry was last written. Once the disk cache entry is older than CONFIG_TTL, 
+# the map is read from the database again.
+snapshots = {}
+SNAPSHOT_CHECK = 1
+
+# How long a config map read from the database is used for. This means direct 
+# database updates show up eventually.
+CONFIG_TTL = 3600
+
 def get_map(dbo: Database) -> Dict[str, str]:
-    """ Returns a map of the config items, using a read-through cache to save database calls """
-    cmap = asm3.cachedisk.get("config", dbo.name(), expectedtype=dict)
+    """ Returns a map of the config items. Uses an in-process snapshot, backed by 
+        a read-through disk cache to save database calls. The map returned is shared
+        and must not be modified. """
+    dbname = dbo.name()
+    now = time.time()
+    snap = snapshots.get(dbname)
+    if snap is not None and now - snap[2] < SNAPSHOT_CHECK: 
+        return snap[3]
+    generation = _get_config_generation(dbo)
+    modified = asm3.cachedisk.modified("config", dbname)
+    if snap is not None and snap[0] == generation and snap[1] == modified and modified != 0 and now - modified < CONFIG_TTL:
+        snap[2] = now
+        return snap[3]
+    cmap = asm3.cachedisk.get("config", dbname, expectedtype=dict)
     if cmap is None:
         rows = dbo.query("SELECT ItemName, ItemValue FROM configuration ORDER BY ItemName")
         cmap = DEFAULTS.copy()
         for r in rows:
             cmap[r.itemname] = r.itemvalue
-        asm3.cachedisk.put("config", dbo.name(), cmap, 3600) # one hour cache means direct database updates show up eventually
+        asm3.cachedisk.put("config", dbname, cmap, CONFIG_TTL)
+        modified = asm3.cachedisk.modified("config", dbname)
+    snapshots[dbname] = [ generation, modified, now, cmap ]
     return cmap
 
 def invalidate_config_cache(dbo: Database) -> None:
+    """ Discards the cached config map for this database in all processes """
     asm3.cachedisk.delete("config", dbo.name())
+    snapshots.pop(dbo.name(), None)
+    _bump_config_generation(dbo)
+
+def _get_config_generation(dbo: Database) -> int:
+    """ Returns the current config generation for this database, starting a new one if there isn't one """
+    key = "%s_config_generation" % dbo.name()
+    g = asm3.cachemem.get(key)
+    if g is None:
+        g = int(time.time() * 1000)
+        asm3.cachemem.put(key, g, 86400)
+    return g
+
+def _bump_config_generation(dbo: Database) -> None:
+    """ Moves the config generation on so that other processes discard their snapshots """
+    key = "%s_config_generation" % dbo.name()
+    if asm3.cachemem.increment(key) is None:
+        asm3.cachemem.put(key, int(time.time() * 1000), 86400)
 
 def address_change_log(dbo: Database) -> bool:
     return cboolean(dbo, "AddressChangeLog", DEFAULTS["AddressChangeLog"] == "Yes")
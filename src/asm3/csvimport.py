@@ -8,10 +8,12 @@ import asm3.configuration
 import asm3.dbupdate
 import asm3.financial
 import asm3.i18n
+import asm3.lookups
 import asm3.media
 import asm3.medical
 import asm3.movement
 import asm3.person
+import asm3.searchindex
 import asm3.utils
 
 from asm3.sitedefs import SERVICE_URL
@@ -186,6 +188,7 @@ def gkbr(dbo: Database, m: Dict, f: str, speciesid: int, create: bool) -> str:
         nextid = dbo.get_id("breed")
         sql = "INSERT INTO breed (ID, SpeciesID, BreedName) VALUES (?,?,?)"
         dbo.execute(sql, (nextid, speciesid, lv.replace("'", "`")))
+        asm3.lookups.invalidate_lookup_cache(dbo)
         return str(nextid)
     return str(matchid)
 
@@ -204,6 +207,7 @@ def gkl(dbo: Database, m: Dict, f: str, table: str, namefield: str, create: bool
         nextid = dbo.insert(table, {
             namefield:  lv
         }, setRecordVersion=False, setCreated=False, writeAudit=False)
+        asm3.lookups.invalidate_lookup_cache(dbo)
         return str(nextid)
     return str(matchid)
 
@@ -225,19 +229,23 @@ def create_additional_fields(dbo: Database, row: Dict, errors: List, rowno: int,
         This is used during merge duplicates too as it only sets additional fields if a value
         has been supplied in the file.
     """
+    values = []
     for a in asm3.additional.get_field_definitions(dbo, linktype):
         v = gks(row, csvkey + str(a.fieldname).upper())
         if v != "":
-            try:
-                dbo.delete("additional", "LinkID=%s AND AdditionalFieldID=%s" % (linkid, a.ID))
-                dbo.insert("additional", {
-                    "LinkType":             a.linktype,
-                    "LinkID":               linkid,
-                    "AdditionalFieldID":    a.id,
-                    "Value":                v
-                }, generateID=False)
-            except Exception as e:
-                errors.append( (rowno, str(row), str(e)) )
+            values.append({
+                "LinkType":             a.linktype,
+                "LinkID":               linkid,
+                "AdditionalFieldID":    a.id,
+                "Value":                v
+            })
+    if len(values) == 0: return
+    try:
+        dbo.delete("additional", "LinkID=%s AND AdditionalFieldID IN (%s)" % (linkid, ",".join(str(x["AdditionalFieldID"]) for x in values)))
+        dbo.insert_many("additional", values, generateID=False)
+        asm3.searchindex.refresh(dbo, asm3.searchindex.get_additional_subjects(values[0]["LinkType"], linkid))
+    except Exception as e:
+        errors.append( (rowno, str(row), str(e)) )
 
 def row_error(errors: List, rowtype: str, rowno: int, row: Dict, e: Any, dbo: Database, exinfo: Any):
     """ 
@@ -428,14 +436,14 @@ def csvimport(dbo: Database, csvdata: bytes, encoding: str = "utf-8-sig", user:
     errors = []
     rowno = 1
     animalcodes = {}
-    asm3.asynctask.set_progress_max(dbo, len(rows))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(rows))
     for row in rows:
 
         asm3.al.debug("import csv: row %d of %d" % (rowno, len(rows)), "csvimport.csvimport", dbo)
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
 
         # Should we stop?
-        if asm3.asynctask.get_cancel(dbo): break
+        if progress.is_cancelled(): break
 
         # Do we have accounts data to read?
         if hasaccounts:
@@ -1244,6 +1252,7 @@ def csvimport(dbo: Database, csvdata: bytes, encoding: str = "utf-8-sig", user:
                 row_error(errors, "stocklevel", rowno, row, e, dbo, sys.exc_info())
 
         rowno += 1
+    progress.finish()
     
     if htmlresults:
         h = [ "<p>%d success, %d errors</p><table>" % (len(rows) - len(errors), len(errors)) ]
@@ -1290,7 +1299,7 @@ def csvimport_paypal(dbo: Database, csvdata: bytes, donationtypeid: int, donatio
 
     errors = []
     rowno = 1
-    asm3.asynctask.set_progress_max(dbo, len(rows))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(rows))
 
     if len(rows) == 0:
         asm3.asynctask.set_last_error(dbo, "CSV file is empty")
@@ -1308,10 +1317,10 @@ def csvimport_paypal(dbo: Database, csvdata: bytes, donationtypeid: int, donatio
         if len(r) == 0: continue
 
         # Should we stop?
-        if asm3.asynctask.get_cancel(dbo): break
+        if progress.is_cancelled(): break
 
         asm3.al.debug("import paypal csv: row %d of %d" % (rowno, len(rows)), "csvimport.csvimport_paypal", dbo)
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
 
         if r["Status"] != "Completed":
             asm3.al.debug("skipping: Status='%s' (!= Completed), Type='%s'" % (r["Status"], r["Type"]), "csvimport.csvimport_paypal", dbo)
@@ -1394,6 +1403,7 @@ def csvimport_paypal(dbo: Database, csvdata: bytes, donationtypeid: int, donatio
                 row_error(errors, "payment", rowno, r, e, dbo, sys.exc_info())
 
         rowno += 1
+    progress.finish()
 
     h = [ "<p>%d success, %d errors</p><table>" % (len(rows) - len(errors), len(errors)) ]
     for rowno, row, err in errors:
@@ -1422,7 +1432,7 @@ def csvimport_stripe(dbo: Database, csvdata: bytes, donationtypeid: int, donatio
 
     errors = []
     rowno = 1
-    asm3.asynctask.set_progress_max(dbo, len(rows))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(rows))
 
     if len(rows) == 0:
         asm3.asynctask.set_last_error(dbo, "CSV file is empty")
@@ -1444,10 +1454,10 @@ def csvimport_stripe(dbo: Database, csvdata: bytes, donationtypeid: int, donatio
         if len(r) == 0: continue
 
         # Should we stop?
-        if asm3.asynctask.get_cancel(dbo): break
+        if progress.is_cancelled(): break
 
         asm3.al.debug("import stripe csv: row %d of %d" % (rowno, len(rows)), "csvimport.csvimport_stripe", dbo)
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
 
         if r["Status"] != "Paid":
             asm3.al.debug("skipping: Status='%s' (!= Paid)" % (r["Status"]), "csvimport.csvimport_paypal", dbo)
@@ -1523,6 +1533,7 @@ def csvimport_stripe(dbo: Database, csvdata: bytes, donationtypeid: int, donatio
                 row_error(errors, "payment", rowno, r, e, dbo, sys.exc_info())
 
         rowno += 1
+    progress.finish()
 
     h = [ "<p>%d success, %d errors</p><table>" % (len(rows) - len(errors), len(errors)) ]
     for rowno, row, err in errors:
@@ -1592,11 +1603,11 @@ def csvexport_animals(dbo: Database, dataset: str, animalids: str = "", where: s
         return s
 
     firstrow = True
-    asm3.asynctask.set_progress_max(dbo, len(ids))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(ids))
     for aid in ids:
 
         # Should we stop?
-        if asm3.asynctask.get_cancel(dbo): break
+        if progress.is_cancelled(): break
 
         if firstrow:
             firstrow = False
@@ -1606,7 +1617,7 @@ def csvexport_animals(dbo: Database, dataset: str, animalids: str = "", where: s
         a = asm3.animal.get_animal(dbo, aid.ID)
         if a is None: continue
 
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
 
         row["ANIMALID"] = aid.ID
         row["ANIMALCODE"] = a["SHELTERCODE"]
@@ -1787,6 +1798,7 @@ def csvexport_animals(dbo: Database, dataset: str, animalids: str = "", where: s
 
         del a
         del row
+    progress.finish()
 
     # Generate a disk cache key and store the data in the cache so it can be retrieved for the next hour
     key = asm3.utils.uuid_str()
@@ -1866,11 +1878,11 @@ def csvexport_people(dbo: Database, dataset: str, flags: str = "", where: str =
         return s
 
     firstrow = True
-    asm3.asynctask.set_progress_max(dbo, len(pids))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(pids))
     for pid in pids:
 
         # Should we stop?
-        if asm3.asynctask.get_cancel(dbo): break
+        if progress.is_cancelled(): break
 
         if firstrow:
             firstrow = False
@@ -1881,7 +1893,7 @@ def csvexport_people(dbo: Database, dataset: str, flags: str = "", where: str =
         p = dbo.query("SELECT * FROM owner WHERE ID = %s" % (pid["ID"]) )
         if p is None: continue
         p = p[0]
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
 
         row["PERSONCODE"] = "XP-" + nn(p["OWNERCODE"])
         row["PERSONDATEOFBIRTH"] = asm3.i18n.python2display(l, nn(p["DATEOFBIRTH"]))
@@ -2092,6 +2104,7 @@ def csvexport_people(dbo: Database, dataset: str, flags: str = "", where: str =
 
         del p
         del row
+    progress.finish()
 
     # Generate a disk cache key and store the data in the cache so it can be retrieved for the next hour
     key = asm3.utils.uuid_str()
@@ -0,0 +1,106 @@
+
+"""
+Precomputed counters for the home page (alerts, overview and stats).
+
+A counter is a name, the tables it reads and a scalar subquery that calculates it.
+Calculated values are kept in the disk cache along with a hash of the subquery
+and the change generation of each table it read at the time. Writes to those
+tables move the table's generation on (see changed, which is called by
+Database.execute), so a read only recalculates the counters that
+read a table that has changed since, or whose subquery is different (the day
+has moved on or the config has changed). Everything else is returned as is.
+The daily batch reconciles all counters from scratch to pick up any changes
+made outside of the application.
+
+Generations have to be seen by every process that shares the disk cache. They
+are kept in memcached when it is configured, otherwise the memory cache is
+private to each process so they are kept in the disk cache as well.
+"""
+
+import asm3.cachedisk
+import asm3.cachemem
+
+import hashlib
+import re
+import time
+import uuid
+
+from asm3.sitedefs import MEMCACHED_SERVER
+from asm3.typehints import Any, Database, Dict, List, Tuple
+
+# Tables read by counters. Writes to other tables are not tracked.
+TABLES = set([ "adoption", "animal", "animalboarding", "animalcontrol", "animalcost",
+    "animalmedical", "animalmedicaltreatment", "animaltest", "animaltransport",
+    "animalvaccination", "animalwaitinglist", "clinicappointment", "log",
+    "onlineformincoming", "owner", "ownercitation", "ownerdonation", "ownertraploan",
+    "product", "publishlog", "stocklevel" ])
+
+# How long calculated counters are kept for if they are not read
+COUNTER_TTL = 86400 * 2
+
+WRITE_TABLES = re.compile(r"(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+(\w+)", re.IGNORECASE)
+
+def _key(dbo: Database, table: str) -> str:
+    return "%s_dashboard_%s" % (dbo.name(), table)
+
+def _hash(sql: str) -> str:
+    return hashlib.md5(sql.encode("utf-8")).hexdigest()
+
+def changed(dbo: Database, sql: str) -> None:
+    """ Called after an action query has run. Moves the generation on for
+        any tracked tables that sql writes to """
+    for table in set(t.lower() for t in WRITE_TABLES.findall(sql)):
+        if table not in TABLES: continue
+        key = _key(dbo, table)
+        if MEMCACHED_SERVER == "":
+            asm3.cachedisk.put(key, dbo.name(), uuid.uuid4().hex, COUNTER_TTL)
+        elif asm3.cachemem.increment(key) is None:
+            asm3.cachemem.put(key, int(time.time() * 1000), COUNTER_TTL)
+
+def _get_generations(dbo: Database, tables: List[str]) -> Dict[str, int]:
+    """ Returns the current generation of each table in tables, starting
+        a new one for any that don't have one """
+    gens = {}
+    for table in tables:
+        key = _key(dbo, table)
+        if MEMCACHED_SERVER == "":
+            g = asm3.cachedisk.get(key, dbo.name(), expectedtype=str)
+            if g is None:
+                g = uuid.uuid4().hex
+                asm3.cachedisk.put(key, dbo.name(), g, COUNTER_TTL)
+        else:
+            g = asm3.cachemem.get(key)
+            if g is None:
+                g = int(time.time() * 1000)
+                asm3.cachemem.put(key, g, COUNTER_TTL)
+        gens[table] = g
+    return gens
+
+def get(dbo: Database, group: str, counters: List[Tuple[str, Tuple, str]], reconcile: bool = False) -> Dict[str, Any]:
+    """ Returns a dict of counter name (upper case) to value for a group of counters.
+        group: The name the group's values are stored under
+        counters: A list of (name, tables, subquery) tuples
+        reconcile: If True, recalculates all counters in the group
+    """
+    stored = None
+    if not reconcile:
+        stored = asm3.cachedisk.get("dashboard_%s" % group, dbo.name(), expectedtype=dict)
+    if stored is None: stored = {}
+    gens = _get_generations(dbo, sorted(set(t for c in counters for t in c[1])))
+    values = {}
+    stale = []
+    for name, tables, sql in counters:
+        s = stored.get(name)
+        tgens = { t: gens[t] for t in tables }
+        if s is None or s[0] != _hash(sql) or s[1] != tgens:
+            stale.append((name, tgens, sql))
+        else:
+            values[name.upper()] = s[2]
+    if len(stale) > 0:
+        row = dbo.query("SELECT %s FROM lksmovementtype WHERE ID=1" % \
+            ", ".join("%s AS %s" % (sql, name) for name, tgens, sql in stale))[0]
+        for name, tgens, sql in stale:
+            values[name.upper()] = row[name.upper()]
+            stored[name] = ( _hash(sql), tgens, row[name.upper()] )
+        asm3.cachedisk.put("dashboard_%s" % group, dbo.name(), stored, COUNTER_TTL)
+    return values
@@ -1,6 +1,7 @@
 
 import asm3.al
 import asm3.cachedisk
+import asm3.derivatives
 import asm3.smcom
 import asm3.utils
 
@@ -605,6 +606,7 @@ def delete_orphaned_media(dbo: Database) -> None:
     for r in rows:
         o = DBFSStorage(dbo, r.url)
         o.delete(r.url)
+        asm3.derivatives.delete(dbo.name(), r.id)
     asm3.al.debug("Removed %s orphaned dbfs/media records" % len(rows), "dbfs.delete_orphaned_media", dbo)
 
 def switch_storage(dbo: Database) -> None:
@@ -3,16 +3,31 @@ import asm3.al
 import asm3.audit
 import asm3.cachemem
 import asm3.cachedisk
+import asm3.dashboard
+import asm3.dbms.pool
 import asm3.i18n
+import asm3.searchindex
+import asm3.timeline
 import asm3.utils
 
+import collections
 import datetime
 import sys
+import threading
 import time
+import uuid
 
-from asm3.sitedefs import DB_TYPE, DB_HOST, DB_PORT, DB_USERNAME, DB_PASSWORD, DB_NAME, DB_EXEC_LOG, DB_EXPLAIN_QUERIES, DB_TIME_QUERIES, DB_TIME_LOG_OVER, DB_TIMEOUT, CACHE_COMMON_QUERIES
+from asm3.sitedefs import DB_TYPE, DB_HOST, DB_PORT, DB_USERNAME, DB_PASSWORD, DB_NAME, DB_EXEC_LOG, DB_EXPLAIN_QUERIES, DB_TIME_QUERIES, DB_TIME_LOG_OVER, DB_TIMEOUT, DB_POOL_MAX_SIZE, DB_ID_BLOCK_SIZE, CACHE_COMMON_QUERIES, MEMCACHED_SERVER
 from asm3.typehints import Any, Dict, Generator, List, Tuple
 
+# IDs reserved by get_id that have not been handed out yet, keyed by database and table,
+# with the ID generation they were reserved in
+idpools = {}
+idpoolslock = threading.Lock()
+
+# The last ID generation this process read for each database
+idgenerations = {}
+
 class ResultRow(dict):
     """
     A ResultRow object is like a dictionary except `obj.foo` can be used
@@ -132,6 +147,9 @@ class Database(object):
     type_integer = "INTEGER"
     type_float = "REAL"
 
+    # The most parameters to send with a single multi-row statement
+    max_params = 999
+
     def connect(self) -> Any:
         """ Virtual: Connect to the database and return the connection """
         raise NotImplementedError()
@@ -139,30 +157,63 @@ class Database(object):
     def cursor_open(self) -> Tuple[Any, Any]:
         """ Returns a tuple containing an open connection and cursor.
             If the dbo object contains an active connection, we'll just use
-            that to get a cursor to save time.
+            that to get a cursor to save time. Otherwise, the connection
+            is checked out of the pool for this database.
         """
         if self.connection is not None:
             c = self.connection
             s = self.connection.cursor()
         else:
-            c = self.connect()
-            s = c.cursor()
+            c = self.pool_checkout()
+            try:
+                s = c.cursor()
+            except Exception as err:
+                self.pool_checkin(c)
+                raise err
         return c, s
 
     def cursor_close(self, c: Any, s: Any) -> None:
         """ Closes a connection and cursor pair. If self.connection exists, then
             c must be it, so don't close it. Connection caching in this object
             is done by processes called via cron.py as they do not use pooling.
+            Otherwise the connection is returned to the pool. Call this
+            once for each cursor_open, as another thread can check the 
+            connection out again as soon as it has been returned.
         """
         try:
             s.close()
         except:
             pass
         if self.connection is None:
+            self.pool_checkin(c)
+
+    def cursor_open_stream(self) -> Tuple[Any, Any]:
+        """ Returns a tuple containing an open connection and a cursor for
+            reading large resultsets with query_generator. Backends that support
+            server-side cursors override this, the default is a normal cursor.
+        """
+        return self.cursor_open()
+
+    def pool_checkout(self) -> Any:
+        """ Returns a connection from the pool for this database, or a new
+            connection if pooling is disabled """
+        if DB_POOL_MAX_SIZE <= 0: return self.connect()
+        return asm3.dbms.pool.checkout(self)
+
+    def pool_checkin(self, c: Any) -> None:
+        """ Returns a connection to the pool for this database, or closes
+            it if pooling is disabled """
+        if DB_POOL_MAX_SIZE <= 0:
             try:
                 c.close()
             except:
                 pass
+            return
+        asm3.dbms.pool.checkin(self, c)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """ Returns connection pool stats for this database (checkouts, waits, creates, etc) """
+        return asm3.dbms.pool.get_stats(self)[self.name()]
 
     def name(self) -> str:
         """ Returns the database name """
@@ -176,6 +227,11 @@ class Database(object):
         if unique: u = "UNIQUE "
         return "CREATE %sINDEX %s ON %s (%s)" % (u, name, table, column)
 
+    def ddl_add_prefix_index(self, name: str, table: str, column: str) -> str:
+        """ Returns an index on column (a list of columns, the last of which 
+            is compared with LIKE 'prefix%') that can be used for prefix matches """
+        return self.ddl_add_index(name, table, column)
+
     def ddl_add_sequence(self, table: str, startat: int) -> str:
         return "" # Not all RDBMSes support sequences so don't do anything by default
 
@@ -293,8 +349,8 @@ class Database(object):
                 s.execute(sql)
             rv = s.rowcount
             c.commit()
-            self.cursor_close(c, s)
             self._log_sql(sql, params)
+            asm3.dashboard.changed(self, sql)
             return rv
         except Exception as err:
             asm3.al.error(str(err), "Database.execute", self, sys.exc_info())
@@ -344,7 +400,7 @@ class Database(object):
             s.executemany(sql, params)
             rv = s.rowcount
             c.commit()
-            self.cursor_close(c, s)
+            asm3.dashboard.changed(self, sql)
             return rv
         except Exception as err:
             asm3.al.error(str(err), "Database.execute_many", self, sys.exc_info())
@@ -368,11 +424,69 @@ class Database(object):
         return rows[0]
 
     def get_id(self, table: str) -> int:
-        """ Returns the next ID for a table """
-        nextid = self.get_id_cache_pk(table)
-        asm3.al.debug("get_id: %s -> %d (cache_pk)" % (table, nextid), "Database.get_id", self)
+        """ Returns the next ID for a table. IDs are reserved DB_ID_BLOCK_SIZE at 
+            a time with get_ids and handed out from a pool for this process.
+            The pool is discarded if reset_ids has been called by any process since it was reserved. """
+        key = "%s_%s" % (self.name(), table)
+        generation = self._get_id_generation()
+        with idpoolslock:
+            entry = idpools.get(key)
+            if entry is None or entry[0] != generation or len(entry[1]) == 0:
+                entry = ( generation, collections.deque(self.get_ids(table, max(1, DB_ID_BLOCK_SIZE))) )
+                idpools[key] = entry
+            nextid = entry[1].popleft()
+        asm3.al.debug("get_id: %s -> %d (pool)" % (table, nextid), "Database.get_id", self)
         return nextid
 
+    def reset_ids(self, table: str = "") -> None:
+        """ Discards the IDs reserved for table (or all tables if not given) so that the next 
+            get_id reserves a new block. Call after IDs have been reset. Moves the ID generation 
+            on when all tables are reset so that other processes discard their pools too. """
+        with idpoolslock:
+            for key in list(idpools.keys()):
+                if key == "%s_%s" % (self.name(), table) or (table == "" and key.startswith("%s_" % self.name())):
+                    del idpools[key]
+        if table == "":
+            idgenerations[self.name()] = uuid.uuid4().hex
+            self._put_id_generation(idgenerations[self.name()])
+
+    def _get_id_generation(self) -> str:
+        """ Returns the ID generation for this database shared by all processes. If it has 
+            expired or can't be read, the last one this process saw is stored again. """
+        key = "%s_id_generation" % self.name()
+        if MEMCACHED_SERVER == "":
+            g = asm3.cachedisk.get(key, self.name(), expectedtype=str)
+        else:
+            g = asm3.cachemem.get(key)
+        if g is None:
+            g = idgenerations.get(self.name(), uuid.uuid4().hex)
+            self._put_id_generation(g)
+        idgenerations[self.name()] = g
+        return g
+
+    def _put_id_generation(self, generation: str) -> None:
+        """ Stores the ID generation for this database where all processes can read it """
+        key = "%s_id_generation" % self.name()
+        if MEMCACHED_SERVER == "":
+            asm3.cachedisk.put(key, self.name(), generation, 86400)
+        else:
+            asm3.cachemem.put(key, generation, 86400)
+
+    def get_ids(self, table: str, count: int) -> List[int]:
+        """ Returns a block of count new IDs for a table, reserved with a single
+            increment of the cache and update of the primarykey table """
+        if count <= 0: return []
+        cache_key = "%s_pkt_%s" % (self.name(), table)
+        lastid = asm3.cachemem.increment(cache_key, count)
+        if lastid is None:
+            lastid = self.get_id_pk(table)
+            if lastid == 1: lastid = self.get_id_max(table) # no pk entry, use table ID
+            lastid += count - 1
+            asm3.cachemem.put(cache_key, lastid, 60)
+        self.update_primarykey(table, lastid)
+        asm3.al.debug("get_ids: %s -> %d-%d (cache_pk)" % (table, lastid - count + 1, lastid), "Database.get_ids", self)
+        return list(range(lastid - count + 1, lastid + 1))
+
     def get_id_cache(self, table: str, idcol: str = "ID") -> int:
         """ Returns the next ID for a table using an in-memory cache, backed by the highest ID in the table (deprecated) """
         cache_key = "%s_pk_%s" % (self.name(), table)
@@ -459,8 +573,106 @@ class Database(object):
         self.execute(sql, list(values.values()), override_lock=setOverrideDBLock)
         if writeAudit and iid != 0 and user != "":
             asm3.audit.create(self, user, table, iid, asm3.audit.get_parent_links(values, table), asm3.audit.dump_row(self, table, iid))
+        if iid != 0:
+            asm3.timeline.refresh(self, asm3.timeline.get_subjects(self, table, "ID=%s" % iid))
+            asm3.searchindex.refresh(self, asm3.searchindex.get_subjects(self, table, "ID=%s" % iid))
         return iid
 
+    def insert_many(self, table: str, rows: List[Dict], user: str = "", generateID: bool = True, 
+                    setOverrideDBLock: bool = False, setRecordVersion: bool = True, 
+                    setCreated: bool = True, writeAudit: bool = True) -> List[int]:
+        """ Inserts a list of rows into a table. IDs are reserved in one block, 
+            rows with the same columns are sent together as multi-row INSERT statements 
+            (up to max_params values per statement) and audit records are written in one go.
+            table: The table to insert into
+            rows: A list of dicts of column names with values
+            The other arguments are the same as insert.
+            Returns the IDs of the inserted records, in the same order as rows
+        """
+        if len(rows) == 0: return []
+        if generateID: 
+            newids = self.get_ids(table, len(rows))
+        now = self.now()
+        recordversion = self.get_recordversion()
+        ids = []
+        groups = {}
+        for i, values in enumerate(rows):
+            if user != "" and setCreated:
+                values["CreatedBy"] = user
+                values["LastChangedBy"] = user
+                values["CreatedDate"] = now
+                values["LastChangedDate"] = now
+                if setRecordVersion: values["RecordVersion"] = recordversion
+            iid = 0
+            if generateID:
+                iid = newids[i]
+                values["ID"] = iid
+            elif "ID" in values:
+                iid = values["ID"]
+            ids.append(iid)
+            values = self.encode_str_before_write(values)
+            groups.setdefault(tuple(values.keys()), []).append(list(values.values()))
+        for cols, grows in groups.items():
+            chunk = max(1, self.max_params // len(cols))
+            for x in range(0, len(grows), chunk):
+                crows = grows[x:x+chunk]
+                sql = "INSERT INTO %s (%s) VALUES %s" % ( table, ",".join(cols), ",".join( ["(%s)" % self.sql_placeholders(cols)] * len(crows) ))
+                self.execute(sql, [ v for r in crows for v in r ], override_lock=setOverrideDBLock)
+        auditids = [ x for x in ids if x != 0 ]
+        for x in range(0, len(auditids), self.max_params):
+            chunkids = auditids[x:x+self.max_params]
+            if writeAudit and user != "":
+                asm3.audit.create_rows(self, user, table, chunkids)
+            asm3.timeline.refresh(self, asm3.timeline.get_subjects(self, table, "ID IN (%s)" % ",".join(str(i) for i in chunkids)))
+            asm3.searchindex.refresh(self, asm3.searchindex.get_subjects(self, table, "ID IN (%s)" % ",".join(str(i) for i in chunkids)))
+        return ids
+
+    def update_many(self, table: str, rows: List[Dict], user: str = "", 
+                    setOverrideDBLock: bool = False, setRecordVersion: bool = True, 
+                    setLastChanged: bool = True, writeAudit: bool = True) -> int:
+        """ Updates a list of rows in a table by ID. Rows with the same columns are 
+            sent together with execute_many and the before images for the audit 
+            trail are read with one query for up to max_params rows.
+            table: The table to update
+            rows: A list of dicts of column names with values, each must include the ID of the row to update
+            The other arguments are the same as update.
+            returns the number of rows updated
+        """
+        if len(rows) == 0: return 0
+        now = self.now()
+        recordversion = self.get_recordversion()
+        updates = []
+        for values in rows:
+            values = values.copy()
+            iid = asm3.utils.cint(values.pop("ID"))
+            if user != "" and setLastChanged:
+                values["LastChangedBy"] = user
+                values["LastChangedDate"] = now
+                if setRecordVersion: values["RecordVersion"] = recordversion
+            updates.append( (iid, self.encode_str_before_write(values)) )
+        audit = writeAudit and user != ""
+        readable = asm3.audit.get_readable_fields_for_table(table)
+        rows_affected = 0
+        for x in range(0, len(updates), self.max_params):
+            chunk = updates[x:x+self.max_params]
+            where = "ID IN (%s)" % ",".join(str(iid) for iid, values in chunk)
+            if audit: 
+                preaudit = dict( (r.ID, r) for r in self.query("SELECT * FROM %s WHERE %s" % (table, where)) )
+            groups = {}
+            for iid, values in chunk:
+                groups.setdefault(tuple(values.keys()), []).append(list(values.values()) + [iid])
+            for cols, params in groups.items():
+                sql = "UPDATE %s SET %s WHERE ID=?" % ( table, ",".join( ["%s=?" % c for c in cols] ) )
+                rows_affected += self.execute_many(sql, params, override_lock=setOverrideDBLock) or 0
+            if audit:
+                asm3.audit.action_many(self, asm3.audit.EDIT, user, table, [ 
+                    (iid, asm3.audit.get_parent_links(values, table), 
+                        asm3.audit.map_diff([preaudit[iid]], [asm3.audit.apply_values(self, preaudit[iid], values)], readable)) 
+                    for iid, values in chunk if iid in preaudit ])
+            asm3.timeline.refresh(self, asm3.timeline.get_subjects(self, table, where, [ c for cols in groups for c in cols ]))
+            asm3.searchindex.refresh(self, asm3.searchindex.get_subjects(self, table, where, [ c for cols in groups for c in cols ]))
+        return rows_affected
+
     def update(self, table: str, where: str, values: Dict, user: str = "", 
                setOverrideDBLock: bool = False, setRecordVersion: bool = True, 
                setLastChanged: bool = True, writeAudit: bool = True) -> int:
@@ -483,13 +695,18 @@ class Database(object):
             iid = asm3.utils.cint(where)
             where = "ID=%s" % where
         sql = "UPDATE %s SET %s WHERE %s" % ( table, ",".join( ["%s=?" % x for x in values.keys()] ), where )
-        if iid > 0: 
+        # Read the row before the update for the audit trail. The row after is the 
+        # same with the values we're writing applied, so it doesn't need reading back.
+        audit = user != "" and iid > 0 and writeAudit
+        if audit: 
             preaudit = self.query_row(table, iid)
         rows_affected = self.execute(sql, list(values.values()), override_lock=setOverrideDBLock)
-        if iid > 0:
-            postaudit = self.query_row(table, iid)
-        if user != "" and iid > 0 and rows_affected > 0 and writeAudit:
-            asm3.audit.edit(self, user, table, iid, asm3.audit.get_parent_links(values, table), asm3.audit.map_diff(preaudit, postaudit, asm3.audit.get_readable_fields_for_table(table)))
+        if audit and rows_affected > 0 and len(preaudit) > 0:
+            postaudit = asm3.audit.apply_values(self, preaudit[0], values)
+            asm3.audit.edit(self, user, table, iid, asm3.audit.get_parent_links(values, table), asm3.audit.map_diff(preaudit, [postaudit], asm3.audit.get_readable_fields_for_table(table)))
+        if rows_affected > 0:
+            asm3.timeline.refresh(self, asm3.timeline.get_subjects(self, table, where, list(values.keys())))
+            asm3.searchindex.refresh(self, asm3.searchindex.get_subjects(self, table, where, list(values.keys())))
         return rows_affected
 
     def delete(self, table: str, where: str, user: str = "", writeAudit: bool = True, writeDeletion: bool = True) -> int:
@@ -507,7 +724,12 @@ class Database(object):
             asm3.audit.delete_rows(self, user, table, where)
         if writeDeletion and user != "":
             asm3.audit.insert_deletions(self, user, table, where)
-        return self.execute("DELETE FROM %s WHERE %s" % (table, where))
+        subjects = asm3.timeline.get_subjects(self, table, where)
+        indexed = asm3.searchindex.get_subjects(self, table, where)
+        rows_affected = self.execute("DELETE FROM %s WHERE %s" % (table, where))
+        asm3.timeline.refresh(self, subjects)
+        asm3.searchindex.refresh(self, indexed)
+        return rows_affected
 
     def install_stored_procedures(self) -> None:
         """ Install any supporting stored procedures (typically for reports) needed for this backend """
@@ -639,7 +861,6 @@ class Database(object):
                         l.append(rowmap)
                 else:
                     l.append(rowmap)
-            self.cursor_close(c, s)
             if DB_TIME_QUERIES:
                 tt = time.time() - start
                 if tt > DB_TIME_LOG_OVER:
@@ -697,7 +918,6 @@ class Database(object):
             cn = []
             for col in s.description:
                 cn.append(col[0].upper())
-            self.cursor_close(c, s)
             return cn
         except Exception as err:
             asm3.al.error(str(err), "Database.query_columns", self, sys.exc_info())
@@ -727,33 +947,41 @@ class Database(object):
             o.append(r[0])
         return "\n".join(o)
     
-    def query_generator(self, sql: str, params: List = None) -> Generator[ResultRow, None, None]:
+    def query_generator(self, sql: str, params: List = None, batchsize: int = 1000) -> Generator[ResultRow, None, None]:
         """ Runs the query given and returns the resultset as a list of dictionaries. 
             generator function version that uses a forward cursor.
+            Rows are fetched from the cursor batchsize at a time. Where the
+            backend supports it, a server-side cursor is used so that only
+            one batch of rows is held in memory.
         """
+        committed = False
         try:
-            c, s = self.cursor_open()
+            c, s = self.cursor_open_stream()
             # Run the query and retrieve all rows
             if params:
                 sql = self.switch_param_placeholder(sql)
                 s.execute(sql, params)
             else:
                 s.execute(sql)
-            c.commit()
+            # Server-side cursors do not have a description until the first fetch
+            rows = s.fetchmany(batchsize)
             cols = []
             # Get the list of column names
             for i in s.description:
                 cols.append(i[0].upper())
-            row = s.fetchone()
-            while row:
-                # Intialise a map for each row
-                rowmap = ResultRow()
-                for i in range(0, len(row)):
-                    v = self.encode_str_after_read(row[i])
-                    rowmap[cols[i]] = v
-                yield rowmap
-                row = s.fetchone()
-            self.cursor_close(c, s)
+            while rows:
+                for row in rows:
+                    # Intialise a map for each row
+                    rowmap = ResultRow()
+                    for i in range(0, len(row)):
+                        v = self.encode_str_after_read(row[i])
+                        rowmap[cols[i]] = v
+                    yield rowmap
+                rows = s.fetchmany(batchsize)
+            # Server-side cursors are closed by the end of the transaction,
+            # so only commit once we have read everything
+            c.commit()
+            committed = True
         except Exception as err:
             asm3.al.error(str(err), "Database.query_generator", self, sys.exc_info())
             asm3.al.error("failing sql: %s %s" % (sql, params), "Database.query_generator", self)
@@ -761,10 +989,17 @@ class Database(object):
                 # An error can leave a connection in unusable state, 
                 # rollback any attempted changes.
                 c.rollback()
+                committed = True
             except:
                 pass
             raise err
         finally:
+            try:
+                # The caller stopped iterating before the end, don't return
+                # a pooled connection with the transaction still open
+                if not committed and self.connection is None: c.rollback()
+            except:
+                pass
             try:
                 self.cursor_close(c, s)
             except:
@@ -822,7 +1057,6 @@ class Database(object):
                 s.execute(sql)
             d = s.fetchall()
             c.commit()
-            self.cursor_close(c, s)
             return d
         except Exception as err:
             asm3.al.error(str(err), "Database.query_tuple", self, sys.exc_info())
@@ -861,7 +1095,6 @@ class Database(object):
             cn = []
             for col in s.description:
                 cn.append(col[0].upper())
-            self.cursor_close(c, s)
             return (d, cn)
         except Exception as err:
             asm3.al.error(str(err), "Database.query_tuple_columns", self, sys.exc_info())
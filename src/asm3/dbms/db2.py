@@ -14,7 +14,7 @@
 """
 import asm3.al
 from .base import Database
-from asm3.typehints import Any, Dict
+from asm3.typehints import Any, Dict, List
 
 try:
     import ibm_db_dbi
@@ -83,6 +83,11 @@ class DatabaseDB2(Database):
         self.update_asm2_primarykey(table, nextid)
         return nextid
 
+    def get_ids(self, table: str, count: int) -> List[int]:
+        """ Returns a block of count new IDs for a table using sequences
+        """
+        return [ self.get_id(table) for x in range(count) ]
+
     def query_explain(self, sql: str, params: Dict = None) -> str:
         """
         Runs an EXPLAIN query
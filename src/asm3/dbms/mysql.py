@@ -5,6 +5,7 @@ from asm3.typehints import Any, List, Tuple
 
 try:
     import MySQLdb
+    import MySQLdb.cursors
 except:
     pass
 
@@ -16,6 +17,8 @@ class DatabaseMySQL(Database):
     type_integer = "INTEGER"
     type_float = "DOUBLE"
 
+    max_params = 10000
+
     def connect(self) -> Any:
         if self.password != "":
             return MySQLdb.connect(host=self.host, port=self.port, user=self.username, passwd=self.password, db=self.database, charset="utf8", use_unicode=True)
@@ -26,7 +29,25 @@ class DatabaseMySQL(Database):
         """ Overridden to apply timeout """
         c, s = Database.cursor_open(self)
         if self.timeout > 0: 
-            s.execute("SET SESSION max_execution_time=%d" % self.timeout)
+            try:
+                s.execute("SET SESSION max_execution_time=%d" % self.timeout)
+            except Exception as err:
+                self.cursor_close(c, s) # don't leak the connection from the pool
+                raise err
+        return c, s
+
+    def cursor_open_stream(self) -> Tuple[Any, Any]:
+        """ Overridden to use an unbuffered (server-side) cursor. Not used for 
+            connections shared via self.connection as nothing else can use the 
+            connection until all rows have been read. """
+        c, s = self.cursor_open()
+        if self.connection is not None: return c, s
+        try:
+            s.close()
+            s = c.cursor(MySQLdb.cursors.SSCursor)
+        except Exception as err:
+            self.cursor_close(c, s)
+            raise err
         return c, s
 
     def ddl_add_index(self, name: str, table: str, column: str, unique: bool = False, partial: bool = False) -> str:
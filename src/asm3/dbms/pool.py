@@ -0,0 +1,240 @@
+
+"""
+Per-process connection pooling for the Database classes.
+
+Database.cursor_open/cursor_close check connections out of and back in to
+the pool for the database they are pointed at, so that a page firing dozens
+of queries only pays for the TCP and auth handshake once.
+
+Pools are keyed on the provider class and connection details, so each
+database in a multiple database setup gets its own pool.
+"""
+
+import asm3.al
+
+import threading
+import time
+
+from asm3.sitedefs import DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT, DB_POOL_MAX_LIFETIME, DB_POOL_HEALTH_CHECK, DB_POOL_WAIT
+from asm3.typehints import Any, Database, Dict, List, Tuple
+
+class PooledConnection(object):
+    """
+    Wraps a DBAPI connection with the times we need to decide
+    whether it can be handed out again.
+    """
+    def __init__(self, conn: Any):
+        self.conn = conn
+        self.created = time.time()
+        self.lastused = self.created
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of connections to a single database.
+    minsize:     Idle connections are not expired below this many connections
+    maxsize:     The most connections that can be open at once. If they are all in use,
+                 callers wait up to wait seconds for one to be returned, after which
+                 a temporary overflow connection is opened (and closed when released)
+    idletimeout: Discard connections that have been idle for more than this many seconds
+    maxlifetime: Discard connections that are older than this many seconds
+    healthcheck: Run a test query on connections that have been idle for more than this many seconds
+                 before handing them out (0 to check every time)
+    """
+    def __init__(self, name: str, minsize: int = DB_POOL_MIN_SIZE, maxsize: int = DB_POOL_MAX_SIZE,
+                 idletimeout: int = DB_POOL_IDLE_TIMEOUT, maxlifetime: int = DB_POOL_MAX_LIFETIME,
+                 healthcheck: int = DB_POOL_HEALTH_CHECK, wait: int = DB_POOL_WAIT):
+        self.name = name
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.idletimeout = idletimeout
+        self.maxlifetime = maxlifetime
+        self.healthcheck = healthcheck
+        self.wait = wait
+        self.idle: List[PooledConnection] = []
+        self.inuse: Dict[int, PooledConnection] = {}
+        self.connecting = 0
+        self.lock = threading.Condition(threading.Lock())
+        self.stats = { "checkouts": 0, "waits": 0, "creates": 0, "discards": 0, "overflows": 0, "healthfails": 0 }
+
+    def size(self) -> int:
+        """ The total number of pooled connections, idle, in use and being opened """
+        return len(self.idle) + len(self.inuse) + self.connecting
+
+    def checkout(self, dbo: Database) -> Any:
+        """ Returns a connection from the pool, creating one if necessary """
+        deadline = time.time() + self.wait
+        waited = False
+        while True:
+            pc = None
+            with self.lock:
+                self._expire_idle()
+                if len(self.idle) > 0:
+                    pc = self.idle.pop()
+                    self.inuse[id(pc.conn)] = pc
+                elif self.size() < self.maxsize:
+                    self.connecting += 1 # reserve a slot while we connect outside the lock
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.stats["overflows"] += 1
+                        asm3.al.warn("pool exhausted (%s connections), opening overflow connection" % self.maxsize, "ConnectionPool.checkout", dbo)
+                        return dbo.connect()
+                    if not waited:
+                        self.stats["waits"] += 1
+                        waited = True
+                    self.lock.wait(remaining)
+                    continue
+            if pc is None:
+                try:
+                    conn = dbo.connect()
+                finally:
+                    with self.lock:
+                        self.connecting -= 1
+                with self.lock:
+                    self.inuse[id(conn)] = PooledConnection(conn)
+                    self.stats["creates"] += 1
+                    self.stats["checkouts"] += 1
+                return conn
+            if not self._healthy(dbo, pc):
+                with self.lock:
+                    del self.inuse[id(pc.conn)]
+                    self.stats["healthfails"] += 1
+                    self.lock.notify()
+                self._close(pc)
+                continue
+            with self.lock:
+                self.stats["checkouts"] += 1
+            return pc.conn
+
+    def checkin(self, conn: Any) -> None:
+        """ Returns a connection to the pool. Connections this pool did not hand out
+            (overflow connections) are closed. Must only be called once for each checkout,
+            once the connection is back in the pool another caller can check it out and
+            a second checkin would return it while they are still using it. """
+        with self.lock:
+            pc = self.inuse.get(id(conn))
+            if pc is not None and pc.conn is conn:
+                del self.inuse[id(conn)]
+                self.lock.notify()
+                now = time.time()
+                if not self._is_closed(conn) and (self.maxlifetime <= 0 or now - pc.created < self.maxlifetime):
+                    pc.lastused = now
+                    self.idle.append(pc)
+                    return
+                self.stats["discards"] += 1
+            elif any(x.conn is conn for x in self.idle):
+                return # already checked in
+        try:
+            conn.close()
+        except:
+            pass
+
+    def close_all(self) -> None:
+        """ Closes all idle connections. Connections in use are closed when they are returned. """
+        with self.lock:
+            idle = self.idle
+            self.idle = []
+            self.inuse = {}
+        for pc in idle:
+            self._close(pc)
+
+    def get_stats(self) -> Dict[str, int]:
+        """ Returns a copy of the stats for this pool along with the current sizes """
+        with self.lock:
+            s = self.stats.copy()
+            s["idle"] = len(self.idle)
+            s["inuse"] = len(self.inuse)
+            s["size"] = self.size()
+            s["maxsize"] = self.maxsize
+            return s
+
+    def _close(self, pc: PooledConnection) -> None:
+        try:
+            pc.conn.close()
+        except:
+            pass
+
+    def _expire_idle(self) -> None:
+        """ Drops idle connections that are past their idle timeout or lifetime.
+            Must be called with the lock held. """
+        now = time.time()
+        keep = []
+        expired = []
+        for pc in self.idle:
+            toolong = self.maxlifetime > 0 and now - pc.created > self.maxlifetime
+            tooidle = self.idletimeout > 0 and now - pc.lastused > self.idletimeout and self.size() - len(expired) > self.minsize
+            if toolong or tooidle:
+                expired.append(pc)
+            else:
+                keep.append(pc)
+        if len(expired) > 0:
+            self.idle = keep
+            self.stats["discards"] += len(expired)
+            for pc in expired:
+                self._close(pc)
+
+    def _healthy(self, dbo: Database, pc: PooledConnection) -> bool:
+        """ Returns True if the connection is still usable """
+        if self._is_closed(pc.conn): return False
+        if time.time() - pc.lastused < self.healthcheck: return True
+        try:
+            s = pc.conn.cursor()
+            s.execute("SELECT 1")
+            s.fetchall()
+            s.close()
+            pc.conn.commit()
+            return True
+        except Exception as err:
+            asm3.al.warn("discarding broken pooled connection: %s" % err, "ConnectionPool._healthy", dbo)
+            return False
+
+    def _is_closed(self, conn: Any) -> bool:
+        """ psycopg2 connections have a closed attribute that is non-zero once the
+            connection has gone. Other drivers will be caught by the health check. """
+        try:
+            return bool(getattr(conn, "closed", False))
+        except:
+            return True
+
+pools: Dict[Tuple, ConnectionPool] = {}
+poolslock = threading.Lock()
+
+def pool_key(dbo: Database) -> Tuple:
+    """ The key that identifies the pool for dbo """
+    return ( dbo.__class__.__name__, dbo.host, dbo.port, dbo.username, dbo.database )
+
+def get_pool(dbo: Database) -> ConnectionPool:
+    """ Returns the pool for dbo, creating it if it does not exist yet """
+    k = pool_key(dbo)
+    p = pools.get(k)
+    if p is None:
+        with poolslock:
+            p = pools.get(k)
+            if p is None:
+                p = ConnectionPool(dbo.name())
+                pools[k] = p
+    return p
+
+def checkout(dbo: Database) -> Any:
+    """ Returns a connection for dbo from its pool """
+    return get_pool(dbo).checkout(dbo)
+
+def checkin(dbo: Database, conn: Any) -> None:
+    """ Returns conn to the pool for dbo """
+    get_pool(dbo).checkin(conn)
+
+def close_all() -> None:
+    """ Closes all idle connections in all pools """
+    with poolslock:
+        for p in pools.values():
+            p.close_all()
+        pools.clear()
+
+def get_stats(dbo: Database = None) -> Dict[str, Dict[str, int]]:
+    """ Returns stats for all pools as a dictionary of pool name to stats, or
+        just the pool for dbo if it is given. """
+    if dbo is not None:
+        return { dbo.name(): get_pool(dbo).get_stats() }
+    with poolslock:
+        return { p.name: p.get_stats() for p in pools.values() }
+
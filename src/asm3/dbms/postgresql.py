@@ -1,7 +1,8 @@
 
 import asm3.al
+import asm3.utils
 from .base import Database
-from asm3.typehints import Any, Tuple
+from asm3.typehints import Any, List, Tuple
 
 try:
     import psycopg2
@@ -17,6 +18,8 @@ class DatabasePostgreSQL(Database):
     type_datetime = "TIMESTAMP"
     type_integer = "INTEGER"
     type_float = "REAL"
+
+    max_params = 10000
     
     def connect(self) -> Any:
         c = psycopg2.connect(host=self.host, port=self.port, user=self.username, password=self.password, database=self.database)
@@ -26,7 +29,25 @@ class DatabasePostgreSQL(Database):
     def cursor_open(self) -> Tuple[Any, Any]:
         """ Overridden to apply timeout """
         c, s = Database.cursor_open(self)
-        if self.timeout > 0: s.execute("SET statement_timeout=%d" % self.timeout)
+        if self.timeout > 0: 
+            try:
+                s.execute("SET statement_timeout=%d" % self.timeout)
+            except Exception as err:
+                self.cursor_close(c, s) # don't leak the connection from the pool
+                raise err
+        return c, s
+
+    def cursor_open_stream(self) -> Tuple[Any, Any]:
+        """ Overridden to use a named (server-side) cursor. Not used for 
+            connections shared via self.connection as a commit would close it. """
+        c, s = self.cursor_open()
+        if self.connection is not None: return c, s
+        try:
+            s.close()
+            s = c.cursor(name="asm_stream_%s" % asm3.utils.uuid_str().replace("-", ""))
+        except Exception as err:
+            self.cursor_close(c, s)
+            raise err
         return c, s
 
     def ddl_add_index(self, name: str, table: str, column: str, unique: bool = False, partial: bool = False) -> str:
@@ -35,6 +56,10 @@ class DatabasePostgreSQL(Database):
         if partial: column = "left(%s,255)" % column
         return "CREATE %sINDEX %s ON %s (%s)" % (u, name, table, column)
 
+    def ddl_add_prefix_index(self, name: str, table: str, column: str) -> str:
+        """ LIKE can only use an index with the pattern operator class in a non-C locale """
+        return "CREATE INDEX %s ON %s (%s text_pattern_ops)" % (name, table, column)
+
     def ddl_add_sequence(self, table: str, startat: int) -> str:
         return "CREATE SEQUENCE seq_%s START %s" % (table, startat)
 
@@ -59,14 +84,14 @@ class DatabasePostgreSQL(Database):
         s = psycopg2.extensions.adapt(s).adapted
         return s
 
-    def get_id(self, table: str) -> int:
-        """ Returns the next ID for a table using Postgres sequences
+    def get_ids(self, table: str, count: int) -> List[int]:
+        """ Returns a block of count new IDs for a table from its sequence in one query.
+            get_id uses this to fill its pool.
         """
-        nextid = self.query_int("SELECT nextval('seq_%s')" % table)
-        # No point copying the sequence to the pk table like we used to
-        # self.update_primarykey(table, nextid) 
-        asm3.al.debug("get_id: %s -> %d (sequence)" % (table, nextid), "DatabasePostgreSQL.get_id", self)
-        return nextid
+        if count <= 0: return []
+        ids = self.query_list("SELECT nextval('seq_%s') FROM generate_series(1, %d)" % (table, count))
+        asm3.al.debug("get_ids: %s -> %d IDs (sequence)" % (table, count), "DatabasePostgreSQL.get_ids", self)
+        return ids
 
     def install_stored_procedures(self) -> None:
         """ Extra PG report procedures to cast a value to date and integer while ignoring errors """
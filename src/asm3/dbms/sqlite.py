@@ -16,7 +16,12 @@ class DatabaseSQLite3(Database):
     type_float = "REAL"
    
     def connect(self) -> Any:
-        return sqlite3.connect(self.database, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        # Pooled connections can be checked out by different threads, but are only ever used by one at a time
+        return sqlite3.connect(self.database, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES, check_same_thread=False)
+
+    def ddl_add_prefix_index(self, name: str, table: str, column: str) -> str:
+        """ LIKE is case insensitive in SQLite and can only use an index with the NOCASE collation """
+        return "CREATE INDEX %s ON %s (%s COLLATE NOCASE)" % (name, table, column)
 
     def name(self) -> str:
         """ Returns the database name. Strip the path from SQLite databases """
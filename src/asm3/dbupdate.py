@@ -3,6 +3,7 @@ import asm3.al
 import asm3.animal
 import asm3.animalcontrol
 import asm3.financial
+import asm3.lookups
 import asm3.lostfound
 import asm3.medical
 import asm3.movement
@@ -30,7 +31,7 @@ TABLES = ( "accounts", "accountsrole", "accountstrx", "additional", "additionalf
     "animaltype", "animaltest", "animaltransport", "animalvaccination", "animalwaitinglist", "audittrail", 
     "basecolour", "breed", "citationtype", "clinicappointment", "clinicinvoiceitem", "configuration", 
     "costtype", "customreport", "customreportrole", "dbfs", "deathreason", "deletion", "diary", 
-    "diarytaskdetail", "diarytaskhead", "diet", "donationpayment", "donationtype", 
+    "diarytaskdetail", "diarytaskhead", "diet", "donationpayment", "donationtype", "emailqueue", 
     "entryreason", "event", "eventanimal", "incidentcompleted", "incidenttype", "internallocation", 
     "jurisdiction", "licencetype", "lkanimalflags", "lkboardingtype", "lkclinicinvoiceitems", "lkclinictype", "lkcoattype", "lkmediaflags", 
     "lkownerflags", "lkproducttype", "lksaccounttype", "lksclinicstatus", "lksdiarylink", "lksdonationfreq", "lksentrytype",
@@ -40,8 +41,8 @@ TABLES = ( "accounts", "accountsrole", "accountstrx", "additional", "additionalf
     "log", "logtype", "media", "medicalprofile", "messages", "onlineform", 
     "onlineformfield", "onlineformincoming", "owner", "ownercitation", "ownerdonation", "ownerinvestigation", 
     "ownerlicence", "ownerlookingfor", "ownerrole", "ownerrota", "ownertraploan", "ownervoucher", "pickuplocation", "product", "publishlog", 
-    "reservationstatus", "role", "site", "species", "stocklevel", "stocklocation", "stockusage", "stockusagetype", 
-    "templatedocument", "templatehtml", "testtype", "testresult", "transporttype", "traptype", "userrole", "users", 
+    "reservationstatus", "role", "searchindex", "site", "species", "stocklevel", "stocklocation", "stockusage", "stockusagetype", 
+    "templatedocument", "templatehtml", "testtype", "testresult", "timeline", "transporttype", "traptype", "userrole", "users", 
     "vaccinationtype", "voucher" )
 
 # ASM2_COMPATIBILITY This is used for dumping tables in ASM2/HSQLDB format. 
@@ -61,7 +62,7 @@ TABLES_ASM2 = ( "accounts", "accountstrx", "additional", "additionalfield",
 # Tables that don't have an ID column (we don't create sequences for these tables for supporting dbs like postgres)
 TABLES_NO_ID_COLUMN = ( "accountsrole", "additional", "audittrail", "animalcontrolanimal", 
     "animalcontrolrole", "animallostfoundmatch", "animalpublished", "configuration", "customreportrole", 
-    "deletion", "onlineformincoming", "ownerlookingfor", "ownerrole", "userrole" )
+    "deletion", "onlineformincoming", "ownerlookingfor", "ownerrole", "searchindex", "timeline", "userrole" )
 
 # Tables that contain data rather than lookups - used by reset_db
 # to determine which tables to delete data from
@@ -71,10 +72,10 @@ TABLES_DATA = ( "accountsrole", "accountstrx", "additional", "adoption",
     "animalcost", "animaldiet", "animalentry", "animalfigures", "animalfiguresannual", 
     "animalfound", "animallitter", "animallost", "animalmedical", "animalmedicaltreatment", "animalname",
     "animaltest", "animaltransport", "animalvaccination", "animalwaitinglist", "audittrail", 
-    "clinicappointment", "clinicinvoiceitem", "deletion", "diary", "event", "eventanimal", 
+    "clinicappointment", "clinicinvoiceitem", "deletion", "diary", "emailqueue", "event", "eventanimal", 
     "log", "ownerlookingfor", "publishlog", "media", "messages", "owner", "ownercitation", 
     "ownerdonation", "ownerinvestigation", "ownerlicence", "ownerrole", "ownerrota", "ownertraploan", "ownervoucher", 
-    "stocklevel", "stockusage" )
+    "searchindex", "stocklevel", "stockusage", "timeline" )
 
 # Tables that contain lookup data. used by dump with includeLookups
 TABLES_LOOKUP = ( "accounts", "additionalfield", "animaltype", "basecolour", "breed", "citationtype", 
@@ -1047,6 +1048,26 @@ def sql_structure(dbo: Database) -> str:
         fstr("PaymentDescription", True),
         fint("IsRetired", True) ), False)
 
+    sql += table("emailqueue", (
+        fid(),
+        fstr("BatchRef"),
+        fstr("ReplyAddress", True),
+        fstr("ToAddress"),
+        fstr("Subject", True),
+        flongstr("Body"),
+        fstr("ContentType"),
+        fint("Status"),
+        fint("Attempts"),
+        fdate("QueuedDate"),
+        fdate("NextAttemptDate"),
+        fdate("SentDate", True),
+        fstr("ClaimRef", True),
+        fdate("ClaimedDate", True),
+        flongstr("LastError") ), False)
+    sql += index("emailqueue_StatusNextAttemptDate", "emailqueue", "Status, NextAttemptDate")
+    sql += index("emailqueue_BatchRef", "emailqueue", "BatchRef")
+    sql += index("emailqueue_ClaimRef", "emailqueue", "ClaimRef")
+
     sql += table("entryreason", (
         fid(),
         fstr("ReasonName"),
@@ -1706,6 +1727,13 @@ def sql_structure(dbo: Database) -> str:
         flongstr("SecurityMap")), False)
     sql += index("role_Rolename", "role", "Rolename")
 
+    sql += table("searchindex", (
+        fstr("SubjectTable"),
+        fint("LinkID"),
+        fstr("Token") ), False)
+    sql += "%s;\n" % dbo.ddl_add_prefix_index("searchindex_SubjectTableToken", "searchindex", "SubjectTable, Token")
+    sql += index("searchindex_SubjectTableLinkID", "searchindex", "SubjectTable, LinkID")
+
     sql += table("site", (
         fid(),
         fstr("SiteName") ), False)
@@ -1797,6 +1825,19 @@ def sql_structure(dbo: Database) -> str:
         fstr("ResultDescription", True),
         fint("IsRetired", True) ), False)
 
+    sql += table("timeline", (
+        fstr("SubjectTable"),
+        fint("LinkID"),
+        fstr("LinkTarget"),
+        fstr("Category"),
+        fdate("EventDate"),
+        flongstr("Text1"),
+        flongstr("Text2"),
+        flongstr("Text3"),
+        fstr("LastChangedBy", True) ), False)
+    sql += index("timeline_EventDate", "timeline", "EventDate")
+    sql += index("timeline_SubjectTableLinkID", "timeline", "SubjectTable, LinkID")
+
     sql += table("traptype", (
         fid(),
         fstr("TrapTypeName"),
@@ -2850,6 +2891,8 @@ def install_db_sequences(dbo: Database) -> None:
         initialvalue = dbo.get_id_max(table)
         execute(dbo, dbo.ddl_drop_sequence(table) )
         execute(dbo, dbo.ddl_add_sequence(table, initialvalue) )
+    # Any IDs reserved before the sequences were reset are no longer safe to use
+    dbo.reset_ids()
 
 def install_db_stored_procedures(dbo: Database) -> None:
     """
@@ -3547,6 +3590,7 @@ def perform_updates(dbo: Database) -> int:
     v = _dbupdates_exec(dbo)
     if v > ver:
         asm3.configuration.dbv(dbo, v)
+        asm3.lookups.invalidate_lookup_cache(dbo)
     return asm3.configuration.dbv(dbo)
 
 def perform_updates_stdout(dbo: Database, stoponexc = False) -> None:
@@ -3559,6 +3603,7 @@ def perform_updates_stdout(dbo: Database, stoponexc = False) -> None:
     v = _dbupdates_exec(dbo, stdout=True, stoponexception = stoponexc)
     if v > ver:
         asm3.configuration.dbv(dbo, v)
+        asm3.lookups.invalidate_lookup_cache(dbo)
 
 def add_column(dbo: Database, table: str, column: str, coltype: str) -> None:
     execute(dbo, dbo.ddl_add_column(table, column, coltype) )
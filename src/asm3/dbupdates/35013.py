@@ -0,0 +1,18 @@
+from asm3.dbupdate import execute, add_index
+import asm3.timeline
+
+fields = ",".join([
+    dbo.ddl_add_table_column("SubjectTable", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("LinkID", dbo.type_integer, False),
+    dbo.ddl_add_table_column("LinkTarget", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("Category", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("EventDate", dbo.type_datetime, False),
+    dbo.ddl_add_table_column("Text1", dbo.type_longtext, True),
+    dbo.ddl_add_table_column("Text2", dbo.type_longtext, True),
+    dbo.ddl_add_table_column("Text3", dbo.type_longtext, True),
+    dbo.ddl_add_table_column("LastChangedBy", dbo.type_shorttext, True)
+])
+execute(dbo, dbo.ddl_add_table("timeline", fields) )
+add_index(dbo, "timeline_EventDate", "timeline", "EventDate")
+add_index(dbo, "timeline_SubjectTableLinkID", "timeline", "SubjectTable, LinkID")
+asm3.timeline.rebuild(dbo)
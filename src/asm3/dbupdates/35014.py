@@ -0,0 +1,12 @@
+from asm3.dbupdate import execute, add_index
+import asm3.searchindex
+
+fields = ",".join([
+    dbo.ddl_add_table_column("SubjectTable", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("LinkID", dbo.type_integer, False),
+    dbo.ddl_add_table_column("Token", dbo.type_shorttext, False)
+])
+execute(dbo, dbo.ddl_add_table("searchindex", fields) )
+execute(dbo, dbo.ddl_add_prefix_index("searchindex_SubjectTableToken", "searchindex", "SubjectTable, Token") )
+add_index(dbo, "searchindex_SubjectTableLinkID", "searchindex", "SubjectTable, LinkID")
+asm3.searchindex.rebuild(dbo)
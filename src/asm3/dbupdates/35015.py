@@ -0,0 +1,20 @@
+from asm3.dbupdate import execute, add_index
+
+fields = ",".join([
+    dbo.ddl_add_table_column("ID", dbo.type_integer, False, pk=True),
+    dbo.ddl_add_table_column("BatchRef", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("ReplyAddress", dbo.type_shorttext, True),
+    dbo.ddl_add_table_column("ToAddress", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("Subject", dbo.type_shorttext, True),
+    dbo.ddl_add_table_column("Body", dbo.type_longtext, True),
+    dbo.ddl_add_table_column("ContentType", dbo.type_shorttext, False),
+    dbo.ddl_add_table_column("Status", dbo.type_integer, False),
+    dbo.ddl_add_table_column("Attempts", dbo.type_integer, False),
+    dbo.ddl_add_table_column("QueuedDate", dbo.type_datetime, False),
+    dbo.ddl_add_table_column("NextAttemptDate", dbo.type_datetime, False),
+    dbo.ddl_add_table_column("SentDate", dbo.type_datetime, True),
+    dbo.ddl_add_table_column("LastError", dbo.type_longtext, True)
+])
+execute(dbo, dbo.ddl_add_table("emailqueue", fields) )
+add_index(dbo, "emailqueue_StatusNextAttemptDate", "emailqueue", "Status, NextAttemptDate")
+add_index(dbo, "emailqueue_BatchRef", "emailqueue", "BatchRef")
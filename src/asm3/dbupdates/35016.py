@@ -0,0 +1,5 @@
+from asm3.dbupdate import add_column, add_index
+
+add_column(dbo, "emailqueue", "ClaimRef", dbo.type_shorttext)
+add_column(dbo, "emailqueue", "ClaimedDate", dbo.type_datetime)
+add_index(dbo, "emailqueue_ClaimRef", "emailqueue", "ClaimRef")
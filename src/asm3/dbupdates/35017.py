@@ -0,0 +1,4 @@
+import asm3.searchindex
+
+# Phone numbers are now only indexed as their marked digits
+asm3.searchindex.rebuild(dbo)
@@ -0,0 +1,149 @@
+
+"""
+Persistent store for scaled renditions of media images (thumbnails, etc).
+Renditions are kept as files under MEDIA_DERIVATIVES/<dbname>/ and are
+keyed by the DBFS id of the original, the size spec and the media date,
+so changing the image (which updates the media date) invalidates them.
+Each database has a byte budget, when it is exceeded the least recently
+used renditions are removed first.
+"""
+
+import asm3.al
+
+import os
+import re
+import threading
+import time
+
+from asm3.sitedefs import MEDIA_DERIVATIVES, MEDIA_DERIVATIVES_MAX_SIZE
+from asm3.typehints import datetime, List, Tuple
+
+# When evicting, remove renditions until the store is this fraction of the budget
+# so that we are not walking the store again on the next put
+EVICT_TO = 0.9
+
+# Only update the last used time of a rendition when it is read if it
+# has not been updated for this many seconds
+TOUCH_INTERVAL = 3600
+
+# Approximate number of bytes in use for each database in this process
+totals = {}
+totalslock = threading.Lock()
+
+def _sanitise(s: str) -> str:
+    """ Make sure a path element only contains letters and numbers """
+    return re.sub(r'[\W_]+', '', s)
+
+def _getpath(dbname: str, dbfsid: int, mkpath: bool = False) -> str:
+    """ Returns the folder for renditions of dbfsid, spread over
+        256 subfolders to keep directories small """
+    path = os.path.join(MEDIA_DERIVATIVES, _sanitise(dbname), "%02x" % (dbfsid % 256))
+    if mkpath: os.makedirs(path, exist_ok=True)
+    return path
+
+def _prefix(dbfsid: int, sizespec: str) -> str:
+    return "%d_%s_" % (dbfsid, _sanitise(sizespec))
+
+def _getfilename(dbname: str, dbfsid: int, sizespec: str, date: datetime, mkpath: bool = False) -> str:
+    stamp = "0"
+    if date is not None: stamp = date.strftime("%Y%m%d%H%M%S")
+    return os.path.join(_getpath(dbname, dbfsid, mkpath), "%s%s.jpg" % (_prefix(dbfsid, sizespec), stamp))
+
+def _scan(dbname: str) -> List[Tuple[float, int, str]]:
+    """ Returns a list of (last used, size, filename) for all renditions of dbname """
+    files = []
+    for root, dummy, names in os.walk(os.path.join(MEDIA_DERIVATIVES, _sanitise(dbname))):
+        for name in names:
+            if name.startswith("."): continue
+            try:
+                fname = os.path.join(root, name)
+                st = os.stat(fname)
+                files.append( (st.st_mtime, st.st_size, fname) )
+            except:
+                pass # removed by another process
+    return files
+
+def get(dbname: str, dbfsid: int, sizespec: str, date: datetime) -> bytes:
+    """ Returns the stored rendition of dbfsid at sizespec for the media date given,
+        or None if there isn't one """
+    if MEDIA_DERIVATIVES == "" or dbfsid == 0: return None
+    fname = _getfilename(dbname, dbfsid, sizespec, date)
+    try:
+        with open(fname, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        asm3.al.error("%s: %s" % (fname, err), "derivatives.get")
+        return None
+    try:
+        # Record the last use for LRU eviction
+        now = time.time()
+        if now - os.stat(fname).st_mtime > TOUCH_INTERVAL: os.utime(fname, (now, now))
+    except:
+        pass
+    return data
+
+def put(dbname: str, dbfsid: int, sizespec: str, date: datetime, data: bytes) -> None:
+    """ Stores a rendition of dbfsid at sizespec for the media date given.
+        Any older renditions of dbfsid at sizespec are removed. """
+    if MEDIA_DERIVATIVES == "" or dbfsid == 0: return
+    try:
+        fname = _getfilename(dbname, dbfsid, sizespec, date, mkpath=True)
+        # Write to a temporary file and rename so that readers never see a partial file
+        tmpname = "%s.%d.%d.tmp" % (fname, os.getpid(), threading.get_ident())
+        with open(tmpname, "wb") as f:
+            f.write(data)
+        os.replace(tmpname, fname)
+        delete(dbname, dbfsid, sizespec, keep=fname)
+    except Exception as err:
+        asm3.al.error("%s/%s/%s: %s" % (dbname, dbfsid, sizespec, err), "derivatives.put")
+        return
+    with totalslock:
+        if dbname not in totals:
+            totals[dbname] = sum(x[1] for x in _scan(dbname))
+        else:
+            totals[dbname] += len(data)
+        over = MEDIA_DERIVATIVES_MAX_SIZE > 0 and totals[dbname] > MEDIA_DERIVATIVES_MAX_SIZE
+    if over: evict(dbname)
+
+def delete(dbname: str, dbfsid: int, sizespec: str = "", keep: str = "") -> None:
+    """ Removes the stored renditions of dbfsid. If sizespec is given, only
+        renditions at that size are removed. keep is a filename not to remove. """
+    if MEDIA_DERIVATIVES == "": return
+    path = _getpath(dbname, dbfsid)
+    prefix = "%d_" % dbfsid
+    if sizespec != "": prefix = _prefix(dbfsid, sizespec)
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return
+    for name in names:
+        fname = os.path.join(path, name)
+        if not name.startswith(prefix) or fname == keep or name.endswith(".tmp"): continue
+        try:
+            os.unlink(fname)
+        except:
+            pass
+
+def evict(dbname: str, maxsize: int = MEDIA_DERIVATIVES_MAX_SIZE) -> None:
+    """ Removes the least recently used renditions of dbname until the store
+        is within its budget """
+    if MEDIA_DERIVATIVES == "" or maxsize <= 0: return
+    files = _scan(dbname)
+    total = sum(x[1] for x in files)
+    removed = 0
+    if total > maxsize:
+        target = maxsize * EVICT_TO
+        for dummy, size, fname in sorted(files):
+            if total <= target: break
+            try:
+                os.unlink(fname)
+                total -= size
+                removed += 1
+            except:
+                pass
+    with totalslock:
+        totals[dbname] = total
+    if removed > 0:
+        asm3.al.debug("removed %s media derivatives for '%s' (%s bytes remaining)" % (removed, dbname, total), "derivatives.evict")
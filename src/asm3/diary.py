@@ -337,10 +337,11 @@ def update_link_info_incomplete(dbo: Database) -> None:
     Updates the link info of all incomplete diary notes
     """
     rows = dbo.query("SELECT DISTINCT LinkType, LinkID FROM diary WHERE DateCompleted Is Null")
-    asm3.asynctask.set_progress_max(dbo, len(rows))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(rows))
     for d in rows:
         update_link_info(dbo, "system", d.LINKTYPE, d.LINKID)
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
+    progress.finish()
     asm3.al.info(f"updated {len(rows)} diary link info elements", "diary.update_link_info_incomplete", dbo)
 
 def insert_diary_from_form(dbo: Database, username: str, linktypeid: int, linkid: int, post: PostedData) -> int:
@@ -455,13 +456,16 @@ def execute_diary_task(dbo: Database, username: str, tasktype: int, taskid: int,
     rollingdate = dbo.today()
     dtd = dbo.query("SELECT * FROM diarytaskdetail WHERE DiaryTaskHeadID = ? ORDER BY OrderIndex", [taskid])
     tags = {}
+    tokens = []
+    for d in dtd:
+        tokens += asm3.wordprocessor.get_tokens(d.SUBJECT or "") + asm3.wordprocessor.get_tokens(d.NOTE or "")
     linktype = ANIMAL
     if tasktype == "ANIMAL": 
         linktype = ANIMAL
-        tags = asm3.wordprocessor.animal_tags(dbo, asm3.animal.get_animal(dbo, linkid))
+        tags = asm3.wordprocessor.animal_tags(dbo, asm3.animal.get_animal(dbo, linkid), tokens=tokens)
     elif tasktype == "PERSON": 
         linktype = PERSON
-        tags = asm3.wordprocessor.person_tags(dbo, asm3.person.get_person(dbo, linkid))
+        tags = asm3.wordprocessor.person_tags(dbo, asm3.person.get_person(dbo, linkid), tokens=tokens)
     for d in dtd:
         if d.DAYPIVOT == 9999: 
             rollingdate = selecteddate
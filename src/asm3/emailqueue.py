@@ -0,0 +1,292 @@
+"""
+Outbox for bulk emails (mail merges).
+
+Messages are stored in the emailqueue table and sent in the background by a
+worker thread for each database (see start). The worker claims the messages
+that are due, builds them and hands them out between EMAIL_QUEUE_CONNECTIONS
+senders, each of which keeps its SMTP connection open and logged in for all
+of the messages it sends rather than connecting again for every one.
+Sending is throttled to EMAIL_QUEUE_RATE emails per minute for the database
+(capped at smcom.MAX_EMAILS_PER_MINUTE when sending through the
+sheltermanager.com server, whose quota is checked by smcom.check_bulk_email
+when the batch is queued).
+
+A message that fails is tried again after RETRY_SECS, doubling each time, until
+it has been attempted MAX_ATTEMPTS times. Messages the server rejects outright
+(5xx responses) are not tried again. The outcome of each message is recorded
+against its batch (see get_progress and get_failures).
+
+Several workers can run against the same queue (one in each web process that
+queued a batch and cron.py maint_email_queue). A worker claims the messages it
+is about to send by marking them SENDING with its own claim reference, and only
+sends the messages it managed to claim. Claims left behind by a worker that
+died are released after CLAIM_TIMEOUT_SECS when the next worker starts.
+
+Queued messages outlive the process that queued them, cron.py maint_email_queue
+sends anything left in the queue after a restart. The daily batch purges old
+sent and failed messages.
+"""
+
+import asm3.al
+import asm3.smcom
+import asm3.utils
+
+from asm3.sitedefs import EMAIL_QUEUE_CONNECTIONS, EMAIL_QUEUE_RATE
+from asm3.typehints import Any, Database, Dict, List, Results
+
+import datetime
+import smtplib
+import sys
+import threading
+import time
+
+QUEUED = 0
+SENT = 1
+FAILED = 2
+SENDING = 3
+
+# The number of messages claimed from the queue at a time
+CLAIM_SIZE = 100
+
+# Claims older than this are assumed to belong to a worker that died and are released
+CLAIM_TIMEOUT_SECS = 3600
+
+# The number of times a message is tried before it is marked as failed
+MAX_ATTEMPTS = 5
+
+# The wait before the first retry of a message, doubled for each retry after
+RETRY_SECS = 60
+
+# The longest a worker sleeps while waiting for retries to fall due
+MAX_SLEEP_SECS = 60
+
+# Sent and failed messages are purged after this many days
+PURGE_DAYS = 30
+
+# Worker thread for each database name and the lock guarding it
+workers = {}
+workers_lock = threading.Lock()
+
+class RateLimiter(object):
+    """
+    Spaces calls to wait so that they return no more than perminute times a
+    minute between all of the threads that share the limiter.
+    """
+    interval = 0.0
+    nexttime = 0.0
+
+    def __init__(self, perminute: int) -> None:
+        if perminute > 0: self.interval = 60.0 / perminute
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.interval == 0: return
+        with self.lock:
+            now = time.monotonic()
+            t = max(now, self.nexttime)
+            self.nexttime = t + self.interval
+        if t > now: time.sleep(t - now)
+
+def get_rate(dbo: Database) -> int:
+    """ Returns the most emails per minute to send for dbo, 0 for no limit """
+    rate = EMAIL_QUEUE_RATE
+    if asm3.utils.is_smcom_smtp(dbo) and (rate == 0 or rate > asm3.smcom.MAX_EMAILS_PER_MINUTE):
+        rate = asm3.smcom.MAX_EMAILS_PER_MINUTE
+    return rate
+
+def is_permanent(err: Exception) -> bool:
+    """ Returns True if err is a rejection from the server that will not succeed if tried again """
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, msg in err.recipients.values())
+    if isinstance(err, smtplib.SMTPResponseException):
+        return err.smtp_code >= 500
+    return False
+
+def queue(dbo: Database, messages: List[Dict], startworker: bool = True) -> str:
+    """
+    Adds messages to the queue as a new batch.
+    messages: A list of dicts with replyadd, toadd, subject, body and contenttype keys
+              (see utils.send_email for their meaning)
+    startworker: If True, starts the worker for dbo to send them
+    Returns the reference for the batch.
+    """
+    batchref = asm3.utils.uuid_str()
+    now = dbo.now()
+    rows = []
+    for m in messages:
+        rows.append({
+            "BatchRef":         batchref,
+            "*ReplyAddress":    m["replyadd"],
+            "*ToAddress":       m["toadd"],
+            "*Subject":         m["subject"],
+            "*Body":            m["body"],
+            "ContentType":      m["contenttype"],
+            "Status":           QUEUED,
+            "Attempts":         0,
+            "QueuedDate":       now,
+            "NextAttemptDate":  now
+        })
+    dbo.insert_many("emailqueue", rows, writeAudit=False)
+    asm3.al.debug("queued %d emails in batch %s" % (len(rows), batchref), "emailqueue.queue", dbo)
+    if startworker and len(rows) > 0: start(dbo)
+    return batchref
+
+def start(dbo: Database) -> None:
+    """
+    Starts the worker thread for dbo if it is not already running.
+    """
+    with workers_lock:
+        if dbo.name() in workers: return
+        t = threading.Thread(target=_worker, args=(dbo,), daemon=True)
+        workers[dbo.name()] = t
+        t.start()
+
+def _worker(dbo: Database) -> None:
+    """
+    Runs the queue for dbo until it is empty. The last check for queued messages
+    is made while holding the lock so that a batch queued as the worker finishes
+    either gets picked up by it or starts another.
+    """
+    try:
+        while True:
+            run(dbo)
+            with workers_lock:
+                if dbo.query_int("SELECT COUNT(*) FROM emailqueue WHERE Status=?", [QUEUED]) == 0:
+                    del workers[dbo.name()]
+                    return
+    except Exception as err:
+        asm3.al.error(str(err), "emailqueue._worker", dbo, sys.exc_info())
+        with workers_lock:
+            workers.pop(dbo.name(), None)
+
+def run(dbo: Database) -> None:
+    """
+    Sends queued messages until there are none left, sleeping while waiting for retries.
+    """
+    release_stale(dbo)
+    settings = asm3.utils.get_smtp_settings(dbo)
+    senders = [ asm3.utils.SMTPSender(dbo, settings) for i in range(max(1, EMAIL_QUEUE_CONNECTIONS)) ]
+    limiter = RateLimiter(get_rate(dbo))
+    try:
+        while True:
+            if process(dbo, senders, limiter) > 0: continue
+            nextdate = dbo.query_date("SELECT MIN(NextAttemptDate) FROM emailqueue WHERE Status=?", [QUEUED])
+            if nextdate is None: break
+            # Don't hold connections open while waiting for the next retry
+            for s in senders: s.close()
+            time.sleep(max(1, min(MAX_SLEEP_SECS, (nextdate - dbo.now()).total_seconds())))
+    finally:
+        for s in senders: s.close()
+
+def claim(dbo: Database) -> Results:
+    """
+    Claims up to CLAIM_SIZE messages that are due for this worker and returns them.
+    The claim only takes messages that are still queued, so messages another
+    worker claimed first are not returned.
+    """
+    ids = dbo.query_list("SELECT ID FROM emailqueue WHERE Status=? AND NextAttemptDate<=? ORDER BY ID",
+        [QUEUED, dbo.now()], limit=CLAIM_SIZE)
+    if len(ids) == 0: return []
+    claimref = asm3.utils.uuid_str()
+    dbo.execute("UPDATE emailqueue SET Status=?, ClaimRef=?, ClaimedDate=? WHERE ID IN (%s) AND Status=?" % \
+        ",".join(str(x) for x in ids), [SENDING, claimref, dbo.now(), QUEUED])
+    return dbo.query("SELECT * FROM emailqueue WHERE ClaimRef=? AND Status=? ORDER BY ID", [claimref, SENDING])
+
+def release_stale(dbo: Database) -> int:
+    """
+    Puts messages claimed more than CLAIM_TIMEOUT_SECS ago back in the queue.
+    Returns the number of messages released.
+    """
+    cutoff = dbo.now() - datetime.timedelta(seconds = CLAIM_TIMEOUT_SECS)
+    released = dbo.execute("UPDATE emailqueue SET Status=?, ClaimRef=NULL WHERE Status=? AND ClaimedDate<?", [QUEUED, SENDING, cutoff])
+    if released > 0:
+        asm3.al.warn("released %d emails from stale claims" % released, "emailqueue.release_stale", dbo)
+    return released
+
+def process(dbo: Database, senders: List = None, limiter: RateLimiter = None) -> int:
+    """
+    Claims up to CLAIM_SIZE messages that are due, sends them and records the outcomes.
+    senders: The senders to share the messages between, if None one is opened and closed
+    limiter: Throttles sending, if None there is no limit
+    Returns the number of messages processed.
+    """
+    rows = claim(dbo)
+    if len(rows) == 0: return 0
+    closesenders = senders is None
+    if senders is None: senders = [ asm3.utils.SMTPSender(dbo) ]
+    if limiter is None: limiter = RateLimiter(0)
+    results = {}
+    # Messages are built here rather than in the sending threads as that reads config from the database
+    work = []
+    for r in rows:
+        try:
+            msg, fromadd, tolist = asm3.utils.build_email(dbo, r.REPLYADDRESS, r.TOADDRESS, "", "",
+                r.SUBJECT, r.BODY, r.CONTENTTYPE, bulk=True)
+            work.append((r.ID, msg, fromadd, tolist))
+        except Exception as err:
+            results[r.ID] = err
+    def send_all(sender: Any, items: List) -> None:
+        for iid, msg, fromadd, tolist in items:
+            limiter.wait()
+            try:
+                sender.send(msg, fromadd, tolist)
+                results[iid] = None
+            except Exception as err:
+                results[iid] = err
+                # The server is still talking to us after a rejection, otherwise start again
+                if not isinstance(err, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    sender.close()
+    threads = [ threading.Thread(target=send_all, args=(s, work[i::len(senders)])) for i, s in enumerate(senders) ]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    if closesenders:
+        for s in senders: s.close()
+    now = dbo.now()
+    updates = []
+    for r in rows:
+        err = results.get(r.ID, Exception("not sent"))
+        u = { "ID": r.ID, "Attempts": r.ATTEMPTS + 1, "ClaimRef": None }
+        if err is None:
+            u["Status"] = SENT
+            u["SentDate"] = now
+        elif is_permanent(err) or u["Attempts"] >= MAX_ATTEMPTS:
+            u["Status"] = FAILED
+            u["LastError"] = str(err)
+            asm3.al.error("failed sending to %s after %d attempts: %s" % (r.TOADDRESS, u["Attempts"], err), "emailqueue.process", dbo)
+        else:
+            u["Status"] = QUEUED
+            u["NextAttemptDate"] = now + datetime.timedelta(seconds = RETRY_SECS * 2 ** r.ATTEMPTS)
+            u["LastError"] = str(err)
+            asm3.al.warn("retrying %s: %s" % (r.TOADDRESS, err), "emailqueue.process", dbo)
+        updates.append(u)
+    dbo.update_many("emailqueue", updates, writeAudit=False)
+    for batchref in set(r.BATCHREF for r in rows):
+        p = get_progress(dbo, batchref)
+        if p["QUEUED"] == 0:
+            asm3.al.info("batch %s complete: %d sent, %d failed" % (batchref, p["SENT"], p["FAILED"]), "emailqueue.process", dbo)
+    return len(rows)
+
+def get_progress(dbo: Database, batchref: str) -> Dict:
+    """
+    Returns the number of messages in a batch as a dict with TOTAL, QUEUED, SENT and FAILED keys
+    (messages being sent are counted as queued)
+    """
+    p = { "TOTAL": 0, "QUEUED": 0, "SENT": 0, "FAILED": 0 }
+    names = { QUEUED: "QUEUED", SENDING: "QUEUED", SENT: "SENT", FAILED: "FAILED" }
+    for r in dbo.query("SELECT Status, COUNT(*) AS Total FROM emailqueue WHERE BatchRef=? GROUP BY Status", [batchref]):
+        p[names[r.STATUS]] += r.TOTAL
+        p["TOTAL"] += r.TOTAL
+    return p
+
+def get_failures(dbo: Database, batchref: str) -> Results:
+    """
+    Returns the messages in a batch that could not be sent and the last error for each
+    """
+    return dbo.query("SELECT ToAddress, Subject, Attempts, LastError FROM emailqueue " \
+        "WHERE BatchRef=? AND Status=? ORDER BY ID", [batchref, FAILED])
+
+def purge(dbo: Database) -> None:
+    """
+    Deletes sent and failed messages queued more than PURGE_DAYS ago. Called by the daily batch.
+    """
+    dbo.execute("DELETE FROM emailqueue WHERE Status IN (?,?) AND QueuedDate<?", [SENT, FAILED, dbo.today(offset=PURGE_DAYS*-1)])
@@ -1,5 +1,6 @@
 
 import asm3.cachedisk
+import asm3.cachemem
 import asm3.configuration
 import asm3.financial
 import asm3.utils
@@ -8,6 +9,8 @@ from asm3.sitedefs import URL_MICROCHIP_PREFIXES
 from asm3.typehints import datetime, Database, Dict, List, LocationFilter, Results, Tuple
 
 import re
+import threading
+import time
 
 # Look up tables map
 # tablename : ( tablelabel, namefield, namelabel, descfield, hasspecies, haspfspecies, haspfbreed, hasapcolour, hasdefaultcost, hasunits, hassite, canadd, candelete, canretire,(foreignkeys) )
@@ -793,14 +796,78 @@ def add_message(dbo: Database, createdby: str, email: int, message: str, forname
 def delete_message(dbo: Database, mid: int) -> None:
     dbo.delete("messages", mid)
 
+# In-process cache of lookup table rows for each database, dbname: [ generation, modified, checked, { sql: rows } ]
+# Lookup tables rarely change, but are read by nearly every form. Each process
+# only checks its cache is still current every LOOKUP_CACHE_CHECK seconds, against
+# a generation number in the memory cache (shared between processes and servers
+# when memcached is in use) and the time a stamp in the disk cache was last
+# written (shared between processes on the same server when it is not). Both
+# are moved on whenever a lookup is changed.
+lookupcache = {}
+lookupcachelock = threading.Lock()
+LOOKUP_CACHE_CHECK = 5
+
+def _query_lookup(dbo: Database, sql: str) -> Results:
+    """ Runs sql, a parameterless query against lookup tables, returning the
+        rows from the in-process cache if they are present and current.
+        The rows returned are copies and may be modified by the caller. """
+    dbname = dbo.name()
+    now = time.time()
+    with lookupcachelock:
+        entry = lookupcache.get(dbname)
+    if entry is None or now - entry[2] >= LOOKUP_CACHE_CHECK:
+        generation = _get_lookup_generation(dbo)
+        modified = _get_lookup_modified(dbo)
+        if entry is None or entry[0] != generation or entry[1] != modified:
+            entry = [ generation, modified, now, {} ]
+        else:
+            entry = [ generation, modified, now, entry[3] ]
+        with lookupcachelock:
+            lookupcache[dbname] = entry
+    rows = entry[3].get(sql)
+    if rows is None:
+        rows = dbo.query(sql)
+        entry[3][sql] = rows
+    return [ r.copy() for r in rows ]
+
+def invalidate_lookup_cache(dbo: Database) -> None:
+    """ Discards the cached lookup tables for this database in all processes """
+    with lookupcachelock:
+        lookupcache.pop(dbo.name(), None)
+    _bump_lookup_generation(dbo)
+    asm3.cachedisk.put("lookup_stamp", dbo.name(), time.time(), 86400)
+
+def _get_lookup_generation(dbo: Database) -> int:
+    """ Returns the current lookup generation for this database, starting a new one if there isn't one """
+    key = "%s_lookup_generation" % dbo.name()
+    g = asm3.cachemem.get(key)
+    if g is None:
+        g = int(time.time() * 1000)
+        asm3.cachemem.put(key, g, 86400)
+    return g
+
+def _get_lookup_modified(dbo: Database) -> float:
+    """ Returns the time the lookup stamp in the disk cache was last written, writing one if there isn't one """
+    modified = asm3.cachedisk.modified("lookup_stamp", dbo.name())
+    if modified == 0:
+        asm3.cachedisk.put("lookup_stamp", dbo.name(), time.time(), 86400)
+        modified = asm3.cachedisk.modified("lookup_stamp", dbo.name())
+    return modified
+
+def _bump_lookup_generation(dbo: Database) -> None:
+    """ Moves the lookup generation on so that other processes discard their cached lookups """
+    key = "%s_lookup_generation" % dbo.name()
+    if asm3.cachemem.increment(key) is None:
+        asm3.cachemem.put(key, int(time.time() * 1000), 86400)
+
 def get_account_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksaccounttype ORDER BY AccountType")
+    return _query_lookup(dbo, "SELECT * FROM lksaccounttype ORDER BY AccountType")
 
 def get_additionalfield_links(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksfieldlink ORDER BY LinkType")
+    return _query_lookup(dbo, "SELECT * FROM lksfieldlink ORDER BY LinkType")
 
 def get_additionalfield_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksfieldtype ORDER BY FieldType")
+    return _query_lookup(dbo, "SELECT * FROM lksfieldtype ORDER BY FieldType")
 
 def _merge_db_flags(dbflags: Results, flags: str = "") -> Results:
     """
@@ -826,39 +893,39 @@ def _merge_db_flags(dbflags: Results, flags: str = "") -> Results:
     return out
 
 def get_animal_flags(dbo: Database, flags: str = "") -> Results:
-    dbflags = dbo.query("SELECT * FROM lkanimalflags WHERE IsRetired=0 ORDER BY Flag")
+    dbflags = _query_lookup(dbo, "SELECT * FROM lkanimalflags WHERE IsRetired=0 ORDER BY Flag")
     return _merge_db_flags(dbflags, flags)
 
 def get_animal_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM animaltype ORDER BY AnimalType")
+    return _query_lookup(dbo, "SELECT * FROM animaltype ORDER BY AnimalType")
 
 def get_animaltype_name(dbo: Database, aid: int) -> str:
     if id is None: return ""
     return dbo.query_string("SELECT AnimalType FROM animaltype WHERE ID = ?", [aid])
 
 def get_basecolours(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM basecolour ORDER BY BaseColour")
+    return _query_lookup(dbo, "SELECT * FROM basecolour ORDER BY BaseColour")
 
 def get_basecolour_name(dbo: Database, cid: int) -> str:
     if id is None: return ""
     return dbo.query_string("SELECT BaseColour FROM basecolour WHERE ID = ?", [cid])
 
 def get_boarding_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkboardingtype ORDER BY BoardingName")
+    return _query_lookup(dbo, "SELECT * FROM lkboardingtype ORDER BY BoardingName")
 
 def get_breeds(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM breed ORDER BY BreedName")
+    return _query_lookup(dbo, "SELECT * FROM breed ORDER BY BreedName")
 
 def get_breeds_by_species(dbo: Database) -> Results:
-    return dbo.query("SELECT breed.*, species.SpeciesName FROM breed " \
+    return _query_lookup(dbo, "SELECT breed.*, species.SpeciesName FROM breed " \
         "LEFT OUTER JOIN species ON breed.SpeciesID = species.ID " \
         "ORDER BY species.SpeciesName, breed.BreedName")
 
 def get_clinic_invoice_items(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkclinicinvoiceitems ORDER BY ClinicInvoiceItemName")
+    return _query_lookup(dbo, "SELECT * FROM lkclinicinvoiceitems ORDER BY ClinicInvoiceItemName")
 
 def get_clinic_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkclinictype ORDER BY ClinicTypeName")
+    return _query_lookup(dbo, "SELECT * FROM lkclinictype ORDER BY ClinicTypeName")
 
 def get_species_for_breed(dbo: Database, bid: int) -> int:
     return dbo.query_int("SELECT SpeciesID FROM breed WHERE ID=?", [bid])
@@ -868,59 +935,59 @@ def get_breed_name(dbo: Database, bid: int) -> str:
     return dbo.query_string("SELECT BreedName FROM breed WHERE ID = ?", [bid])
 
 def get_citation_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM citationtype ORDER BY CitationName")
+    return _query_lookup(dbo, "SELECT * FROM citationtype ORDER BY CitationName")
 
 def get_clinic_statuses(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksclinicstatus ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksclinicstatus ORDER BY ID")
 
 def get_coattypes(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkcoattype ORDER BY CoatType")
+    return _query_lookup(dbo, "SELECT * FROM lkcoattype ORDER BY CoatType")
 
 def get_costtypes(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM costtype ORDER BY CostTypeName")
+    return _query_lookup(dbo, "SELECT * FROM costtype ORDER BY CostTypeName")
 
 def get_coattype_name(dbo: Database, cid: int) -> str:
     if id is None: return ""
     return dbo.query_string("SELECT CoatTypeName FROM lkcoattype WHERE ID = ?", [cid])
 
 def get_deathreasons(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM deathreason ORDER BY ReasonName")
+    return _query_lookup(dbo, "SELECT * FROM deathreason ORDER BY ReasonName")
 
 def get_deathreason_name(dbo: Database, rid: int) -> str:
     if id is None: return ""
     return dbo.query_string("SELECT ReasonName FROM deathreason WHERE ID = ?", [rid])
 
 def get_diets(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM diet ORDER BY DietName")
+    return _query_lookup(dbo, "SELECT * FROM diet ORDER BY DietName")
 
 def get_donation_default(dbo: Database, donationtypeid: int) -> int:
     return dbo.query_int("SELECT DefaultCost FROM donationtype WHERE ID = ?", [donationtypeid])
 
 def get_donation_frequencies(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksdonationfreq ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksdonationfreq ORDER BY ID")
 
 def get_donation_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM donationtype ORDER BY DonationName")
+    return _query_lookup(dbo, "SELECT * FROM donationtype ORDER BY DonationName")
 
 def get_donationtype_name(dbo: Database, did: int) -> str:
     if did is None: return ""
     return dbo.query_string("SELECT DonationName FROM donationtype WHERE ID = ?", [did])
 
 def get_entryreasons(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM entryreason ORDER BY ReasonName")
+    return _query_lookup(dbo, "SELECT * FROM entryreason ORDER BY ReasonName")
 
 def get_entryreason_name(dbo: Database, rid: int) -> str:
     if rid is None: return ""
     return dbo.query_string("SELECT ReasonName FROM entryreason WHERE ID = ?", [rid])
 
 def get_entry_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksentrytype ORDER BY EntryTypeName")
+    return _query_lookup(dbo, "SELECT * FROM lksentrytype ORDER BY EntryTypeName")
 
 def get_incident_completed_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM incidentcompleted ORDER BY CompletedName")
+    return _query_lookup(dbo, "SELECT * FROM incidentcompleted ORDER BY CompletedName")
 
 def get_incident_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM incidenttype ORDER BY IncidentName")
+    return _query_lookup(dbo, "SELECT * FROM incidenttype ORDER BY IncidentName")
 
 def get_internal_locations(dbo: Database, lf: LocationFilter = None) -> Results:
     clauses = []
@@ -928,7 +995,7 @@ def get_internal_locations(dbo: Database, lf: LocationFilter = None) -> Results:
     if lf is not None and lf.siteid != 0: clauses.append("SiteID = %s" % lf.siteid)
     c = " AND ".join(clauses)
     if c != "": c = "WHERE %s" % c
-    return dbo.query("SELECT * FROM internallocation %s ORDER BY LocationName" % c)
+    return _query_lookup(dbo, "SELECT * FROM internallocation %s ORDER BY LocationName" % c)
 
 def get_internal_locations_counts(dbo: Database, lf: LocationFilter = None) -> Results:
     clauses = []
@@ -946,10 +1013,10 @@ def get_internallocation_name(dbo: Database, lid: int) -> str:
     return dbo.query_string("SELECT LocationName FROM internallocation WHERE ID = ?", [lid])
 
 def get_jurisdictions(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM jurisdiction ORDER BY JurisdictionName")
+    return _query_lookup(dbo, "SELECT * FROM jurisdiction ORDER BY JurisdictionName")
 
 def get_licence_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM licencetype ORDER BY LicenceTypeName")
+    return _query_lookup(dbo, "SELECT * FROM licencetype ORDER BY LicenceTypeName")
 
 def get_messages(dbo: Database, user: str, roles: str, superuser: int) -> Results:
     """
@@ -975,14 +1042,14 @@ def get_messages(dbo: Database, user: str, roles: str, superuser: int) -> Result
     return rv
 
 def get_log_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM logtype ORDER BY LogTypeName")
+    return _query_lookup(dbo, "SELECT * FROM logtype ORDER BY LogTypeName")
 
 def get_logtype_name(dbo: Database, tid: int) -> str:
     if tid is None: return ""
     return dbo.query_string("SELECT LogTypeName FROM logtype WHERE ID = ?", [tid])
 
 def get_media_flags(dbo: Database, flags: str = "") -> Results:
-    dbflags = dbo.query("SELECT * FROM lkmediaflags WHERE IsRetired=0 ORDER BY Flag")
+    dbflags = _query_lookup(dbo, "SELECT * FROM lkmediaflags WHERE IsRetired=0 ORDER BY Flag")
     return _merge_db_flags(dbflags, flags)
 
 def get_theme(theme: str) -> Tuple[str, str, str, str]:
@@ -1001,6 +1068,15 @@ def insert_lookup(dbo: Database, username: str, lookup: str, name: str, desc: st
                   speciesid: int = 0, pfbreed: str = "", pfspecies: str = "", apcolour: str = "", 
                   units: str = "", site: int = 1, rescheduledays: int = 0, accountid: int = 0, 
                   defaultcost: int = 0, vat: int = 0, retired: int = 0, taxrate: float = 0) -> int:
+    nid = _insert_lookup(dbo, username, lookup, name, desc, speciesid, pfbreed, pfspecies, apcolour, 
+        units, site, rescheduledays, accountid, defaultcost, vat, retired, taxrate)
+    invalidate_lookup_cache(dbo)
+    return nid
+
+def _insert_lookup(dbo: Database, username: str, lookup: str, name: str, desc: str = "", 
+                  speciesid: int = 0, pfbreed: str = "", pfspecies: str = "", apcolour: str = "", 
+                  units: str = "", site: int = 1, rescheduledays: int = 0, accountid: int = 0, 
+                  defaultcost: int = 0, vat: int = 0, retired: int = 0, taxrate: float = 0) -> int:
     t = LOOKUP_TABLES[lookup]
     nid = 0
     if lookup == "basecolour":
@@ -1197,10 +1273,12 @@ def update_lookup(dbo: Database, username: str, iid: int, lookup: str, name: str
             dbo.update(lookup, iid, { t[LOOKUP_NAMEFIELD]: name, t[LOOKUP_DESCFIELD]: desc, "IsRetired": retired }, username, setLastChanged=False)
         else:
             dbo.update(lookup, iid, { t[LOOKUP_NAMEFIELD]: name, t[LOOKUP_DESCFIELD]: desc }, username, setLastChanged=False)
+    invalidate_lookup_cache(dbo)
 
 def update_lookup_retired(dbo: Database, username: str, lookup: str, iid: int, retired: int) -> None:
     """ Updates lookup item with ID=iid, setting IsRetired=retired """
     dbo.update(lookup, iid, { "IsRetired": retired }, username, setLastChanged=False)
+    invalidate_lookup_cache(dbo)
 
 def delete_lookup(dbo: Database, username: str, lookup: str, iid: int) -> None:
     l = dbo.locale
@@ -1210,9 +1288,10 @@ def delete_lookup(dbo: Database, username: str, lookup: str, iid: int) -> None:
         if 0 < dbo.query_int("SELECT COUNT(*) FROM %s WHERE %s = %s" % (table, field, iid)):
             raise asm3.utils.ASMValidationError(_("This item is referred to in the database ({0}) and cannot be deleted until it is no longer in use.", l).format(fv))
     dbo.delete(lookup, iid, username)
+    invalidate_lookup_cache(dbo)
 
 def get_medical_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksmedicaltype ORDER BY MedicalTypeName")
+    return _query_lookup(dbo, "SELECT * FROM lksmedicaltype ORDER BY MedicalTypeName")
 
 def get_microchip_manufacturer(l: str, chipno: str) -> str:
     """
@@ -1271,43 +1350,43 @@ def get_movementtype_name(dbo: Database, mid: int) -> str:
     return dbo.query_string("SELECT MovementType FROM lksmovementtype WHERE ID = ?", [mid])
 
 def get_movement_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksmovementtype ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksmovementtype ORDER BY ID")
 
 def get_paymentmethod_name(dbo: Database, pid: int) -> str:
     if pid is None: return ""
     return dbo.query_string("SELECT PaymentName FROM donationpayment WHERE ID = ?", [pid])
 
 def get_payment_methods(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM donationpayment ORDER BY PaymentName")
+    return _query_lookup(dbo, "SELECT * FROM donationpayment ORDER BY PaymentName")
 
 def get_person_flags(dbo: Database, flags: str = "") -> Results:
-    dbflags = dbo.query("SELECT * FROM lkownerflags WHERE IsRetired=0 ORDER BY Flag")
+    dbflags = _query_lookup(dbo, "SELECT * FROM lkownerflags WHERE IsRetired=0 ORDER BY Flag")
     return _merge_db_flags(dbflags, flags)
 
 def get_pickup_locations(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM pickuplocation ORDER BY LocationName")
+    return _query_lookup(dbo, "SELECT * FROM pickuplocation ORDER BY LocationName")
 
 def get_posneg(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksposneg ORDER BY Name")
+    return _query_lookup(dbo, "SELECT * FROM lksposneg ORDER BY Name")
 
 def get_product_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkproducttype ORDER BY ProductTypeName")
+    return _query_lookup(dbo, "SELECT * FROM lkproducttype ORDER BY ProductTypeName")
 
 def get_reservation_statuses(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM reservationstatus ORDER BY StatusName")
+    return _query_lookup(dbo, "SELECT * FROM reservationstatus ORDER BY StatusName")
 
 def get_rota_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksrotatype ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksrotatype ORDER BY ID")
 
 def get_sex_name(dbo: Database, sid: int) -> str:
     if id is None: return ""
     return dbo.query_string("SELECT Sex FROM lksex WHERE ID = ?", [sid])
 
 def get_sexes(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksex ORDER BY Sex")
+    return _query_lookup(dbo, "SELECT * FROM lksex ORDER BY Sex")
 
 def get_sites(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM site ORDER BY SiteName")
+    return _query_lookup(dbo, "SELECT * FROM site ORDER BY SiteName")
 
 def get_site_name(dbo: Database, sid: int) -> str:
     if sid is None: return ""
@@ -1318,7 +1397,7 @@ def get_size_name(dbo: Database, sid: int) -> str:
     return dbo.query_string("SELECT Size FROM lksize WHERE ID = ?", [sid])
 
 def get_species(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM species ORDER BY SpeciesName")
+    return _query_lookup(dbo, "SELECT * FROM species ORDER BY SpeciesName")
 
 def get_species_name(dbo: Database, sid: int) -> str:
     if id is None: return ""
@@ -1338,26 +1417,26 @@ def update_species_id(dbo: Database, find: str, replace: str) -> int:
     return affected
 
 def get_sizes(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksize ORDER BY Size")
+    return _query_lookup(dbo, "SELECT * FROM lksize ORDER BY Size")
 
 def get_stock_locations(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM stocklocation ORDER BY LocationName")
+    return _query_lookup(dbo, "SELECT * FROM stocklocation ORDER BY LocationName")
 
 def get_stock_location_name(dbo: Database, slid: int) -> str:
     if slid is None: return ""
     return dbo.query_string("SELECT LocationName FROM stocklocation WHERE ID = ?", [slid])
 
 def get_stock_usage_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM stockusagetype ORDER BY UsageTypeName")
+    return _query_lookup(dbo, "SELECT * FROM stockusagetype ORDER BY UsageTypeName")
 
 def get_trap_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM traptype ORDER BY TrapTypeName")
+    return _query_lookup(dbo, "SELECT * FROM traptype ORDER BY TrapTypeName")
 
 def get_unit_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksunittype ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksunittype ORDER BY ID")
 
 def get_urgencies(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkurgency ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lkurgency ORDER BY ID")
 
 def get_urgency_name(dbo: Database, uid: int) -> str:
     if id is None: return ""
@@ -1368,35 +1447,35 @@ def get_tax_rates(dbo: Database) -> Results:
         dbo.sql_concat([ "TaxRateName", "' ('", "TaxRate", "'%'", "')'" ]))
 
 def get_test_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM testtype ORDER BY TestName")
+    return _query_lookup(dbo, "SELECT * FROM testtype ORDER BY TestName")
 
 def get_test_results(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM testresult ORDER BY ResultName")
+    return _query_lookup(dbo, "SELECT * FROM testresult ORDER BY ResultName")
 
 def get_transport_statuses(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkstransportstatus ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lkstransportstatus ORDER BY ID")
 
 def get_transport_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM transporttype ORDER BY TransportTypeName")
+    return _query_lookup(dbo, "SELECT * FROM transporttype ORDER BY TransportTypeName")
 
 def get_vaccination_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM vaccinationtype ORDER BY VaccinationType")
+    return _query_lookup(dbo, "SELECT * FROM vaccinationtype ORDER BY VaccinationType")
 
 def get_voucher_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM voucher ORDER BY VoucherName")
+    return _query_lookup(dbo, "SELECT * FROM voucher ORDER BY VoucherName")
 
 def get_waitinglist_removals(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkwaitinglistremoval ORDER BY RemovalName")
+    return _query_lookup(dbo, "SELECT * FROM lkwaitinglistremoval ORDER BY RemovalName")
 
 def get_work_types(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lkworktype ORDER BY WorkType")
+    return _query_lookup(dbo, "SELECT * FROM lkworktype ORDER BY WorkType")
 
 def get_yesno(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksyesno ORDER BY Name")
+    return _query_lookup(dbo, "SELECT * FROM lksyesno ORDER BY Name")
 
 def get_ynun(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksynun ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksynun ORDER BY ID")
 
 def get_ynunk(dbo: Database) -> Results:
-    return dbo.query("SELECT * FROM lksynunk ORDER BY ID")
+    return _query_lookup(dbo, "SELECT * FROM lksynunk ORDER BY ID")
 
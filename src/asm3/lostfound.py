@@ -12,8 +12,12 @@ import asm3.media
 import asm3.reports
 import asm3.utils
 import asm3.waitinglist
-from asm3.i18n import _, date_diff_days, now, subtract_years, python2display
-from asm3.typehints import Database, Dict, List, PostedData, ResultRow, Results
+from asm3.i18n import _, now, subtract_years, python2display
+from asm3.typehints import Any, Callable, Database, Dict, List, PostedData, ResultRow, Results
+
+import bisect
+import datetime
+import time
 
 class LostFoundMatch:
     dbo = None
@@ -135,11 +139,7 @@ def get_lostanimal_find_simple(dbo: Database, query: str = "", limit: int = 0, s
         ss.values.append(dbo.today(offset=-30))
     else:
         if asm3.utils.is_numeric(query): ss.add_field_value("a.ID", asm3.utils.cint(query))
-        ss.add_fields([ "o.OwnerName", "a.AreaLost", "a.AreaPostcode", "a.MicrochipNumber" ])
-        ss.add_clause("EXISTS(SELECT ad.Value FROM additional ad " \
-            "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
-            "WHERE ad.LinkID=a.ID AND ad.LinkType IN (%s) AND LOWER(ad.Value) LIKE ?)" % asm3.additional.LOSTANIMAL_IN)
-        ss.add_large_text_fields([ "b.BreedName", "a.DistFeat", "a.Comments" ])
+        ss.add_search_index("animallost", "a.ID")
 
     sql = "%s WHERE a.ID > 0 %s AND (%s)" % (get_lostanimal_query(dbo), sitefilter, " OR ".join(ss.ors))
     return dbo.query(sql, ss.values, limit=limit, distincton="ID")
@@ -161,11 +161,7 @@ def get_foundanimal_find_simple(dbo: Database, query: str = "", limit: int = 0,
         ss.values.append(dbo.today(offset=-30))
     else:
         if asm3.utils.is_numeric(query): ss.add_field_value("a.ID", asm3.utils.cint(query))
-        ss.add_fields([ "o.OwnerName", "a.AreaFound", "a.AreaPostcode", "a.MicrochipNumber" ])
-        ss.add_clause("EXISTS(SELECT ad.Value FROM additional ad " \
-            "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
-            "WHERE ad.LinkID=a.ID AND ad.LinkType IN (%s) AND LOWER(ad.Value) LIKE ?)" % asm3.additional.FOUNDANIMAL_IN)
-        ss.add_large_text_fields([ "b.BreedName", "a.DistFeat", "a.Comments" ])
+        ss.add_search_index("animalfound", "a.ID")
 
     sql = "%s WHERE a.ID > 0 %s AND (%s)" % (get_foundanimal_query(dbo), sitefilter, " OR ".join(ss.ors))
     return dbo.query(sql, ss.values, limit=limit, distincton="ID")
@@ -335,23 +331,136 @@ def send_email_from_form(dbo: Database, username: str, post: PostedData) -> bool
         asm3.log.add_log_email(dbo, username, post["lfmode"] == "lost" and asm3.log.LOSTANIMAL or asm3.log.FOUNDANIMAL, post.integer("lfid"), logtype, emailto, subject, body)
     return rv
 
-def words(str1: str, str2: str, maxpoints: int):
+def word_list(s: str) -> List[str]:
     """
-    Evalutes words in string 1 for appearances in string 2
-    Returns the number of points for 1 to 2 as a percentage of maxpoints
+    Returns the lower case words in s, as they are compared by words
+    """
+    if s is None: s = ""
+    return s.replace(",", " ").replace("\n", " ").lower().strip().split(" ")
+
+def words_points(s1words: List[str], s2words: Any, maxpoints: int) -> int:
+    """
+    Evaluates the words from word_list in s1words for appearances in s2words
+    (which can be a set of words to make the lookups quicker).
+    Returns the number of points as a percentage of maxpoints
     """
-    if str1 is None: str1 = ""
-    if str2 is None: str2 = ""
-    str1 = str1.replace(",", " ").replace("\n", " ").lower().strip()
-    str2 = str2.replace(",", " ").replace("\n", " ").lower().strip()
     matches = 0
-    s1words = str1.split(" ")
-    s2words = str2.split(" ")
     for w in s1words:
         if w in s2words: 
             matches += 1
     return int((float(matches) / float(len(s1words))) * float(maxpoints))
 
+def words(str1: str, str2: str, maxpoints: int):
+    """
+    Evalutes words in string 1 for appearances in string 2
+    Returns the number of points for 1 to 2 as a percentage of maxpoints
+    """
+    return words_points(word_list(str1), word_list(str2), maxpoints)
+
+def unix_time(d: datetime.datetime) -> float:
+    """
+    Returns date d as unix time for within_days, None if there is no date
+    """
+    if d is None: return None
+    try:
+        return time.mktime(d.timetuple())
+    except Exception:
+        return None
+
+def within_days(t1: float, t2: float, days: int) -> bool:
+    """
+    Returns True if unix time t2 is no more than days after t1, or either has no date.
+    The same as date_diff_days(d1, d2) <= days, without converting the dates each time.
+    """
+    if t1 is None or t2 is None: return True
+    return int((t2 - t1) / 60 / 60 / 24) <= days
+
+class MatchIndex(object):
+    """
+    Blocking index over the found or shelter animals that lost animals are
+    compared with (see match_animals). 
+    Records are grouped by species, as a different species can never reach 
+    the point floor, then indexed within each species by their values for 
+    each criterion that scores points. candidates returns only the records that 
+    share a value with the lost animal for at least one of the criteria it 
+    would need to reach the point floor.
+    """
+    def __init__(self, records: Results, species: Callable, criteria: Dict[str, Callable], date: Callable, blockspecies: bool) -> None:
+        """
+        species: Returns the species of a record
+        criteria: Returns the values of a record that score points for each criterion matched by equality
+        date: Returns the date of a record for the within 2 weeks criterion
+        blockspecies: Group by species, False if a different species could still reach the floor
+        """
+        self.blockspecies = blockspecies
+        self.blocks = {}
+        for i, r in enumerate(records):
+            key = species(r) if blockspecies else None
+            if key not in self.blocks: 
+                self.blocks[key] = { "all": [], "criteria": { c: {} for c in criteria }, "dates": [], "nodates": [] }
+            b = self.blocks[key]
+            b["all"].append(i)
+            for c, fn in criteria.items():
+                for v in fn(r):
+                    b["criteria"][c].setdefault(v, []).append(i)
+            d = date(r)
+            if d is None: 
+                b["nodates"].append(i)
+            else:
+                b["dates"].append((d, i))
+        for b in self.blocks.values():
+            b["dates"].sort(key=lambda x: x[0])
+            b["datekeys"] = [ x[0] for x in b["dates"] ]
+
+    def candidates(self, species: int, values: Dict[str, List], date: datetime.datetime, weights: Dict[str, int], base: int, floor: int) -> List[int]:
+        """
+        Returns the positions of the records that could score floor points against a lost animal, in order.
+        species: The lost animal's species
+        values: The lost animal's values that score points for each criterion matched by equality, 
+            an empty list if the criterion cannot score
+        date: The lost animal's date for the within 2 weeks criterion
+        weights: The points for each criterion in values and "date"
+        base: The most points a record can score from anything not in weights
+        """
+        b = self.blocks.get(species if self.blockspecies else None)
+        if b is None: return []
+        if base >= floor: return b["all"]
+        # (size, criterion, points, bucket) where bucket is the value in the index or number of dates in the window
+        buckets = []
+        for c, points in weights.items():
+            if points <= 0: continue
+            if c == "date":
+                if date is None: 
+                    buckets.append((len(b["all"]), c, points, None))
+                    continue
+                # date_diff_days <= 14 is within 15 days, allow a day for DST
+                n = bisect.bisect_right(b["datekeys"], date + datetime.timedelta(days=16))
+                buckets.append((n + len(b["nodates"]), c, points, n))
+            else:
+                bucket = []
+                for v in values[c]: bucket += b["criteria"][c].get(v, [])
+                buckets.append((len(bucket), c, points, bucket))
+        # Leave out the criteria with the most records, for as long as 
+        # matching all of them still can't reach the point floor
+        total = base
+        include = []
+        for size, c, points, bucket in sorted(buckets, key=lambda x: x[0], reverse=True):
+            if total + points < floor:
+                total += points
+            else:
+                include.append((size, c, bucket))
+        if len(include) == 0: return []
+        if sum(x[0] for x in include) * 2 >= len(b["all"]): return b["all"]
+        found = set()
+        for size, c, bucket in include:
+            if c == "date" and bucket is None: return b["all"]
+            elif c == "date": 
+                found.update(b["nodates"])
+                found.update(x[1] for x in b["dates"][:bucket])
+            else:
+                found.update(bucket)
+        return sorted(found)
+
 def match(dbo: Database, lostanimalid: int = 0, foundanimalid: int = 0, animalid: int = 0, limit: int = 0) -> List[LostFoundMatch]:
     """
     Performs a lost and found match by going through all lost animals
@@ -361,23 +470,7 @@ def match(dbo: Database, lostanimalid: int = 0, foundanimalid: int = 0, animalid
     limit:          Stop when we hit this many matches (or 0 for all)
     returns a list of LostFoundMatch objects
     """
-    l = dbo.locale
     batch = []
-    matches = []
-    matchspecies = asm3.configuration.match_species(dbo)
-    matchbreed = asm3.configuration.match_breed(dbo)
-    matchage = asm3.configuration.match_age(dbo)
-    matchsex = asm3.configuration.match_sex(dbo)
-    matcharealost = asm3.configuration.match_area_lost(dbo)
-    matchfeatures = asm3.configuration.match_features(dbo)
-    matchpostcode = asm3.configuration.match_postcode(dbo)
-    matchcolour = asm3.configuration.match_colour(dbo)
-    matchmicrochip = asm3.configuration.match_microchip(dbo)
-    matchdatewithin2weeks = asm3.configuration.match_within2weeks(dbo)
-    matchmax = matchspecies + matchbreed + matchage + matchsex + \
-        matcharealost + matchfeatures + matchpostcode + matchcolour + \
-        matchmicrochip + matchdatewithin2weeks
-    matchpointfloor = asm3.configuration.match_point_floor(dbo)
     includeshelter = asm3.configuration.match_include_shelter(dbo)
     fullmatch = animalid == 0 and lostanimalid == 0 and foundanimalid == 0
     # Ignore records older than 6 months to keep things useful
@@ -396,18 +489,19 @@ def match(dbo: Database, lostanimalid: int = 0, foundanimalid: int = 0, animalid
     if len(lostanimals) > 0:
         oldestdate = lostanimals[0].DATELOST
 
-    # Get the set of found animals for comparison
-    foundanimals = None
-    if foundanimalid == 0:
+    # Get the set of found animals for comparison (if an animal id 
+    # has been given don't check found animals)
+    foundanimals = []
+    if animalid == 0 and foundanimalid == 0:
         foundanimals = dbo.query(get_foundanimal_query(dbo) + \
             " WHERE a.ReturnToOwnerDate Is Null" \
             " AND a.DateFound >= ? ", [oldestdate])
-    else:
+    elif animalid == 0:
         foundanimals = dbo.query(get_foundanimal_query(dbo) + " WHERE a.ID = ?", [foundanimalid])
 
     # Get the set of shelter animals for comparison - anything brought in recently
     # that's 1. still on shelter or 2. was released to wild, transferred or escaped
-    shelteranimals = None
+    shelteranimals = []
     if includeshelter:
         if animalid == 0:
             shelteranimals = dbo.query(asm3.animal.get_animal_query(dbo) + " WHERE " + \
@@ -416,147 +510,11 @@ def match(dbo: Database, lostanimalid: int = 0, foundanimalid: int = 0, animalid
         else:
             shelteranimals = dbo.query(asm3.animal.get_animal_query(dbo) + " WHERE a.ID = ?", [animalid])
 
-    asm3.asynctask.set_progress_max(dbo, len(lostanimals))
-    for la in lostanimals:
-        asm3.asynctask.increment_progress_value(dbo)
-        # Stop if we've hit our limit
-        if limit > 0 and len(matches) >= limit:
-            break
-        # Found animals (if an animal id has been given don't
-        # check found animals)
-        if animalid == 0:
-            for fa in foundanimals:
-                matchpoints = 0
-                if la["MICROCHIPNUMBER"] != "" and la["MICROCHIPNUMBER"] == fa["MICROCHIPNUMBER"]: matchpoints += matchmicrochip
-                if la["ANIMALTYPEID"] == fa["ANIMALTYPEID"]: matchpoints += matchspecies
-                if la["ANIMALTYPEID"] != fa["ANIMALTYPEID"]: matchpoints -= 9999 # if species is different, force no match
-                if la["BREEDID"] == fa["BREEDID"]: matchpoints += matchbreed
-                if la["AGEGROUP"] == fa["AGEGROUP"]: matchpoints += matchage
-                if la["SEX"] == fa["SEX"]: matchpoints += matchsex
-                matchpoints += words(la["AREALOST"], fa["AREAFOUND"], matcharealost)
-                matchpoints += words(la["DISTFEAT"], fa["DISTFEAT"], matchfeatures)
-                if la["AREAPOSTCODE"] == fa["AREAPOSTCODE"]: matchpoints += matchpostcode
-                if la["BASECOLOURID"] == fa["BASECOLOURID"]: matchpoints += matchcolour
-                if date_diff_days(la["DATELOST"], fa["DATEFOUND"]) <= 14: matchpoints += matchdatewithin2weeks
-                if matchpoints > matchmax: matchpoints = matchmax
-                if matchpoints >= matchpointfloor:
-                    m = LostFoundMatch(dbo)
-                    m.lid = la["ID"]
-                    m.lcontactname = la["OWNERNAME"]
-                    m.lmicrochip = la["MICROCHIPNUMBER"]
-                    m.lcontactnumber = la["HOMETELEPHONE"]
-                    m.larealost = la["AREALOST"]
-                    m.lareapostcode = la["AREAPOSTCODE"]
-                    m.lagegroup = la["AGEGROUP"]
-                    m.lsexid = la["SEX"]
-                    m.lsexname = la["SEXNAME"]
-                    m.lspeciesid = la["ANIMALTYPEID"]
-                    m.lspeciesname = la["SPECIESNAME"]
-                    m.lbreedid = la["BREEDID"]
-                    m.lbreedname = la["BREEDNAME"]
-                    m.ldistinguishingfeatures = la["DISTFEAT"]
-                    m.lbasecolourid = la["BASECOLOURID"]
-                    m.lbasecolourname = la["BASECOLOURNAME"]
-                    m.ldatelost = la["DATELOST"]
-                    m.fid = fa["ID"]
-                    m.fanimalid = 0
-                    m.fcontactname = fa["OWNERNAME"]
-                    m.fmicrochip = fa["MICROCHIPNUMBER"]
-                    m.fcontactnumber = fa["HOMETELEPHONE"]
-                    m.fareafound = fa["AREAFOUND"]
-                    m.fareapostcode = fa["AREAPOSTCODE"]
-                    m.fagegroup = fa["AGEGROUP"]
-                    m.fsexid = fa["SEX"]
-                    m.fsexname = fa["SEXNAME"]
-                    m.fspeciesid = fa["ANIMALTYPEID"]
-                    m.fspeciesname = fa["SPECIESNAME"]
-                    m.fbreedid = fa["BREEDID"]
-                    m.fbreedname = fa["BREEDNAME"]
-                    m.fdistinguishingfeatures = fa["DISTFEAT"]
-                    m.fbasecolourid = fa["BASECOLOURID"]
-                    m.fbasecolourname = fa["BASECOLOURNAME"]
-                    m.fdatefound = fa["DATEFOUND"]
-                    m.matchpoints = int((float(matchpoints) / float(matchmax)) * 100.0)
-                    matches.append(m)
-                    if fullmatch: 
-                        batch.append(m.toParams())
-                    if limit > 0 and len(matches) >= limit:
-                        break
-
-        # Shelter animals
-        if includeshelter:
-            for a in shelteranimals:
-                matchpoints = 0
-                foundarea = ""
-                foundpostcode = ""
-                if la["MICROCHIPNUMBER"] != "" and la["MICROCHIPNUMBER"] == a["IDENTICHIPNUMBER"]: matchpoints += matchmicrochip
-                if la["ANIMALTYPEID"] == a["SPECIESID"]: matchpoints += matchspecies
-                if la["ANIMALTYPEID"] != a["SPECIESID"]: matchpoints -= 9999 # if species is different, force no match
-                if la["BREEDID"] == a["BREEDID"] or la["BREEDID"] == a["BREED2ID"]: matchpoints += matchbreed
-                if la["BASECOLOURID"] == a["BASECOLOURID"]: matchpoints += matchcolour
-                if la["AGEGROUP"] == a["AGEGROUP"]: matchpoints += matchage
-                if la["SEX"] == a["SEX"]: matchpoints += matchsex
-                matchpoints += words(la["DISTFEAT"], a["MARKINGS"], matchfeatures)
-                if a["ISPICKUP"] == 1:
-                    matchpoints += words(la["AREALOST"], a["PICKUPADDRESS"], matcharealost)
-                    foundarea = a["PICKUPADDRESS"]
-                elif a["BROUGHTINBYOWNERADDRESS"] is not None:
-                    matchpoints += words(la["AREALOST"], a["BROUGHTINBYOWNERADDRESS"], matcharealost)
-                    if asm3.utils.nulltostr(a["BROUGHTINBYOWNERPOSTCODE"]).find(la["AREAPOSTCODE"]) != -1: matchpoints += matchpostcode
-                    foundarea = a["BROUGHTINBYOWNERADDRESS"]
-                    foundpostcode = a["BROUGHTINBYOWNERPOSTCODE"]
-                elif a["ORIGINALOWNERADDRESS"] is not None:
-                    matchpoints += words(la["AREALOST"], a["ORIGINALOWNERADDRESS"], matcharealost)
-                    if asm3.utils.nulltostr(a["ORIGINALOWNERPOSTCODE"]).find(la["AREAPOSTCODE"]) != -1: matchpoints += matchpostcode
-                    foundarea = a["ORIGINALOWNERADDRESS"]
-                    foundpostcode = a["ORIGINALOWNERPOSTCODE"]
-                if date_diff_days(la["DATELOST"], a["DATEBROUGHTIN"]) <= 14: matchpoints += matchdatewithin2weeks
-                if matchpoints > matchmax: matchpoints = matchmax
-                if matchpoints >= matchpointfloor:
-                    m = LostFoundMatch(dbo)
-                    m.lid = la["ID"]
-                    m.lcontactname = la["OWNERNAME"]
-                    m.lmicrochip = la["MICROCHIPNUMBER"]
-                    m.lcontactnumber = la["HOMETELEPHONE"]
-                    m.larealost = la["AREALOST"]
-                    m.lareapostcode = la["AREAPOSTCODE"]
-                    m.lagegroup = la["AGEGROUP"]
-                    m.lsexid = la["SEX"]
-                    m.lsexname = la["SEXNAME"]
-                    m.lspeciesid = la["ANIMALTYPEID"]
-                    m.lspeciesname = la["SPECIESNAME"]
-                    m.lbreedid = la["BREEDID"]
-                    m.lbreedname = la["BREEDNAME"]
-                    m.ldistinguishingfeatures = la["DISTFEAT"]
-                    m.lbasecolourid = la["BASECOLOURID"]
-                    m.lbasecolourname = la["BASECOLOURNAME"]
-                    m.ldatelost = la["DATELOST"]
-                    m.fid = 0
-                    m.fanimalid = a["ID"]
-                    m.fcontactname = _("Shelter animal {0} '{1}'", l).format(a["CODE"], a["ANIMALNAME"])
-                    m.fmicrochip = a["IDENTICHIPNUMBER"]
-                    m.fcontactnumber = a["SPECIESNAME"]
-                    m.fareafound = foundarea
-                    m.fareapostcode = foundpostcode
-                    m.fagegroup = a["AGEGROUP"]
-                    m.fsexid = a["SEX"]
-                    m.fsexname = a["SEXNAME"]
-                    m.fspeciesid = a["SPECIESID"]
-                    m.fspeciesname = a["SPECIESNAME"]
-                    m.fbreedid = a["BREEDID"]
-                    m.fbreedname = a["BREEDNAME"]
-                    m.fdistinguishingfeatures = a["MARKINGS"]
-                    m.fbasecolourid = a["BASECOLOURID"]
-                    m.fbasecolourname = a["BASECOLOURNAME"]
-                    m.fdatefound = a["DATEBROUGHTIN"]
-                    m.matchpoints = int((float(matchpoints) / float(matchmax)) * 100.0)
-                    matches.append(m)
-                    if fullmatch:
-                        batch.append(m.toParams())
-                    if limit > 0 and len(matches) >= limit:
-                        break
+    matches = match_animals(dbo, lostanimals, foundanimals, shelteranimals, limit)
 
     if fullmatch:
+        for m in matches:
+            batch.append(m.toParams())
         dbo.execute("DELETE FROM animallostfoundmatch")
         sql = "INSERT INTO animallostfoundmatch (AnimalLostID, AnimalFoundID, AnimalID, LostContactName, LostContactNumber, " \
             "LostArea, LostPostcode, LostAgeGroup, LostSex, LostSpeciesID, LostBreedID, LostFeatures, LostBaseColourID, LostDate, " \
@@ -568,6 +526,231 @@ def match(dbo: Database, lostanimalid: int = 0, foundanimalid: int = 0, animalid
 
     return matches
 
+def match_animals(dbo: Database, lostanimals: Results, foundanimals: Results, shelteranimals: Results, limit: int = 0) -> List[LostFoundMatch]:
+    """
+    Compares each of the lost animals with the found and shelter animals given, 
+    scoring each pair with the points for the criteria they match.
+    The text of each record is normalised once and the found and shelter animals
+    are indexed (see MatchIndex) so that only pairs that could reach the point 
+    floor are scored.
+    limit:          Stop when we hit this many matches (or 0 for all)
+    returns a list of LostFoundMatch objects for the pairs that reached the point floor
+    """
+    l = dbo.locale
+    matches = []
+    matchspecies = asm3.configuration.match_species(dbo)
+    matchbreed = asm3.configuration.match_breed(dbo)
+    matchage = asm3.configuration.match_age(dbo)
+    matchsex = asm3.configuration.match_sex(dbo)
+    matcharealost = asm3.configuration.match_area_lost(dbo)
+    matchfeatures = asm3.configuration.match_features(dbo)
+    matchpostcode = asm3.configuration.match_postcode(dbo)
+    matchcolour = asm3.configuration.match_colour(dbo)
+    matchmicrochip = asm3.configuration.match_microchip(dbo)
+    matchdatewithin2weeks = asm3.configuration.match_within2weeks(dbo)
+    matchmax = matchspecies + matchbreed + matchage + matchsex + \
+        matcharealost + matchfeatures + matchpostcode + matchcolour + \
+        matchmicrochip + matchdatewithin2weeks
+    matchpointfloor = asm3.configuration.match_point_floor(dbo)
+    # The most points the words and species criteria can add
+    maxwords = max(0, matcharealost) + max(0, matchfeatures)
+    maxspecies = max(0, matchspecies)
+    # Points for the criteria that are indexed
+    weights = { "microchip": matchmicrochip, "breed": matchbreed, "age": matchage, "sex": matchsex, 
+        "postcode": matchpostcode, "colour": matchcolour, "date": matchdatewithin2weeks }
+    # A different species takes off 9999 points, only group by species if that means it cannot match
+    blockspecies = sum(max(0, x) for x in weights.values()) + maxwords - 9999 < matchpointfloor
+
+    # Normalise the text compared by words and the dates once for each record
+    lostwords = [ (word_list(la["AREALOST"]), word_list(la["DISTFEAT"])) for la in lostanimals ]
+    foundwords = [ (set(word_list(fa["AREAFOUND"])), set(word_list(fa["DISTFEAT"]))) for fa in foundanimals ]
+    shelterwords = [ (set(word_list(a["MARKINGS"])), set(word_list(a["PICKUPADDRESS"])), 
+        set(word_list(a["BROUGHTINBYOWNERADDRESS"])), set(word_list(a["ORIGINALOWNERADDRESS"]))) for a in shelteranimals ]
+    losttimes = [ unix_time(la["DATELOST"]) for la in lostanimals ]
+    foundtimes = [ unix_time(fa["DATEFOUND"]) for fa in foundanimals ]
+    sheltertimes = [ unix_time(a["DATEBROUGHTIN"]) for a in shelteranimals ]
+
+    foundindex = MatchIndex(foundanimals, lambda r: r["ANIMALTYPEID"], {
+        "microchip": lambda r: [ r["MICROCHIPNUMBER"] ],
+        "breed": lambda r: [ r["BREEDID"] ],
+        "age": lambda r: [ r["AGEGROUP"] ],
+        "sex": lambda r: [ r["SEX"] ],
+        "postcode": lambda r: [ r["AREAPOSTCODE"] ],
+        "colour": lambda r: [ r["BASECOLOURID"] ]
+    }, lambda r: r["DATEFOUND"], blockspecies)
+    # The postcode of shelter animals is matched by substring so it is not indexed
+    shelterweights = weights.copy()
+    del shelterweights["postcode"]
+    shelterindex = MatchIndex(shelteranimals, lambda r: r["SPECIESID"], {
+        "microchip": lambda r: [ r["IDENTICHIPNUMBER"] ],
+        "breed": lambda r: list(set([ r["BREEDID"], r["BREED2ID"] ])),
+        "age": lambda r: [ r["AGEGROUP"] ],
+        "sex": lambda r: [ r["SEX"] ],
+        "colour": lambda r: [ r["BASECOLOURID"] ]
+    }, lambda r: r["DATEBROUGHTIN"], blockspecies)
+
+    progress = asm3.asynctask.ProgressTracker(dbo, len(lostanimals))
+    for li, la in enumerate(lostanimals):
+        progress.increment()
+        # Stop if we've hit our limit
+        if limit > 0 and len(matches) >= limit:
+            break
+        lmicrochip = la["MICROCHIPNUMBER"]
+        lspecies = la["ANIMALTYPEID"]
+        lbreed = la["BREEDID"]
+        lagegroup = la["AGEGROUP"]
+        lsex = la["SEX"]
+        lpostcode = la["AREAPOSTCODE"]
+        lcolour = la["BASECOLOURID"]
+        ltime = losttimes[li]
+        larealost, ldistfeat = lostwords[li]
+        values = {
+            "microchip":    lmicrochip != "" and [ lmicrochip ] or [],
+            "breed":        [ lbreed ],
+            "age":          [ lagegroup ],
+            "sex":          [ lsex ],
+            "postcode":     [ lpostcode ],
+            "colour":       [ lcolour ]
+        }
+
+        # Found animals
+        for fi in foundindex.candidates(lspecies, values, la["DATELOST"], weights, maxspecies + maxwords, matchpointfloor):
+            fa = foundanimals[fi]
+            matchpoints = 0
+            if lmicrochip != "" and lmicrochip == fa["MICROCHIPNUMBER"]: matchpoints += matchmicrochip
+            if lspecies == fa["ANIMALTYPEID"]: matchpoints += matchspecies
+            if lspecies != fa["ANIMALTYPEID"]: matchpoints -= 9999 # if species is different, force no match
+            if lbreed == fa["BREEDID"]: matchpoints += matchbreed
+            if lagegroup == fa["AGEGROUP"]: matchpoints += matchage
+            if lsex == fa["SEX"]: matchpoints += matchsex
+            if lpostcode == fa["AREAPOSTCODE"]: matchpoints += matchpostcode
+            if lcolour == fa["BASECOLOURID"]: matchpoints += matchcolour
+            if within_days(ltime, foundtimes[fi], 14): matchpoints += matchdatewithin2weeks
+            # Don't bother comparing words if they can't bring it up to the floor
+            if matchpoints + maxwords < matchpointfloor: continue
+            fareafound, fdistfeat = foundwords[fi]
+            matchpoints += words_points(larealost, fareafound, matcharealost)
+            matchpoints += words_points(ldistfeat, fdistfeat, matchfeatures)
+            if matchpoints > matchmax: matchpoints = matchmax
+            if matchpoints >= matchpointfloor:
+                m = LostFoundMatch(dbo)
+                m.lid = la["ID"]
+                m.lcontactname = la["OWNERNAME"]
+                m.lmicrochip = la["MICROCHIPNUMBER"]
+                m.lcontactnumber = la["HOMETELEPHONE"]
+                m.larealost = la["AREALOST"]
+                m.lareapostcode = la["AREAPOSTCODE"]
+                m.lagegroup = la["AGEGROUP"]
+                m.lsexid = la["SEX"]
+                m.lsexname = la["SEXNAME"]
+                m.lspeciesid = la["ANIMALTYPEID"]
+                m.lspeciesname = la["SPECIESNAME"]
+                m.lbreedid = la["BREEDID"]
+                m.lbreedname = la["BREEDNAME"]
+                m.ldistinguishingfeatures = la["DISTFEAT"]
+                m.lbasecolourid = la["BASECOLOURID"]
+                m.lbasecolourname = la["BASECOLOURNAME"]
+                m.ldatelost = la["DATELOST"]
+                m.fid = fa["ID"]
+                m.fanimalid = 0
+                m.fcontactname = fa["OWNERNAME"]
+                m.fmicrochip = fa["MICROCHIPNUMBER"]
+                m.fcontactnumber = fa["HOMETELEPHONE"]
+                m.fareafound = fa["AREAFOUND"]
+                m.fareapostcode = fa["AREAPOSTCODE"]
+                m.fagegroup = fa["AGEGROUP"]
+                m.fsexid = fa["SEX"]
+                m.fsexname = fa["SEXNAME"]
+                m.fspeciesid = fa["ANIMALTYPEID"]
+                m.fspeciesname = fa["SPECIESNAME"]
+                m.fbreedid = fa["BREEDID"]
+                m.fbreedname = fa["BREEDNAME"]
+                m.fdistinguishingfeatures = fa["DISTFEAT"]
+                m.fbasecolourid = fa["BASECOLOURID"]
+                m.fbasecolourname = fa["BASECOLOURNAME"]
+                m.fdatefound = fa["DATEFOUND"]
+                m.matchpoints = int((float(matchpoints) / float(matchmax)) * 100.0)
+                matches.append(m)
+                if limit > 0 and len(matches) >= limit:
+                    break
+
+        # Shelter animals
+        for si in shelterindex.candidates(lspecies, values, la["DATELOST"], shelterweights, 
+            maxspecies + maxwords + max(0, matchpostcode), matchpointfloor):
+            a = shelteranimals[si]
+            matchpoints = 0
+            foundarea = ""
+            foundpostcode = ""
+            if lmicrochip != "" and lmicrochip == a["IDENTICHIPNUMBER"]: matchpoints += matchmicrochip
+            if lspecies == a["SPECIESID"]: matchpoints += matchspecies
+            if lspecies != a["SPECIESID"]: matchpoints -= 9999 # if species is different, force no match
+            if lbreed == a["BREEDID"] or lbreed == a["BREED2ID"]: matchpoints += matchbreed
+            if lcolour == a["BASECOLOURID"]: matchpoints += matchcolour
+            if lagegroup == a["AGEGROUP"]: matchpoints += matchage
+            if lsex == a["SEX"]: matchpoints += matchsex
+            if within_days(ltime, sheltertimes[si], 14): matchpoints += matchdatewithin2weeks
+            # Don't bother comparing words if they can't bring it up to the floor
+            if matchpoints + maxwords + max(0, matchpostcode) < matchpointfloor: continue
+            smarkings, spickupaddress, sbroughtinbyowneraddress, soriginalowneraddress = shelterwords[si]
+            matchpoints += words_points(ldistfeat, smarkings, matchfeatures)
+            if a["ISPICKUP"] == 1:
+                matchpoints += words_points(larealost, spickupaddress, matcharealost)
+                foundarea = a["PICKUPADDRESS"]
+            elif a["BROUGHTINBYOWNERADDRESS"] is not None:
+                matchpoints += words_points(larealost, sbroughtinbyowneraddress, matcharealost)
+                if asm3.utils.nulltostr(a["BROUGHTINBYOWNERPOSTCODE"]).find(lpostcode) != -1: matchpoints += matchpostcode
+                foundarea = a["BROUGHTINBYOWNERADDRESS"]
+                foundpostcode = a["BROUGHTINBYOWNERPOSTCODE"]
+            elif a["ORIGINALOWNERADDRESS"] is not None:
+                matchpoints += words_points(larealost, soriginalowneraddress, matcharealost)
+                if asm3.utils.nulltostr(a["ORIGINALOWNERPOSTCODE"]).find(lpostcode) != -1: matchpoints += matchpostcode
+                foundarea = a["ORIGINALOWNERADDRESS"]
+                foundpostcode = a["ORIGINALOWNERPOSTCODE"]
+            if matchpoints > matchmax: matchpoints = matchmax
+            if matchpoints >= matchpointfloor:
+                m = LostFoundMatch(dbo)
+                m.lid = la["ID"]
+                m.lcontactname = la["OWNERNAME"]
+                m.lmicrochip = la["MICROCHIPNUMBER"]
+                m.lcontactnumber = la["HOMETELEPHONE"]
+                m.larealost = la["AREALOST"]
+                m.lareapostcode = la["AREAPOSTCODE"]
+                m.lagegroup = la["AGEGROUP"]
+                m.lsexid = la["SEX"]
+                m.lsexname = la["SEXNAME"]
+                m.lspeciesid = la["ANIMALTYPEID"]
+                m.lspeciesname = la["SPECIESNAME"]
+                m.lbreedid = la["BREEDID"]
+                m.lbreedname = la["BREEDNAME"]
+                m.ldistinguishingfeatures = la["DISTFEAT"]
+                m.lbasecolourid = la["BASECOLOURID"]
+                m.lbasecolourname = la["BASECOLOURNAME"]
+                m.ldatelost = la["DATELOST"]
+                m.fid = 0
+                m.fanimalid = a["ID"]
+                m.fcontactname = _("Shelter animal {0} '{1}'", l).format(a["CODE"], a["ANIMALNAME"])
+                m.fmicrochip = a["IDENTICHIPNUMBER"]
+                m.fcontactnumber = a["SPECIESNAME"]
+                m.fareafound = foundarea
+                m.fareapostcode = foundpostcode
+                m.fagegroup = a["AGEGROUP"]
+                m.fsexid = a["SEX"]
+                m.fsexname = a["SEXNAME"]
+                m.fspeciesid = a["SPECIESID"]
+                m.fspeciesname = a["SPECIESNAME"]
+                m.fbreedid = a["BREEDID"]
+                m.fbreedname = a["BREEDNAME"]
+                m.fdistinguishingfeatures = a["MARKINGS"]
+                m.fbasecolourid = a["BASECOLOURID"]
+                m.fbasecolourname = a["BASECOLOURNAME"]
+                m.fdatefound = a["DATEBROUGHTIN"]
+                m.matchpoints = int((float(matchpoints) / float(matchmax)) * 100.0)
+                matches.append(m)
+                if limit > 0 and len(matches) >= limit:
+                    break
+    progress.finish()
+    return matches
+
 def match_report(dbo: Database, username: str = "system", lostanimalid: int = 0, foundanimalid: int = 0, animalid: int = 0, limit: int = 0) -> str:
     """
     Generates the match report and returns it as a string
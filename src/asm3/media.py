@@ -4,6 +4,7 @@ import asm3.animal
 import asm3.audit
 import asm3.configuration
 import asm3.dbfs
+import asm3.derivatives
 import asm3.log
 import asm3.utils
 from asm3.i18n import _
@@ -211,7 +212,7 @@ def get_image_file_data(dbo: Database, mode: str, iid: str = "", seq: int = 0, j
     def thumb_mrec(mm):
         if mm is None: return thumb_nopic()
         if justdate: return mm.DATE
-        return (mm.DATE, scale_image(asm3.dbfs.get_string_id(dbo, mm.DBFSID), asm3.configuration.thumbnail_size(dbo)))
+        return (mm.DATE, get_image_derivative(dbo, mm.DBFSID, mm.DATE, asm3.configuration.thumbnail_size(dbo)))
 
     sid = str(iid)
     iid = asm3.utils.cint(iid)
@@ -279,6 +280,28 @@ def get_image_file_data(dbo: Database, mode: str, iid: str = "", seq: int = 0, j
     else:
         return nopic()
 
+def get_image_derivative(dbo: Database, dbfsid: int, date: datetime, resizespec: str, imagedata: bytes = None) -> bytes:
+    """
+    Returns a scaled version of the image at dbfsid, using the derivative
+    store if we have already scaled it for this media date. 
+    If imagedata is given, it is used instead of reading the image from the dbfs.
+    """
+    scaled = asm3.derivatives.get(dbo.name(), dbfsid, resizespec, date)
+    if scaled is not None: return scaled
+    if imagedata is None: imagedata = asm3.dbfs.get_string_id(dbo, dbfsid)
+    scaled = scale_image(imagedata, resizespec)
+    # scale_image returns the original data if it could not scale it, don't store that
+    if scaled is not imagedata:
+        asm3.derivatives.put(dbo.name(), dbfsid, resizespec, date, scaled)
+    return scaled
+
+def create_image_derivatives(dbo: Database, dbfsid: int, date: datetime, imagedata: bytes) -> None:
+    """
+    Creates the scaled versions of an image we serve (currently just the
+    thumbnail) in the derivative store when it is attached or changed.
+    """
+    get_image_derivative(dbo, dbfsid, date, asm3.configuration.thumbnail_size(dbo), imagedata)
+
 def get_dbfs_path(linkid: int, linktype: int) -> str:
     path = "/animal/%d" % int(linkid)
     if linktype == PERSON:
@@ -439,6 +462,7 @@ def attach_file_from_form(dbo: Database, username: str, linktype: int, linkid: i
 
     # Calculate the retain until date from retainfor years
     retainuntil = calc_retainuntil_from_retainfor(dbo, post.integer("retainfor"))
+    mediadate = dbo.now()
     
     # Create the media record
     dbo.insert("media", {
@@ -461,8 +485,8 @@ def attach_file_from_form(dbo: Database, username: str, linktype: int, linkid: i
         # ASM2_COMPATIBILITY
         "LinkID":               linkid,
         "LinkTypeID":           linktype,
-        "Date":                 dbo.now(),
-        "CreatedDate":          dbo.now(),
+        "Date":                 mediadate,
+        "CreatedDate":          mediadate,
         "RetainUntil":          retainuntil
     }, username, generateID=False)
 
@@ -470,6 +494,10 @@ def attach_file_from_form(dbo: Database, username: str, linktype: int, linkid: i
     if ispicture and excludefrompublish == 0:
         check_default_web_doc_pic(dbo, mediaid, linkid, linktype)
 
+    # Scale the thumbnail now rather than when it is first requested
+    if ispicture:
+        create_image_derivatives(dbo, dbfsid, mediadate, filedata)
+
     return mediaid
 
 def attach_link_from_form(dbo: Database, username: str, linktype: int, linkid: int, post: PostedData) -> int:
@@ -835,11 +863,16 @@ def update_file_content(dbo: Database, username: str, mid: int, content: bytes)
     content should be a bytes string.
     This function will update multiple media records if they point to the same DBFSID.
     """
-    m = dbo.first_row(dbo.query("SELECT DBFSID, MediaName FROM media WHERE ID=?", [mid]))
+    m = dbo.first_row(dbo.query("SELECT DBFSID, MediaName, MediaMimeType FROM media WHERE ID=?", [mid]))
     if m is None: raise IOError("media id %s does not exist" % mid)
     if m.DBFSID == 0: raise IOError("cannot update contents of DBFSID 0")
     asm3.dbfs.put_string_id(dbo, m.DBFSID, m.MEDIANAME, content)
-    dbo.update("media", f"DBFSID={m.DBFSID}", { "Date": dbo.now(), "MediaSize": len(content) }, username)
+    asm3.derivatives.delete(dbo.name(), m.DBFSID)
+    mediadate = dbo.now()
+    dbo.update("media", f"DBFSID={m.DBFSID}", { "Date": mediadate, "MediaSize": len(content) }, username)
+    # Rescale the thumbnail for the new image (eg: after rotating or watermarking)
+    if m.MEDIAMIMETYPE == "image/jpeg":
+        create_image_derivatives(dbo, m.DBFSID, mediadate, content)
 
 def update_media_from_form(dbo: Database, username: str, post: PostedData) -> None:
     mediaid = post.integer("mediaid")
@@ -901,6 +934,7 @@ def delete_media(dbo: Database, username: str, mid: int) -> None:
     mr = dbo.first_row(dbo.query("SELECT * FROM media WHERE ID=?", [mid]))
     if not mr: return
     dbo.delete("media", mid, username)
+    asm3.derivatives.delete(dbo.name(), mr.DBFSID)
     # Was it the web or doc preferred? If so, make the first image for the link
     # the web or doc preferred instead
     if mr.WEBSITEPHOTO == 1:
@@ -1144,6 +1178,8 @@ def remove_expired_media(dbo: Database, years: int = None, username: str = "syst
     #for r in rows:
     #    asm3.dbfs.delete_id(dbo, r.dbfsid)
     dbo.execute("DELETE FROM media WHERE RetainUntil Is Not Null AND RetainUntil < ?", [ dbo.today() ])
+    for r in rows:
+        asm3.derivatives.delete(dbo.name(), r.DBFSID)
     asm3.al.debug("removed %d expired media items (retain until)" % len(rows), "media.remove_expired_media", dbo)
     enabled = asm3.configuration.auto_remove_document_media(dbo)
     retainyears = asm3.configuration.auto_remove_document_media_years(dbo)
@@ -1156,6 +1192,8 @@ def remove_expired_media(dbo: Database, years: int = None, username: str = "syst
         #for r in rows:
         #    asm3.dbfs.delete_id(dbo, r.dbfsid) 
         dbo.execute("DELETE FROM media WHERE MediaType = ? AND MediaMimeType <> 'image/jpeg' AND Date < ?", ( MEDIATYPE_FILE, cutoff ))
+        for r in rows:
+            asm3.derivatives.delete(dbo.name(), r.DBFSID)
         asm3.al.debug("removed %d expired document media items (remove after %s years)" % (len(rows), retainyears), "media.remove_expired_media", dbo)
         return "OK %s" % len(rows)
 
@@ -1176,7 +1214,11 @@ def remove_media_after_exit(dbo: Database, years: int = None, username: str = "s
         animals = dbo.query_list("SELECT ID FROM animal WHERE Archived=1 AND (ActiveMovementDate < ? OR DeceasedDate < ?)", (cutoff, cutoff))
         affected = 0
         if len(animals) > 0:
-            affected = dbo.delete("media", "LinkType=0 AND LinkID IN (%s)" % ",".join(animals), username) 
+            where = "LinkType=0 AND LinkID IN (%s)" % ",".join(animals)
+            dbfsids = dbo.query_list("SELECT DBFSID FROM media WHERE %s" % where)
+            affected = dbo.delete("media", where, username) 
+            for dbfsid in dbfsids:
+                asm3.derivatives.delete(dbo.name(), dbfsid)
         asm3.al.debug("removed %d expired animal media items (remove %s years after exit)" % (affected, years), "media.remove_media_after_exit", dbo)
         return "OK %s" % affected
     
@@ -1335,6 +1377,7 @@ def scale_all_animal_images(dbo: Database) -> None:
             os.unlink(outputfile.name)
             # Update the image file data
             asm3.dbfs.put_string_id(dbo, m.DBFSID, m.MEDIANAME, data)
+            asm3.derivatives.delete(dbo.name(), m.DBFSID)
             dbo.update("media", m.ID, { "MediaSize": len(data) })
         except Exception as err:
             asm3.al.error("failed scaling image (ID=%s, DBFSID=%s): %s" % (m.ID, m.DBFSID, err), "media.scale_all_animal_images", dbo)
@@ -809,15 +809,30 @@ def calculate_given_remaining(dbo: Database, amid: int) -> None:
     """
     Calculates the number of treatments given and remaining
     """
-    given = dbo.query_int("SELECT COUNT(*) FROM animalmedicaltreatment " +
-        "WHERE AnimalMedicalID = ? AND DateGiven Is Not Null", [amid]) 
-    cpt = dbo.query_int("SELECT CostPerTreatment FROM animalmedical WHERE ID=?", [amid])
-    dbo.execute("UPDATE animalmedical SET " \
-        "TreatmentsGiven = ?, " \
-        "TreatmentsRemaining = ((TotalNumberOfTreatments * TimingRule) - ?) " \
-        "WHERE ID = ?", (given, given, amid))
-    if cpt > 0 and given > 0:
-        dbo.execute("UPDATE animalmedical SET Cost = ? WHERE ID = ?", [ cpt * given, amid ])
+    calculate_given_remaining_many(dbo, [amid])
+
+def calculate_given_remaining_many(dbo: Database, amids: List[int]) -> None:
+    """
+    Calculates the number of treatments given and remaining for a list of animalmedical IDs
+    """
+    counts = []
+    costs = []
+    for x in range(0, len(amids), dbo.max_params):
+        inclause = ",".join(str(i) for i in amids[x:x+dbo.max_params])
+        for r in dbo.query("SELECT am.ID, am.CostPerTreatment, " \
+            "(SELECT COUNT(*) FROM animalmedicaltreatment WHERE AnimalMedicalID = am.ID AND DateGiven Is Not Null) AS Given " \
+            f"FROM animalmedical am WHERE am.ID IN ({inclause})"):
+            given = asm3.utils.cint(r.GIVEN)
+            cpt = asm3.utils.cint(r.COSTPERTREATMENT)
+            counts.append( (given, given, r.ID) )
+            if cpt > 0 and given > 0: costs.append( (cpt * given, r.ID) )
+    if len(counts) > 0:
+        dbo.execute_many("UPDATE animalmedical SET " \
+            "TreatmentsGiven = ?, " \
+            "TreatmentsRemaining = ((TotalNumberOfTreatments * TimingRule) - ?) " \
+            "WHERE ID = ?", counts)
+    if len(costs) > 0:
+        dbo.execute_many("UPDATE animalmedical SET Cost = ? WHERE ID = ?", costs)
 
 def complete_vaccination(dbo: Database, username: str, vaccinationid: int, newdate: datetime, 
                          givenby: str = "", vetid: int = 0, dateexpires: datetime = None, 
@@ -927,51 +942,120 @@ def update_medical_treatments(dbo: Database, username: str, amid: int) -> None:
     4. If the record has no outstanding treatment records, generate
        one from the last administered record
     """
-    am = dbo.first_row(dbo.query("SELECT * FROM animalmedical WHERE ID = ?", [amid]))
-    amt = dbo.query("SELECT * FROM animalmedicaltreatment " \
-        "WHERE AnimalMedicalID = ? ORDER BY DateRequired DESC", [amid])
-    ost = dbo.query_int("SELECT COUNT(ID) FROM animalmedicaltreatment " \
-        "WHERE AnimalMedicalID = ? AND DateGiven Is Null", [amid])
+    update_medical_treatments_many(dbo, username, [amid])
+
+def update_medical_treatments_many(dbo: Database, username: str, amids: List[int]) -> None:
+    """
+    Does the same as update_medical_treatments for a list of animalmedical IDs.
+    The regimens and their treatments are read in one go (per max_params IDs),
+    then the completed regimens are marked and the next treatments for all of 
+    them are created with one batch of statements.
+    """
+    amids = list(dict.fromkeys(amids))
+    regimens = {}
+    treatments = {} # AnimalMedicalID: [ total, outstanding, latest date given ]
+    for x in range(0, len(amids), dbo.max_params):
+        inclause = ",".join(str(i) for i in amids[x:x+dbo.max_params])
+        for am in dbo.query(f"SELECT * FROM animalmedical WHERE ID IN ({inclause})"):
+            regimens[am.ID] = am
+        for amt in dbo.query(f"SELECT AnimalMedicalID, DateGiven FROM animalmedicaltreatment WHERE AnimalMedicalID IN ({inclause})"):
+            t = treatments.setdefault(amt.ANIMALMEDICALID, [ 0, 0, None ])
+            t[0] += 1
+            if amt.DATEGIVEN is None: 
+                t[1] += 1
+            elif t[2] is None or amt.DATEGIVEN > t[2]: 
+                t[2] = amt.DATEGIVEN
+
+    completed = []
+    scheduled = []
+    rows = []
+    for amid in amids:
+        am = regimens.get(amid)
+
+        # Drop out if it's inactive
+        if am is None or am.STATUS != ACTIVE:
+            continue
+
+        total, ost, ldg = treatments.get(amid, [ 0, 0, None ])
+
+        # If it's a one-off treatment and we've given it, mark complete
+        if am.TIMINGRULE == ONEOFF:
+            if total > 0 and ost == 0:
+                completed.append(amid)
+                continue
+
+        # If it's a fixed length treatment, check to see if it's 
+        # complete
+        if am.TREATMENTRULE == FIXED_LENGTH:
+
+            # Do we have any outstanding treatments? 
+            # Drop out if we do
+            if ost > 0: continue
+
+            # Does the number of treatments given match the total? 
+            # Mark the record complete if so and we're done
+            if am.TIMINGRULE == ONEOFF:
+                if am.TREATMENTSGIVEN == 1:
+                    completed.append(amid)
+                    continue
+            else:
+                if am.TREATMENTSGIVEN >= (am.TOTALNUMBEROFTREATMENTS * am.TIMINGRULE):
+                    completed.append(amid)
+                    continue
 
-    # Drop out if it's inactive
-    if am is None or am.STATUS != ACTIVE:
-        return
+        # If there aren't any treatment records at all, create one now
+        if total == 0:
+            rows += get_treatment_rows(am, am.STARTDATE)
+        else:
+            # We've still got some outstanding treatments. Bail out
+            if ost > 0: continue
 
-    # If it's a one-off treatment and we've given it, mark complete
-    if am.TIMINGRULE == ONEOFF:
-        if len(amt) > 0 and ost == 0:
-            dbo.execute("UPDATE animalmedical SET Status = ? WHERE ID = ?", ( COMPLETED, amid ))
-            return
+            # Otherwise, create new treatments, using the latest available date given for this medical
+            rows += get_treatment_rows(am, get_next_treatment_date(am, ldg))
+        scheduled.append(amid)
 
-    # If it's a fixed length treatment, check to see if it's 
-    # complete
-    if am.TREATMENTRULE == FIXED_LENGTH:
-        
-        # Do we have any outstanding treatments? 
-        # Drop out if we do
-        if ost > 0: return
+    if len(completed) > 0:
+        dbo.execute_many("UPDATE animalmedical SET Status = ? WHERE ID = ?", [ (COMPLETED, amid) for amid in completed ])
+    dbo.insert_many("animalmedicaltreatment", rows, username)
 
-        # Does the number of treatments given match the total? 
-        # Mark the record complete if so and we're done
-        if am.TIMINGRULE == ONEOFF:
-            if am.TREATMENTSGIVEN == 1:
-                dbo.execute("UPDATE animalmedical SET Status = ? WHERE ID = ?", ( COMPLETED, amid ))
-                return
-        else:
-            if am.TREATMENTSGIVEN >= (am.TOTALNUMBEROFTREATMENTS * am.TIMINGRULE):
-                dbo.execute("UPDATE animalmedical SET Status = ? WHERE ID = ?", ( COMPLETED, amid ))
-                return
+    # Update the number of treatments given and remaining
+    calculate_given_remaining_many(dbo, scheduled)
 
-    # If there aren't any treatment records at all, create one now
-    if len(amt) == 0:
-        insert_treatments(dbo, username, amid, am.STARTDATE, True)
-    else:
-        # We've still got some outstanding treatments. Bail out
-        if ost > 0: return
+def get_next_treatment_date(am: ResultRow, lastdate: datetime) -> datetime:
+    """
+    Returns the date the treatments for medical record am that follow
+    the ones on lastdate are due, according to its timing rule.
+    """
+    requireddate = lastdate
+    nofreq = am.TIMINGRULENOFREQUENCIES
+    if am.TIMINGRULEFREQUENCY == DAILY:   requireddate = add_days(requireddate, nofreq)
+    if am.TIMINGRULEFREQUENCY == WEEKLY:  requireddate = add_days(requireddate, nofreq*7)
+    if am.TIMINGRULEFREQUENCY == MONTHLY: requireddate = add_days(requireddate, nofreq*31)
+    if am.TIMINGRULEFREQUENCY == YEARLY:  requireddate = add_days(requireddate, nofreq*365)
+    if am.TIMINGRULEFREQUENCY == WEEKDAILY: 
+        requireddate = add_days(requireddate, nofreq)
+        # For python weekday, 0 == Monday, 6 == Sunday
+        while requireddate.weekday() == 5 or requireddate.weekday() == 6: requireddate = add_days(requireddate, 1)
+    return requireddate
 
-        # Otherwise, create new treatments, using the latest available date given for this medical
-        ldg = dbo.query_date("SELECT DateGiven FROM animalmedicaltreatment WHERE AnimalMedicalID=? ORDER BY DateGiven DESC", [amid])
-        insert_treatments(dbo, username, amid, ldg, False)
+def get_treatment_rows(am: ResultRow, requireddate: datetime) -> List[Dict]:
+    """
+    Returns the animalmedicaltreatment rows to insert for medical record am
+    required on requireddate (one for each treatment in its timing rule).
+    """
+    norecs = am.TIMINGRULE
+    if norecs == 0: norecs = 1
+    return [ {
+        "AnimalID":             am.ANIMALID,
+        "AnimalMedicalID":      am.ID,
+        "CustomTreatmentName":  "",
+        "DateRequired":         requireddate,
+        "DateGiven":            None,
+        "GivenBy":              "",
+        "TreatmentNumber":      x,
+        "TotalTreatments":      norecs,
+        "Comments":             ""
+    } for x in range(1, norecs+1) ]
 
 def insert_treatments(dbo: Database, username: str, amid: int, requireddate: datetime, isstart: bool = True) -> datetime:
     """
@@ -982,49 +1066,28 @@ def insert_treatments(dbo: Database, username: str, amid: int, requireddate: dat
     Returns the requireddate of the treatment(s) we just created.
     """
     am = dbo.first_row(dbo.query("SELECT * FROM animalmedical WHERE ID = ?", [amid]))
-    nofreq = am.TIMINGRULENOFREQUENCIES
     if not isstart:
-        if am.TIMINGRULEFREQUENCY == DAILY:   requireddate = add_days(requireddate, nofreq)
-        if am.TIMINGRULEFREQUENCY == WEEKLY:  requireddate = add_days(requireddate, nofreq*7)
-        if am.TIMINGRULEFREQUENCY == MONTHLY: requireddate = add_days(requireddate, nofreq*31)
-        if am.TIMINGRULEFREQUENCY == YEARLY:  requireddate = add_days(requireddate, nofreq*365)
-        if am.TIMINGRULEFREQUENCY == WEEKDAILY: 
-            requireddate = add_days(requireddate, nofreq)
-            # For python weekday, 0 == Monday, 6 == Sunday
-            while requireddate.weekday() == 5 or requireddate.weekday() == 6: requireddate = add_days(requireddate, 1)
+        requireddate = get_next_treatment_date(am, requireddate)
 
     # Create correct number of records
-    norecs = am.TIMINGRULE
-    if norecs == 0: norecs = 1
-    
-    for x in range(1, norecs+1):
-        dbo.insert("animalmedicaltreatment", {
-            "AnimalID":             am.ANIMALID,
-            "AnimalMedicalID":      amid,
-            "CustomTreatmentName":  "",
-            "DateRequired":         requireddate,
-            "DateGiven":            None,
-            "GivenBy":              "",
-            "TreatmentNumber":      x,
-            "TotalTreatments":      norecs,
-            "Comments":             ""
-        }, username)
+    dbo.insert_many("animalmedicaltreatment", get_treatment_rows(am, requireddate), username)
 
     # Update the number of treatments given and remaining
     calculate_given_remaining(dbo, amid)
     return requireddate
 
-def insert_treatments_custom(dbo: Database, username: str, amid: int, startdate: datetime, txdays: Dict[int, str]) -> None:
+def get_custom_treatment_rows(am: ResultRow, startdate: datetime, txdays: Dict[int, str]) -> List[Dict]:
     """
-    Creates new treatment records for the given medical record to a custom scheme.
+    Returns the animalmedicaltreatment rows to insert for medical record am
+    to a custom scheme (see parse_custom_timing) starting on startdate.
     """
-    am = dbo.first_row(dbo.query("SELECT * FROM animalmedical WHERE ID = ?", [amid]))
+    rows = []
     for txday, txlist in txdays.items():
         reqdate = add_days(startdate, txday)
         for x, label in enumerate(txlist):
-            dbo.insert("animalmedicaltreatment", {
+            rows.append({
                 "AnimalID":             am.ANIMALID,
-                "AnimalMedicalID":      amid,
+                "AnimalMedicalID":      am.ID,
                 "CustomTreatmentName":  label,
                 "DateRequired":         reqdate,
                 "DateGiven":            None,
@@ -1032,7 +1095,15 @@ def insert_treatments_custom(dbo: Database, username: str, amid: int, startdate:
                 "TreatmentNumber":      x+1,
                 "TotalTreatments":      len(txlist),
                 "Comments":             ""
-            }, username)
+            })
+    return rows
+
+def insert_treatments_custom(dbo: Database, username: str, amid: int, startdate: datetime, txdays: Dict[int, str]) -> None:
+    """
+    Creates new treatment records for the given medical record to a custom scheme.
+    """
+    am = dbo.first_row(dbo.query("SELECT * FROM animalmedical WHERE ID = ?", [amid]))
+    dbo.insert_many("animalmedicaltreatment", get_custom_treatment_rows(am, startdate, txdays), username)
 
     # Update the number of treatments given and remaining
     calculate_given_remaining(dbo, amid)
@@ -1041,6 +1112,14 @@ def insert_regimen_from_form(dbo: Database, username: str, post: PostedData) ->
     """
     Creates a regimen record from posted form data
     """
+    return insert_regimens_from_form(dbo, username, post, [ post.integer("animal") ])[0]
+
+def insert_regimens_from_form(dbo: Database, username: str, post: PostedData, animalids: List[int]) -> List[int]:
+    """
+    Creates the regimen in the posted form data for each of animalids (eg: a litter),
+    their treatments are created together. 
+    Returns the new regimen IDs in the same order as animalids.
+    """
     l = dbo.locale
     if post.date("startdate") is None:
         raise asm3.utils.ASMValidationError(_("Start date must be a valid date", l))
@@ -1079,8 +1158,8 @@ def insert_regimen_from_form(dbo: Database, username: str, post: PostedData) ->
     costpertreatment = post.integer("costpertreatment")
     if costpertreatment == 0 and cost > 0: costpertreatment = cost
 
-    nregid = dbo.insert("animalmedical", {
-        "AnimalID":                 post.integer("animal"),
+    nregids = dbo.insert_many("animalmedical", [ {
+        "AnimalID":                 animalid,
         "MedicalProfileID":         post.integer("profileid"),
         "TreatmentName":            post["treatmentname"],
         "MedicalTypeID":            post.integer("medicaltype"), 
@@ -1099,39 +1178,54 @@ def insert_regimen_from_form(dbo: Database, username: str, post: PostedData) ->
         "TreatmentsGiven":          0,
         "TreatmentsRemaining":      treatmentsremaining,
         "Comments":                 post["comments"]
-    }, username)
+    } for animalid in animalids ], username)
+
+    regimens = []
+    for x in range(0, len(nregids), dbo.max_params):
+        inclause = ",".join(str(i) for i in nregids[x:x+dbo.max_params])
+        regimens += dbo.query(f"SELECT * FROM animalmedical WHERE ID IN ({inclause}) ORDER BY ID")
 
     if singlemulti == TREATMENT_CUSTOM:
         txdays = parse_custom_timing(post["customtiming"])
-        insert_treatments_custom(dbo, username, nregid, post.date("startdate"), txdays)
+        rows = []
+        for am in regimens:
+            rows += get_custom_treatment_rows(am, post.date("startdate"), txdays)
+        dbo.insert_many("animalmedicaltreatment", rows, username)
+        calculate_given_remaining_many(dbo, nregids)
     elif treatmentrule == FIXED_LENGTH and asm3.configuration.medical_precreate_treatments(dbo):
-        if timingrule == ONEOFF:
-            insert_treatments(dbo, username, nregid, post.date("startdate"), isstart = True)
-        else:
-            created = 1
+        rows = []
+        for am in regimens:
             reqdate = post.date("startdate")
-            insert_treatments(dbo, username, nregid, reqdate, isstart = True)
-            while created < totalnumberoftreatments:
-                reqdate = insert_treatments(dbo, username, nregid, reqdate, isstart = False)
-                created += 1
+            rows += get_treatment_rows(am, reqdate)
+            if timingrule != ONEOFF:
+                created = 1
+                while created < totalnumberoftreatments:
+                    reqdate = get_next_treatment_date(am, reqdate)
+                    rows += get_treatment_rows(am, reqdate)
+                    created += 1
+        dbo.insert_many("animalmedicaltreatment", rows, username)
+        calculate_given_remaining_many(dbo, nregids)
     else:
         # We aren't pre-creating, or we have an unspecified length regimen,
         # just create the first treatment(s).
-        update_medical_treatments(dbo, username, nregid)
+        update_medical_treatments_many(dbo, username, nregids)
 
     # If the user chose a completed status, mark the regimen completed
     # and mark any treatments we created as given on the start date
     if post.integer("status") == COMPLETED:
-        dbo.execute("UPDATE animalmedical SET Status = ? WHERE ID = ?", [COMPLETED, nregid])
-        for t in dbo.query("SELECT ID FROM animalmedicaltreatment WHERE AnimalMedicalID = ?", [nregid]):
-            update_treatment_given(dbo, username, t.ID, post.date("startdate"))
+        dbo.execute_many("UPDATE animalmedical SET Status = ? WHERE ID = ?", [ (COMPLETED, x) for x in nregids ])
+        amtids = []
+        for x in range(0, len(nregids), dbo.max_params):
+            inclause = ",".join(str(i) for i in nregids[x:x+dbo.max_params])
+            amtids += dbo.query_list(f"SELECT ID FROM animalmedicaltreatment WHERE AnimalMedicalID IN ({inclause}) ORDER BY ID")
+        update_treatments_given(dbo, username, amtids, post.date("startdate"))
 
     # If they picked a held status, we've still created the first treatment, 
     # set the status so we don't create any more
     elif post.integer("status") == HELD:
-        dbo.execute("UPDATE animalmedical SET Status = ? WHERE ID = ?", [HELD, nregid])
+        dbo.execute_many("UPDATE animalmedical SET Status = ? WHERE ID = ?", [ (HELD, x) for x in nregids ])
 
-    return nregid
+    return nregids
 
 def update_regimen_from_form(dbo: Database, username: str, post: PostedData) -> None:
     """
@@ -1472,22 +1566,39 @@ def update_treatment_given(dbo: Database, username: str, amtid: int, newdate: da
     """
     Marks a treatment record as given on newdate, assuming that newdate is valid.
     """
-    amid = dbo.query_int("SELECT AnimalMedicalID FROM animalmedicaltreatment WHERE ID = ?", [amtid])
-    animalid = dbo.query_int("SELECT AnimalID FROM animalmedicaltreatment WHERE ID=?", [amtid])
-    dbo.update("animalmedicaltreatment", amtid, {
-        "AnimalID":             animalid,
+    update_treatments_given(dbo, username, [amtid], newdate, by, vetid, comments)
+
+def update_treatments_given(dbo: Database, username: str, amtids: List[int], newdate: datetime, by: str = "", vetid: int = 0, comments: str = "") -> None:
+    """
+    Marks a list of treatment records as given on newdate (eg: from the medical book), 
+    assuming that newdate is valid. The regimens they belong to are updated together afterwards.
+    """
+    treatments = {}
+    for x in range(0, len(amtids), dbo.max_params):
+        inclause = ",".join(str(i) for i in amtids[x:x+dbo.max_params])
+        for t in dbo.query(f"SELECT ID, AnimalID, AnimalMedicalID FROM animalmedicaltreatment WHERE ID IN ({inclause})"):
+            treatments[t.ID] = t
+    amtids = [ x for x in dict.fromkeys(amtids) if x in treatments ]
+    dbo.update_many("animalmedicaltreatment", [ {
+        "ID":                   amtid,
+        "AnimalID":             treatments[amtid].ANIMALID,
         "AdministeringVetID":   vetid,
         "DateGiven":            newdate,
         "GivenBy":              by,
         "Comments":             comments
-    }, username)
+    } for amtid in amtids ], username)
+
+    # Marking the treatments one at a time would create the next treatments for a 
+    # regimen after its last treatment in the list, so update them in that order
+    amids = list(dict.fromkeys(reversed([ treatments[x].ANIMALMEDICALID for x in amtids ])))
+    amids.reverse()
 
     # Update number of treatments given and remaining
-    calculate_given_remaining(dbo, amid)
+    calculate_given_remaining_many(dbo, amids)
 
     # Generate next treatments in sequence or complete the
-    # medical record appropriately
-    update_medical_treatments(dbo, username, amid)
+    # medical records appropriately
+    update_medical_treatments_many(dbo, username, amids)
 
 def update_treatment_required(dbo: Database, username: str, amtid: int, newdate: datetime) -> None:
     """
@@ -630,14 +630,7 @@ def get_person_find_simple(dbo: Database, query: str, username: str = "", classf
     typefilter:  all, individual or organization
     """
     ss = asm3.utils.SimpleSearchBuilder(dbo, query)
-    ss.add_words("o.OwnerName")
-    ss.add_fields([ "o.OwnerCode", "o.OwnerAddress", "o.OwnerTown", "o.OwnerCounty", "o.OwnerPostcode",
-        "o.EmailAddress", "o.HomeTelephone", "o.WorkTelephone", "o.MobileTelephone", 
-        "o.EmailAddress2", "o.WorkTelephone2", "o.MobileTelephone2", "o.IdentificationNumber", "o.IdentificationNumber2", 
-        "o.MembershipNumber" ])
-    ss.add_clause("EXISTS(SELECT ad.Value FROM additional ad " \
-        "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
-        "WHERE ad.LinkID=o.ID AND ad.LinkType IN (%s) AND LOWER(ad.Value) LIKE ?)" % asm3.additional.PERSON_IN)
+    ss.add_search_index("owner", "o.ID")
     classfilters = {
         "all":              "",
         "coordinator":      " AND o.IsAdoptionCoordinator = 1",
@@ -1002,7 +995,7 @@ def update_owner_names(dbo: Database) -> str:
     nameformat = asm3.configuration.owner_name_format(dbo)
     coupleformat = asm3.configuration.owner_name_couple_format(dbo)
     marriedformat = asm3.configuration.owner_name_married_format(dbo)
-    asm3.asynctask.set_progress_max(dbo, len(own))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(own))
     for o in own:
         if o.ownercode is None or o.ownercode == "":
             dbo.update("owner", o.id, { 
@@ -1015,7 +1008,8 @@ def update_owner_names(dbo: Database) -> str:
                 "OwnerName": calculate_owner_name(dbo, o.ownertype, o.ownertitle, o.ownerinitials, o.ownerforenames, o.ownersurname, \
                     nameformat, coupleformat, marriedformat, o.ownertitle2, o.ownerinitials2, o.ownerforenames2, o.ownersurname2)
             }, setRecordVersion=False, setLastChanged=False, writeAudit=False)
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
+    progress.finish()
     asm3.al.debug("regenerated %d owner names and codes" % len(own), "person.update_owner_names", dbo)
     return "OK %d" % len(own)
 
@@ -1947,9 +1941,9 @@ def lookingfor_report(dbo: Database, username: str = "system", personid: int = 0
     ah.append( "</tr>")
 
     totalmatches = 0
-    asm3.asynctask.set_progress_max(dbo, len(people))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(people))
     for p in people:
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
         ands = [ "a.Archived=0", "a.IsNotAvailableForAdoption=0", "a.HasActiveReserve=0", "a.CrueltyCase=0", "a.DeceasedDate Is Null" ]
         v = [] # query values
         if p.MATCHANIMALTYPE != -1: 
@@ -2054,6 +2048,7 @@ def lookingfor_report(dbo: Database, username: str = "system", personid: int = 0
 
         if limit > 0 and totalmatches >= limit:
             break
+    progress.finish()
 
     if len(people) == 0:
         h.append( "<p>%s</p>" % _("No matches found.", l) )
@@ -2112,9 +2107,9 @@ def update_check_flags(dbo: Database) -> str:
         "IsShelter, IsACO, IsStaff, IsFosterer, IsRetailer, IsVet, IsGiftAid, IsSponsor, IsSupplier FROM owner ORDER BY ID")
     lookupflags = [x["FLAG"] for x in dbo.query("SELECT Flag from lkownerflags ORDER BY Flag")]
     batch = []
-    asm3.asynctask.set_progress_max(dbo, len(people))
+    progress = asm3.asynctask.ProgressTracker(dbo, len(people))
     for p in people:
-        asm3.asynctask.increment_progress_value(dbo)
+        progress.increment()
         pflags = asm3.utils.nulltostr(p.ADDITIONALFLAGS).split("|")
         # Add any missing builtins
         for flag, column in builtins.items():
@@ -2126,6 +2121,7 @@ def update_check_flags(dbo: Database) -> str:
         newval = "|".join(sorted(pflags, key = lambda x: x.lower())) + "|"
         if newval != p.ADDITIONALFLAGS:
             batch.append([ newval, p.ID ])
+    progress.finish()
     if len(batch) > 0:
         dbo.execute_many("UPDATE owner SET AdditionalFlags=? WHERE ID=?", batch)
     asm3.al.debug("updated %d person flags" % len(batch), "person.update_missing_builtin_flags", dbo)
@@ -784,7 +784,7 @@ class AbstractPublisher(threading.Thread):
         """
         Replace any $$Tag$$ tags in s, using animal a
         """
-        tags = asm3.wordprocessor.animal_tags_publisher(self.dbo, a)
+        tags = asm3.wordprocessor.animal_tags_publisher(self.dbo, a, tokens=asm3.wordprocessor.get_tokens(s, "$$", "$$"))
         return asm3.wordprocessor.substitute_tags(s, tags, True, "$$", "$$", cr_to_br = False)
 
     def resetPublisherProgress(self) -> None:
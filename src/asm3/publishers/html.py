@@ -229,6 +229,7 @@ def animals_to_page(dbo: Database, animals: Results, style="", speciesid=0, anim
     foot = asm3.wordprocessor.substitute_tags(foot, org_tags, True, "$$", "$$")
     # Run through each animal and generate body sections
     bodies = []
+    tokens = asm3.wordprocessor.get_tokens(body, "$$", "$$")
     for a in animals:
         if speciesid > 0 and a.SPECIESID != speciesid: continue
         if animaltypeid > 0 and a.ANIMALTYPEID != animaltypeid: continue
@@ -241,7 +242,7 @@ def animals_to_page(dbo: Database, animals: Results, style="", speciesid=0, anim
         else:
             a.WEBSITEMEDIANAME = "%s?method=animal_image&animalid=%d" % (SERVICE_URL, a.ID)
         # Generate tags for this row
-        tags = asm3.wordprocessor.animal_tags_publisher(dbo, a)
+        tags = asm3.wordprocessor.animal_tags_publisher(dbo, a, tokens=tokens)
         tags = asm3.wordprocessor.append_tags(tags, org_tags)
         # Add extra tags for websitemedianame2-8 if they exist
         if a.WEBSITEIMAGECOUNT > 1: tags["WEBMEDIAFILENAME2"] = "%s&seq=2" % a.WEBSITEMEDIANAME
@@ -284,6 +285,7 @@ def lostfound_animals_to_page(dbo: Database, rows: Results, lostorfound="found",
     foot = asm3.wordprocessor.substitute_tags(foot, org_tags, True, "$$", "$$")
     # Run through each animal and generate body sections
     bodies = []
+    tokens = asm3.wordprocessor.get_tokens(body, "$$", "$$")
     for a in rows:
         if speciesid > 0:
             speciesname = asm3.lookups.get_species_name(dbo, speciesid)
@@ -293,7 +295,7 @@ def lostfound_animals_to_page(dbo: Database, rows: Results, lostorfound="found",
             tags = asm3.wordprocessor.lostanimal_tags(dbo, a)
         else:
             tags = asm3.wordprocessor.foundanimal_tags(dbo, a)
-        persontags = asm3.wordprocessor.person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID))
+        persontags = asm3.wordprocessor.person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID), tokens=tokens)
         tags = asm3.wordprocessor.append_tags(tags, persontags)
         bodies.append(asm3.wordprocessor.substitute_tags(body, tags, True, "$$", "$$"))
     return "%s\n%s\n%s" % (head,"\n".join(bodies), foot)
@@ -318,7 +320,7 @@ def get_animal_view(dbo: Database, animalid: int, style: str = "", ustyle: str =
     else:
         a.WEBSITEMEDIANAME = "%s?method=animal_image&animalid=%d" % (SERVICE_URL, animalid)
     s = head + body + foot
-    tags = asm3.wordprocessor.animal_tags_publisher(dbo, a)
+    tags = asm3.wordprocessor.animal_tags_publisher(dbo, a, tokens=asm3.wordprocessor.get_tokens(s, "$$", "$$"))
     tags = asm3.wordprocessor.append_tags(tags, asm3.wordprocessor.org_tags(dbo, "system"))
     tags = asm3.wordprocessor.append_tags(tags, get_html_template_tags(dbo, [a]))
     # Add extra tags for websitemedianame2-10 if they exist
@@ -463,7 +465,7 @@ class HTMLPublisher(FTPPublisher):
         """
         Substitutes any tags in the body for animal data
         """
-        tags = asm3.wordprocessor.animal_tags_publisher(self.dbo, a)
+        tags = asm3.wordprocessor.animal_tags_publisher(self.dbo, a, tokens=asm3.wordprocessor.get_tokens(searchin, "$$", "$$"))
         tags["TotalAnimals"] = str(self.totalAnimals)
         tags["IMAGE"] = str(a["WEBSITEMEDIANAME"])
         # Note: WEBSITEMEDIANOTES becomes ANIMALCOMMENTS in get_animal_data when publisher_use_comments is on
@@ -13,11 +13,17 @@ import asm3.template
 import asm3.users
 import asm3.utils
 from asm3.sitedefs import BASE_URL, SERVICE_URL, URL_REPORTS
-from asm3.typehints import Any, CriteriaParams, Database, List, MenuItems, PostedData, ReportParams, ResultRow, Results, Session, Tuple
+from asm3.typehints import Any, CriteriaParams, Database, Dict, Generator, List, MenuItems, PostedData, ReportParams, ResultRow, Results, Session, Tuple
 
 HEADER = 0
 FOOTER = 1
 
+# Calculation keys in group headers and footers that aggregate a field over the group
+AGGREGATES = ( "sum", "count", "avg", "pct", "pctg", "min", "max" )
+
+# Characters that denote a field token in a report block has ended
+FIELD_END = (" ", "\n", "\r", ",", "<", ">", "&" , "[", "]", "{", "}", ".", "$", "*", ":", ";", "!", "%", "^", "(", ")", "@", "~", "/", "\\", "'", "\"", "|")
+
 RECOMMENDED_REPORTS = [
     "Active Donors", "Active Fosters", "Active Members", "Adoptions by Date with Addresses",
     "Animal Entry Reasons", "Animal Return Reasons", "Animals Inducted by Date and Species",
@@ -785,6 +791,15 @@ def execute_query(dbo: Database, customreportid: int, username: str = "system",
     r = Report(dbo)
     return r.ExecuteQuery(customreportid, username, params)
 
+def execute_query_generator(dbo: Database, customreportid: int, username: str = "system", params: CriteriaParams = None, batchsize: int = 1000) -> Generator[ResultRow, None, None]:
+    """
+    Executes a custom report query by its ID as execute_query does, but
+    returns a generator that reads the rows from the database batchsize
+    at a time instead of a list of all of them.
+    """
+    r = Report(dbo)
+    return r.ExecuteQueryGenerator(customreportid, username, params, batchsize)
+
 def execute_sql(dbo: Database, title: str, sql: str, html: str, headerfooter: bool = True, username: str = "system") -> str:
     """
     Executes a sql/html combo as if it were a custom report.
@@ -830,10 +845,17 @@ class Report:
     omitHeaderFooter = False
     isSubReport = False
     toolbar = False
-    output = ""
     
     def __init__(self, dbo: Database):
         self.dbo = dbo
+        self.outputparts = []
+        self.compiled = {}
+        self.aggregates = {}
+
+    @property
+    def output(self) -> str:
+        """ The report output so far """
+        return "".join(self.outputparts)
 
     def _ReadReport(self, reportId: int) -> bool:
         """
@@ -896,9 +918,8 @@ class Report:
             s = self._SubstituteTemplateHeaderFooter(s)
             return s
 
-    def _Append(self, s: str) -> str:
-        self.output += str(s)
-        return self.output
+    def _Append(self, s: str) -> None:
+        self.outputparts.append(str(s))
 
     def _p(self, s: str) -> str:
         self._Append("<p>%s</p>" % s)
@@ -913,8 +934,7 @@ class Report:
         up the parser after substitution.
         s is the html string, k is the fieldname, v is the value
         """
-        # Characters that denote a field token has ended
-        validend = (" ", "\n", "\r", ",", "<", ">", "&" , "[", "]", "{", "}", ".", "$", "*", ":", ";", "!", "%", "^", "(", ")", "@", "~", "/", "\\", "'", "\"", "|")
+        validend = FIELD_END
         lc = s.lower()
         tok = lc.find("$")
         while tok != -1:
@@ -927,6 +947,77 @@ class Report:
                 lc = s.lower()
             tok = lc.find("$", tok+1) 
         return s
+
+    def _CompileFields(self, s: str, keys: Tuple) -> List[str]:
+        """
+        Parses block s once for the field names in keys, returning a list of 
+        alternating literal text and field names, starting and ending with literal text.
+        Returns None if the block cannot be safely compiled, in which case
+        it should be substituted field by field with _ReplaceFields. That is when 
+        field names clash or contain a token end character, when lower casing changes 
+        the length of the text, or when a field token is immediately followed by 
+        another $, where the output of _ReplaceFields depends on the order of the fields.
+        """
+        if len(s.lower()) != len(s): return None
+        lckeys = {}
+        for k in keys:
+            if k == "" or len(k.lower()) != len(k): return None
+            if k.lower() in lckeys: return None
+            for c in k:
+                if c in FIELD_END: return None
+            lckeys[k.lower()] = k
+        lc = s.lower()
+        parts = []
+        last = 0
+        tok = lc.find("$")
+        while tok != -1:
+            end = tok + 1
+            while end < len(lc) and lc[end] not in FIELD_END:
+                end += 1
+            if end < len(lc) and lc[tok+1:end] in lckeys:
+                if lc[end] == "$": return None
+                start = tok - 1
+                while start >= 0 and lc[start] not in FIELD_END:
+                    start -= 1
+                if start >= 0 and lc[start] == "$": return None
+                parts.append(s[last:tok])
+                parts.append(lckeys[lc[tok+1:end]])
+                last = end
+            tok = lc.find("$", tok+1)
+        parts.append(s[last:])
+        return parts
+
+    def _RenderFields(self, s: str, row: ResultRow) -> str:
+        """
+        Substitutes the fields from row in block s. Gives the same output as
+        calling _ReplaceFields for every field in the row, but the block is only
+        parsed once for each set of field names and then rendered in a single pass.
+        """
+        keys = tuple(row.keys())
+        ck = (s, keys)
+        if ck not in self.compiled:
+            self.compiled[ck] = self._CompileFields(s, keys)
+        parts = self.compiled[ck]
+        out = None
+        if parts is not None:
+            out = [ parts[0] ]
+            for i in range(1, len(parts), 2):
+                k = parts[i]
+                v = self._DisplayValue(k, row[k])
+                v = v.replace("{", "&#123;").replace("}", "&#125;")
+                v = v.replace("$", "&#36;")
+                # _ReplaceFields loses its place in the block if a value
+                # changes length when lower cased
+                if not v.isascii() and len(v.lower()) != len(v):
+                    out = None
+                    break
+                out.append(v)
+                out.append(parts[i+1])
+        if out is None:
+            for k, v in row.items():
+                s = self._ReplaceFields(s, k, self._DisplayValue(k, v))
+            return s
+        return "".join(out)
         
     def _DisplayValue(self, k: str, v: Any) -> str:
         """
@@ -948,6 +1039,157 @@ class Report:
 
         return str(v)
     
+    def _GroupAggregate(self, rs: Results, start: int, end: int, key: str) -> str:
+        """
+        Calculates the value of a {SUM/COUNT/AVG/PCT/PCTG/MIN/MAX.field} key over 
+        rows start to end of rs in a single pass. Values are cached by range and key 
+        so that the same key in a group header and footer (or repeated in the block)
+        is only calculated once. Returns None if key is not one of these.
+        """
+        ck = (start, end, key.lower())
+        if ck in self.aggregates: return self.aggregates[ck]
+        value = None
+        fields = key.lower().split(".")
+        calcfield = fields[1].upper()
+        rows = range(start, end + 1)
+
+        # {SUM.field[.round]}
+        if fields[0] == "sum":
+            # rounding
+            roundto = 2
+            if len(fields) > 2:
+                roundto = abs(asm3.utils.cint(fields[2]))
+
+            total = 0.0
+            for i in rows:
+                if calcfield in rs[i]:
+                    total += asm3.utils.cfloat(rs[i][calcfield])
+
+            if asm3.utils.is_currency(fields[1]):
+                value = asm3.i18n.format_currency(self.dbo.locale, asm3.utils.cint(total))
+            else:
+                fmt = "%%0.%sf" % roundto
+                value = fmt % total
+
+        # {COUNT.field[.distinct]}
+        elif fields[0] == "count":
+            if len(fields) > 2 and fields[2].lower() == "distinct":
+                # distinct set, return the number of unique values of field in the group
+                value = str(len(set(rs[i][calcfield] for i in rows)))
+            else:
+                # no distinct flag, just return how many records there are in the group
+                value = str(end - start + 1)
+
+        # {AVG.field[.round]}
+        elif fields[0] == "avg":
+            # rounding
+            roundto = 2
+            if len(fields) > 2:
+                roundto = abs(asm3.utils.cint(fields[2]))
+
+            total = 0.0
+            num = 0
+            currency = asm3.utils.is_currency(fields[1])
+            for i in rows:
+                fv = 0
+                if calcfield in rs[i]:
+                    fv = asm3.utils.cfloat(rs[i][calcfield])
+                    if currency:
+                        fv /= 100
+                    total += fv
+                    num += 1
+            fstr = "%0." + str(roundto) + "f"
+            value = fstr % (0)
+            if num > 0:
+                value = fstr % (total / num)
+
+        # {PCT.field.match[.round]}
+        elif fields[0] == "pct":
+            calcfield2 = fields[2].upper()
+            
+            # rounding
+            roundto = 2
+            if len(fields) > 3:
+                roundto = abs(asm3.utils.cint(fields[3]))
+
+            match = str(calcfield2).strip().lower()
+            matched = 0
+            for i in rows:
+                try:
+                    if str(rs[i][calcfield]).strip().lower() == match:
+                        matched += 1
+                except:
+                    # Ignore errors
+                    pass
+
+            outof = end - start + 1
+            fstr = "%0." + str(roundto) + "f"
+            value = fstr % ((matched / outof) * 100)
+
+        # {PCTG.field[.round]}
+        elif fields[0] == "pctg":
+            # rounding
+            roundto = 2
+            if len(fields) > 2:
+                roundto = abs(asm3.utils.cint(fields[2]))
+
+            matched = end - start + 1
+            outof = len(rs)
+            fstr = "%0." + str(roundto) + "f"
+            value = fstr % ((matched / outof) * 100)
+
+        # {MIN.field}
+        elif fields[0] == "min":
+            HIGH_MINVAL = 9999999
+            minval = HIGH_MINVAL
+            for i in rows:
+                try:
+                    minval = min(minval, rs[i][calcfield])
+                except:
+                    # Ignore errors
+                    pass
+            if minval == HIGH_MINVAL: minval = 0
+            if asm3.utils.is_currency(fields[1]):
+                value = str(minval / 100.0)
+            else:
+                value = str(minval)
+
+        # {MAX.field}
+        elif fields[0] == "max":
+            maxval = 0
+            for i in rows:
+                try:
+                    maxval = max(maxval, rs[i][calcfield])
+                except:
+                    # Ignore errors
+                    pass
+            if asm3.utils.is_currency(fields[1]):
+                value = str(maxval / 100.0)
+            else:
+                value = str(maxval)
+
+        self.aggregates[ck] = value
+        return value
+
+    def _GroupRunEnds(self, groups: List[GroupDescriptor], rs: Results) -> Dict[str, List[int]]:
+        """
+        Returns a dictionary of group field name to a list that holds, for
+        every row in rs, the index of the next row where the value of that 
+        field changes (or len(rs) if it does not). Built with one backwards
+        pass over the rows per group, rather than scanning forwards from the
+        start of every group to find its end.
+        """
+        ends = {}
+        n = len(rs)
+        for gd in groups:
+            f = gd.fieldName
+            if f in ends or f not in rs[0]: continue
+            e = [n] * n
+            for i in range(n - 2, -1, -1):
+                e[i] = i + 1 if rs[i+1][f] != rs[i][f] else e[i+1]
+            ends[f] = e
+        return ends
+
     def _OutputGroupBlock(self, gd: GroupDescriptor, headfoot: int, rs: Results) -> str:
         """
         Outputs a group block, 'gd' is the group descriptor,
@@ -967,8 +1209,7 @@ class Report:
 
         # Replace any fields in the block based on the last row
         # in the group
-        for k, v in rs[gd.lastGroupEndPosition].items():
-            out = self._ReplaceFields(out, k, self._DisplayValue(k, v))
+        out = self._RenderFields(out, rs[gd.lastGroupEndPosition])
 
         # Replace any of our special header/footer tokens
         out = self._SubstituteTemplateHeaderFooter(out)
@@ -983,147 +1224,10 @@ class Report:
             value = ""
             valid = False
 
-            # {SUM.field[.round]}
-            if key.lower().startswith("sum."):
-                valid = True
-                fields = key.lower().split(".")
-                calcfield = fields[1].upper()
-                
-                # rounding
-                roundto = 2
-                if len(fields) > 2:
-                    roundto = abs(asm3.utils.cint(fields[2]))
-
-                total = 0.0
-                for i in range(gd.lastGroupStartPosition, gd.lastGroupEndPosition + 1):
-                    if calcfield in rs[i]:
-                        total += asm3.utils.cfloat(rs[i][calcfield])
-
-                if asm3.utils.is_currency(fields[1]):
-                    value = asm3.i18n.format_currency(self.dbo.locale, asm3.utils.cint(total))
-                else:
-                    fmt = "%%0.%sf" % roundto
-                    value = fmt % total
-
-            # {COUNT.field[.distinct]}
-            if key.lower().startswith("count."):
-                valid = True
-                fields = key.lower().split(".")
-                countfield = fields[1].upper()
-                if len(fields) > 2 and fields[2].lower() == "distinct":
-                    # distinct set, return the number of unique values of field in the group
-                    countitems = []
-                    for i in range(gd.lastGroupStartPosition, gd.lastGroupEndPosition + 1):
-                        countitems.append(rs[i][countfield])
-                    value = str(len(set(countitems)))
-                else:
-                    # no distinct flag, just return how many records there are in the group
-                    value = str(gd.lastGroupEndPosition - gd.lastGroupStartPosition + 1)
-
-            # {AVG.field[.round]}
-            if key.lower().startswith("avg."):
-                valid = True
-                fields = key.lower().split(".")
-                calcfield = fields[1].upper()
-               
-                # rounding
-                roundto = 2
-                if len(fields) > 2:
-                    roundto = abs(asm3.utils.cint(fields[2]))
-
-                total = 0.0
-                num = 0
-                for i in range(gd.lastGroupStartPosition, gd.lastGroupEndPosition + 1):
-                    fv = 0
-                    if calcfield in rs[i]:
-                        fv = asm3.utils.cfloat(rs[i][calcfield])
-                        if asm3.utils.is_currency(fields[1]):
-                            fv /= 100
-                        total += fv
-                        num += 1
-                fstr = "%0." + str(roundto) + "f"
-                value = fstr % (0)
-                if num > 0:
-                    value = fstr % (total / num)
-
-            # {PCT.field.match[.round]}
-            if key.lower().startswith("pct."):
-                valid = True
-                fields = key.lower().split(".")
-                calcfield = fields[1].upper()
-                calcfield2 = fields[2].upper()
-                
-                # rounding
-                roundto = 2
-                if len(fields) > 3:
-                    roundto = abs(asm3.utils.cint(fields[3]))
-
-                matched = 0
-                for i in range(gd.lastGroupStartPosition, gd.lastGroupEndPosition + 1):
-                    try:
-                        if str(rs[i][calcfield]).strip().lower() == str(calcfield2).strip().lower():
-                            matched += 1
-                    except:
-                        # Ignore errors
-                        pass
-
-                outof = gd.lastGroupEndPosition - gd.lastGroupStartPosition + 1
-                fstr = "%0." + str(roundto) + "f"
-                value = fstr % ((matched / outof) * 100)
-
-            # {PCTG.field[.round]}
-            if key.lower().startswith("pctg."):
-                valid = True
-                fields = key.lower().split(".")
-                calcfield = fields[1].upper()
-                
-                # rounding
-                roundto = 2
-                if len(fields) > 2:
-                    roundto = abs(asm3.utils.cint(fields[2]))
-
-                matched = gd.lastGroupEndPosition - gd.lastGroupStartPosition + 1
-                outof = len(rs)
-                fstr = "%0." + str(roundto) + "f"
-                value = fstr % ((matched / outof) * 100)
-
-            # {MIN.field}
-            if key.lower().startswith("min."):
-                valid = True
-                fields = key.lower().split(".")
-                calcfield = fields[1].upper()
-               
-                HIGH_MINVAL = 9999999
-                minval = HIGH_MINVAL
-                for i in range(gd.lastGroupStartPosition, gd.lastGroupEndPosition + 1):
-                    try:
-                        minval = min(minval, rs[i][calcfield])
-                    except:
-                        # Ignore errors
-                        pass
-                if minval == HIGH_MINVAL: minval = 0
-                if asm3.utils.is_currency(fields[1]):
-                    value = str(minval / 100.0)
-                else:
-                    value = str(minval)
-
-            # {MAX.field}
-            if key.lower().startswith("max."):
+            # {SUM/COUNT/AVG/PCT/PCTG/MIN/MAX.field}
+            if key.find(".") != -1 and key.lower().split(".")[0] in AGGREGATES:
                 valid = True
-                fields = key.lower().split(".")
-                calcfield = fields[1].upper()
-               
-                maxval = 0
-                for i in range(gd.lastGroupStartPosition, gd.lastGroupEndPosition + 1):
-                    try:
-                        maxval = max(maxval, rs[i][calcfield])
-                    except:
-                        # Ignore errors
-                        pass
-                if asm3.utils.is_currency(fields[1]):
-                    value = str(maxval / 100.0)
-                else:
-                    value = str(maxval)
+                value = self._GroupAggregate(rs, gd.lastGroupStartPosition, gd.lastGroupEndPosition, key)
 
             # {FIRST.field}
             if key.lower().startswith("first."):
@@ -1551,7 +1655,8 @@ class Report:
         """
         self.user = username
         self.params = params
-        self.output = ""
+        self.outputparts = []
+        self.aggregates = {}
 
         # Attempt to read our report if an ID was specified
         if reportId != 0: 
@@ -1582,7 +1687,7 @@ class Report:
         """
         self.user = username
         self.params = params
-        self.output = ""
+        self.outputparts = []
 
         # Attempt to read our report if an ID was specified
         if reportId != 0: 
@@ -1607,6 +1712,32 @@ class Report:
             raise asm3.utils.ASMError(str(e))
         return (rs, cols)
     
+    def ExecuteQueryGenerator(self, reportId: int = 0, username: str = "system", params: CriteriaParams = None, batchsize: int = 1000) -> Generator[ResultRow, None, None]:
+        """
+        Executes the query portion of a report only and returns a
+        generator for the rows, which are read from the database 
+        batchsize at a time.
+        The report is read and validated before returning so that
+        any problems are raised to the caller straight away.
+        """
+        self.user = username
+        self.params = params
+        self.outputparts = []
+
+        # Attempt to read our report if an ID was specified
+        if reportId != 0: 
+            if not self._ReadReport(reportId):
+                raise asm3.utils.ASMValidationError("Report %s does not exist." % reportId)
+
+        # Substitute our parameters in the SQL
+        self._SubstituteSQLParameters(params)
+
+        # Make sure the report query is valid
+        if not is_valid_query(self.sql):
+            raise asm3.utils.ASMValidationError("Reports must be based on a SELECT query.")
+
+        return self.dbo.query_generator(self.sql, batchsize=batchsize)
+    
     def _GenerateGraph(self) -> str:
         """
         Does the work of generating a graph. Graph queries have to return rows that
@@ -1976,6 +2107,9 @@ class Report:
                 self._Append(nodata)
             return
 
+        # Find where the value of each group field changes up front
+        runends = self._GroupRunEnds(groups, rs)
+
         # Add the header to the report
         self._SubstituteHeaderFooter(HEADER, cheader, rs)
 
@@ -2025,16 +2159,9 @@ class Report:
                         return
                     # Find the end position of the group so that calculations work in headers. 
                     # Also tracks the previous group changing to mark the end if this is a 2nd level group.
-                    groupval = rs[row][gd.fieldName]
-                    prevgroupval = ""
-                    if prevgroup != "": prevgroupval = rs[row][prevgroup]
-                    for trow in range(row, len(rs)):
-                        if prevgroupval != "" and prevgroupval != rs[trow][prevgroup]:
-                            gd.lastGroupEndPosition = trow-1
-                            break
-                        if groupval != rs[trow][gd.fieldName]:
-                            gd.lastGroupEndPosition = trow-1
-                            break
+                    gd.lastGroupEndPosition = runends[gd.fieldName][row] - 1
+                    if prevgroup != "" and rs[row][prevgroup] != "":
+                        gd.lastGroupEndPosition = min(gd.lastGroupEndPosition, runends[prevgroup][row] - 1)
                     # Output the header, switching field values
                     # and calculating any totals
                     self._OutputGroupBlock(gd, HEADER, rs)
@@ -2042,11 +2169,8 @@ class Report:
 
             first_record = False
 
-            # Make a temp string to hold the body block 
-            # while we substitute fields for tags
-            tempbody = cbody
-            for k, v in rs[row].items():
-                tempbody = self._ReplaceFields(tempbody, k, self._DisplayValue(k, v))
+            # Substitute fields for tags in the body block
+            tempbody = self._RenderFields(cbody, rs[row])
 
             # Update the last value for each group
             for gd in groups:
@@ -0,0 +1,297 @@
+"""
+Index of the words in animal, person, incident, lost animal, found animal and
+waiting list records for the quick search.
+
+The searchable columns of each subject record (and its searchable additional
+fields) are split into lower case words in Python and stored in the searchindex
+table, one row per word along with each of its suffixes down to MIN_SUFFIX
+characters. A search term matches a record if every word in it is the start
+of one of the record's tokens, which is the same as appearing anywhere in a
+word of the record. That is a prefix match on an indexed column, which all of
+our databases can answer with an index range scan rather than a LIKE '%term%'
+over every row and column.
+
+Phone numbers are only indexed as their digits, marked with PHONE_MARK so that
+words never match them. As with SimpleSearchBuilder.add_field_phone, a search
+needs at least PHONE_DIGITS digits to match a phone number.
+
+When a source record is inserted, updated or deleted through the Database
+object, the tokens for its subject are derived again (see get_subjects and
+refresh, called alongside the timeline hooks in Database). Changing the name
+of a person, location or incident type refreshes the subjects that include it
+(see DEPENDENTS). Inside a batch, this is deferred until the end so each record
+is only indexed once. The daily batch rebuilds the whole table a chunk of
+subjects at a time to pick up changes made outside of the application.
+"""
+
+import asm3.additional
+import asm3.al
+
+import contextlib
+import re
+import sys
+import threading
+
+from asm3.typehints import Database, Generator, List, Tuple
+
+# Tokens are truncated to this length
+MAX_TOKEN = 40
+
+# The shortest suffix of a word that is indexed
+MIN_SUFFIX = 3
+
+# The most subjects to refresh with a single statement
+REFRESH_BATCH = 500
+
+# Phone number tokens start with this so that words never match them
+PHONE_MARK = "#"
+
+# The fewest digits a search needs to match phone numbers
+PHONE_DIGITS = 6
+
+SUBJECTS = ( "animal", "owner", "animalcontrol", "animallost", "animalfound", "animalwaitinglist" )
+
+# Subject table, subject id column and query for the searchable columns of each subject.
+# Columns with Telephone in the name are indexed as just their digits.
+QUERIES = [
+    ("animal", "a.ID",
+    "SELECT a.ID, a.AnimalName, a.ShelterCode, a.ShortCode, a.AcceptanceNumber, a.BreedName, " \
+        "a.IdentichipNumber, a.Identichip2Number, a.TattooNumber, a.RabiesTag, il.LocationName, " \
+        "a.ShelterLocationUnit, a.PickupAddress FROM animal a " \
+        "LEFT OUTER JOIN internallocation il ON il.ID = a.ShelterLocation WHERE a.ID > 0"),
+    ("animal", "AnimalID",
+    "SELECT AnimalID AS ID, RabiesTag FROM animalvaccination WHERE RabiesTag Is Not Null"),
+    ("owner", "o.ID",
+    "SELECT o.ID, o.OwnerName, o.OwnerCode, o.OwnerAddress, o.OwnerTown, o.OwnerCounty, o.OwnerPostcode, " \
+        "o.EmailAddress, o.HomeTelephone, o.WorkTelephone, o.MobileTelephone, o.EmailAddress2, o.WorkTelephone2, " \
+        "o.MobileTelephone2, o.IdentificationNumber, o.IdentificationNumber2, o.MembershipNumber " \
+        "FROM owner o WHERE o.ID > 0"),
+    ("animalcontrol", "ac.ID",
+    "SELECT ac.ID, ac.IncidentCode, co.OwnerName AS CallerName, ti.IncidentName, ac.DispatchAddress, ac.DispatchPostcode, " \
+        "o1.OwnerName AS OwnerName1, o2.OwnerName AS OwnerName2, o3.OwnerName AS OwnerName3, vo.OwnerName AS VictimName " \
+        "FROM animalcontrol ac " \
+        "LEFT OUTER JOIN owner co ON co.ID = ac.CallerID " \
+        "LEFT OUTER JOIN owner o1 ON o1.ID = ac.OwnerID " \
+        "LEFT OUTER JOIN owner o2 ON o2.ID = ac.Owner2ID " \
+        "LEFT OUTER JOIN owner o3 ON o3.ID = ac.Owner3ID " \
+        "LEFT OUTER JOIN owner vo ON vo.ID = ac.VictimID " \
+        "LEFT OUTER JOIN incidenttype ti ON ti.ID = ac.IncidentTypeID WHERE ac.ID > 0"),
+    ("animallost", "a.ID",
+    "SELECT a.ID, o.OwnerName, a.AreaLost, a.AreaPostcode, a.MicrochipNumber FROM animallost a " \
+        "LEFT OUTER JOIN owner o ON a.OwnerID = o.ID WHERE a.ID > 0"),
+    ("animalfound", "a.ID",
+    "SELECT a.ID, o.OwnerName, a.AreaFound, a.AreaPostcode, a.MicrochipNumber FROM animalfound a " \
+        "LEFT OUTER JOIN owner o ON a.OwnerID = o.ID WHERE a.ID > 0"),
+    ("animalwaitinglist", "a.ID",
+    "SELECT a.ID, o.OwnerName, a.AnimalName, a.MicrochipNumber FROM animalwaitinglist a " \
+        "LEFT OUTER JOIN owner o ON a.OwnerID = o.ID WHERE a.ID > 0")
+]
+
+# Tables that tokens are derived from and the column in each holding the subject's ID
+SOURCES = {
+    "animal":               ( "animal", "ID" ),
+    "animalvaccination":    ( "animal", "AnimalID" ),
+    "owner":                ( "owner", "ID" ),
+    "animalcontrol":        ( "animalcontrol", "ID" ),
+    "animallost":           ( "animallost", "ID" ),
+    "animalfound":          ( "animalfound", "ID" ),
+    "animalwaitinglist":    ( "animalwaitinglist", "ID" )
+}
+
+# Tables whose names are included in the tokens of other subjects, the name column and
+# the subject table and columns in it that refer to the table
+DEPENDENTS = {
+    "owner": ( "OWNERNAME", [
+        ( "animalcontrol", ( "CallerID", "OwnerID", "Owner2ID", "Owner3ID", "VictimID" ) ),
+        ( "animallost", ( "OwnerID", ) ),
+        ( "animalfound", ( "OwnerID", ) ),
+        ( "animalwaitinglist", ( "OwnerID", ) ) ] ),
+    "internallocation": ( "LOCATIONNAME", [ ( "animal", ( "ShelterLocation", ) ) ] ),
+    "incidenttype": ( "INCIDENTNAME", [ ( "animalcontrol", ( "IncidentTypeID", ) ) ] )
+}
+
+WORDS = re.compile(r"[^\W_]+")
+
+# Subjects waiting to be refreshed by the batch the current thread is in
+queued = threading.local()
+
+def _additional_in(subject: str) -> str:
+    """ Returns the additional field link types that belong to subject """
+    return {
+        "animal":               asm3.additional.ANIMAL_IN,
+        "owner":                asm3.additional.PERSON_IN,
+        "animalcontrol":        asm3.additional.INCIDENT_IN,
+        "animallost":           asm3.additional.LOSTANIMAL_IN,
+        "animalfound":          asm3.additional.FOUNDANIMAL_IN,
+        "animalwaitinglist":    asm3.additional.WAITINGLIST_IN
+    }[subject]
+
+def _additional_sql(subject: str) -> str:
+    """ Returns the query for the searchable additional field values of subject """
+    return "SELECT ad.LinkID AS ID, ad.Value FROM additional ad " \
+        "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
+        "WHERE ad.LinkType IN (%s)" % _additional_in(subject)
+
+def tokenise(s: str) -> List[str]:
+    """ Splits s into lower case words """
+    if s is None: return []
+    return [ w[:MAX_TOKEN] for w in WORDS.findall(str(s).lower()) ]
+
+def get_tokens(column: str, value: str) -> List[str]:
+    """
+    Returns the tokens to index for a column value, the words and their suffixes.
+    Phone numbers are their digits and the suffixes of them that are at least PHONE_DIGITS long.
+    """
+    if column.find("TELEPHONE") != -1:
+        digits = re.sub(r"\D", "", str(value or ""))[:MAX_TOKEN]
+        return [ PHONE_MARK + digits[i:] for i in range(0, len(digits) - PHONE_DIGITS + 1) ]
+    tokens = set()
+    for w in tokenise(value):
+        tokens.add(w)
+        for i in range(1, len(w) - MIN_SUFFIX + 1):
+            tokens.add(w[i:])
+    return list(tokens)
+
+def clause(subject: str, column: str, q: str) -> Tuple[str, List[str]]:
+    """
+    Returns a tuple of a where clause and its parameters for the records of subject
+    (whose ID is in column) containing every word of q, or all records if q is blank.
+    If q starts with a number of at least PHONE_DIGITS digits, records with a phone
+    number containing them match too.
+    The tokens are lower case and only contain letters, numbers and PHONE_MARK, so LIKE 'word%'
+    is a prefix match that can use the index on SubjectTable, Token 
+    (see Database.ddl_add_prefix_index).
+    """
+    if q.strip() == "": return ("1=1", [])
+    match = "%s IN (SELECT LinkID FROM searchindex WHERE SubjectTable=? AND Token LIKE ?)" % column
+    ands = []
+    values = []
+    for w in sorted(set(tokenise(q))):
+        ands.append(match)
+        values += [ subject, "%s%%" % w ]
+    ors = []
+    if len(ands) > 0: ors.append("(%s)" % " AND ".join(ands))
+    digits = re.sub(r"\D", "", q).lstrip("0")
+    if q.strip()[0].isdigit() and len(digits) >= PHONE_DIGITS:
+        ors.append(match)
+        values += [ subject, "%s%s%%" % (PHONE_MARK, digits) ]
+    if len(ors) == 0: return ("0=1", [])
+    return ("(%s)" % " OR ".join(ors), values)
+
+def get_subjects(dbo: Database, table: str, where: str, columns: List[str] = None) -> List[Tuple[str, int]]:
+    """
+    Returns a list of (subject table, id) for the subjects of the rows in table matching where.
+    columns is the list of columns written, or None for all of them (when rows are deleted).
+    If the name column of a table in DEPENDENTS was written, the subjects including it are returned too.
+    Returns an empty list if tokens are not derived from table.
+    """
+    subjects = []
+    if table == "additional":
+        for r in dbo.query("SELECT DISTINCT LinkType, LinkID FROM additional WHERE %s" % where):
+            subjects += get_additional_subjects(r.LINKTYPE, r.LINKID)
+        return subjects
+    m = re.match(r"^ID=(\d+)$", where)
+    if table in SOURCES:
+        subject, column = SOURCES[table]
+        if column == "ID" and m is not None:
+            subjects.append( (subject, int(m.group(1))) )
+        else:
+            subjects += [ (subject, x) for x in set(dbo.query_list("SELECT %s FROM %s WHERE %s" % (column, table, where))) if x is not None ]
+    if table in DEPENDENTS:
+        namecolumn, dependents = DEPENDENTS[table]
+        if columns is not None and namecolumn not in [ c.upper() for c in columns ]: return subjects
+        if m is not None:
+            ids = [ int(m.group(1)) ]
+        else:
+            ids = dbo.query_list("SELECT ID FROM %s WHERE %s" % (table, where))
+        for i in range(0, len(ids), REFRESH_BATCH):
+            inclause = ",".join(str(x) for x in ids[i:i+REFRESH_BATCH])
+            for subject, refcolumns in dependents:
+                refwhere = " OR ".join("%s IN (%s)" % (c, inclause) for c in refcolumns)
+                subjects += [ (subject, x) for x in dbo.query_list("SELECT ID FROM %s WHERE %s" % (subject, refwhere)) ]
+    return subjects
+
+def get_additional_subjects(linktype: int, linkid: int) -> List[Tuple[str, int]]:
+    """
+    Returns a list of (subject table, id) for an additional field value
+    """
+    return [ (subject, linkid) for subject in SUBJECTS if str(linktype) in _additional_in(subject).split(", ") ]
+
+@contextlib.contextmanager
+def batch() -> Generator[None, None, None]:
+    """
+    Context manager that holds back the refreshes requested by the current thread
+    inside the block and then refreshes each subject once when the block ends.
+    Nested batches are refreshed by the outermost one.
+    """
+    if getattr(queued, "subjects", None) is not None:
+        yield
+        return
+    queued.subjects = {}
+    try:
+        yield
+    finally:
+        pending = queued.subjects
+        queued.subjects = None
+        for dbo, subjects in pending.values():
+            refresh(dbo, list(subjects))
+
+def refresh(dbo: Database, subjects: List[Tuple[str, int]]) -> None:
+    """
+    Derives the tokens for a list of (subject table, id) again, replacing any already stored.
+    Subjects are refreshed REFRESH_BATCH at a time for each subject table.
+    Errors are logged rather than raised so that they do not fail the write that triggered them.
+    """
+    if len(subjects) == 0: return
+    q = getattr(queued, "subjects", None)
+    if q is not None:
+        q.setdefault(id(dbo), (dbo, set()))[1].update(subjects)
+        return
+    bysubject = {}
+    for subject, sid in subjects:
+        bysubject.setdefault(subject, set()).add(int(sid))
+    for subject, sids in bysubject.items():
+        sids = sorted(sids)
+        for i in range(0, len(sids), REFRESH_BATCH):
+            ids = ",".join(str(x) for x in sids[i:i+REFRESH_BATCH])
+            try:
+                _index(dbo, subject, "IN (%s)" % ids)
+            except Exception as err:
+                asm3.al.error("%s %s: %s" % (subject, ids, err), "searchindex.refresh", dbo, sys.exc_info())
+
+def _index(dbo: Database, subject: str, idclause: str) -> int:
+    """
+    Replaces the tokens for the records of subject whose id matches idclause.
+    The tokens are derived before the old ones are deleted so that searches
+    only miss these records for as long as it takes to insert them.
+    Returns the number of tokens stored.
+    """
+    tokens = {}
+    queries = [ (column, sql) for s, column, sql in QUERIES if s == subject ]
+    queries.append( ("ad.LinkID", _additional_sql(subject)) )
+    for column, sql in queries:
+        for r in dbo.query("%s AND %s %s" % (sql, column, idclause)):
+            t = tokens.setdefault(r.ID, set())
+            for k, v in r.items():
+                if k != "ID": t.update(get_tokens(k, v))
+    rows = [ { "SubjectTable": subject, "LinkID": sid, "Token": token } for sid, t in tokens.items() for token in t ]
+    dbo.execute("DELETE FROM searchindex WHERE SubjectTable=? AND LinkID %s" % idclause, [subject])
+    if len(rows) > 0:
+        dbo.insert_many("searchindex", rows, generateID=False, writeAudit=False)
+    return len(rows)
+
+def rebuild(dbo: Database) -> None:
+    """
+    Derives all tokens again. Used to backfill the searchindex table and by the daily batch.
+    Each chunk of REFRESH_BATCH subjects is replaced in turn so that the rest of the
+    index can still be searched, then tokens for subjects that no longer exist are deleted.
+    """
+    dbo.execute("DELETE FROM searchindex WHERE SubjectTable NOT IN (%s)" % ",".join("'%s'" % s for s in SUBJECTS))
+    total = 0
+    for subject in SUBJECTS:
+        sids = dbo.query_list("SELECT ID FROM %s ORDER BY ID" % subject)
+        for i in range(0, len(sids), REFRESH_BATCH):
+            chunk = sids[i:i+REFRESH_BATCH]
+            total += _index(dbo, subject, "BETWEEN %d AND %d" % (chunk[0], chunk[-1]))
+        dbo.execute("DELETE FROM searchindex WHERE SubjectTable=? AND LinkID NOT IN (SELECT ID FROM %s)" % subject, [subject])
+    asm3.al.debug("rebuilt search index, %d tokens" % total, "searchindex.rebuild", dbo)
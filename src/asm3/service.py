@@ -31,8 +31,10 @@ import asm3.utils
 from asm3.i18n import _, now, add_seconds, format_currency, format_time, python2display, subtract_seconds
 from asm3.sitedefs import BOOTSTRAP_JS, BOOTSTRAP_CSS, BOOTSTRAP_ICONS_CSS
 from asm3.sitedefs import JQUERY_JS, JQUERY_UI_JS, SIGNATURE_JS, JQUERY_UI_CSS, MOUSETRAP_JS
-from asm3.sitedefs import BASE_URL, SERVICE_URL, MULTIPLE_DATABASES, CACHE_SERVICE_RESPONSES, IMAGE_HOTLINKING_ONLY_FROM_DOMAIN
-from asm3.typehints import Database, PostedData, Results, ServiceResponse
+from asm3.sitedefs import BASE_URL, SERVICE_URL, MULTIPLE_DATABASES, CACHE_SERVICE_RESPONSES, IMAGE_HOTLINKING_ONLY_FROM_DOMAIN, REPORT_STREAM_BATCH_SIZE
+from asm3.typehints import Database, Generator, PostedData, ResultRow, Results, ServiceResponse
+
+import itertools
 
 # Service methods that require authentication
 AUTH_METHODS = [
@@ -252,6 +254,38 @@ def method_output(method: str, locale: str, rows: Results) -> str:
     else:
         raise asm3.utils.ASMValidationError("cannot format output, method does not start with csv, xml or json")
 
+def method_output_generator(method: str, locale: str, rows: Generator[ResultRow, None, None], batchsize: int) -> Generator[bytes, None, None]:
+    """ Streaming version of method_output for csv and json methods.
+    rows is a row generator, eg: from asm3.reports.execute_query_generator
+    The first row is read before returning so that any error running the
+    query is raised here rather than part way through the response.
+    Returns a generator of utf-8 encoded chunks of batchsize rows.
+    """
+    first = next(rows, None)
+    if first is None:
+        return iter([ method_output(method, locale, []).encode("utf-8") ])
+    rows = itertools.chain([first], rows)
+    if method.startswith("csv"):
+        # csv_generator yields the BOM before the header
+        lines = asm3.utils.csv_generator(locale, rows, sorted(first.keys()))
+        perbatch = batchsize + 2
+    elif method.startswith("json"):
+        # json_generator yields the opening bracket before the rows
+        lines = asm3.utils.json_generator(rows)
+        perbatch = batchsize + 1
+    else:
+        raise asm3.utils.ASMValidationError("cannot stream output, method does not start with csv or json")
+    def chunks():
+        buf = []
+        for x in lines:
+            buf.append(x)
+            if len(buf) >= perbatch:
+                yield "".join(buf).encode("utf-8")
+                buf = []
+        if len(buf) > 0:
+            yield "".join(buf).encode("utf-8")
+    return chunks()
+
 def checkout_adoption_page(dbo: Database, token: str) -> str:
     """ Outputs a page that generates paperwork, allows an adopter to sign it
         and then pay their adoption fee and an optional donation """
@@ -819,6 +853,10 @@ def handler(post: PostedData, path: str, remoteip: str, referer: str, useragent:
         asm3.users.check_permission_map(l, user.SUPERUSER, securitymap, asm3.users.VIEW_REPORT)
         crid = asm3.reports.get_id(dbo, title)
         p = asm3.reports.get_criteria_params(dbo, crid, post)
+        if method in ("csv_report", "json_report") and REPORT_STREAM_BATCH_SIZE > 0:
+            # Stream large reports rather than holding them in memory, they are not cached on the server
+            rows = asm3.reports.execute_query_generator(dbo, crid, username, p, REPORT_STREAM_BATCH_SIZE)
+            return (method_mimetype(method), 600, 0, method_output_generator(method, l, rows, REPORT_STREAM_BATCH_SIZE))
         rows, cols = asm3.reports.execute_query(dbo, crid, username, p)
         return set_cached_response(cache_key, account, method_mimetype(method), 600, 600, method_output(method, l, rows))
 
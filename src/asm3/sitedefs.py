@@ -128,6 +128,26 @@ DB_TIME_LOG_OVER = get_integer("db_time_log_over", 0)
 # Time out queries that take longer than this (ms) to run
 DB_TIMEOUT = get_integer("db_timeout", 0)
 
+# Connection pooling. Each process keeps a pool of connections per database
+# of up to DB_POOL_MAX_SIZE connections (0 to disable pooling and open a new 
+# connection for every query). Idle connections are closed after 
+# DB_POOL_IDLE_TIMEOUT seconds (but the pool is not shrunk below DB_POOL_MIN_SIZE),
+# and all connections are closed after DB_POOL_MAX_LIFETIME seconds.
+# Connections idle for longer than DB_POOL_HEALTH_CHECK seconds are tested
+# before they are handed out. When the pool is exhausted, callers wait up to
+# DB_POOL_WAIT seconds before a temporary overflow connection is opened.
+DB_POOL_MIN_SIZE = get_integer("db_pool_min_size", 0)
+DB_POOL_MAX_SIZE = get_integer("db_pool_max_size", 10)
+DB_POOL_IDLE_TIMEOUT = get_integer("db_pool_idle_timeout", 300)
+DB_POOL_MAX_LIFETIME = get_integer("db_pool_max_lifetime", 3600)
+DB_POOL_HEALTH_CHECK = get_integer("db_pool_health_check", 30)
+DB_POOL_WAIT = get_integer("db_pool_wait", 10)
+
+# New IDs are reserved DB_ID_BLOCK_SIZE at a time (from the sequence on PostgreSQL,
+# or the primarykey table elsewhere) and handed out from a pool in each process.
+# Unused IDs in a pool are lost when the process ends. 1 reserves IDs one at a time.
+DB_ID_BLOCK_SIZE = get_integer("db_id_block_size", 50)
+
 # URLs for ASM services
 URL_NEWS = get_string("url_news", "https://sheltermanager.com/repo/asm_news.html")
 URL_REPORTS = get_string("url_reports", "https://sheltermanager.com/repo/reports.txt")
@@ -195,11 +215,26 @@ DBFS_S3_BACKUP_ENDPOINT_URL = get_string("dbfs_s3_backup_endpoint_url", "")
 # as the application will not attempt to create it.
 DISK_CACHE = get_string("disk_cache", "/tmp/asm_disk_cache")
 
+# The maximum number of bytes the disk cache can use for each database,
+# the least recently used entries are removed when it is exceeded (0 for no limit)
+DISK_CACHE_MAX_SIZE = get_integer("disk_cache_max_size", 1073741824)
+
+# The directory to store scaled renditions of media images (eg: thumbnails)
+# in so that they are not scaled again on every request, blank to disable.
+# Renditions for each database are limited to MEDIA_DERIVATIVES_MAX_SIZE bytes,
+# the least recently used are removed when it is exceeded (0 for no limit)
+MEDIA_DERIVATIVES = get_string("media_derivatives", "/tmp/asm_media_derivatives")
+MEDIA_DERIVATIVES_MAX_SIZE = get_integer("media_derivatives_max_size", 268435456)
+
 # Allow some non-critical queries to be cached for short periods in the 
 # disk cache to help with performance. The majority of these are queries for
 # to populate the home page so that it can load quickly. 
 CACHE_COMMON_QUERIES = get_boolean("cache_common_queries", False)
 
+# Keep precomputed alert, overview and stats counters for the home page.
+# Counters are only recalculated when a table they read has changed.
+DASHBOARD_COUNTERS = get_boolean("dashboard_counters", True)
+
 # Cache service call responses on the server side according
 # to their max-age headers in the disk cache
 CACHE_SERVICE_RESPONSES = get_boolean("cache_service_responses", False)
@@ -224,6 +259,11 @@ IMAGE_HOTLINKING_ONLY_FROM_DOMAIN = get_string("image_hotlinking_only_from_domai
 # dumps of large databases.
 LARGE_FILES_CHUNKED = get_boolean("large_files_chunked", True)
 
+# The csv_report and json_report service calls stream their output
+# to the client, reading this many rows from the database at a time
+# rather than building the whole response in memory (0 disables streaming)
+REPORT_STREAM_BATCH_SIZE = get_integer("report_stream_batch_size", 1000)
+
 # Maximum size a document template can be. Anything over this and the
 # user has probably copied/pasted an image as a data-uri and it will cause
 # tinymce to break and the doc to fail to load. Default 2M
@@ -345,6 +385,13 @@ EMERGENCY_NOTICE = get_string("emergency_notice", "")
 # SMTP_SERVER = { "sendmail": False, "host": "mail.yourdomain.com", "port": 25, "username": "", "password": "", "usetls": False }
 SMTP_SERVER = get_dict("smtp_server", { "sendmail": True })
 
+# Bulk emails (mail merges) are queued and sent in the background by a worker
+# for each database (see asm3.emailqueue). The worker sends through this many
+# SMTP connections at once and no faster than this many emails per minute
+# (0 for no limit). The rate is capped for the sheltermanager.com server.
+EMAIL_QUEUE_CONNECTIONS = get_integer("email_queue_connections", 2)
+EMAIL_QUEUE_RATE = get_integer("email_queue_rate", 0)
+
 # The from address for all outgoing emails. The email address configured
 # in the database will be used as the Reply-To header to avoid
 # any issues with DKIM/SPF/DMARC spoofing
@@ -18,6 +18,10 @@ MAX_EMAILS_CACHE_KEY = "emails_sent"
 MAX_EMAILS_TTL = 3600 * 12 # Use a 12 hour reset period
 MAX_EMAILS = 3000
 
+# The most emails per minute that the email queue will send for 
+# each database through the sheltermanager.com email server
+MAX_EMAILS_PER_MINUTE = 60
+
 # Regex to remove invalid chars from an entered database
 INVALID_REMOVE = re.compile(r'[\/\.\*\?\ ]')
 
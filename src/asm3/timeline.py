@@ -0,0 +1,335 @@
+
+"""
+Materialised timeline of recent events at the shelter (animals entering,
+being adopted, vaccinated, incidents opened, etc) for the home page and rss feed.
+
+Events are derived from the source records by the queries below and stored in
+the timeline table, indexed by date so that the most recent can be read with a
+single range scan. Each event belongs to a subject record (an animal, incident,
+lost animal, found animal or waiting list entry). When a source record is
+inserted, updated or deleted through the Database object, the events for its
+subject are derived again (see get_subjects and refresh, called alongside the
+audit hooks in Database). Renaming an owner or lookup value shown in events
+refreshes the subjects that show it (see DEPENDENTS). The daily batch rebuilds
+the whole table a chunk of subjects at a time to pick up changes made outside
+of the application.
+"""
+
+import asm3.al
+
+import re
+import sys
+
+from asm3.typehints import Database, List, Results, Tuple
+
+# Subject table, subject id column and query for each kind of event
+QUERIES = [
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'ENTERED' AS Category, DateBroughtIn AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'MICROCHIP' AS Category, IdentichipDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND IdentichipDate Is Not Null"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'NEUTERED' AS Category, NeuteredDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND NeuteredDate Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'RESERVED' AS Category, ReservationDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Null AND ReservationDate Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'CANCRESERVE' AS Category, ReservationCancelledDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Null AND ReservationDate Is Not Null AND ReservationCancelledDate Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'ADOPTED' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 1 AND IsTrial = 0"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'TRIALSTART' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 1 AND IsTrial = 1"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'TRIALEND' AS Category, TrialEndDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND TrialEndDate Is Not Null AND MovementType = 1 AND IsTrial = 1"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'FOSTERED' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 2"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'TRANSFER' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 3"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'ESCAPED' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 4"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'RECLAIMED' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 5"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'STOLEN' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 6"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'RELEASED' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 7"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'RETAILER' AS Category, MovementDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "INNER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND MovementType = 8"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_movements' AS LinkTarget, 'RETURNED' AS Category, ReturnDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, owner.OwnerName AS Text3, adoption.LastChangedBy FROM animal " \
+        "INNER JOIN adoption ON adoption.AnimalID = animal.ID " \
+        "LEFT OUTER JOIN owner ON adoption.OwnerID = owner.ID " \
+        "WHERE NonShelterAnimal = 0 AND MovementDate Is Not Null AND ReturnDate Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal' AS LinkTarget, 'DIED' AS Category, DeceasedDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, ReasonName AS Text3, animal.LastChangedBy FROM animal " \
+        "INNER JOIN deathreason ON animal.PTSReasonID = deathreason.ID " \
+        "WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND PutToSleep = 0 AND DeceasedDate Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal' AS LinkTarget, 'EUTHANISED' AS Category, DeceasedDate AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, ReasonName AS Text3, animal.LastChangedBy FROM animal " \
+        "INNER JOIN deathreason ON animal.PTSReasonID = deathreason.ID " \
+        "WHERE NonShelterAnimal = 0 AND DiedOffShelter = 0 AND PutToSleep = 1 AND DeceasedDate Is Not Null"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'FIVP' AS Category, CombiTestDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND CombiTested = 1 AND CombiTestDate Is Not Null AND CombiTestResult = 2"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'FLVP' AS Category, CombiTestDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND CombiTested = 1 AND CombiTestDate Is Not Null AND FLVResult = 2"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'HWP' AS Category, CombiTestDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND HeartwormTested = 1 AND HeartwormTestDate Is Not Null AND HeartwormTestResult = 2"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'QUARANTINE' AS Category, LastChangedDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND IsQuarantine = 1"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'HOLDON' AS Category, DateBroughtIn AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND IsHold = 1"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'HOLDOFF' AS Category, HoldUntilDate AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND HoldUntilDate Is Not Null"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'NOTADOPT' AS Category, DateBroughtIn AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND IsNotAvailableForAdoption = 1"),
+    ("animal", "ID",
+    "SELECT 'animal' AS LinkTarget, 'AVAILABLE' AS Category, ActiveMovementReturn AS EventDate, ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, '' AS Text3, LastChangedBy FROM animal " \
+        "WHERE NonShelterAnimal = 0 AND ActiveMovementReturn Is Not Null AND IsNotAvailableForAdoption = 0"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_vaccination' AS LinkTarget, 'VACC' AS Category, DateOfVaccination AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, VaccinationType AS Text3, animalvaccination.LastChangedBy FROM animal " \
+        "INNER JOIN animalvaccination ON animalvaccination.AnimalID = animal.ID " \
+        "INNER JOIN vaccinationtype ON vaccinationtype.ID = animalvaccination.VaccinationID " \
+        "WHERE NonShelterAnimal = 0 AND DateOfVaccination Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_test' AS LinkTarget, 'TEST' AS Category, DateOfTest AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, TestName AS Text3, animaltest.LastChangedBy FROM animal " \
+        "INNER JOIN animaltest ON animaltest.AnimalID = animal.ID " \
+        "INNER JOIN testtype ON testtype.ID = animaltest.TestTypeID " \
+        "WHERE NonShelterAnimal = 0 AND DateOfTest Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_medical' AS LinkTarget, 'MEDICAL' AS Category, DateGiven AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, TreatmentName AS Text3, animalmedicaltreatment.LastChangedBy FROM animal " \
+        "INNER JOIN animalmedicaltreatment ON animalmedicaltreatment.AnimalID = animal.ID " \
+        "INNER JOIN animalmedical ON animalmedicaltreatment.AnimalMedicalID = animalmedical.ID " \
+        "WHERE NonShelterAnimal = 0 AND DateGiven Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_boarding' AS LinkTarget, 'BOARDIN' AS Category, InDateTime AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, BoardingName AS Text3, animalboarding.LastChangedBy FROM animalboarding " \
+        "INNER JOIN lkboardingtype ON lkboardingtype.ID = animalboarding.BoardingTypeID " \
+        "INNER JOIN animal ON animalboarding.AnimalID = animal.ID " \
+        "WHERE InDateTime Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_boarding' AS LinkTarget, 'BOARDOUT' AS Category, OutDateTime AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, BoardingName AS Text3, animalboarding.LastChangedBy FROM animalboarding " \
+        "INNER JOIN lkboardingtype ON lkboardingtype.ID = animalboarding.BoardingTypeID " \
+        "INNER JOIN animal ON animalboarding.AnimalID = animal.ID " \
+        "WHERE OutDateTime Is Not Null"),
+    ("animal", "animal.ID",
+    "SELECT 'animal_transport' AS LinkTarget, 'TRANSPORT' AS Category, PickupDateTime AS EventDate, animal.ID, " \
+        "ShelterCode AS Text1, AnimalName AS Text2, TransportTypeName AS Text3, animaltransport.LastChangedBy FROM animaltransport " \
+        "INNER JOIN transporttype ON transporttype.ID = animaltransport.TransportTypeID " \
+        "INNER JOIN animal ON animaltransport.AnimalID = animal.ID " \
+        "WHERE PickupDateTime Is Not Null"),
+    ("animalcontrol", "animalcontrol.ID",
+    "SELECT 'incident' AS LinkTarget, 'INCIDENTOPEN' AS Category, IncidentDateTime AS EventDate, animalcontrol.ID, " \
+        "IncidentName AS Text1, DispatchAddress AS Text2, '' AS Text3, LastChangedBy FROM animalcontrol " \
+        "INNER JOIN incidenttype ON incidenttype.ID = animalcontrol.IncidentTypeID " \
+        "WHERE IncidentDateTime Is Not Null"),
+    ("animalcontrol", "animalcontrol.ID",
+    "SELECT 'incident' AS LinkTarget, 'INCIDENTCLOSE' AS Category, CompletedDate AS EventDate, animalcontrol.ID, " \
+        "IncidentName AS Text1, DispatchAddress AS Text2, CompletedName AS Text3, LastChangedBy FROM animalcontrol " \
+        "INNER JOIN incidenttype ON incidenttype.ID = animalcontrol.IncidentTypeID " \
+        "INNER JOIN incidentcompleted ON incidentcompleted.ID = animalcontrol.IncidentCompletedID " \
+        "WHERE CompletedDate Is Not Null"),
+    ("animallost", "animallost.ID",
+    "SELECT 'lostanimal' AS LinkTarget, 'LOST' AS Category, DateLost AS EventDate, animallost.ID, " \
+        "DistFeat AS Text1, AreaLost AS Text2, SpeciesName AS Text3, LastChangedBy FROM animallost " \
+        "INNER JOIN species ON animallost.AnimalTypeID = species.ID " \
+        "WHERE DateLost Is Not Null"),
+    ("animalfound", "animalfound.ID",
+    "SELECT 'foundanimal' AS LinkTarget, 'FOUND' AS Category, DateFound AS EventDate, animalfound.ID, " \
+        "DistFeat AS Text1, AreaFound AS Text2, SpeciesName AS Text3, LastChangedBy FROM animalfound " \
+        "INNER JOIN species ON animalfound.AnimalTypeID = species.ID " \
+        "WHERE DateFound Is Not Null"),
+    ("animalwaitinglist", "animalwaitinglist.ID",
+    "SELECT 'waitinglist' AS LinkTarget, 'WAITINGLIST' AS Category, DatePutOnList AS EventDate, animalwaitinglist.ID, " \
+        "AnimalDescription AS Text1, lkurgency.Urgency AS Text2, '' AS Text3, LastChangedBy FROM animalwaitinglist " \
+        "INNER JOIN lkurgency ON lkurgency.ID = animalwaitinglist.Urgency " \
+        "WHERE DatePutOnList Is Not Null")
+]
+
+# The most subjects to refresh with a single statement
+REFRESH_BATCH = 500
+
+SUBJECTS = ( "animal", "animalcontrol", "animallost", "animalfound", "animalwaitinglist" )
+
+# Tables that events are derived from and the column in each holding the subject's ID
+SOURCES = {
+    "animal":                   ( "animal", "ID" ),
+    "adoption":                 ( "animal", "AnimalID" ),
+    "animalboarding":           ( "animal", "AnimalID" ),
+    "animalmedical":            ( "animal", "AnimalID" ),
+    "animalmedicaltreatment":   ( "animal", "AnimalID" ),
+    "animaltest":               ( "animal", "AnimalID" ),
+    "animaltransport":          ( "animal", "AnimalID" ),
+    "animalvaccination":        ( "animal", "AnimalID" ),
+    "animalcontrol":            ( "animalcontrol", "ID" ),
+    "animallost":               ( "animallost", "ID" ),
+    "animalfound":              ( "animalfound", "ID" ),
+    "animalwaitinglist":        ( "animalwaitinglist", "ID" )
+}
+
+# Tables whose names are shown in the events of other subjects, the name column and
+# the subject table, the table referring to it, the subject id column and referring column in that table
+DEPENDENTS = {
+    "owner":                ( "OWNERNAME", [ ( "animal", "adoption", "AnimalID", "OwnerID" ) ] ),
+    "deathreason":          ( "REASONNAME", [ ( "animal", "animal", "ID", "PTSReasonID" ) ] ),
+    "vaccinationtype":      ( "VACCINATIONTYPE", [ ( "animal", "animalvaccination", "AnimalID", "VaccinationID" ) ] ),
+    "testtype":             ( "TESTNAME", [ ( "animal", "animaltest", "AnimalID", "TestTypeID" ) ] ),
+    "lkboardingtype":       ( "BOARDINGNAME", [ ( "animal", "animalboarding", "AnimalID", "BoardingTypeID" ) ] ),
+    "transporttype":        ( "TRANSPORTTYPENAME", [ ( "animal", "animaltransport", "AnimalID", "TransportTypeID" ) ] ),
+    "incidenttype":         ( "INCIDENTNAME", [ ( "animalcontrol", "animalcontrol", "ID", "IncidentTypeID" ) ] ),
+    "incidentcompleted":    ( "COMPLETEDNAME", [ ( "animalcontrol", "animalcontrol", "ID", "IncidentCompletedID" ) ] ),
+    "species":              ( "SPECIESNAME", [ ( "animallost", "animallost", "ID", "AnimalTypeID" ),
+                                ( "animalfound", "animalfound", "ID", "AnimalTypeID" ) ] ),
+    "lkurgency":            ( "URGENCY", [ ( "animalwaitinglist", "animalwaitinglist", "ID", "Urgency" ) ] )
+}
+
+def _insert_sql(subject: str, queries: List[str]) -> str:
+    """ Returns an INSERT INTO timeline ... SELECT statement for the events from queries """
+    return "INSERT INTO timeline (SubjectTable, LinkID, LinkTarget, Category, EventDate, Text1, Text2, Text3, LastChangedBy) " \
+        "SELECT '%s', ID, LinkTarget, Category, EventDate, Text1, Text2, Text3, LastChangedBy FROM (%s) q" % \
+        (subject, " UNION ALL ".join(queries))
+
+def get_events(dbo: Database, limit: int = 500, age: int = 120) -> Results:
+    """
+    Returns the most recent events up to the end of today, newest first.
+    """
+    # We use end of today rather than now() for 2 reasons -
+    # 1. so it picks up all items for today and 2. now() would invalidate query_cache
+    return dbo.query_cache("SELECT LinkTarget, Category, EventDate, LinkID AS ID, Text1, Text2, Text3, LastChangedBy " \
+        "FROM timeline WHERE EventDate <= ? ORDER BY EventDate DESC, LinkID " + dbo.sql_limit(limit),
+        [dbo.today(settime="23:59:59")], age=age)
+
+def get_subjects(dbo: Database, table: str, where: str, columns: List[str] = None) -> List[Tuple[str, int]]:
+    """
+    Returns a list of (subject table, id) for the subjects of the rows in table matching where.
+    columns is the list of columns written, or None for all of them (when rows are deleted).
+    If the name column of a table in DEPENDENTS was written, the subjects showing it are returned too.
+    Returns an empty list if events are not derived from table.
+    """
+    subjects = []
+    m = re.match(r"^ID=(\d+)$", where)
+    if table in SOURCES:
+        subject, column = SOURCES[table]
+        if column == "ID" and m is not None:
+            subjects.append( (subject, int(m.group(1))) )
+        else:
+            subjects += [ (subject, x) for x in set(dbo.query_list("SELECT %s FROM %s WHERE %s" % (column, table, where))) if x is not None ]
+    if table in DEPENDENTS:
+        namecolumn, dependents = DEPENDENTS[table]
+        if columns is not None and namecolumn not in [ c.upper() for c in columns ]: return subjects
+        if m is not None:
+            ids = [ int(m.group(1)) ]
+        else:
+            ids = dbo.query_list("SELECT ID FROM %s WHERE %s" % (table, where))
+        for i in range(0, len(ids), REFRESH_BATCH):
+            inclause = ",".join(str(x) for x in ids[i:i+REFRESH_BATCH])
+            for subject, reftable, idcolumn, refcolumn in dependents:
+                subjects += [ (subject, x) for x in set(dbo.query_list("SELECT %s FROM %s WHERE %s IN (%s)" % (idcolumn, reftable, refcolumn, inclause))) if x is not None ]
+    return subjects
+
+def refresh(dbo: Database, subjects: List[Tuple[str, int]]) -> None:
+    """
+    Derives the events for a list of (subject table, id) again, replacing any already stored.
+    Subjects are refreshed REFRESH_BATCH at a time for each subject table.
+    Errors are logged rather than raised so that they do not fail the write that triggered them.
+    """
+    bysubject = {}
+    for subject, sid in subjects:
+        bysubject.setdefault(subject, set()).add(int(sid))
+    for subject, sids in bysubject.items():
+        sids = sorted(sids)
+        for i in range(0, len(sids), REFRESH_BATCH):
+            ids = ",".join(str(x) for x in sids[i:i+REFRESH_BATCH])
+            try:
+                dbo.execute("DELETE FROM timeline WHERE SubjectTable=? AND LinkID IN (%s)" % ids, [subject])
+                dbo.execute(_insert_sql(subject, [ "%s AND %s IN (%s)" % (sql, column, ids) for s, column, sql in QUERIES if s == subject ]))
+            except Exception as err:
+                asm3.al.error("%s %s: %s" % (subject, ids, err), "timeline.refresh", dbo, sys.exc_info())
+
+def rebuild(dbo: Database) -> None:
+    """
+    Derives all events again. Used to backfill the timeline table and by the daily batch.
+    Each chunk of REFRESH_BATCH subjects is replaced in turn so that the rest of the
+    timeline can still be read, then events for subjects that no longer exist are deleted.
+    """
+    dbo.execute("DELETE FROM timeline WHERE SubjectTable NOT IN (%s)" % ",".join("'%s'" % s for s in SUBJECTS))
+    for subject in SUBJECTS:
+        sids = dbo.query_list("SELECT ID FROM %s ORDER BY ID" % subject)
+        for i in range(0, len(sids), REFRESH_BATCH):
+            chunk = sids[i:i+REFRESH_BATCH]
+            between = "BETWEEN %d AND %d" % (chunk[0], chunk[-1])
+            dbo.execute("DELETE FROM timeline WHERE SubjectTable=? AND LinkID %s" % between, [subject])
+            dbo.execute(_insert_sql(subject, [ "%s AND %s %s" % (sql, column, between) for s, column, sql in QUERIES if s == subject ]))
+        dbo.execute("DELETE FROM timeline WHERE SubjectTable=? AND LinkID NOT IN (SELECT ID FROM %s)" % subject, [subject])
+    asm3.al.debug("rebuilt timeline, %d events" % dbo.query_int("SELECT COUNT(*) FROM timeline"), "timeline.rebuild", dbo)
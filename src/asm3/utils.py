@@ -2,7 +2,9 @@
 import asm3.al
 import asm3.cachemem
 import asm3.configuration
+import asm3.emailqueue
 import asm3.i18n
+import asm3.searchindex
 import asm3.users
 
 from asm3.sitedefs import ADMIN_EMAIL, BASE_URL, DISK_CACHE, MULTIPLE_DATABASES, SERVICE_URL, SMTP_SERVER, FROM_ADDRESS, HTML_TO_PDF, URL_NEWS
@@ -32,7 +34,6 @@ import time
 import uuid
 import zipfile
 
-import _thread as thread
 import urllib.parse
 from io import BytesIO, StringIO
 from html.parser import HTMLParser
@@ -384,6 +385,13 @@ class SimpleSearchBuilder(object):
         self.ors.append(clause)
         self.values.append(self.qlike)
 
+    def add_search_index(self, subject: str, field: str) -> None:
+        """ Add a clause matching the records of subject (whose ID is in field) that
+            contain every word of the search term in the search index """
+        clause, values = asm3.searchindex.clause(subject, field, self.q)
+        self.ors.append(clause)
+        self.values += values
+
 class FormHTMLParser(HTMLParser):
     """ Class for parsing HTML forms and extracting the input/select/textarea tags """
     tag: str = ""
@@ -640,6 +648,22 @@ def json(obj: Any, readable: bool = False) -> str:
     else:
         return extjson.dumps(obj, default=json_handler, indent=4, separators=(',', ': ')).replace("</", "<\\/")
 
+def json_generator(rows: Results) -> Generator[str, None, None]:
+    """
+    Serializes a sequence of rows to a JSON array, one row at a time.
+    rows can be any iterable, eg: the generator from Database.query_generator
+    The joined output is the same as json(rows).
+    """
+    yield "["
+    first = True
+    for r in rows:
+        if first:
+            first = False
+            yield json(r)
+        else:
+            yield ", " + json(r)
+    yield "]"
+
 def parse_qs(s: str) -> Dict[str, str]:
     """ Given a querystring, parses it and returns a dict of elements """
     return dict(urllib.parse.parse_qsl(s))
@@ -1257,6 +1281,29 @@ def generator2file(outfile: str, fn: Callable, *args: Any) -> None:
         for x in fn(*args):
             f.write(x)
 
+def substitute_value(v: Any, escape_html: bool = True, cr_to_br: bool = True) -> str:
+    """
+    Does any processing needed on tag value v before it is substituted (see substitute_tags)
+    """
+    v = str(v)
+    # Escape <>& unless the replacement value is an
+    # image, URL or already contains HTML entities
+    if escape_html and \
+        not v.lower().startswith("<img") and \
+        not v.lower().find("&#") != -1 and \
+        not v.lower().find("/>") != -1 and \
+        not v.lower().startswith("<table") and \
+        not v.lower().startswith("http") and \
+        not v.lower().startswith("image?"):
+        v = v.replace("&", "&amp;")
+        v = v.replace("<", "&lt;")
+        v = v.replace(">", "&gt;")
+    # Switch linebreaks if requested
+    if cr_to_br: 
+        v = v.replace("\r\n", "<br>")
+        v = v.replace("\n", "<br>")
+    return v
+
 def substitute_tags(searchin: str, tags: Dict[str, str], escape_html: bool = True, 
                     opener: str = "&lt;&lt;", closer: str = "&gt;&gt;", 
                     cr_to_br: bool = True, remove_unmatched = True) -> str:
@@ -1269,67 +1316,130 @@ def substitute_tags(searchin: str, tags: Dict[str, str], escape_html: bool = Tru
         True: replaces everything between any opener and closer
             with an empty string. This can cause HTML and XML documents to be malformed
             if there are tags that start in the data and end outside it.
-            It performs very well though because it assumes only the tag is between
-            the opener and closer. It does not have to iterate the tags collection to test.
+            It assumes only the tag is between the opener and closer.
         False: Only finds/replaces the tag between the opener and closer, keeping
             anything around the tag intact, and leaving the tag if it did not match.
             This can be a visual indicator that the tag was entered wrong.
-            It does not perform as well because it has to iterate the tag collection
-            every time a tag is found.
-    """
-    def _get_value(v):
-        """ Does any processing needed on tag value v """
-        v = str(v)
-        # Escape <>& unless the replacement value is an
-        # image, URL or already contains HTML entities
-        if escape_html and \
-            not v.lower().startswith("<img") and \
-            not v.lower().find("&#") != -1 and \
-            not v.lower().find("/>") != -1 and \
-            not v.lower().startswith("<table") and \
-            not v.lower().startswith("http") and \
-            not v.lower().startswith("image?"):
-            v = v.replace("&", "&amp;")
-            v = v.replace("<", "&lt;")
-            v = v.replace(">", "&gt;")
-        # Switch linebreaks if requested
-        if cr_to_br: 
-            v = v.replace("\r\n", "<br>")
-            v = v.replace("\n", "<br>")
-        return v
+            The tag can be the whole of the text between opener and closer, the text 
+            at the end after markup, or text surrounded by markup, eg:
+            &lt;&lt;<text:span>NAME</text:span>&gt;&gt;
+            Where more than one tag could match, the first in the tags collection wins.
+    searchin is read once from start to finish with the output collected in a list. 
+    Values are only processed (escaped, line breaks) once, however many times 
+    their tag appears.
+    """
+    values = {}
+    def _get_value(tag):
+        """ Does any processing needed on the value of tag, caching the result """
+        if tag not in values: values[tag] = substitute_value(tags[tag], escape_html, cr_to_br)
+        return values[tag]
+    order = {}
+    maxlen = 0
+    if not remove_unmatched and len(tags) > 0:
+        order = { tag: i for i, tag in enumerate(tags) }
+        maxlen = max(len(tag) for tag in tags)
+    def _substitute_token(tagstr):
+        """ Replaces the first tag from the tags collection in the token tagstr """
+        u = tagstr.upper()
+        # candidates are (position in tags, precedence, index in tagstr, tag)
+        candidates = []
+        if u in order: candidates.append((order[u], 0, 0, u))
+        gt = u.find(">")
+        while gt != -1:
+            if len(u) - gt - 1 <= maxlen and u[gt+1:] in order: 
+                candidates.append((order[u[gt+1:]], 1, gt+1, u[gt+1:]))
+            lt = u.find("<", gt+1)
+            while lt != -1 and lt - gt - 1 <= maxlen:
+                if u[gt+1:lt] in order: candidates.append((order[u[gt+1:lt]], 2, gt+1, u[gt+1:lt]))
+                lt = u.find("<", lt+1)
+            gt = u.find(">", gt+1)
+        if len(candidates) == 0: return tagstr
+        c = min(candidates)
+        i, tag = c[2], c[3]
+        return tagstr[:i] + _get_value(tag) + tagstr[i + len(tag):]
     if not escape_html:
         opener = opener.replace("&lt;", "<").replace("&gt;", ">")
         closer = closer.replace("&lt;", "<").replace("&gt;", ">")
     s = searchin
+    out = []
+    pos = 0
     sp = s.find(opener)
     while sp != -1:
         ep = s.find(closer, sp + len(opener))
-        if ep != -1 and remove_unmatched:
-            matchtag = s[sp + len(opener):ep].upper()
-            newval = ""
-            if matchtag in tags: newval = _get_value(tags[matchtag])
-            s = "%s%s%s" % ( s[0:sp], newval, s[ep + len(closer):] )
-        elif ep != -1 and not remove_unmatched:
-            tagstr = s[sp + len(opener):ep]
-            #print("start %s, end %s, '%s'" % (sp, ep, tagstr))
-            for tag, v in tags.items():
-                i = -1
-                if tagstr.upper() == tag: 
-                    i = 0
-                elif tagstr.upper().endswith(f">{tag}"): 
-                    i = len(tagstr) - len(tag)
-                elif tagstr.upper().find(f">{tag}<") != -1: 
-                    i = tagstr.upper().find(f">{tag}<")
-                if i != -1:
-                    tagstr = tagstr[:i] + _get_value(v) + tagstr[i + len(tag):]
-                    #print("found tag '%s' at %s, new sub value: '%s'" % (tag, i, tagstr))
-                    break
-            s = "%s%s%s" % ( s[0:sp], tagstr, s[ep + len(closer):] )
-        else:
+        if ep == -1: 
             # No end marker for this tag, stop processing
             break
-        sp = s.find(opener, sp)
-    return s
+        tagstr = s[sp + len(opener):ep]
+        if remove_unmatched:
+            matchtag = tagstr.upper()
+            newval = ""
+            if matchtag in tags: newval = _get_value(matchtag)
+        else:
+            newval = _substitute_token(tagstr)
+        out.append(s[pos:sp])
+        pos = ep + len(closer)
+        if (newval + s[pos:pos + len(opener) - 1]).find(opener) != -1:
+            # The replacement contains (or runs into the text after it to make) an opener,
+            # carry on searching from the start of the replacement so it is substituted too
+            s = newval + s[pos:]
+            pos = 0
+            sp = s.find(opener)
+        else:
+            out.append(newval)
+            sp = s.find(opener, pos)
+    out.append(s[pos:])
+    return "".join(out)
+
+class TagTemplate(object):
+    """
+    A template that is parsed once and then has the tags for many records
+    substituted into it, eg: for mail merges. 
+    render(tags) gives the same output as substitute_tags with remove_unmatched=True
+    and the same escape_html, opener, closer and cr_to_br.
+    """
+    def __init__(self, template: str, escape_html: bool = True, 
+                 opener: str = "&lt;&lt;", closer: str = "&gt;&gt;", cr_to_br: bool = True) -> None:
+        self.template = template
+        self.escape_html = escape_html
+        self.cr_to_br = cr_to_br
+        self.opener = opener
+        self.closer = closer
+        if not escape_html:
+            opener = opener.replace("&lt;", "<").replace("&gt;", ">")
+            closer = closer.replace("&lt;", "<").replace("&gt;", ">")
+        self.sopener = opener
+        # The text between tags, the upper case tags and the text following each tag
+        # that could make an opener if the value ends with part of one
+        self.literals = []
+        self.tokens = []
+        self.follows = []
+        pos = 0
+        sp = template.find(opener)
+        while sp != -1:
+            ep = template.find(closer, sp + len(opener))
+            if ep == -1: break
+            self.literals.append(template[pos:sp])
+            self.tokens.append(template[sp + len(opener):ep].upper())
+            pos = ep + len(closer)
+            self.follows.append(template[pos:pos + len(opener) - 1])
+            sp = template.find(opener, pos)
+        self.literals.append(template[pos:])
+
+    def render(self, tags: Dict[str, str]) -> str:
+        """ Returns the template with tags substituted """
+        values = {}
+        out = [ self.literals[0] ]
+        for i, token in enumerate(self.tokens):
+            if token not in values:
+                values[token] = ""
+                if token in tags: values[token] = substitute_value(tags[token], self.escape_html, self.cr_to_br)
+            v = values[token]
+            if (v + self.follows[i]).find(self.sopener) != -1:
+                # The value contains a tag, which substitute_tags substitutes too
+                return substitute_tags(self.template, tags, self.escape_html, self.opener, self.closer, self.cr_to_br)
+            out.append(v)
+            out.append(self.literals[i + 1])
+        return "".join(out)
 
 def md5_hash_hex(s: str) -> str:
     """
@@ -1768,12 +1878,13 @@ def generate_image_pdf(locale: str, imagedata: bytes) -> bytes:
 
 def generate_label_pdf(dbo: Database, locale: str, records: Results, papersize: str, units: str, fontpt: int, 
                        hpitch: float, vpitch: float, width: float, height: float, 
-                       lmargin: float, tmargin: float, cols: int, rows: int) -> bytes:
+                       lmargin: float, tmargin: float, cols: int, rows: int, progress: Any = None) -> bytes:
     """
     Generates a PDF of labels from the rows given to the measurements provided.
     papersize can be "a4" or "letter"
     units can be "inch" or "cm"
     all units themselves should be floats, cols and rows should be ints
+    progress: An optional asynctask.ProgressTracker, set to the number of label tables and incremented as each is drawn
     """
     #from reportlab.lib import colors
     from reportlab.lib.pagesizes import letter, A4
@@ -1860,7 +1971,14 @@ def generate_label_pdf(dbo: Database, locale: str, records: Results, papersize:
     # Add anything pending to the page
     addTable(data)
     # Build the PDF
+    if progress is not None: 
+        progress.set_max(len(elements))
+        tableids = set(id(e) for e in elements)
+        def afterFlowable(flowable):
+            if id(flowable) in tableids: progress.increment()
+        doc.afterFlowable = afterFlowable
     doc.build(elements)
+    if progress is not None: progress.finish()
     return fout.getvalue()
 
 def replace_url_token(body: str, url: str, text: str) -> str:
@@ -1941,6 +2059,23 @@ def send_email(dbo: Database, replyadd: str, toadd: str, ccadd: str = "", bccadd
     user under Settings->Options->Email (if they set their own SMTP server), 
     or the one from smtp_override sitedef/config item.
     """
+    msg, fromadd, tolist = build_email(dbo, replyadd, toadd, ccadd, bccadd, subject, body, contenttype,
+        attachments, bulk, fromoverride)
+
+    asm3.al.debug("from: %s, reply-to: %s, to: %s, subject: %s, body: %s" % \
+        (fromadd, msg["Reply-To"], str(tolist), subject, body), "utils.send_email", dbo)
+
+    return _send_email(msg, fromadd, tolist, dbo, exceptions=exceptions, retries=retries)
+
+def build_email(dbo: Database, replyadd: str, toadd: str, ccadd: str = "", bccadd: str = "",
+                subject: str = "", body: str = "", contenttype: str = "plain",
+                attachments: List[Tuple[str, str, bytes]] = [],
+                bulk: bool = False, fromoverride: bool = True) -> Tuple[MIMEMultipart, str, List[str]]:
+    """
+    Constructs an email message. The arguments are the same as send_email.
+    Returns a tuple of the message, the envelope sender address and
+    the list of recipient addresses to pass to _send_email or an SMTPSender.
+    """
 
     def add_header(msg: str, header: str, value: str) -> None:
         """
@@ -2075,12 +2210,85 @@ def send_email(dbo: Database, replyadd: str, toadd: str, ccadd: str = "", bccadd
     if ccadd != "":  tolist += [strip_email_address(x) for x in ccadd.split(",")]
     if bccadd != "": tolist += [strip_email_address(x) for x in bccadd.split(",")]
 
-    replyadd = strip_email_address(replyadd)
+    return (msg, fromadd, tolist)
 
-    asm3.al.debug("from: %s, reply-to: %s, to: %s, subject: %s, body: %s" % \
-        (fromadd, replyadd, str(tolist), subject, body), "utils.send_email", dbo)
+def get_smtp_settings(dbo: Database = None) -> Dict:
+    """
+    Returns the outbound mail transport settings as a dict with sendmail, host, port, 
+    username, password, usetls and headers keys. The SMTP_SERVER sitedef is loaded over
+    the defaults and then any smtp override in the database (if dbo is given) over that.
+    """
+    s = { "sendmail": True, "host": "", "port": 25, "username": "", "password": "", "usetls": False, "headers": {} }
+    if SMTP_SERVER is not None:
+        for k in s.keys():
+            if k in SMTP_SERVER: s[k] = SMTP_SERVER[k]
+    if dbo and asm3.configuration.smtp_override(dbo):
+        s["sendmail"] = False
+        s["host"] = asm3.configuration.smtp_server(dbo)
+        s["port"] = asm3.utils.cint(asm3.configuration.smtp_port(dbo))
+        s["usetls"] = asm3.configuration.smtp_use_tls(dbo)
+        s["username"] = asm3.configuration.smtp_username(dbo)
+        s["password"] = asm3.configuration.smtp_password(dbo)
+    return s
+
+class SMTPSender(object):
+    """
+    Transmits messages with the transport configured for a database (see get_smtp_settings).
+    For SMTP, one connection is opened and logged in when the first message is sent and
+    reused for the messages after it until close is called. 
+    If the server has dropped the connection, it is opened again.
+    sendmail is run once per message.
+    """
+    dbo = None
+    settings = None
+    smtp = None
+
+    def __init__(self, dbo: Database = None, settings: Dict = None) -> None:
+        self.dbo = dbo
+        self.settings = settings or get_smtp_settings(dbo)
 
-    _send_email(msg, fromadd, tolist, dbo, exceptions=exceptions, retries=retries)
+    def transport(self) -> str:
+        """ Returns the name of the transport in use for logging """
+        return iif(self.settings["sendmail"], "sendmail", "smtp")
+
+    def connect(self) -> smtplib.SMTP:
+        """ Returns the open SMTP connection, opening and logging in if necessary """
+        if self.smtp is None:
+            smtp = smtplib.SMTP(self.settings["host"], self.settings["port"])
+            if self.settings["usetls"]:
+                smtp.starttls()
+            if self.settings["password"].strip() != "":
+                smtp.login(self.settings["username"], self.settings["password"])
+            self.smtp = smtp
+        return self.smtp
+
+    def send(self, msg: MIMEMultipart, fromadd: str, tolist: List[str]) -> None:
+        """
+        Transmits msg to the addresses in tolist. 
+        Raises any error from the transport.
+        """
+        for k, v in self.settings["headers"].items():
+            del msg[k]
+            msg[k] = Header(v)
+        if self.settings["sendmail"]:
+            p = subprocess.Popen(["/usr/sbin/sendmail", "-t", "-oi"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdoutdata, stderrdata = p.communicate(str2bytes(msg.as_string()))
+            if p.returncode != 0: raise Exception("%s %s" % (stdoutdata, stderrdata))
+            return
+        try:
+            self.connect().sendmail(fromadd, tolist, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self.smtp = None
+            self.connect().sendmail(fromadd, tolist, msg.as_string())
+
+    def close(self) -> None:
+        """ Closes the SMTP connection if one is open """
+        if self.smtp is None: return
+        try:
+            self.smtp.quit()
+        except:
+            pass
+        self.smtp = None
 
 def _send_email(msg: MIMEMultipart, fromadd: str, tolist: List[str], dbo: Database = None, 
                 exceptions: bool = True, retries: int = 1) -> bool:
@@ -2089,98 +2297,58 @@ def _send_email(msg: MIMEMultipart, fromadd: str, tolist: List[str], dbo: Databa
     msg: The python message object
     fromadd: The envelope sender address for the SMTP server (not used by sendmail)
     tolist: A list of recipient addresses [ "add1@test.com", "add2@test.com" ... ]
-    dbo can be None, is only used for logging
+    dbo can be None, is only used for logging and the smtp override settings
     exceptions: If True throws exceptions on error, otherwise returns success boolean
     retries: If >1, waits RETRY_SECS seconds and retries this many times in the 
              event of an error (SMTP only, exceptions must be False)
              Since _send_email is synchronous/blocking, never set retries from UI calls
     """
-    # Load the server config over default vars
     RETRY_SECS = 10
-    sendmail = True
-    host = ""
-    port = 25
-    username = ""
-    password = ""
-    usetls = False
-    if SMTP_SERVER is not None:
-        if "sendmail" in SMTP_SERVER: sendmail = SMTP_SERVER["sendmail"]
-        if "host" in SMTP_SERVER: host = SMTP_SERVER["host"]
-        if "port" in SMTP_SERVER: port = SMTP_SERVER["port"]
-        if "username" in SMTP_SERVER: username = SMTP_SERVER["username"]
-        if "password" in SMTP_SERVER: password = SMTP_SERVER["password"]
-        if "usetls" in SMTP_SERVER: usetls = SMTP_SERVER["usetls"]
-        if "headers" in SMTP_SERVER: 
-            for k, v in SMTP_SERVER["headers"].items():
-                msg[k] = Header(v)
-
-    # If we have a dbo and there's an smtp override in the database, use it
-    if dbo and asm3.configuration.smtp_override(dbo):
-        sendmail = False
-        host = asm3.configuration.smtp_server(dbo)
-        port = asm3.utils.cint(asm3.configuration.smtp_port(dbo))
-        usetls = asm3.configuration.smtp_use_tls(dbo)
-        username = asm3.configuration.smtp_username(dbo)
-        password = asm3.configuration.smtp_password(dbo)
-     
-    # Use sendmail or SMTP for the transport depending on config
-    if sendmail:
-        try:
-            p = subprocess.Popen(["/usr/sbin/sendmail", "-t", "-oi"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            stdoutdata, stderrdata = p.communicate(str2bytes(msg.as_string()))
-            if p.returncode != 0: raise Exception("%s %s" % (stdoutdata, stderrdata))
-            return True
-        except Exception as err:
-            asm3.al.error("sendmail: %s" % str(err), "utils.send_email", dbo)
-            if exceptions: raise ASMError(str(err))
-            return False
-    else:
-        try:
-            smtp = smtplib.SMTP(host, port)
-            if usetls:
-                smtp.starttls()
-            if password.strip() != "":
-                smtp.login(username, password)
-            smtp.sendmail(fromadd, tolist, msg.as_string())
-            return True
-        except Exception as err:
-            asm3.al.error("smtp: %s" % str(err), "utils.send_email", dbo)
-            if exceptions: raise ASMError(str(err))
-            if retries == 1: return False # Last attempt, quit
-            # Wait 10 seconds and try again until retries is exhausted
-            time.sleep(RETRY_SECS)
-            _send_email(msg, fromadd, tolist, dbo=dbo, exceptions=exceptions, retries=retries-1)
-
-def send_bulk_email(dbo: Database, replyadd: str, subject: str, body: str, rows: Results, contenttype: str, unsubscribe: bool) -> None:
-    """
-    Sends a set of bulk emails asynchronously.
+    sender = SMTPSender(dbo)
+    try:
+        sender.send(msg, fromadd, tolist)
+        return True
+    except Exception as err:
+        asm3.al.error("%s: %s" % (sender.transport(), str(err)), "utils.send_email", dbo)
+        if exceptions: raise ASMError(str(err))
+        if sender.settings["sendmail"] or retries <= 1: return False # Last attempt, quit
+    finally:
+        sender.close()
+    # Wait 10 seconds and try again until retries is exhausted
+    time.sleep(RETRY_SECS)
+    return _send_email(msg, fromadd, tolist, dbo=dbo, exceptions=exceptions, retries=retries-1)
+
+def send_bulk_email(dbo: Database, replyadd: str, subject: str, body: str, rows: Results, contenttype: str, unsubscribe: bool) -> str:
+    """
+    Sends a set of bulk emails asynchronously by adding them to the email queue.
     replyadd is an RFC821 address and controls the Reply-To header
     subject and body are strings. Either can contain <<TAGS>>
     rows is a list of dictionaries of tag tokens with real values to substitute
     contenttype is either "plain" or "html"
     unsubscribe: if True, adds a link to the bottom of the email to "unsubscribe" (set excludefrombulkemail for this person)
                  does nothing if OWNERCODE is not in the results, or the content type is plain
+    Returns the reference of the queued batch (see asm3.emailqueue.get_progress)
     """
     l = dbo.locale
-    def do_send():
-        for r in rows:
-            ssubject = substitute_tags(subject, r, False, opener = "<<", closer = ">>", cr_to_br = False)
-            sbody = substitute_tags(body, r)
-            if "OWNERCODE" in r and unsubscribe and contenttype == "html":
-                token = asm3.utils.base64encode(r.OWNERCODE)
-                token = token.replace("=", "%3D")
-                linktext = asm3.i18n._("Unsubscribe from future messages", l)
-                sbody = f'{sbody}\n<p><a href="{SERVICE_URL}?account={dbo.name()}&method=unsubscribe&token={token}">{linktext}</a>'
-            toadd = r.EMAILADDRESS
+    messages = []
+    subjecttemplate = TagTemplate(subject, False, opener = "<<", closer = ">>", cr_to_br = False)
+    bodytemplate = TagTemplate(body)
+    for r in rows:
+        ssubject = subjecttemplate.render(r)
+        sbody = bodytemplate.render(r)
+        if "OWNERCODE" in r and unsubscribe and contenttype == "html":
+            token = asm3.utils.base64encode(r.OWNERCODE)
+            token = token.replace("=", "%3D")
+            linktext = asm3.i18n._("Unsubscribe from future messages", l)
+            sbody = f'{sbody}\n<p><a href="{SERVICE_URL}?account={dbo.name()}&method=unsubscribe&token={token}">{linktext}</a>'
+        toadd = r.EMAILADDRESS
+        if toadd is None or toadd.strip() == "": continue
+        messages.append({ "replyadd": replyadd, "toadd": toadd, "subject": ssubject, "body": sbody, "contenttype": contenttype })
+        if "EMAILADDRESS2" in r: 
+            toadd = r.EMAILADDRESS2
             if toadd is None or toadd.strip() == "": continue
-            asm3.al.debug("sending bulk email: to=%s, subject=%s" % (toadd, ssubject), "utils.send_bulk_email", dbo)
-            send_email(dbo, replyadd, toadd, "", "", ssubject, sbody, contenttype, exceptions=False, bulk=True)
-            if "EMAILADDRESS2" in r: 
-                toadd = r.EMAILADDRESS2
-                if toadd is None or toadd.strip() == "": continue
-                asm3.al.debug("sending bulk email: to=%s, subject=%s" % (toadd, ssubject), "utils.send_bulk_email", dbo)
-                send_email(dbo, replyadd, toadd, "", "", ssubject, sbody, contenttype, exceptions=False, bulk=True)
-    thread.start_new_thread(do_send, ())
+            messages.append({ "replyadd": replyadd, "toadd": toadd, "subject": ssubject, "body": sbody, "contenttype": contenttype })
+    return asm3.emailqueue.queue(dbo, messages)
 
 def send_error_email(errtype, errvalue, path, errmsg) -> None:
     """
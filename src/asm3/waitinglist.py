@@ -160,13 +160,7 @@ def get_waitinglist_find_simple(dbo: Database, query: str = "", limit: int = 0,
     if query == "":
         return get_waitinglist(dbo)
     if asm3.utils.is_numeric(query): ss.add_field_value("a.ID", asm3.utils.cint(query))
-    ss.add_field("o.OwnerName")
-    ss.add_field("a.AnimalName")
-    ss.add_field("a.MicrochipNumber")
-    ss.add_clause("EXISTS(SELECT ad.Value FROM additional ad " \
-        "INNER JOIN additionalfield af ON af.ID = ad.AdditionalFieldID AND af.Searchable = 1 " \
-        "WHERE ad.LinkID=a.ID AND ad.LinkType IN (%s) AND LOWER(ad.Value) LIKE ?)" % asm3.additional.WAITINGLIST_IN)
-    ss.add_large_text_fields([ "a.AnimalDescription", "a.ReasonForWantingToPart", "a.ReasonForRemoval" ])
+    ss.add_search_index("animalwaitinglist", "a.ID")
 
     sql = "%s WHERE a.ID > 0 %s AND (%s) ORDER BY a.ID" % (get_waitinglist_query(dbo), sitefilter, " OR ".join(ss.ors))
     return dbo.query(sql, ss.values, limit=limit, distincton="ID")
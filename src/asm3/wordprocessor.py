@@ -25,6 +25,7 @@ from asm3.i18n import _, date_diff_days, format_currency, format_currency_no_sym
 from asm3.sitedefs import SERVICE_URL
 from asm3.typehints import bytes_or_str, Database, Dict, List, ResultRow, Results, Tags, Tuple
 
+import re
 import zipfile
 
 def org_tags(dbo: Database, username: str) -> Tags:
@@ -125,6 +126,22 @@ def fw(s: str) -> str:
     if s.find(" ") == -1: return s
     return s.split(" ")[0]
 
+def wants(tokens: List[str], *prefixes: str) -> bool:
+    """ Returns True if any of the tokens a template uses (see get_tokens) starts
+        with one of prefixes, or tokens is None because every tag is wanted.
+        Used to skip the queries for groups of tags that a template does not use.
+    """
+    if tokens is None: return True
+    return any(t.startswith(prefixes) for t in tokens)
+
+def wants_additional(dbo: Database, tokens: List[str]) -> bool:
+    """ Returns True if the tokens could refer to an additional field. Additional field 
+        tags contain the field name, with a prefix and/or a person field suffix.
+    """
+    if tokens is None: return True
+    names = [ x.upper() for x in dbo.query_list("SELECT DISTINCT FieldName FROM additionalfield") if x ]
+    return any(n in t for t in tokens for n in names)
+
 def separate_results(rows: Results, f: str) -> Results:
     """ Given a list of result rows, looks at field f and produces
         a list containing a new list of result rows for each
@@ -260,21 +277,25 @@ def animal_flags(dbo: Database, flags: str, include_emblems: bool = False, emble
         s.append(x)
     return ", ".join(s)
 
-def animal_tags_publisher(dbo: Database, a: ResultRow, includeAdditional=True) -> Tags:
+def animal_tags_publisher(dbo: Database, a: ResultRow, includeAdditional=True, tokens: List[str] = None) -> Tags:
     """
     Convenience method for getting animal tags when used by a publisher - 
     very little apart from additional fields are required and we can save
     database calls for each asm3.animal.
+    tokens: The tokens used by the publishing template (see get_tokens)
     """
     return animal_tags(dbo, a, includeAdditional=includeAdditional, includeCosts=False, includeDiary=False, 
         includeDiet=True, includeDonations=False, includeFutureOwner=False, includeIsVaccinated=True, includeLitterMates=False, 
-        includeLogs=False, includeMedical=False, includeTransport=False)
+        includeLogs=False, includeMedical=False, includeTransport=False, tokens=tokens)
 
 def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCosts=True, includeDiary=True, 
         includeDiet=True, includeDonations=True, includeFutureOwner=True, includeIsVaccinated=True, 
-        includeLitterMates=True, includeLogs=True, includeLicence=True, includeMedical=True, includeTransport=True) -> Tags:
+        includeLitterMates=True, includeLogs=True, includeLicence=True, includeMedical=True, includeTransport=True,
+        tokens: List[str] = None) -> Tags:
     """
     Generates a list of tags from an animal result (the deep type from calling asm3.animal.get_animal)
+    tokens: If set, the tokens used by the template (see get_tokens). Groups of tags that
+        need extra queries are only generated if the template uses one of their tags.
     """
     l = dbo.locale
     
@@ -687,7 +708,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
                 tags["MOSTRECENTENTRYCATEGORY"] = latest["RETURNEDREASONNAME"]
 
     # Additional fields
-    if includeAdditional:
+    if includeAdditional and wants_additional(dbo, tokens):
         tags.update(additional_field_tags(dbo, asm3.additional.get_additional_fields(dbo, a["ID"], "animal")))
         if a["ORIGINALOWNERID"] and a["ORIGINALOWNERID"] > 0:
             tags.update(additional_field_tags(dbo, asm3.additional.get_additional_fields(dbo, a["ORIGINALOWNERID"], "person"), "ORIGINALOWNER"))
@@ -699,19 +720,20 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
             tags.update(additional_field_tags(dbo, asm3.additional.get_additional_fields(dbo, a["CURRENTVETID"], "person"), "CURRENTVET"))
 
     # Is vaccinated indicator
-    if includeIsVaccinated:    
+    if includeIsVaccinated and wants(tokens, "ANIMALISVACCINATED"):
         tags["ANIMALISVACCINATED"] = asm3.utils.iif(asm3.medical.get_vaccinated(dbo, a["ID"]), _("Yes", l), _("No", l))
 
     # Last licence number
-    if includeLicence:
+    if includeLicence and wants(tokens, "LICENCENUMBER", "LICENSENUMBER"):
         licences = asm3.financial.get_animal_licences(dbo, a["ID"], asm3.financial.DESCENDING)
         if len(licences) > 0:
             tags["LICENCENUMBER"] = licences[0]["LICENCENUMBER"]
             tags["LICENSENUMBER"] = licences[0]["LICENCENUMBER"]
 
-    if includeMedical:
-        iic = asm3.configuration.include_incomplete_medical_doc(dbo)
-        # Vaccinations
+    iic = asm3.configuration.include_incomplete_medical_doc(dbo)
+
+    # Vaccinations
+    if includeMedical and wants(tokens, "VACCINATION", "ANIMALVACCINATIONS", "GIVENANIMALVACCINATIONS", "DUEANIMALVACCINATIONS"):
         d = {
             "VACCINATIONNAME":          "VACCINATIONTYPE",
             "VACCINATIONREQUIRED":      "d:DATEREQUIRED",
@@ -767,7 +789,8 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
             ( "COMMENTS", _("Comments", l)) 
         ))
 
-        # Tests
+    # Tests
+    if includeMedical and wants(tokens, "TEST", "ANIMALTESTS"):
         d = {
             "TESTNAME":                 "TESTNAME",
             "TESTRESULT":               "RESULTNAME",
@@ -801,7 +824,8 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
             ( "COMMENTS", _("Comments", l)) 
         ))
 
-        # Medical
+    # Medical
+    if includeMedical and wants(tokens, "MEDICAL", "ANIMALMEDICALS", "ACTIVEANIMALMEDICALS"):
         d = {
             "MEDICALNAME":              "TREATMENTNAME",
             "MEDICALCOMMENTS":          "COMMENTS",
@@ -844,6 +868,8 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
             ( "COMMENTS", _("Comments", l)) 
         ))
 
+    # Medical types
+    if includeMedical and wants(tokens, "MEDICALTYPE", "ANIMALMEDICALTYPES"):
         medicaltypes = asm3.medical.get_medical_types_animal(dbo, a["ID"])
         tags["ANIMALMEDICALTYPES"] = html_table(l, medicaltypes, (
             ( "MEDICALTYPENAME", _("Medical Type", l) ),
@@ -858,7 +884,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
             tags[tagname + "DUE"] = python2display(l, mt["DATEREQUIRED"])
 
     # Diary
-    if includeDiary:
+    if includeDiary and wants(tokens, "DIARY"):
         d = {
             "DIARYDATE":                "d:DIARYDATETIME",
             "DIARYCOMPLETED":           "d:DATECOMPLETED",
@@ -870,7 +896,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
         tags.update(table_tags(dbo, d, asm3.diary.get_diaries(dbo, asm3.diary.ANIMAL, a["ID"]), "DIARYFORNAME", "DIARYDATETIME", "DATECOMPLETED"))
 
     # Diet
-    if includeDiet:
+    if includeDiet and wants(tokens, "DIET"):
         d = {
             "DIETNAME":                 "DIETNAME",
             "DIETDESCRIPTION":          "DIETDESCRIPTION",
@@ -880,7 +906,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
         tags.update(table_tags(dbo, d, asm3.animal.get_diets(dbo, a["ID"]), "DIETNAME", "DATESTARTED", "DATESTARTED"))
 
     # Donations
-    if includeDonations:
+    if includeDonations and wants(tokens, "RECEIPTNUM", "DONATION", "PAYMENT"):
         d = {
             "RECEIPTNUM":               "RECEIPTNUMBER",
             "DONATIONTYPE":             "DONATIONNAME",
@@ -911,7 +937,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
         tags.update(table_tags(dbo, d, dons, "DONATIONNAME", "DATEDUE", "DATE"))
 
     # Transport
-    if includeTransport:
+    if includeTransport and wants(tokens, "TRANSPORT"):
         d = {
             "TRANSPORTTYPE":            "TRANSPORTTYPENAME",
             "TRANSPORTDRIVERNAME":      "DRIVEROWNERNAME", 
@@ -957,7 +983,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
         tags.update(table_tags(dbo, d, asm3.movement.get_animal_transports(dbo, a["ID"]), "TRANSPORTTYPENAME", "PICKUPDATETIME", "DROPOFFDATETIME"))
 
     # Costs
-    if includeCosts:
+    if includeCosts and wants(tokens, "COST"):
         d = {
             "COSTTYPE":                 "COSTTYPENAME",
             "COSTDATE":                 "d:COSTDATE",
@@ -967,7 +993,9 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
         }
         tags.update(table_tags(dbo, d, asm3.animal.get_costs(dbo, a["ID"]), "COSTTYPENAME", "COSTDATE", "COSTPAIDDATE"))
 
-        # Cost totals
+    # Cost totals
+    if includeCosts and wants(tokens, "TOTALVACCINATIONCOSTS", "TOTALTRANSPORTCOSTS", "TOTALTESTCOSTS", "TOTALMEDICALCOSTS", 
+            "TOTALLINECOSTS", "DAILYBOARDINGCOST", "CURRENTBOARDINGCOST", "TOTALCOSTS"):
         totalvaccinations = dbo.query_int("SELECT SUM(Cost) FROM animalvaccination WHERE AnimalID = ?", [a["ID"]])
         totaltransports = dbo.query_int("SELECT SUM(Cost) FROM animaltransport WHERE AnimalID = ?", [a["ID"]])
         totaltests = dbo.query_int("SELECT SUM(Cost) FROM animaltest WHERE AnimalID = ?", [a["ID"]])
@@ -991,7 +1019,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
         }
         tags = append_tags(tags, costtags)
 
-    if includeLitterMates and a["ACCEPTANCENUMBER"] is not None and len(a["ACCEPTANCENUMBER"]) > 2:
+    if includeLitterMates and wants(tokens, "LITTERMATES", "ACTIVELITTERMATES") and a["ACCEPTANCENUMBER"] is not None and len(a["ACCEPTANCENUMBER"]) > 2:
         # Littermates
         lm = dbo.query("SELECT AnimalName, ShelterCode FROM animal " \
             "WHERE AcceptanceNumber = ? AND ID <> ? " \
@@ -1008,7 +1036,7 @@ def animal_tags(dbo: Database, a: ResultRow, includeAdditional=True, includeCost
             ( "ANIMALNAME", _("Name", l))
         ))
 
-    if includeLogs:
+    if includeLogs and wants(tokens, "LOG", "ANIMALLOGS"):
         # Logs
         d = {
             "LOGNAME":                  "LOGTYPENAME",
@@ -1535,10 +1563,13 @@ def clinic_tags(dbo: Database, c: ResultRow) -> Tags:
     tags.update(table_tags(dbo, d, asm3.clinic.get_invoice_items(dbo, c.ID)))
     return tags
 
-def person_tags(dbo: Database, p: ResultRow, includeImg=False, includeDonations=False, includeVouchers=False) -> Tags:
+def person_tags(dbo: Database, p: ResultRow, includeImg=False, includeDonations=False, includeVouchers=False, 
+        tokens: List[str] = None) -> Tags:
     """
     Generates a list of tags from a person result (the deep type from
     calling asm3.person.get_person)
+    tokens: If set, the tokens used by the template (see get_tokens). Groups of tags that
+        need extra queries are only generated if the template uses one of their tags.
     """
     l = dbo.locale
     tags = { 
@@ -1614,11 +1645,13 @@ def person_tags(dbo: Database, p: ResultRow, includeImg=False, includeDonations=
         "HOMECHECKEDBYMOBILETELEPHONE": p["HOMECHECKEDBYMOBILETELEPHONE"],
         "HOMECHECKEDBYCELLTELEPHONE": p["HOMECHECKEDBYMOBILETELEPHONE"],
         "MEMBERSHIPNUMBER"      : p["MEMBERSHIPNUMBER"],
-        "MEMBERSHIPEXPIRYDATE"  : python2display(l, p["MEMBERSHIPEXPIRYDATE"]),
-        "OWNERLOOKINGFOR"       : asm3.person.lookingfor_summary(dbo, p["ID"])
+        "MEMBERSHIPEXPIRYDATE"  : python2display(l, p["MEMBERSHIPEXPIRYDATE"])
     }
 
-    if includeImg:
+    if wants(tokens, "OWNERLOOKINGFOR"):
+        tags["OWNERLOOKINGFOR"] = asm3.person.lookingfor_summary(dbo, p["ID"])
+
+    if includeImg and wants(tokens, "PERSONDOCUMENTIMG"):
         tags["PERSONDOCUMENTIMGSRC"] = asm3.html.doc_img_src(dbo, p)
         tags["PERSONDOCUMENTIMGLINK"] = "<img height=\"200\" src=\"" + asm3.html.doc_img_src(dbo, p) + "\" >"
         tags["PERSONDOCUMENTIMGLINK200"] = "<img height=\"200\" src=\"" + asm3.html.doc_img_src(dbo, p) + "\" >"
@@ -1627,7 +1660,7 @@ def person_tags(dbo: Database, p: ResultRow, includeImg=False, includeDonations=
         tags["PERSONDOCUMENTIMGLINK500"] = "<img height=\"500\" src=\"" + asm3.html.doc_img_src(dbo, p) + "\" >"
 
     # Donations
-    if includeDonations:
+    if includeDonations and wants(tokens, "RECEIPTNUM", "DONATION", "PAYMENT"):
         d = {
             "RECEIPTNUM":               "RECEIPTNUMBER",
             "DONATIONTYPE":             "DONATIONNAME",
@@ -1658,7 +1691,7 @@ def person_tags(dbo: Database, p: ResultRow, includeImg=False, includeDonations=
         tags.update(table_tags(dbo, d, dons, "DONATIONNAME", "DATEDUE", "DATE"))
 
     # Vouchers
-    if includeVouchers:
+    if includeVouchers and wants(tokens, "VOUCHER"):
         d = {
             "VOUCHERANIMALNAME":    "ANIMALNAME",
             "VOUCHERSHELTERCODE":   "SHELTERCODE",
@@ -1675,49 +1708,53 @@ def person_tags(dbo: Database, p: ResultRow, includeImg=False, includeDonations=
         tags.update(table_tags(dbo, d, vouc, "VOUCHERNAME", "DATEISSUED", "DATEPRESENTED"))
 
     # Additional fields
-    tags.update(additional_field_tags(dbo, asm3.additional.get_additional_fields(dbo, p["ID"], "person")))
+    if wants_additional(dbo, tokens):
+        tags.update(additional_field_tags(dbo, asm3.additional.get_additional_fields(dbo, p["ID"], "person")))
 
     # Citations
-    d = {
-        "CITATIONNAME":         "CITATIONNAME",
-        "CITATIONDATE":         "d:CITATIONDATE",
-        "CITATIONCOMMENTS":     "COMMENTS",
-        "FINEAMOUNT":           "c:FINEAMOUNT",
-        "FINEDUEDATE":          "d:FINEDUEDATE",
-        "FINEPAIDDATE":         "d:FINEPAIDDATE"
-    }
-    tags.update(table_tags(dbo, d, asm3.financial.get_person_citations(dbo, p["ID"]), "CITATIONNAME", "CITATIONDATE", "FINEPAIDDATE"))
+    if wants(tokens, "CITATION", "FINE"):
+        d = {
+            "CITATIONNAME":         "CITATIONNAME",
+            "CITATIONDATE":         "d:CITATIONDATE",
+            "CITATIONCOMMENTS":     "COMMENTS",
+            "FINEAMOUNT":           "c:FINEAMOUNT",
+            "FINEDUEDATE":          "d:FINEDUEDATE",
+            "FINEPAIDDATE":         "d:FINEPAIDDATE"
+        }
+        tags.update(table_tags(dbo, d, asm3.financial.get_person_citations(dbo, p["ID"]), "CITATIONNAME", "CITATIONDATE", "FINEPAIDDATE"))
 
     # Logs
-    d = {
-        "PERSONLOGNAME":            "LOGTYPENAME",
-        "PERSONLOGDATE":            "d:DATE",
-        "PERSONLOGTIME":            "t:DATE",
-        "PERSONLOGCOMMENTS":        "COMMENTS",
-        "PERSONLOGCREATEDBY":       "CREATEDBY"
-    }
-    tags.update(table_tags(dbo, d, asm3.log.get_logs(dbo, asm3.log.PERSON, p["ID"], 0, asm3.log.ASCENDING), "LOGTYPENAME", "DATE", "DATE"))
+    if wants(tokens, "PERSONLOG"):
+        d = {
+            "PERSONLOGNAME":            "LOGTYPENAME",
+            "PERSONLOGDATE":            "d:DATE",
+            "PERSONLOGTIME":            "t:DATE",
+            "PERSONLOGCOMMENTS":        "COMMENTS",
+            "PERSONLOGCREATEDBY":       "CREATEDBY"
+        }
+        tags.update(table_tags(dbo, d, asm3.log.get_logs(dbo, asm3.log.PERSON, p["ID"], 0, asm3.log.ASCENDING), "LOGTYPENAME", "DATE", "DATE"))
 
     # Trap loans
-    d = {
-        "TRAPTYPENAME":             "TRAPTYPENAME",
-        "TRAPLOANDATE":             "d:LOANDATE",
-        "TRAPDEPOSITAMOUNT":        "c:DEPOSITAMOUNT",
-        "TRAPDEPOSITRETURNDATE":    "d:DEPOSITRETURNDATE",
-        "TRAPNUMBER":               "TRAPNUMBER",
-        "TRAPRETURNDUEDATE":        "d:RETURNDUEDATE",
-        "TRAPRETURNDATE":           "d:RETURNDATE",
-        "TRAPCOMMENTS":             "COMMENTS",
-        "EQUIPMENTTYPENAME":        "TRAPTYPENAME",
-        "EQUIPMENTLOANDATE":        "d:LOANDATE",
-        "EQUIPMENTDEPOSITAMOUNT":   "c:DEPOSITAMOUNT",
-        "EQUIPMENTDEPOSITRETURNDATE":"d:DEPOSITRETURNDATE",
-        "EQUIPMENTNUMBER":          "TRAPNUMBER",
-        "EQUIPMENTRETURNDUEDATE":   "d:RETURNDUEDATE",
-        "EQUIPMENTRETURNDATE":      "d:RETURNDATE",
-        "EQUIPMENTCOMMENTS":        "COMMENTS"
-    }
-    tags.update(table_tags(dbo, d, asm3.animalcontrol.get_person_traploans(dbo, p["ID"], asm3.animalcontrol.ASCENDING), "TRAPTYPENAME", "RETURNDUEDATE", "RETURNDATE"))
+    if wants(tokens, "TRAP", "EQUIPMENT"):
+        d = {
+            "TRAPTYPENAME":             "TRAPTYPENAME",
+            "TRAPLOANDATE":             "d:LOANDATE",
+            "TRAPDEPOSITAMOUNT":        "c:DEPOSITAMOUNT",
+            "TRAPDEPOSITRETURNDATE":    "d:DEPOSITRETURNDATE",
+            "TRAPNUMBER":               "TRAPNUMBER",
+            "TRAPRETURNDUEDATE":        "d:RETURNDUEDATE",
+            "TRAPRETURNDATE":           "d:RETURNDATE",
+            "TRAPCOMMENTS":             "COMMENTS",
+            "EQUIPMENTTYPENAME":        "TRAPTYPENAME",
+            "EQUIPMENTLOANDATE":        "d:LOANDATE",
+            "EQUIPMENTDEPOSITAMOUNT":   "c:DEPOSITAMOUNT",
+            "EQUIPMENTDEPOSITRETURNDATE":"d:DEPOSITRETURNDATE",
+            "EQUIPMENTNUMBER":          "TRAPNUMBER",
+            "EQUIPMENTRETURNDUEDATE":   "d:RETURNDUEDATE",
+            "EQUIPMENTRETURNDATE":      "d:RETURNDATE",
+            "EQUIPMENTCOMMENTS":        "COMMENTS"
+        }
+        tags.update(table_tags(dbo, d, asm3.animalcontrol.get_person_traploans(dbo, p["ID"], asm3.animalcontrol.ASCENDING), "TRAPTYPENAME", "RETURNDUEDATE", "RETURNDATE"))
 
     return tags
 
@@ -2051,6 +2088,42 @@ def substitute_tags(searchin: str, tags: Tags, escape_html: bool = True,
     """
     return asm3.utils.substitute_tags(searchin, tags, escape_html, opener, closer, cr_to_br, remove_unmatched)
 
+def get_tokens(searchin: str, opener: str = "&lt;&lt;", closer: str = "&gt;&gt;") -> List[str]:
+    """
+    Returns the upper case tokens between opener and closer in searchin. 
+    Tokens are found the same way as substitute_tags, where a token contains 
+    markup (eg: formatting in an ODT document), each piece of text in it is 
+    also returned as substitute_tags can match those too.
+    """
+    tokens = set()
+    sp = searchin.find(opener)
+    while sp != -1:
+        ep = searchin.find(closer, sp + len(opener))
+        if ep == -1: break
+        t = searchin[sp + len(opener):ep].upper()
+        tokens.add(t.strip())
+        if t.find("<") != -1:
+            tokens.update(x.strip() for x in re.split(r"<[^>]*>", t) if x.strip() != "")
+        sp = searchin.find(opener, ep + len(closer))
+    return list(tokens)
+
+def get_template_tokens(dbo: Database, templateid: int) -> List[str]:
+    """
+    Returns the tokens used by a document template (see get_tokens) for
+    passing to the tag functions so they only generate tags the template needs.
+    """
+    templatedata = asm3.template.get_document_template_content(dbo, templateid) # bytes
+    templatename = asm3.template.get_document_template_name(dbo, templateid)
+    if templatename.endswith(".html"):
+        return get_tokens(asm3.utils.bytes2str(templatedata))
+    elif templatename.endswith(".odt"):
+        try:
+            zf = zipfile.ZipFile(asm3.utils.bytesio(templatedata), "r")
+            return get_tokens(asm3.utils.bytes2str(zf.open("content.xml").read()))
+        except Exception as zderr:
+            raise asm3.utils.ASMError("Failed reading odt document: %s" % str(zderr))
+    return []
+
 def substitute_template(dbo: Database, templateid: int, tags: Tags, imdata: bytes = None) -> bytes_or_str:
     """
     Reads the template specified by id "template" and substitutes
@@ -2119,6 +2192,7 @@ def generate_animal_doc(dbo: Database, templateid: int, animalid: int, username:
     templateid: The ID of the template
     animalid: The animal to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     a = asm3.animal.get_animal(dbo, animalid)
     if a is None: 
         raise asm3.utils.ASMValidationError("%d is not a valid animal ID" % animalid)
@@ -2130,7 +2204,7 @@ def generate_animal_doc(dbo: Database, templateid: int, animalid: int, username:
     # We include donations here, so that we have RecentType, DueType, Last1, etc
     # But the call below to get_movement_donations will add the totals and allow
     # receipt/invoice type documents to work if there's an active movement
-    tags = animal_tags(dbo, a, includeDonations=True)
+    tags = animal_tags(dbo, a, includeDonations=True, tokens=tokens)
     # Use the person info from the latest open movement for the animal
     # This will pick up future dated adoptions instead of fosterers (which are still currentowner)
     # as get_animal_movements returns them in descending order of movement date
@@ -2138,7 +2212,7 @@ def generate_animal_doc(dbo: Database, templateid: int, animalid: int, username:
     for m in asm3.movement.get_animal_movements(dbo, animalid):
         if m["MOVEMENTDATE"] is not None and m["RETURNDATE"] is None and m["OWNERID"] is not None and m["OWNERID"] != 0:
             has_person_tags = True
-            tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, m["OWNERID"])))
+            tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, m["OWNERID"]), tokens=tokens))
             tags = append_tags(tags, movement_tags(dbo, m))
             md = asm3.financial.get_movement_donations(dbo, m["ID"])
             if len(md) > 0: 
@@ -2146,11 +2220,11 @@ def generate_animal_doc(dbo: Database, templateid: int, animalid: int, username:
             break
     # If we didn't have an open movement and there's a reserve, use that as the person
     if not has_person_tags and a["RESERVEDOWNERID"] is not None and a["RESERVEDOWNERID"] != 0:
-        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, a["RESERVEDOWNERID"])))
+        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, a["RESERVEDOWNERID"]), tokens=tokens))
         has_person_tags = True
     # If this is a non-shelter animal, use the owner
     if not has_person_tags and a["NONSHELTERANIMAL"] == 1 and a["ORIGINALOWNERID"] is not None and a["ORIGINALOWNERID"] != 0:
-        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, a["ORIGINALOWNERID"])))
+        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, a["ORIGINALOWNERID"]), tokens=tokens))
         has_person_tags = True
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags, imdata)
@@ -2173,14 +2247,15 @@ def generate_boarding_doc(dbo: Database, templateid: int, animalboardingid: int,
     templateid: The ID of the template
     animalboardingid: The boarding to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     b = asm3.financial.get_boarding_id(dbo, animalboardingid)
     tags = {}
     if b is None:
         raise asm3.utils.ASMValidationError("%d is not a valid boarding record ID" % animalboardingid)
     if b.ANIMALID is not None and b.ANIMALID != 0:
-        tags = animal_tags(dbo, asm3.animal.get_animal(dbo, b.ANIMALID))
+        tags = animal_tags(dbo, asm3.animal.get_animal(dbo, b.ANIMALID), tokens=tokens)
     if b.OWNERID is not None and b.OWNERID != 0:
-        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, b.OWNERID)))
+        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, b.OWNERID), tokens=tokens))
     tags = append_tags(tags, boarding_tags(dbo, b))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -2191,6 +2266,7 @@ def generate_clinic_doc(dbo: Database, templateid: int, appointmentid: int, user
     templateid: The ID of the template
     appointmentid: The clinicappointment id to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     c = asm3.clinic.get_appointment(dbo, appointmentid)
     if c is None: raise asm3.utils.ASMValidationError("%d is not a valid clinic appointment ID" % appointmentid)
     tags = clinic_tags(dbo, c)
@@ -2198,10 +2274,10 @@ def generate_clinic_doc(dbo: Database, templateid: int, appointmentid: int, user
     a = asm3.animal.get_animal(dbo, c.ANIMALID)
     if a is not None:
         tags = append_tags(tags, animal_tags(dbo, a, includeAdditional=True, includeCosts=False, includeDiet=False, includeDonations=False, \
-            includeFutureOwner=False, includeIsVaccinated=True, includeLogs=False, includeMedical=True))
+            includeFutureOwner=False, includeIsVaccinated=True, includeLogs=False, includeMedical=True, tokens=tokens))
     p = asm3.person.get_person(dbo, c.OWNERID)
     if p is not None:
-        tags = append_tags(tags, person_tags(dbo, p))
+        tags = append_tags(tags, person_tags(dbo, p, tokens=tokens))
     return substitute_template(dbo, templateid, tags)
 
 def generate_person_doc(dbo: Database, templateid: int, personid: int, username: str) -> bytes_or_str:
@@ -2210,16 +2286,17 @@ def generate_person_doc(dbo: Database, templateid: int, personid: int, username:
     templateid: The ID of the template
     personid: The person to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     p = asm3.person.get_person(dbo, personid)
     im = asm3.media.get_image_file_data(dbo, "person", personid)[1]
     if p is None: raise asm3.utils.ASMValidationError("%d is not a valid person ID" % personid)
-    tags = person_tags(dbo, p, includeImg=True, includeDonations=True, includeVouchers=True)
+    tags = person_tags(dbo, p, includeImg=True, includeDonations=True, includeVouchers=True, tokens=tokens)
     tags = append_tags(tags, org_tags(dbo, username))
     m = dbo.first_row(asm3.movement.get_person_movements(dbo, personid))
     if m is not None:
         tags = append_tags(tags, movement_tags(dbo, m))
         if m.ANIMALID is not None and m.ANIMALID != 0:
-            tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, m.ANIMALID)))
+            tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, m.ANIMALID), tokens=tokens))
     return substitute_template(dbo, templateid, tags, im)
 
 def generate_donation_doc(dbo: Database, templateid: int, donationids: List[int], username: str) -> bytes_or_str:
@@ -2228,13 +2305,14 @@ def generate_donation_doc(dbo: Database, templateid: int, donationids: List[int]
     templateid: The ID of the template
     donationids: A list of ids to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     dons = asm3.financial.get_donations_by_ids(dbo, donationids)
     if len(dons) == 0: 
         raise asm3.utils.ASMValidationError("%s does not contain any valid donation IDs" % donationids)
     d = dons[0]
-    tags = person_tags(dbo, asm3.person.get_person(dbo, d.OWNERID))
+    tags = person_tags(dbo, asm3.person.get_person(dbo, d.OWNERID), tokens=tokens)
     if d.ANIMALID is not None and d.ANIMALID != 0:
-        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, d["ANIMALID"]), includeDonations=False))
+        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, d["ANIMALID"]), includeDonations=False, tokens=tokens))
     if d.MOVEMENTID is not None and d.MOVEMENTID != 0:
         tags = append_tags(tags, movement_tags(dbo, asm3.movement.get_movement(dbo, d.MOVEMENTID)))
     tags = append_tags(tags, donation_tags(dbo, dons))
@@ -2247,10 +2325,11 @@ def generate_foundanimal_doc(dbo: Database, templateid: int, faid: int, username
     templateid: The ID of the template
     faid: The found animal to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     a = asm3.lostfound.get_foundanimal(dbo, faid)
     if a is None:
         raise asm3.utils.ASMValidationError("%d is not a valid found animal ID" % faid)
-    tags = person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID))
+    tags = person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID), tokens=tokens)
     tags = append_tags(tags, foundanimal_tags(dbo, a))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -2261,10 +2340,11 @@ def generate_lostanimal_doc(dbo: Database, templateid: int, laid: int, username:
     templateid: The ID of the template
     laid: The lost animal to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     a = asm3.lostfound.get_lostanimal(dbo, laid)
     if a is None:
         raise asm3.utils.ASMValidationError("%d is not a valid lost animal ID" % laid)
-    tags = person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID))
+    tags = person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID), tokens=tokens)
     tags = append_tags(tags, lostanimal_tags(dbo, a))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -2275,12 +2355,13 @@ def generate_licence_doc(dbo: Database, templateid: int, licenceid: int, usernam
     templateid: The ID of the template
     licenceid: The licence to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     l = asm3.financial.get_licence(dbo, licenceid)
     if l is None:
         raise asm3.utils.ASMValidationError("%d is not a valid licence ID" % licenceid)
-    tags = person_tags(dbo, asm3.person.get_person(dbo, l.OWNERID))
+    tags = person_tags(dbo, asm3.person.get_person(dbo, l.OWNERID), tokens=tokens)
     if l.ANIMALID is not None and l.ANIMALID != 0:
-        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, l.ANIMALID), includeLicence=False))
+        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, l.ANIMALID), includeLicence=False, tokens=tokens))
     tags = append_tags(tags, licence_tags(dbo, l))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -2291,13 +2372,14 @@ def generate_medical_doc(dbo: Database, templateid: int, medicalids: List[int],
     templateid: The ID of the template
     medicalids: A list of ids to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     meds = asm3.medical.get_regimens_ids(dbo, medicalids)
     tags = {}
     if len(meds) == 0: 
         raise asm3.utils.ASMValidationError("%s does not contain any valid medical IDs" % medicalids)
     m = meds[0]
     if m.ANIMALID is not None and m.ANIMALID != 0:
-        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, m.ANIMALID), includeMedical=False))
+        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, m.ANIMALID), includeMedical=False, tokens=tokens))
     tags = append_tags(tags, medical_tags(dbo, meds))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -2308,14 +2390,15 @@ def generate_movement_doc(dbo: Database, templateid: int, movementid: int, usern
     templateid: The ID of the template
     movementid: The movement to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     m = asm3.movement.get_movement(dbo, movementid)
     tags = {}
     if m is None:
         raise asm3.utils.ASMValidationError("%d is not a valid movement ID" % movementid)
     if m.ANIMALID is not None and m.ANIMALID != 0:
-        tags = animal_tags(dbo, asm3.animal.get_animal(dbo, m.ANIMALID))
+        tags = animal_tags(dbo, asm3.animal.get_animal(dbo, m.ANIMALID), tokens=tokens)
     if m.OWNERID is not None and m.OWNERID != 0:
-        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, m.OWNERID)))
+        tags = append_tags(tags, person_tags(dbo, asm3.person.get_person(dbo, m.OWNERID), tokens=tokens))
     tags = append_tags(tags, movement_tags(dbo, m))
     tags = append_tags(tags, donation_tags(dbo, asm3.financial.get_movement_donations(dbo, movementid)))
     tags = append_tags(tags, org_tags(dbo, username))
@@ -2340,12 +2423,13 @@ def generate_voucher_doc(dbo: Database, templateid: int, voucherid: int, usernam
     templateid: The ID of the template
     voucherid: The ID of the voucher to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     v = asm3.financial.get_voucher(dbo, voucherid)
     if v is None:
         raise asm3.utils.ASMValidationError("%d is not a valid voucher ID" % voucherid)
-    tags = person_tags(dbo, asm3.person.get_person(dbo, v.OWNERID))
+    tags = person_tags(dbo, asm3.person.get_person(dbo, v.OWNERID), tokens=tokens)
     if v.ANIMALID is not None and v.ANIMALID != 0:
-        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, v.ANIMALID)))
+        tags = append_tags(tags, animal_tags(dbo, asm3.animal.get_animal(dbo, v.ANIMALID), tokens=tokens))
     tags = append_tags(tags, voucher_tags(dbo, v))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -2356,10 +2440,11 @@ def generate_waitinglist_doc(dbo: Database, templateid: int, wlid: int, username
     templateid: The ID of the template
     wlid: The waiting list to generate for
     """
+    tokens = get_template_tokens(dbo, templateid)
     a = asm3.waitinglist.get_waitinglist_by_id(dbo, wlid)
     if a is None:
         raise asm3.utils.ASMValidationError("%d is not a valid waiting list ID" % wlid)
-    tags = person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID))
+    tags = person_tags(dbo, asm3.person.get_person(dbo, a.OWNERID), tokens=tokens)
     tags = append_tags(tags, waitinglist_tags(dbo, a))
     tags = append_tags(tags, org_tags(dbo, username))
     return substitute_template(dbo, templateid, tags)
@@ -16,8 +16,10 @@ from asm3 import clinic
 from asm3 import configuration
 from asm3 import db
 from asm3 import dbfs
+from asm3 import derivatives
 from asm3 import dbupdate
 from asm3 import diary
+from asm3 import emailqueue
 from asm3 import financial
 from asm3 import lostfound
 from asm3 import media
@@ -27,6 +29,8 @@ from asm3 import onlineform
 from asm3 import person
 from asm3 import publish
 from asm3 import reports as extreports
+from asm3 import searchindex
+from asm3 import timeline
 from asm3 import utils
 from asm3 import waitinglist
 from asm3.sitedefs import LOCALE, TIMEZONE, MULTIPLE_DATABASES, MULTIPLE_DATABASES_TYPE, MULTIPLE_DATABASES_MAP
@@ -132,6 +136,18 @@ def daily(dbo: Database):
         # Send automated person emails
         ttask(automail.send_all, dbo)
 
+        # Recalculate the home page counters
+        ttask(animal.update_dashboard_counters, dbo)
+
+        # Rebuild the home page timeline
+        ttask(timeline.rebuild, dbo)
+
+        # Rebuild the quick search index
+        ttask(searchindex.rebuild, dbo)
+
+        # Remove old sent and failed emails from the queue
+        ttask(emailqueue.purge, dbo)
+
     except:
         em = str(sys.exc_info()[0])
         al.error("FAIL: running batch tasks: %s" % em, "cron.daily", dbo, sys.exc_info())
@@ -239,6 +255,27 @@ def maint_animal_figures_annual(dbo: Database):
         em = str(sys.exc_info()[0])
         al.error("FAIL: uncaught error running maint_animal_figures_annual: %s" % em, "cron.maint_animal_figures_annual", dbo, sys.exc_info())
 
+def maint_search_index(dbo: Database):
+    try:
+        searchindex.rebuild(dbo)
+    except:
+        em = str(sys.exc_info()[0])
+        al.error("FAIL: uncaught error running maint_search_index: %s" % em, "cron.maint_search_index", dbo, sys.exc_info())
+
+def maint_timeline(dbo: Database):
+    try:
+        timeline.rebuild(dbo)
+    except:
+        em = str(sys.exc_info()[0])
+        al.error("FAIL: uncaught error running maint_timeline: %s" % em, "cron.maint_timeline", dbo, sys.exc_info())
+
+def maint_email_queue(dbo: Database):
+    try:
+        emailqueue.run(dbo)
+    except:
+        em = str(sys.exc_info()[0])
+        al.error("FAIL: uncaught error running maint_email_queue: %s" % em, "cron.maint_email_queue", dbo, sys.exc_info())
+
 def maint_db_diagnostic(dbo: Database):
     try:
         d = dbupdate.diagnostic(dbo)
@@ -457,6 +494,8 @@ def maint_deduplicate_people(dbo: Database):
 def maint_disk_cache(dbo: Database):
     try:
         cachedisk.remove_expired(dbo.name())
+        cachedisk.evict(dbo.name())
+        derivatives.evict(dbo.name())
     except:
         em = str(sys.exc_info()[0])
         al.error("FAIL: uncaught error running remove_expired: %s" % em, "cron.maint_disk_cache", dbo, sys.exc_info())
@@ -587,6 +626,12 @@ def run(dbo: Database, mode: str) -> None:
         maint_deduplicate_people(dbo)
     elif mode == "maint_disk_cache":
         maint_disk_cache(dbo)
+    elif mode == "maint_email_queue":
+        maint_email_queue(dbo)
+    elif mode == "maint_search_index":
+        maint_search_index(dbo)
+    elif mode == "maint_timeline":
+        maint_timeline(dbo)
 
     elapsed = time.time() - x
     al.info("end %s: elapsed %0.2f secs" % (mode, elapsed), "cron.run", dbo)
@@ -664,14 +709,17 @@ def print_usage() -> None:
     print("       maint_db_delete_orphaned_media - delete all entries from the dbfs not in media")
     print("       maint_db_update - run any outstanding database updates")
     print("       maint_deduplicate_people - automatically merge duplicate people records")
-    print("       maint_disk_cache - remove expired entries from the disk cache")
+    print("       maint_disk_cache - remove expired entries from the disk cache and trim media derivatives")
+    print("       maint_email_queue - send any emails left in the queue (eg: after a restart)")
     print("       maint_import_report - import report txt set file in ASM3_REPORT env")
     print("       maint_recode_all - regenerate all animal codes")
     print("       maint_recode_shelter - regenerate animals codes for all shelter animals")
     print("       maint_scale_animal_images - re-scales all the animal images in the database")
     print("       maint_scale_odts - re-scales all odt files attached to records (remove images)")
     print("       maint_scale_pdfs - re-scales all the PDFs in the database")
+    print("       maint_search_index - rebuild the quick search index from existing data")
     print("       maint_switch_dbfs_storage - moves all existing dbfs files to the current DBFS_STORE")
+    print("       maint_timeline - rebuild the timeline of recent events from existing data")
     print("       maint_variable_data - recalculate all variable data for all animals")
 
 if __name__ == "__main__": 
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import os, sys, traceback
+import os, sys, traceback, types
 
 # The path to the folder containing the ASM3 modules
 PATH = os.path.dirname(os.path.abspath(__file__)) + os.sep
@@ -47,6 +47,7 @@ import asm3.publishers.html
 import asm3.publishers.vetenvoy
 import asm3.reports
 import asm3.search
+import asm3.searchindex
 import asm3.service
 import asm3.smcom
 import asm3.stock
@@ -476,13 +477,16 @@ class ASMEndpoint(object):
         self.check(self.post_permissions)
         o = self._params()
         mode = o.post["mode"]
-        if mode == "": 
-            return self.post_all(o)
-        elif not self.check_mode(mode):
-            raise asm3.utils.ASMError("invalid mode")
-        else:
-            # valid mode value has been supplied, call post_mode
-            return getattr(self.__class__, "post_%s" % mode)(self, o)
+        # Audit records written while handling the post are inserted together at the end
+        # and records that were changed are reindexed for search once
+        with asm3.audit.batch(), asm3.searchindex.batch():
+            if mode == "": 
+                return self.post_all(o)
+            elif not self.check_mode(mode):
+                raise asm3.utils.ASMError("invalid mode")
+            else:
+                # valid mode value has been supplied, call post_mode
+                return getattr(self.__class__, "post_%s" % mode)(self, o)
 
 class GeneratorEndpoint(ASMEndpoint):
     """Base class for endpoints that use generators for their content """
@@ -4816,6 +4820,53 @@ class mailmerge(JSONEndpoint):
     get_permissions = asm3.users.MAIL_MERGE
     post_permissions = asm3.users.MAIL_MERGE
 
+    def document_task(self, dbo: Any, username: str, crid: int, mergeparams: Any, templateid: int) -> str:
+        """ This method should be run in a new thread by asynctask.
+            Runs the mail merge and generates a document from the template for each row,
+            saving them to the disk cache for download.
+            The template is parsed once and each row substituted into it.
+        """
+        l = dbo.locale
+        rows, cols = asm3.reports.execute_query(dbo, crid, username, mergeparams)
+        templatename = asm3.template.get_document_template_name(dbo, templateid)
+        template = asm3.utils.TagTemplate(asm3.utils.bytes2str(asm3.template.get_document_template_content(dbo, templateid)))
+        org_tags = asm3.wordprocessor.org_tags(dbo, username)
+        p = asm3.asynctask.ProgressTracker(dbo, len(rows))
+        c = []
+        for d in rows:
+            c.append( template.render(asm3.wordprocessor.append_tags(d, org_tags)) )
+            p.increment()
+            if p.is_cancelled(): return ""
+        p.finish()
+        content = '<div class="mce-pagebreak" style="page-break-before: always; clear: both; border: 0">&nbsp;</div>'.join(c)
+        key = asm3.utils.uuid_str()
+        asm3.cachedisk.put(key, dbo.name(), { "type": "document", "name": templatename, "content": content }, 3600)
+        return self.download_form(l, key, len(rows))
+
+    def labels_task(self, dbo: Any, username: str, crid: int, mergeparams: Any, mergetitle: str, 
+                    papersize: str, units: str, fontpt: str, hpitch: float, vpitch: float, 
+                    width: float, height: float, lmargin: float, tmargin: float, cols: int, rows: int) -> str:
+        """ This method should be run in a new thread by asynctask.
+            Runs the mail merge and generates a PDF of labels for the rows,
+            saving it to the disk cache for download.
+        """
+        l = dbo.locale
+        mrows, mcols = asm3.reports.execute_query(dbo, crid, username, mergeparams)
+        p = asm3.asynctask.ProgressTracker(dbo, 1)
+        pdf = asm3.utils.generate_label_pdf(dbo, l, mrows, papersize, units, fontpt, hpitch, vpitch, 
+            width, height, lmargin, tmargin, cols, rows, progress=p)
+        key = asm3.utils.uuid_str()
+        asm3.cachedisk.put(key, dbo.name(), { "type": "labels", "name": mergetitle, "content": pdf }, 3600)
+        return self.download_form(l, key, len(mrows))
+
+    def download_form(self, l: str, key: str, count: int) -> str:
+        """ Returns the form shown on the task screen to download a generated mail merge """
+        return '<form action="mailmerge" method="post" target="_blank">' \
+            '<input type="hidden" name="mode" value="download" />' \
+            '<input type="hidden" name="key" value="%s" />' \
+            '<p>%s <button type="submit">%s</button></p></form>' % ( \
+            key, _("Export complete ({0} entries).", l).format(count), _("Download File", l) )
+
     def recipients(self, rows):
         """ Returns a list of all recipients for rows """
         emails = []
@@ -4888,38 +4939,43 @@ class mailmerge(JSONEndpoint):
         post = o.post
         mergeparams = ""
         if post["mergeparams"] != "": mergeparams = asm3.utils.json_parse(post["mergeparams"])
-        rows, cols = asm3.reports.execute_query(dbo, post.integer("mergereport"), o.user, mergeparams)
         templateid = post.integer("templateid")
-        templatecontent = asm3.template.get_document_template_content(dbo, templateid)
         templatename = asm3.template.get_document_template_name(dbo, templateid)
         if not templatename.endswith(".html"):
             raise asm3.utils.ASMValidationError("Only html templates are allowed")
-        # Generate a document from the template for each row
-        org_tags = asm3.wordprocessor.org_tags(dbo, o.user)
-        c = []
-        for d in rows:
-            c.append( asm3.wordprocessor.substitute_tags(asm3.utils.bytes2str(templatecontent), asm3.wordprocessor.append_tags(d, org_tags)) )
-        content = '<div class="mce-pagebreak" style="page-break-before: always; clear: both; border: 0">&nbsp;</div>'.join(c)
-        self.content_type("text/html")
-        self.cache_control(0)
-        return asm3.html.tinymce_header(templatename, "document_edit.js", jswindowprint=True, pdfenabled=False, readonly=True) + \
-            asm3.html.tinymce_main(o.locale, "", recid=0, linktype="", \
-                dtid="", content=asm3.utils.escape_tinymce(content))
+        # Generate a document from the template for each row in the background
+        asm3.asynctask.function_task(dbo, _("Generate documents", o.locale), self.document_task, 
+            dbo, o.user, post.integer("mergereport"), mergeparams, templateid)
+        self.redirect("task")
 
     def post_labels(self, o):
         dbo = o.dbo
         post = o.post
         mergeparams = ""
         if post["mergeparams"] != "": mergeparams = asm3.utils.json_parse(post["mergeparams"])
-        rows, cols = asm3.reports.execute_query(dbo, post.integer("mergereport"), o.user, mergeparams)
-        disp = asm3.configuration.pdf_inline(dbo) and "inline" or "attachment"
-        self.content_disposition(disp, post["mergetitle"], "pdf", "labels.pdf" )
-        self.content_type("application/pdf")
-        return asm3.utils.generate_label_pdf(dbo, o.locale, rows, post["papersize"], post["units"], post["fontpt"], 
+        asm3.asynctask.function_task(dbo, _("Produce a PDF of printable labels", o.locale), self.labels_task, 
+            dbo, o.user, post.integer("mergereport"), mergeparams, post["mergetitle"], 
+            post["papersize"], post["units"], post["fontpt"], 
             post.floating("hpitch"), post.floating("vpitch"), 
             post.floating("width"), post.floating("height"), 
             post.floating("lmargin"), post.floating("tmargin"),
             post.integer("cols"), post.integer("rows"))
+        self.redirect("task")
+
+    def post_download(self, o):
+        dbo = o.dbo
+        v = asm3.cachedisk.get(o.post["key"], dbo.name())
+        if v is None: self.notfound()
+        if v["type"] == "labels":
+            disp = asm3.configuration.pdf_inline(dbo) and "inline" or "attachment"
+            self.content_disposition(disp, v["name"], "pdf", "labels.pdf" )
+            self.content_type("application/pdf")
+            return v["content"]
+        self.content_type("text/html")
+        self.cache_control(0)
+        return asm3.html.tinymce_header(v["name"], "document_edit.js", jswindowprint=True, pdfenabled=False, readonly=True) + \
+            asm3.html.tinymce_main(o.locale, "", recid=0, linktype="", \
+                dtid="", content=asm3.utils.escape_tinymce(v["content"]))
 
     def post_csv(self, o):
         dbo = o.dbo
@@ -5193,9 +5249,7 @@ class medical(JSONEndpoint):
 
     def post_createbulk(self, o):
         self.check(asm3.users.ADD_MEDICAL)
-        for animalid in o.post.integer_list("animals"):
-            o.post.data["animal"] = str(animalid)
-            asm3.medical.insert_regimen_from_form(o.dbo, o.user, o.post)
+        asm3.medical.insert_regimens_from_form(o.dbo, o.user, o.post, o.post.integer_list("animals"))
 
     def post_update(self, o):
         self.check(asm3.users.CHANGE_MEDICAL)
@@ -5221,15 +5275,13 @@ class medical(JSONEndpoint):
         vet = post.integer("givenvet")
         by = post["givenby"]
         comments = post["treatmentcomments"]
-        for mid in post.integer_list("ids"):
-            asm3.medical.update_treatment_given(o.dbo, o.user, mid, newdate, by, vet, comments)
+        asm3.medical.update_treatments_given(o.dbo, o.user, post.integer_list("ids"), newdate, by, vet, comments)
         if post.integer("item") != -1:
             asm3.stock.deduct_stocklevel_from_form(o.dbo, o.user, post)
 
     def post_undo(self, o):
         self.check(asm3.users.BULK_COMPLETE_MEDICAL)
-        for mid in o.post.integer_list("ids"):
-            asm3.medical.update_treatment_given(o.dbo, o.user, mid, None)
+        asm3.medical.update_treatments_given(o.dbo, o.user, o.post.integer_list("ids"), None)
 
     def post_required(self, o):
         self.check(asm3.users.BULK_COMPLETE_MEDICAL)
@@ -7306,6 +7358,8 @@ class service(ASMEndpoint):
             self.content_type(contenttype)
             self.cache_control(client_ttl, cache_ttl) 
             self.header("Access-Control-Allow-Origin", "*") # CORS
+            if LARGE_FILES_CHUNKED and isinstance(response, types.GeneratorType):
+                self.header("Transfer-Encoding", "chunked") # streamed report output
             return response
 
     def content(self, o):
@@ -7,13 +7,19 @@ import test_additional
 import test_animalcontrol
 import test_animalname
 import test_animal
+import test_asynctask
 import test_automail
+import test_cachedisk
 import test_checkmicrochip
 import test_clinic
+import test_configuration
 import test_csvimport
+import test_dashboard
 import test_dbfs
+import test_dbms
 import test_dbupdate
 import test_diary
+import test_emailqueue
 import test_event
 import test_financial
 import test_geo
@@ -30,9 +36,11 @@ import test_person
 import test_publish
 import test_reports
 import test_search
+import test_searchindex
 import test_service
 import test_stock
 import test_template
+import test_timeline
 import test_users
 import test_utils
 import test_waitinglist
@@ -45,13 +53,19 @@ fullsuite = [
     lt(test_animalcontrol),
     lt(test_animalname),
     lt(test_animal),
+    lt(test_asynctask),
     lt(test_automail),
+    lt(test_cachedisk),
     lt(test_checkmicrochip),
     lt(test_clinic),
+    lt(test_configuration),
     lt(test_csvimport),
+    lt(test_dashboard),
     lt(test_dbfs),
+    lt(test_dbms),
     lt(test_dbupdate),
     lt(test_diary),
+    lt(test_emailqueue),
     lt(test_event),
     lt(test_financial),
     lt(test_geo),
@@ -68,9 +82,11 @@ fullsuite = [
     lt(test_publish),
     lt(test_reports),
     lt(test_search),
+    lt(test_searchindex),
     lt(test_service),
     lt(test_stock),
     lt(test_template),
+    lt(test_timeline),
     lt(test_users),
     lt(test_utils),
     lt(test_waitinglist)
@@ -5,6 +5,8 @@ import base
 import asm3.additional
 import asm3.utils
 
+from asm3.dbms.base import ResultRow
+
 class TestAdditional(unittest.TestCase):
  
     nid = 0
@@ -35,6 +37,23 @@ class TestAdditional(unittest.TestCase):
     def test_get_additional_fields_ids(self):
         asm3.additional.get_additional_fields_ids(base.get_dbo(), [], "animal")
 
+    def test_append_to_results(self):
+        dbo = base.get_dbo()
+        asm3.additional.insert_additional(dbo, asm3.additional.ANIMAL, 1, self.nid, "1")
+        asm3.additional.insert_additional(dbo, asm3.additional.ANIMAL, 2, self.nid, "0")
+        rows = []
+        for i in (1, 2, 3, 1):
+            r = ResultRow()
+            r.ID = i
+            rows.append(r)
+        self.assertEqual(asm3.additional.get_additional_fields_ids(dbo, rows, "animal"), 
+            asm3.additional.get_additional_fields_ids(dbo, rows, "animal", chunksize=1))
+        asm3.additional.append_to_results(dbo, rows, "animal")
+        self.assertEqual("1", rows[0].ADDNAME)
+        self.assertEqual("0", rows[1].ADDNAME)
+        self.assertNotIn("ADDNAME", rows[2])
+        self.assertEqual("1", rows[3].ADDNAME)
+
     def test_get_field_definitions(self):
         self.assertNotEqual( len(asm3.additional.get_field_definitions(base.get_dbo(), "animal")), 0 )
 
@@ -2,8 +2,11 @@
 import unittest
 import base
 import asm3.animal
+import asm3.movement
 import asm3.utils
 
+from datetime import datetime
+
 class TestAnimal(unittest.TestCase):
    
     nid = 0
@@ -54,6 +57,12 @@ class TestAnimal(unittest.TestCase):
     def test_get_animal_find_simple(self):
         self.assertNotEqual(0, len(asm3.animal.get_animal_find_simple(base.get_dbo(), "Testio")))
         self.assertNotEqual(0, len(asm3.animal.get_animal_find_simple(base.get_dbo(), "Testio", brief=True)))
+        # The site filter is on the animal's internal location
+        siteid = base.get_dbo().query_int("SELECT il.SiteID FROM animal a INNER JOIN internallocation il ON il.ID = a.ShelterLocation WHERE a.ID=?", [self.nid])
+        lf = asm3.animal.LocationFilter("", siteid, "")
+        self.assertIn(self.nid, [ x.ID for x in asm3.animal.get_animal_find_simple(base.get_dbo(), "Testio", lf=lf) ])
+        lf = asm3.animal.LocationFilter("", siteid + 1, "")
+        self.assertNotIn(self.nid, [ x.ID for x in asm3.animal.get_animal_find_simple(base.get_dbo(), "Testio", lf=lf) ])
 
     def test_get_animal_find_advanced(self):
         self.assertNotEqual(0, len(asm3.animal.get_animal_find_advanced(base.get_dbo(), { "animalname": "Testio" })))
@@ -207,7 +216,12 @@ class TestAnimal(unittest.TestCase):
             "movementtype": "-1"
         }
         post = asm3.utils.PostedData(data, "en")
-        asm3.animal.update_animals_from_form(base.get_dbo(), "test", post)
+        dbo = base.get_dbo()
+        asm3.animal.update_animals_from_form(dbo, "test", post)
+        a = dbo.first_row(dbo.query("SELECT AcceptanceNumber, Fee, IsGoodWithCats FROM animal WHERE ID=?", [self.nid]))
+        self.assertEqual("000", a.ACCEPTANCENUMBER)
+        self.assertEqual(1000, a.FEE)
+        self.assertEqual(1, a.ISGOODWITHCATS)
 
     def test_update_deceased_from_form(self):
         asm3.animal.update_deceased_from_form(base.get_dbo(), "test", asm3.utils.PostedData({ "animal": self.nid }, "en"))
@@ -313,6 +327,26 @@ class TestAnimal(unittest.TestCase):
     def test_update_on_shelter_variable_animal_data(self):
         asm3.animal.update_on_shelter_variable_animal_data(base.get_dbo())
 
+    def test_group_movements_by_animal(self):
+        dbo = base.get_dbo()
+        animals = dbo.query(asm3.animal.get_animal_status_query(dbo))
+        movements = dbo.query(asm3.animal.get_animal_movement_status_query(dbo) + " ORDER BY MovementDate DESC")
+        grouped = asm3.animal.group_movements_by_animal(movements)
+        self.assertEqual(len(movements), sum(len(x) for x in grouped.values()))
+        # Passing each animal only its own movements gives the same updates as the full list
+        flat = []
+        byanimal = []
+        for a in animals:
+            asm3.animal.update_animal_status(dbo, a.id, a.copy(), movements, flat, [])
+            asm3.animal.update_animal_status(dbo, a.id, a.copy(), grouped.get(a.id, []), byanimal, [])
+        self.assertEqual(flat, byanimal)
+        flat = []
+        byanimal = []
+        for a in animals:
+            asm3.animal.update_variable_animal_data(dbo, a.id, a.copy(), flat, None, movements)
+            asm3.animal.update_variable_animal_data(dbo, a.id, a.copy(), byanimal, None, grouped.get(a.id, []))
+        self.assertEqual(flat, byanimal)
+
     def test_update_all_animal_statuses(self):
         asm3.animal.update_all_animal_statuses(base.get_dbo())
 
@@ -366,6 +400,95 @@ class TestAnimal(unittest.TestCase):
         asm3.animal.update_animal_figures(base.get_dbo())
         asm3.animal.update_animal_figures_annual(base.get_dbo())
 
+    def test_animal_figures_inventory(self):
+        # The daily counts calculated in one go should match the per day queries
+        dbo = base.get_dbo()
+        data = {
+            "animal": str(self.nid),
+            "person": "1",
+            "movementdate": base.today_display(),
+            "type": "1"
+        }
+        post = asm3.utils.PostedData(data, "en")
+        mid = asm3.movement.insert_movement_from_form(dbo, "test", post)
+        dbo.update("animal", self.nid, { "DateBroughtIn": datetime(2001, 3, 5, 10, 0), "DeceasedDate": datetime(2001, 3, 28, 14, 0) })
+        dbo.update("adoption", mid, { "MovementType": 2, "MovementDate": datetime(2001, 3, 10, 9, 0), "ReturnDate": datetime(2001, 3, 20, 15, 0) })
+        days = [ datetime(2001, 3, i) for i in range(1, 32) ]
+        for startofday in (False, True):
+            species = asm3.animal.get_number_animals_on_shelter_days(dbo, days, "SpeciesID", startofday).get(1, [0] * 31)
+            types = asm3.animal.get_number_animals_on_shelter_days(dbo, days, "AnimalTypeID", startofday).get(1, [0] * 31)
+            for i, d in enumerate(days):
+                self.assertEqual(asm3.animal.get_number_animals_on_shelter(dbo, d, 1, startofday=startofday), species[i])
+                self.assertEqual(asm3.animal.get_number_animals_on_shelter(dbo, d, 0, 1, startofday=startofday), types[i])
+        fosters = asm3.animal.get_number_animals_on_foster_days(dbo, days).get(1, [0] * 31)
+        litters = asm3.animal.get_number_litters_on_shelter_days(dbo, days).get(1, [0] * 31)
+        for i, d in enumerate(days):
+            self.assertEqual(asm3.animal.get_number_animals_on_foster(dbo, d, 1), fosters[i])
+            self.assertEqual(asm3.animal.get_number_litters_on_shelter(dbo, d, 1), litters[i])
+        self.assertEqual(1, fosters[14])
+        asm3.animal.update_animal_figures(dbo, 3, 2001)
+        row = dbo.query("SELECT * FROM animalfigures WHERE Month=3 AND Year=2001 AND SpeciesID=1 AND Code='SP_ONSHELTER'")[0]
+        for i, d in enumerate(days):
+            self.assertEqual(asm3.animal.get_number_animals_on_shelter(dbo, d, 1), row["D%d" % (i+1)])
+        row = dbo.query("SELECT * FROM animalfigures WHERE Month=3 AND Year=2001 AND SpeciesID=1 AND Code='SP_FOSTERED'")[0]
+        self.assertEqual(1, row.d10)
+        asm3.movement.delete_movement(dbo, "test", mid)
+
+    def test_animal_figures_intake_outcome(self):
+        # The expected rows were produced by the per species/type GROUP BY queries
+        # update_animal_figures ran before the month's events were read in one go
+        dbo = base.get_dbo()
+        def insert_animal(name):
+            post = asm3.utils.PostedData({ "animalname": name, "estimatedage": "1", "animaltype": "1", "entryreason": "1", "species": "1" }, "en")
+            return asm3.animal.insert_animal_from_form(dbo, post, "test")[0]
+        def insert_movement(animalid, movementtype, movementdate, returndate = None):
+            return dbo.insert("adoption", { "AdoptionNumber": "FIG%d%d" % (animalid, movementtype), "AnimalID": animalid, "OwnerID": 1,
+                "MovementType": movementtype, "MovementDate": movementdate, "ReturnDate": returndate, "ReturnedReasonID": 0, "IsTrial": 0 }, "test")
+        a = self.nid
+        b = insert_animal("Testio2")
+        c = insert_animal("Testio3")
+        dbo.update("animal", a, { "AnimalTypeID": 2, "DateBroughtIn": datetime(2001, 3, 5, 10, 0), "DeceasedDate": datetime(2001, 3, 28, 14, 0), "PutToSleep": 0, "DiedOffShelter": 0 })
+        dbo.update("animal", b, { "AnimalTypeID": 2, "DateBroughtIn": datetime(2001, 3, 2, 9, 0), "IsTransfer": 1, "DeceasedDate": datetime(2001, 3, 30, 11, 0), "PutToSleep": 1, "DiedOffShelter": 0 })
+        dbo.update("animal", c, { "AnimalTypeID": 2, "DateBroughtIn": datetime(2001, 3, 8, 12, 0) })
+        mids = [ insert_movement(a, asm3.movement.FOSTER, datetime(2001, 3, 10, 9, 0), datetime(2001, 3, 20, 15, 0)),
+            insert_movement(b, asm3.movement.TRANSFER, datetime(2001, 3, 18, 10, 0), datetime(2001, 3, 22, 10, 0)),
+            insert_movement(c, asm3.movement.FOSTER, datetime(2001, 3, 10, 11, 0), datetime(2001, 3, 12, 11, 0)),
+            insert_movement(c, asm3.movement.ADOPTION, datetime(2001, 3, 15, 13, 0), datetime(2001, 3, 20, 16, 0)),
+            insert_movement(c, asm3.movement.RECLAIMED, datetime(2001, 3, 25, 10, 0)) ]
+        expected = {
+            "ADOPTED": { 15: 1 },
+            "BROUGHTIN": { 5: 1, 8: 1 },
+            "DIED": { 28: 1 },
+            "FOSTERED": { 10: 2 },
+            "INTOTAL": { 2: 1, 5: 1, 8: 1, 12: 1, 20: 2, 22: 1 },
+            "OUTTOTAL": { 10: 2, 15: 1, 18: 1, 25: 1, 28: 1, 30: 1 },
+            "PTS": { 30: 1 },
+            "RECLAIMED": { 25: 1 },
+            "RETURNED": { 20: 1 },
+            "RETURNEDFOSTER": { 12: 1, 20: 1 },
+            "RETURNEDOTHER": { 22: 1 },
+            "TRANSFERIN": { 2: 1 },
+            "TRANSFERRED": { 18: 1 }
+        }
+        try:
+            asm3.animal.update_animal_figures(dbo, 3, 2001)
+            for prefix, where in ( ("SP", "SpeciesID=1"), ("AT", "AnimalTypeID=2") ):
+                rows = dbo.query("SELECT * FROM animalfigures WHERE Month=3 AND Year=2001 AND %s AND Code LIKE '%s_%%'" % (where, prefix))
+                codes = []
+                for r in rows:
+                    code = r.code[3:]
+                    if code in ("ONSHELTER", "ONFOSTER", "LITTERS", "TOTAL", "STARTTOTAL"): continue
+                    codes.append(code)
+                    days = dict( (i, r["D%d" % i]) for i in range(1, 32) if r["D%d" % i] != 0 )
+                    self.assertEqual(expected.get(code, {}), days, r.code)
+                for code in expected:
+                    self.assertTrue(code in codes, "%s_%s" % (prefix, code))
+        finally:
+            for m in mids:
+                dbo.delete("adoption", m)
+            asm3.animal.delete_animal(dbo, "test", b)
+            asm3.animal.delete_animal(dbo, "test", c)
+
     def test_auto_cancel_holds(self):
         asm3.animal.auto_cancel_holds(base.get_dbo())
 
@@ -0,0 +1,43 @@
+import unittest
+import base
+
+import asm3.asynctask
+import asm3.cachedisk
+
+class TestAsyncTask(unittest.TestCase):
+
+    def setUp(self):
+        self.dbo = base.get_dbo()
+        asm3.asynctask.reset(self.dbo)
+        asm3.asynctask.set_task_name(self.dbo, "test")
+        asm3.asynctask.set_progress_value(self.dbo, 0)
+
+    def tearDown(self):
+        asm3.asynctask.reset(self.dbo)
+
+    def test_progress_tracker(self):
+        p = asm3.asynctask.ProgressTracker(self.dbo, 10, flushitems=4, flushms=60000)
+        self.assertEqual(10, asm3.asynctask.get_progress_max(self.dbo))
+        for i in range(3):
+            p.increment()
+        self.assertEqual(0, asm3.asynctask.get_progress_value(self.dbo))
+        p.increment()
+        self.assertEqual(4, asm3.asynctask.get_progress_value(self.dbo))
+        p.increment()
+        p.finish()
+        self.assertEqual(5, asm3.asynctask.get_progress_value(self.dbo))
+
+    def test_progress_tracker_cancel(self):
+        p = asm3.asynctask.ProgressTracker(self.dbo, 10, flushitems=2, flushms=60000)
+        asm3.asynctask.set_cancel(self.dbo, True)
+        p.increment()
+        self.assertFalse(p.is_cancelled())
+        p.increment()
+        self.assertTrue(p.is_cancelled())
+
+    def test_progress_tracker_no_task(self):
+        asm3.cachedisk.delete("taskval", self.dbo.name())
+        p = asm3.asynctask.ProgressTracker(self.dbo, 10, flushitems=1)
+        p.increment()
+        p.finish()
+        self.assertEqual(None, asm3.asynctask.get_progress_value(self.dbo))
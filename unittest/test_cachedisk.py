@@ -0,0 +1,72 @@
+
+import unittest
+import base
+
+import asm3.cachedisk
+
+import os, pickle, time
+
+PATH = "unittestcache"
+
+class TestCacheDisk(unittest.TestCase):
+
+    def test_get_put(self):
+        asm3.cachedisk.put("test", PATH, "value", 60)
+        self.assertEqual("value", asm3.cachedisk.get("test", PATH))
+        self.assertIsNone(asm3.cachedisk.get("test", PATH, int))
+        asm3.cachedisk.delete("test", PATH)
+        self.assertIsNone(asm3.cachedisk.get("test", PATH))
+
+    def test_sharding(self):
+        asm3.cachedisk.put("test", PATH, "value", 60)
+        fname = asm3.cachedisk._getfilename("test", PATH)
+        shard = os.path.dirname(fname)
+        self.assertEqual(os.path.basename(fname)[0:2], os.path.basename(shard))
+        self.assertIn(os.path.basename(fname), asm3.cachedisk._read_index(shard))
+        asm3.cachedisk.delete("test", PATH)
+
+    def test_increment_touch(self):
+        asm3.cachedisk.put("count", PATH, 1, 60)
+        self.assertEqual(2, asm3.cachedisk.increment("count", PATH, 60))
+        self.assertEqual(2, asm3.cachedisk.touch("count", PATH, 60))
+        asm3.cachedisk.delete("count", PATH)
+
+    def test_remove_expired(self):
+        asm3.cachedisk.put("expired", PATH, "value", -1)
+        asm3.cachedisk.put("live", PATH, "value", 60)
+        asm3.cachedisk.remove_expired(PATH)
+        self.assertFalse(asm3.cachedisk.exists("expired", PATH))
+        self.assertTrue(asm3.cachedisk.exists("live", PATH))
+        asm3.cachedisk.delete("live", PATH)
+
+    def test_evict(self):
+        for i in range(0, 5):
+            asm3.cachedisk.put("evict%d" % i, PATH, "x" * 1000, 60)
+        # Make evict0 the most recently used
+        now = time.time()
+        for i in range(1, 5):
+            fname = asm3.cachedisk._getfilename("evict%d" % i, PATH)
+            os.utime(fname, (now - 1000 + i, os.stat(fname).st_mtime))
+        asm3.cachedisk.evict(PATH, 3000)
+        self.assertTrue(asm3.cachedisk.exists("evict0", PATH))
+        self.assertFalse(asm3.cachedisk.exists("evict1", PATH))
+        self.assertTrue(asm3.cachedisk.exists("evict4", PATH))
+        for i in range(0, 5):
+            if asm3.cachedisk.exists("evict%d" % i, PATH): asm3.cachedisk.delete("evict%d" % i, PATH)
+
+    def test_header(self):
+        asm3.cachedisk.put("header", PATH, { "a": 1 }, 60)
+        fname = asm3.cachedisk._getfilename("header", PATH)
+        expires, value = asm3.cachedisk._read(fname, headeronly=True)
+        self.assertTrue(expires > time.time())
+        self.assertIsNone(value)
+        self.assertEqual({ "a": 1 }, asm3.cachedisk._read(fname)[1])
+        asm3.cachedisk.delete("header", PATH)
+
+    def test_legacy_entry(self):
+        # Entries written before the header was added are still readable
+        fname = asm3.cachedisk._getfilename("legacy", PATH, mkpath=True)
+        with open(fname, "wb") as f:
+            pickle.dump({ "expires": time.time() + 60, "value": "old" }, f)
+        self.assertEqual("old", asm3.cachedisk.get("legacy", PATH))
+        asm3.cachedisk.delete("legacy", PATH)
@@ -0,0 +1,51 @@
+
+import unittest
+import base
+
+import asm3.configuration
+
+class TestConfiguration(unittest.TestCase):
+
+    def test_cset(self):
+        dbo = base.get_dbo()
+        asm3.configuration.cset(dbo, "TestConfigValue", "one")
+        self.assertEqual("one", asm3.configuration.cstring(dbo, "TestConfigValue"))
+        asm3.configuration.cset(dbo, "TestConfigValue", "two")
+        self.assertEqual("two", asm3.configuration.cstring(dbo, "TestConfigValue"))
+        asm3.configuration.cset(dbo, "TestConfigValue", "")
+
+    def test_snapshot(self):
+        dbo = base.get_dbo()
+        m1 = asm3.configuration.get_map(dbo)
+        m2 = asm3.configuration.get_map(dbo)
+        self.assertIs(m1, m2)
+        # Another process moving the generation on should discard our snapshot
+        # once it is checked again
+        asm3.configuration._bump_config_generation(dbo)
+        asm3.configuration.snapshots[dbo.name()][2] = 0
+        m3 = asm3.configuration.get_map(dbo)
+        self.assertIsNot(m1, m3)
+        self.assertEqual(m1, m3)
+
+    def test_snapshot_expires(self):
+        dbo = base.get_dbo()
+        asm3.configuration.cset(dbo, "TestConfigValue", "one")
+        ttl = asm3.configuration.CONFIG_TTL
+        try:
+            # Direct database updates are read once the cached map has expired
+            asm3.configuration.CONFIG_TTL = 0
+            self.assertEqual("one", asm3.configuration.cstring(dbo, "TestConfigValue"))
+            dbo.execute("UPDATE configuration SET ItemValue='two' WHERE ItemName='TestConfigValue'")
+            asm3.configuration.snapshots[dbo.name()][2] = 0
+            self.assertEqual("two", asm3.configuration.cstring(dbo, "TestConfigValue"))
+        finally:
+            asm3.configuration.CONFIG_TTL = ttl
+            asm3.configuration.cset(dbo, "TestConfigValue", "")
+
+    def test_cboolean_cint(self):
+        dbo = base.get_dbo()
+        asm3.configuration.cset(dbo, "TestConfigBool", "Yes")
+        asm3.configuration.cset(dbo, "TestConfigInt", "42")
+        self.assertTrue(asm3.configuration.cboolean(dbo, "TestConfigBool"))
+        self.assertEqual(42, asm3.configuration.cint(dbo, "TestConfigInt"))
+        self.assertEqual(7, asm3.configuration.cint(dbo, "TestConfigMissing", 7))
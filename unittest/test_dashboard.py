@@ -0,0 +1,54 @@
+
+import unittest
+import base
+
+import asm3.animal
+import asm3.cachemem
+import asm3.dashboard
+import asm3.log
+
+class TestDashboard(unittest.TestCase):
+
+    counters = [
+        ("logs", ("log",), "(SELECT COUNT(*) FROM log)"),
+        ("vaccs", ("animalvaccination",), "(SELECT COUNT(*) FROM animalvaccination)")
+    ]
+
+    def test_changed(self):
+        dbo = base.get_dbo()
+        before = asm3.dashboard._get_generations(dbo, [ "log", "animalvaccination" ])
+        asm3.dashboard.changed(dbo, "UPDATE log SET Comments='' WHERE ID=0")
+        asm3.dashboard.changed(dbo, "INSERT INTO configuration (ItemName, ItemValue) VALUES ('x', 'y')")
+        after = asm3.dashboard._get_generations(dbo, [ "log", "animalvaccination" ])
+        self.assertNotEqual(before["log"], after["log"])
+        self.assertEqual(before["animalvaccination"], after["animalvaccination"])
+
+    def test_changed_other_process(self):
+        # Without memcached each process has its own memory cache, a write
+        # in one process must still move the generation on for the others
+        dbo = base.get_dbo()
+        before = asm3.dashboard._get_generations(dbo, [ "log" ])
+        asm3.cachemem.dict_client.clear()
+        asm3.dashboard.changed(dbo, "UPDATE log SET Comments='' WHERE ID=0")
+        asm3.cachemem.dict_client.clear()
+        after = asm3.dashboard._get_generations(dbo, [ "log" ])
+        self.assertNotEqual(before["log"], after["log"])
+        self.assertEqual(after, asm3.dashboard._get_generations(dbo, [ "log" ]))
+
+    def test_get(self):
+        dbo = base.get_dbo()
+        v = asm3.dashboard.get(dbo, "test", self.counters, reconcile=True)
+        self.assertEqual(dbo.query_int("SELECT COUNT(*) FROM log"), v["LOGS"])
+        lid = asm3.log.add_log(dbo, "test", 0, 0, 1, "dashboard test")
+        v2 = asm3.dashboard.get(dbo, "test", self.counters)
+        self.assertEqual(v["LOGS"] + 1, v2["LOGS"])
+        self.assertEqual(v["VACCS"], v2["VACCS"])
+        asm3.log.delete_log(dbo, "test", lid)
+        self.assertEqual(v["LOGS"], asm3.dashboard.get(dbo, "test", self.counters)["LOGS"])
+
+    def test_main_screen(self):
+        dbo = base.get_dbo()
+        asm3.animal.update_dashboard_counters(dbo)
+        self.assertNotEqual(0, len(asm3.animal.get_alerts(dbo)))
+        self.assertTrue("ONSHELTER" in asm3.animal.get_overview(dbo))
+        self.assertTrue("ENTERED" in asm3.animal.get_stats(dbo)[0])
@@ -0,0 +1,152 @@
+
+import threading, unittest
+import base
+
+import asm3.audit
+import asm3.dbms.pool
+
+class TestDBMS(unittest.TestCase):
+
+    def test_query(self):
+        dbo = base.get_dbo()
+        self.assertNotEqual(0, dbo.query_int("SELECT COUNT(*) FROM species"))
+        self.assertNotEqual(0, len(dbo.query("SELECT * FROM species")))
+
+    def test_pool_reuse(self):
+        dbo = base.get_dbo()
+        dbo.query("SELECT * FROM species")
+        before = dbo.pool_stats()
+        for dummy in range(10):
+            dbo.query("SELECT * FROM species")
+        after = dbo.pool_stats()
+        self.assertEqual(before["creates"], after["creates"])
+        self.assertEqual(before["checkouts"] + 10, after["checkouts"])
+        self.assertEqual(0, after["inuse"])
+
+    def test_pool_one_checkin(self):
+        # Each statement must return its connection once, a second checkin
+        # could hand a connection another thread has checked out to a third
+        dbo = base.get_dbo()
+        checkins = []
+        pool_checkin = dbo.pool_checkin
+        dbo.pool_checkin = lambda c: checkins.append(c) or pool_checkin(c)
+        try:
+            before = dbo.pool_stats()
+            dbo.query("SELECT * FROM species")
+            dbo.query_tuple("SELECT * FROM species")
+            dbo.query_tuple_columns("SELECT * FROM species")
+            dbo.query_columns("SELECT * FROM species")
+            list(dbo.query_generator("SELECT * FROM species"))
+            dbo.execute("UPDATE species SET SpeciesName = SpeciesName WHERE ID = 0")
+            dbo.execute_many("UPDATE species SET SpeciesName = SpeciesName WHERE ID = ?", [ (0,) ])
+            after = dbo.pool_stats()
+        finally:
+            dbo.pool_checkin = pool_checkin
+        self.assertEqual(7, after["checkouts"] - before["checkouts"])
+        self.assertEqual(7, len(checkins))
+        self.assertEqual(0, after["inuse"])
+
+    def test_pool_wait_overflow(self):
+        dbo = base.get_dbo()
+        p = asm3.dbms.pool.ConnectionPool("test", maxsize=1, wait=0)
+        c1 = p.checkout(dbo)
+        c2 = p.checkout(dbo) # pool exhausted, overflow connection
+        self.assertIsNot(c1, c2)
+        p.checkin(c2)
+        p.checkin(c1)
+        stats = p.get_stats()
+        self.assertEqual(1, stats["overflows"])
+        self.assertEqual(1, stats["creates"])
+        self.assertEqual(1, stats["idle"])
+        p.close_all()
+
+    def test_pool_threads(self):
+        dbo = base.get_dbo()
+        p = asm3.dbms.pool.ConnectionPool("test", maxsize=2, wait=5)
+        def worker():
+            for dummy in range(5):
+                c = p.checkout(dbo)
+                s = c.cursor()
+                s.execute("SELECT COUNT(*) FROM species")
+                s.fetchall()
+                s.close()
+                p.checkin(c)
+        threads = [ threading.Thread(target=worker) for dummy in range(4) ]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        stats = p.get_stats()
+        self.assertEqual(20, stats["checkouts"])
+        self.assertTrue(stats["creates"] <= 2)
+        self.assertEqual(0, stats["overflows"])
+        p.close_all()
+
+    def test_pool_max_lifetime(self):
+        dbo = base.get_dbo()
+        p = asm3.dbms.pool.ConnectionPool("test", maxsize=2, maxlifetime=60)
+        c = p.checkout(dbo)
+        for pc in p.inuse.values(): pc.created -= 120
+        p.checkin(c)
+        self.assertEqual(0, p.get_stats()["idle"])
+        self.assertEqual(1, p.get_stats()["discards"])
+
+    def test_get_ids(self):
+        dbo = base.get_dbo()
+        ids = dbo.get_ids("log", 5)
+        self.assertEqual(5, len(ids))
+        self.assertEqual(ids[0] + 4, ids[4])
+        self.assertNotIn(dbo.get_id("log"), ids)
+
+    def test_get_id_pool(self):
+        dbo = base.get_dbo()
+        dbo.reset_ids("log")
+        first = dbo.get_id("log")
+        pk = dbo.get_id_pk("log")
+        ids = [ dbo.get_id("log") for dummy in range(10) ]
+        self.assertEqual(list(range(first + 1, first + 11)), ids)
+        # Handing out IDs from the pool does not touch the primarykey table
+        self.assertEqual(pk, dbo.get_id_pk("log"))
+        self.assertTrue(pk > ids[-1])
+        dbo.reset_ids("log")
+        self.assertTrue(dbo.get_id("log") >= pk)
+
+    def test_reset_ids_other_process(self):
+        # Another process resetting all IDs moves the shared generation on, which
+        # discards the block this process reserved before it
+        dbo = base.get_dbo()
+        first = dbo.get_id("log")
+        pk = dbo.get_id_pk("log")
+        self.assertEqual(first + 1, dbo.get_id("log"))
+        dbo._put_id_generation("another process")
+        self.assertTrue(dbo.get_id("log") >= pk)
+        dbo.reset_ids()
+        self.assertNotEqual("another process", dbo._get_id_generation())
+
+    def test_insert_update_many(self):
+        dbo = base.get_dbo()
+        rows = [ { "LogTypeID": 1, "LinkID": 1, "LinkType": 0, "Date": base.today(), "Comments": "many %d" % i } for i in range(150) ]
+        rows[3]["Comments"] = "it's different"
+        ids = dbo.insert_many("log", rows, "test")
+        self.assertEqual(150, len(ids))
+        self.assertEqual(150, dbo.query_int("SELECT COUNT(*) FROM log WHERE ID IN (%s)" % ",".join(str(x) for x in ids)))
+        self.assertEqual("it's different", dbo.query_string("SELECT Comments FROM log WHERE ID=?", [ids[3]]))
+        self.assertEqual(150, dbo.query_int("SELECT COUNT(*) FROM audittrail WHERE TableName='log' AND Action=0 AND LinkID IN (%s)" % ",".join(str(x) for x in ids)))
+        updates = [ { "ID": x, "Comments": "updated %d" % x } for x in ids ]
+        updates[0]["LogTypeID"] = 2
+        self.assertEqual(150, dbo.update_many("log", updates, "test"))
+        self.assertEqual("updated %d" % ids[5], dbo.query_string("SELECT Comments FROM log WHERE ID=?", [ids[5]]))
+        self.assertEqual(2, dbo.query_int("SELECT LogTypeID FROM log WHERE ID=?", [ids[0]]))
+        self.assertEqual(150, dbo.query_int("SELECT COUNT(*) FROM audittrail WHERE TableName='log' AND Action=1 AND LinkID IN (%s)" % ",".join(str(x) for x in ids)))
+        dbo.delete("log", "ID IN (%s)" % ",".join(str(x) for x in ids))
+
+    def test_update_audit(self):
+        dbo = base.get_dbo()
+        lid = dbo.insert("log", { "LogTypeID": 1, "LinkID": 1, "LinkType": 0, "Date": base.today(), "Comments": "before" }, "test")
+        with asm3.audit.batch():
+            dbo.update("log", lid, { "LogTypeID": 1, "Date": base.today(), "Comments": "it's after" }, "test")
+            # Nothing is written until the batch ends
+            self.assertEqual(0, dbo.query_int("SELECT COUNT(*) FROM audittrail WHERE TableName='log' AND Action=1 AND LinkID=?", [lid]))
+        desc = dbo.query_string("SELECT Description FROM audittrail WHERE TableName='log' AND Action=1 AND LinkID=?", [lid])
+        self.assertIn("COMMENTS: before ==&gt; it's after", desc)
+        self.assertNotIn("LOGTYPEID", desc)
+        self.assertNotIn("DATE: ", desc.replace("LASTCHANGEDDATE: ", ""))
+        dbo.delete("log", lid)
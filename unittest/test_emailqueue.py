@@ -0,0 +1,124 @@
+
+import unittest
+import base
+
+import asm3.configuration
+import asm3.emailqueue
+import asm3.utils
+
+import socketserver
+import threading
+import time
+
+class DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+    """ Minimal SMTP server that accepts everything except recipients with reject in the address """
+    def reply(self, s):
+        self.wfile.write(("%s\r\n" % s).encode("ascii"))
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost debugging server")
+        while True:
+            line = self.rfile.readline().decode("ascii", "replace").strip()
+            cmd = line[:4].upper()
+            if line == "" or cmd == "QUIT":
+                self.reply("221 bye")
+                return
+            elif cmd == "RCPT" and line.find("reject") != -1:
+                self.reply("550 no such user")
+            elif cmd == "DATA":
+                self.reply("354 go ahead")
+                data = []
+                while True:
+                    l = self.rfile.readline()
+                    if l in (b".\r\n", b""): break
+                    data.append(l)
+                self.server.messages.append(b"".join(data))
+                self.reply("250 ok")
+            else:
+                self.reply("250 ok")
+
+class TestEmailQueue(unittest.TestCase):
+
+    def setUp(self):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), DebuggingSMTPHandler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.messages = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        dbo = base.get_dbo()
+        asm3.configuration.cset(dbo, "SMTPOverride", "Yes")
+        asm3.configuration.cset(dbo, "SMTPServer", "127.0.0.1")
+        asm3.configuration.cset(dbo, "SMTPPort", str(self.server.server_address[1]))
+        asm3.configuration.cset(dbo, "SMTPUsername", "")
+        asm3.configuration.cset(dbo, "SMTPPassword", "")
+        asm3.configuration.cset(dbo, "SMTPUseTLS", "No")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        dbo = base.get_dbo()
+        asm3.configuration.cset(dbo, "SMTPOverride", "No")
+        dbo.execute("DELETE FROM emailqueue")
+
+    def messages(self, *addresses):
+        return [ { "replyadd": "test@example.com", "toadd": a, "subject": "Test", "body": "Hello <b>%s</b>" % a, "contenttype": "html" } for a in addresses ]
+
+    def test_process(self):
+        dbo = base.get_dbo()
+        batchref = asm3.emailqueue.queue(dbo, self.messages("a@example.com", "b@example.com", "c@example.com"), startworker=False)
+        self.assertEqual(3, asm3.emailqueue.get_progress(dbo, batchref)["QUEUED"])
+        sender = asm3.utils.SMTPSender(dbo)
+        self.assertEqual(3, asm3.emailqueue.process(dbo, [ sender ]))
+        sender.close()
+        self.assertEqual(3, len(self.server.messages))
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual({ "TOTAL": 3, "QUEUED": 0, "SENT": 3, "FAILED": 0 }, asm3.emailqueue.get_progress(dbo, batchref))
+        self.assertEqual(0, asm3.emailqueue.process(dbo))
+
+    def test_reject(self):
+        dbo = base.get_dbo()
+        batchref = asm3.emailqueue.queue(dbo, self.messages("a@example.com", "reject@example.com"), startworker=False)
+        asm3.emailqueue.process(dbo)
+        self.assertEqual({ "TOTAL": 2, "QUEUED": 0, "SENT": 1, "FAILED": 1 }, asm3.emailqueue.get_progress(dbo, batchref))
+        failures = asm3.emailqueue.get_failures(dbo, batchref)
+        self.assertEqual("reject@example.com", failures[0].TOADDRESS)
+        self.assertIn("no such user", failures[0].LASTERROR)
+
+    def test_retry(self):
+        dbo = base.get_dbo()
+        self.server.shutdown()
+        self.server.server_close()
+        batchref = asm3.emailqueue.queue(dbo, self.messages("a@example.com"), startworker=False)
+        self.assertEqual(1, asm3.emailqueue.process(dbo))
+        r = dbo.first_row(dbo.query("SELECT * FROM emailqueue WHERE BatchRef=?", [batchref]))
+        self.assertEqual(asm3.emailqueue.QUEUED, r.STATUS)
+        self.assertEqual(1, r.ATTEMPTS)
+        self.assertTrue(r.NEXTATTEMPTDATE > dbo.now())
+        self.assertEqual(0, asm3.emailqueue.process(dbo))
+
+    def test_worker(self):
+        dbo = base.get_dbo()
+        batchref = asm3.emailqueue.queue(dbo, self.messages(*[ "%d@example.com" % i for i in range(10) ]))
+        for i in range(100):
+            if asm3.emailqueue.get_progress(dbo, batchref)["QUEUED"] == 0: break
+            time.sleep(0.1)
+        self.assertEqual(10, asm3.emailqueue.get_progress(dbo, batchref)["SENT"])
+        self.assertEqual(10, len(self.server.messages))
+
+    def test_claim(self):
+        dbo = base.get_dbo()
+        asm3.emailqueue.queue(dbo, self.messages("a@example.com", "b@example.com"), startworker=False)
+        # Another worker has claimed the messages, there is nothing left for this one to send
+        claimed = asm3.emailqueue.claim(dbo)
+        self.assertEqual(2, len(claimed))
+        self.assertEqual(0, len(asm3.emailqueue.claim(dbo)))
+        self.assertEqual(0, asm3.emailqueue.process(dbo))
+        self.assertEqual(0, len(self.server.messages))
+        # Until its claim goes stale
+        self.assertEqual(0, asm3.emailqueue.release_stale(dbo))
+        dbo.execute("UPDATE emailqueue SET ClaimedDate=?", [ dbo.today(offset=-1) ])
+        self.assertEqual(2, asm3.emailqueue.release_stale(dbo))
+        self.assertEqual(2, asm3.emailqueue.process(dbo))
+        self.assertEqual(2, len(self.server.messages))
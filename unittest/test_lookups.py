@@ -2,8 +2,11 @@
 import unittest
 import base
 
+import asm3.cachemem
 import asm3.lookups
 
+import time
+
 class TestLookups(unittest.TestCase):
  
     def test_message_crud(self):
@@ -21,6 +24,35 @@ class TestLookups(unittest.TestCase):
         nid = asm3.lookups.insert_lookup(base.get_dbo(), "test", "vaccinationtype", "Test")
         asm3.lookups.update_lookup(base.get_dbo(), "test", nid, "vaccinationtype", "Test")
         asm3.lookups.delete_lookup(base.get_dbo(), "test", "vaccinationtype", nid)
+
+    def test_lookup_cache(self):
+        dbo = base.get_dbo()
+        nid = asm3.lookups.insert_lookup(dbo, "test", "species", "Cachetest")
+        self.assertTrue(nid in [ x.ID for x in asm3.lookups.get_species(dbo) ])
+        # rows handed out are copies, changing them should not affect the cache
+        asm3.lookups.get_species(dbo)[0].SPECIESNAME = "Changed"
+        self.assertNotEqual("Changed", asm3.lookups.get_species(dbo)[0].SPECIESNAME)
+        asm3.lookups.update_lookup(dbo, "test", nid, "species", "Cachetest2")
+        self.assertTrue("Cachetest2" in [ x.SPECIESNAME for x in asm3.lookups.get_species(dbo) ])
+        asm3.lookups.delete_lookup(dbo, "test", "species", nid)
+        self.assertFalse(nid in [ x.ID for x in asm3.lookups.get_species(dbo) ])
+
+    def test_lookup_cache_other_process(self):
+        # Without memcached each process has its own memory cache, an edit
+        # made by another process is seen through the stamp in the disk cache
+        dbo = base.get_dbo()
+        asm3.lookups.get_species(dbo)
+        entry = asm3.lookups.lookupcache[dbo.name()]
+        key = "%s_lookup_generation" % dbo.name()
+        generation = asm3.cachemem.get(key)
+        time.sleep(0.05)
+        nid = asm3.lookups.insert_lookup(dbo, "test", "species", "Cachetest")
+        # Put this process back how it was before the edit, apart from the time it last checked
+        asm3.cachemem.put(key, generation, 86400)
+        entry[2] = 0
+        asm3.lookups.lookupcache[dbo.name()] = entry
+        self.assertTrue(nid in [ x.ID for x in asm3.lookups.get_species(dbo) ])
+        asm3.lookups.delete_lookup(dbo, "test", "species", nid)
              
     def test_get(self):
         self.assertNotEqual(0, len(asm3.lookups.get_account_types(base.get_dbo())))
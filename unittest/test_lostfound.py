@@ -2,9 +2,12 @@
 import unittest
 import base
 
-import asm3.animal, asm3.lostfound, asm3.waitinglist
+import asm3.animal, asm3.configuration, asm3.lostfound, asm3.waitinglist
 import asm3.utils
 
+from asm3.dbms.base import ResultRow
+from asm3.i18n import add_days
+
 class TestLostFound(unittest.TestCase):
    
     laid = 0
@@ -91,3 +94,55 @@ class TestLostFound(unittest.TestCase):
         aid = asm3.lostfound.create_waitinglist_from_found(base.get_dbo(), "test", self.faid)
         asm3.waitinglist.delete_waitinglist(base.get_dbo(), "test", aid)
 
+
+    def test_match(self):
+        m = asm3.lostfound.match(base.get_dbo(), lostanimalid=self.laid)
+        self.assertIn(self.faid, [ x.fid for x in m ])
+
+    def test_match_animals(self):
+        dbo = base.get_dbo()
+        d = base.today()
+        names = { "OWNERNAME": "", "HOMETELEPHONE": "", "SEXNAME": "", "SPECIESNAME": "", "BREEDNAME": "", "BASECOLOURNAME": "" }
+        def lostfound(iid, species, date, **kw):
+            r = ResultRow({ "ID": iid, "ANIMALTYPEID": species, "BREEDID": 1, "AGEGROUP": "Adult", "SEX": 1, "AREAPOSTCODE": "PC1", 
+                "BASECOLOURID": 1, "MICROCHIPNUMBER": "900", "DATELOST": date, "DATEFOUND": date, "AREALOST": "1 High Street", 
+                "AREAFOUND": "1 High Street", "DISTFEAT": "white patch", **names })
+            r.update(kw)
+            return r
+        lost = [ lostfound(1, 1, d) ]
+        found = [ lostfound(11, 1, d), lostfound(12, 2, d),
+            lostfound(13, 1, add_days(d, 100), BREEDID=2, AGEGROUP="Baby", SEX=0, AREAPOSTCODE="PC2", BASECOLOURID=2, 
+                MICROCHIPNUMBER="", AREAFOUND="Elsewhere", DISTFEAT="") ]
+        shelter = [ ResultRow({ "ID": 21, "CODE": "A21", "ANIMALNAME": "A", "SPECIESID": 1, "BREEDID": 2, "BREED2ID": 1, "AGEGROUP": "Adult", 
+            "SEX": 1, "BASECOLOURID": 1, "IDENTICHIPNUMBER": "", "DATEBROUGHTIN": d, "MARKINGS": "white patch", "ISPICKUP": 1, 
+            "PICKUPADDRESS": "1 High Street", "BROUGHTINBYOWNERADDRESS": None, "BROUGHTINBYOWNERPOSTCODE": None, 
+            "ORIGINALOWNERADDRESS": None, "ORIGINALOWNERPOSTCODE": None, **names }) ]
+        c = asm3.configuration
+        pts = { "species": c.match_species(dbo), "breed": c.match_breed(dbo), "age": c.match_age(dbo), "sex": c.match_sex(dbo),
+            "area": c.match_area_lost(dbo), "features": c.match_features(dbo), "postcode": c.match_postcode(dbo), 
+            "colour": c.match_colour(dbo), "microchip": c.match_microchip(dbo), "date": c.match_within2weeks(dbo) }
+        def pct(points):
+            return int((float(points) / float(sum(pts.values()))) * 100.0)
+        floor = c.match_point_floor(dbo)
+        try:
+            # A different species never matches, the rest match at the points for the criteria they share
+            c.cset(dbo, "MatchPointFloor", "0")
+            m = [ (x.lid, x.fid, x.fanimalid, x.matchpoints) for x in asm3.lostfound.match_animals(dbo, lost, found, shelter) ]
+            self.assertEqual([ (1, 11, 0, 100), (1, 13, 0, pct(pts["species"])), 
+                (1, 0, 21, pct(sum(pts.values()) - pts["microchip"] - pts["postcode"])) ], m)
+            # Pairs below the floor are dropped
+            c.cset(dbo, "MatchPointFloor", str(pts["species"] + 1))
+            m = [ (x.lid, x.fid, x.fanimalid) for x in asm3.lostfound.match_animals(dbo, lost, found, shelter) ]
+            self.assertEqual([ (1, 11, 0), (1, 0, 21) ], m)
+            # As before, the limit is checked after adding each found or shelter animal match
+            m = [ (x.lid, x.fid, x.fanimalid) for x in asm3.lostfound.match_animals(dbo, lost, found, shelter, limit=1) ]
+            self.assertEqual([ (1, 11, 0), (1, 0, 21) ], m)
+        finally:
+            c.cset(dbo, "MatchPointFloor", str(floor))
+
+    def test_words(self):
+        self.assertEqual([ "black", "white", "cat" ], asm3.lostfound.word_list("Black,White\nCat"))
+        self.assertEqual(5, asm3.lostfound.words("Cat", "black cat", 5))
+        self.assertEqual(2, asm3.lostfound.words("black cat", "Cat", 5))
+        self.assertEqual(0, asm3.lostfound.words("black cat", "dog", 5))
+        self.assertEqual(0, asm3.lostfound.words(None, "dog", 5))
@@ -2,7 +2,7 @@
 import unittest
 import base, base64
 
-import asm3.animal, asm3.media
+import asm3.animal, asm3.derivatives, asm3.media
 import asm3.utils
 
 class TestMedia(unittest.TestCase):
@@ -24,6 +24,32 @@ class TestMedia(unittest.TestCase):
         asm3.media.attach_file_from_form(base.get_dbo(), "test", asm3.media.ANIMAL, nid, asm3.media.MEDIASOURCE_ATTACHFILE, post)
         asm3.animal.delete_animal(base.get_dbo(), "test", nid)
  
+    def test_image_derivative(self):
+        dbo = base.get_dbo()
+        with open(base.PATH + "../src/media/reports/nopic.jpg", "rb") as f:
+            data = f.read()
+        dbfsid = asm3.dbfs.put_string(dbo, "derivative.jpg", "/animal/0", data)
+        date = dbo.now()
+        scaled = asm3.media.get_image_derivative(dbo, dbfsid, date, "50x50")
+        self.assertEqual(scaled, asm3.derivatives.get(dbo.name(), dbfsid, "50x50", date))
+        # A new media date means the stored rendition is out of date
+        self.assertIsNone(asm3.derivatives.get(dbo.name(), dbfsid, "50x50", asm3.i18n.add_days(date, 1)))
+        asm3.derivatives.delete(dbo.name(), dbfsid)
+        self.assertIsNone(asm3.derivatives.get(dbo.name(), dbfsid, "50x50", date))
+        asm3.dbfs.delete_id(dbo, dbfsid)
+
+    def test_delete_media_derivatives(self):
+        dbo = base.get_dbo()
+        with open(base.PATH + "../src/media/reports/nopic.jpg", "rb") as f:
+            data = f.read()
+        post = asm3.utils.PostedData({ "filename": "image.jpg", "filetype": "image/jpeg", "filedata": "data:image/jpeg;base64,%s" % asm3.utils.base64encode(data) }, "en")
+        mid = asm3.media.attach_file_from_form(dbo, "test", asm3.media.ANIMAL, 1, asm3.media.MEDIASOURCE_ATTACHFILE, post)
+        m = asm3.media.get_media_by_id(dbo, mid)
+        asm3.media.get_image_derivative(dbo, m.DBFSID, m.DATE, "50x50")
+        self.assertIsNotNone(asm3.derivatives.get(dbo.name(), m.DBFSID, "50x50", m.DATE))
+        asm3.media.delete_media(dbo, "test", mid)
+        self.assertIsNone(asm3.derivatives.get(dbo.name(), m.DBFSID, "50x50", m.DATE))
+
     def test_remove_expired_media(self):
         asm3.media.remove_expired_media(base.get_dbo(), years=1)
 
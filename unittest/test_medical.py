@@ -2,9 +2,11 @@
 import unittest
 import base
 
-import asm3.animal, asm3.medical
+import asm3.animal, asm3.i18n, asm3.medical
 import asm3.utils
 
+from datetime import datetime
+
 class TestMedical(unittest.TestCase):
 
     def test_calendar_event_calls(self):
@@ -102,6 +104,42 @@ class TestMedical(unittest.TestCase):
         asm3.medical.delete_regimen(base.get_dbo(), "test", mid)
         asm3.animal.delete_animal(base.get_dbo(), "test", aid)
 
+    def test_update_treatments_given(self):
+        dbo = base.get_dbo()
+        data = {
+            "startdate": base.today_display(),
+            "treatmentname": "Test",
+            "dosage": "Test",
+            "timingrule": "1",
+            "timingrulenofrequencies": "1",
+            "timingrulefrequency": str(asm3.medical.DAILY),
+            "totalnumberoftreatments": "2",
+            "treatmentrule": str(asm3.medical.FIXED_LENGTH),
+            "singlemulti": "1"
+        }
+        post = asm3.utils.PostedData(data, "en")
+        mids = asm3.medical.insert_regimens_from_form(dbo, "test", post, [1, 1])
+        self.assertEqual(2, len(mids))
+        inclause = ",".join(str(x) for x in mids)
+        def outstanding():
+            return dbo.query_list("SELECT ID FROM animalmedicaltreatment WHERE AnimalMedicalID IN (%s) AND DateGiven Is Null" % inclause)
+        # The first treatment for each is created, giving them creates the second the next day
+        self.assertEqual(2, len(outstanding()))
+        asm3.medical.update_treatments_given(dbo, "test", outstanding(), base.today())
+        amt = dbo.query("SELECT * FROM animalmedicaltreatment WHERE AnimalMedicalID IN (%s) AND DateGiven Is Null" % inclause)
+        self.assertEqual(2, len(amt))
+        for t in amt:
+            self.assertEqual(asm3.i18n.add_days(base.today(), 1), t.DATEREQUIRED)
+        # Giving the second completes them
+        asm3.medical.update_treatments_given(dbo, "test", outstanding(), base.today())
+        for am in dbo.query("SELECT * FROM animalmedical WHERE ID IN (%s)" % inclause):
+            self.assertEqual(asm3.medical.COMPLETED, am.STATUS)
+            self.assertEqual(2, am.TREATMENTSGIVEN)
+            self.assertEqual(0, am.TREATMENTSREMAINING)
+        self.assertEqual(0, len(outstanding()))
+        for mid in mids:
+            asm3.medical.delete_regimen(dbo, "test", mid)
+
     def test_vaccination_crud(self):
         data = {
             "animalname": "Testio",
@@ -163,3 +201,47 @@ class TestMedical(unittest.TestCase):
         asm3.medical.update_profile_from_form(base.get_dbo(), "test", post)
         asm3.medical.delete_profile(base.get_dbo(), "test", mid)
 
+    def test_update_treatments_given_regimens(self):
+        dbo = base.get_dbo()
+        regimens = [
+            # Fixed length, twice a day for 3 days
+            { "timingrule": "2", "timingrulefrequency": str(asm3.medical.DAILY), "timingrulenofrequencies": "1", "totalnumberoftreatments": "3",
+                "treatmentrule": "0", "singlemulti": "1", "costpertreatment": "150" },
+            # Unspecified length, every 2 weeks
+            { "timingrule": "1", "timingrulefrequency": str(asm3.medical.WEEKLY), "timingrulenofrequencies": "2", "totalnumberoftreatments": "1",
+                "treatmentrule": "1", "singlemulti": "1" },
+            # One-off
+            { "timingrule": "1", "timingrulefrequency": "0", "timingrulenofrequencies": "0", "totalnumberoftreatments": "1",
+                "treatmentrule": "0", "singlemulti": "0", "cost": "500" },
+            # Fixed length, every weekday for 4 days
+            { "timingrule": "1", "timingrulefrequency": str(asm3.medical.WEEKDAILY), "timingrulenofrequencies": "1", "totalnumberoftreatments": "4",
+                "treatmentrule": "0", "singlemulti": "1" }
+        ]
+        mids = []
+        for spec in regimens:
+            data = { "startdate": "01/06/2021", "treatmentname": "Test", "dosage": "1" }
+            data.update(spec)
+            mids += asm3.medical.insert_regimens_from_form(dbo, "test", asm3.utils.PostedData(data, "en"), [1])
+        inclause = ",".join(str(x) for x in mids)
+        for d in ( "2021-06-01", "2021-06-08", "2021-06-15" ):
+            amtids = dbo.query_list("SELECT ID FROM animalmedicaltreatment WHERE AnimalMedicalID IN (%s) AND DateGiven Is Null ORDER BY ID" % inclause)
+            asm3.medical.update_treatments_given(dbo, "test", amtids, datetime.strptime(d, "%Y-%m-%d"))
+        # The same regimens and treatments as updating each treatment and its regimen one at a time
+        expected = [
+            (asm3.medical.COMPLETED, 6, 0, 900, [ ("2021-01-06", "2021-06-01", 1, 2), ("2021-01-06", "2021-06-01", 2, 2), ("2021-06-02", "2021-06-08", 1, 2),
+                ("2021-06-02", "2021-06-08", 2, 2), ("2021-06-09", "2021-06-15", 1, 2), ("2021-06-09", "2021-06-15", 2, 2) ]),
+            (asm3.medical.ACTIVE, 3, -3, 0, [ ("2021-01-06", "2021-06-01", 1, 1), ("2021-06-15", "2021-06-08", 1, 1), ("2021-06-22", "2021-06-15", 1, 1),
+                ("2021-06-29", None, 1, 1) ]),
+            (asm3.medical.COMPLETED, 1, -1, 500, [ ("2021-01-06", "2021-06-01", 1, 1) ]),
+            (asm3.medical.ACTIVE, 3, 1, 0, [ ("2021-01-06", "2021-06-01", 1, 1), ("2021-06-02", "2021-06-08", 1, 1), ("2021-06-09", "2021-06-15", 1, 1),
+                ("2021-06-16", None, 1, 1) ])
+        ]
+        def ymd(d):
+            return d and d.strftime("%Y-%m-%d")
+        for mid, e in zip(mids, expected):
+            am = dbo.first_row(dbo.query("SELECT * FROM animalmedical WHERE ID=?", [mid]))
+            amt = dbo.query("SELECT * FROM animalmedicaltreatment WHERE AnimalMedicalID=? ORDER BY ID", [mid])
+            self.assertEqual(e, (am.STATUS, am.TREATMENTSGIVEN, am.TREATMENTSREMAINING, am.COST, 
+                [ (ymd(t.DATEREQUIRED), ymd(t.DATEGIVEN), t.TREATMENTNUMBER, t.TOTALTREATMENTS) for t in amt ]))
+        for mid in mids:
+            asm3.medical.delete_regimen(dbo, "test", mid)
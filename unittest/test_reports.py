@@ -1,11 +1,14 @@
 
 import unittest
 import base
+import glob, re
 import web062 as web
 
 import asm3.reports
 import asm3.utils
 
+from asm3.dbms.base import ResultRow
+
 TEST_QUERY = "SELECT * FROM lksmovementtype"
 
 class TestReports(unittest.TestCase):
@@ -55,7 +58,53 @@ class TestReports(unittest.TestCase):
     def test_execute(self):
         asm3.reports.execute(base.get_dbo(), self.nid)
 
+    def test_execute_query_generator(self):
+        rows, cols = asm3.reports.execute_query(base.get_dbo(), self.nid)
+        self.assertEqual(rows, list(asm3.reports.execute_query_generator(base.get_dbo(), self.nid, batchsize=3)))
+
     def test_smcom_reports(self):
         asm3.reports.install_recommended_smcom_reports(base.get_dbo(), "test") # Calls get_reports to do the install
 
     
+
+    def test_render_fields(self):
+        r = asm3.reports.Report(base.get_dbo())
+        row = ResultRow()
+        row.ID = 1
+        row.ANIMALNAME = "Fido {x} $y"
+        row.NAME = "n"
+        for block in [ "<p>$ID $AnimalName, $animalname.</p> $NAMEX $ID", "$$ID $ID$NAME", "$ID" ]:
+            expected = block
+            for k, v in row.items():
+                expected = r._ReplaceFields(expected, k, r._DisplayValue(k, v))
+            self.assertEqual(expected, r._RenderFields(block, row))
+        self.assertEqual("<p>1 Fido &#123;x&#125; &#36;y</p>", r._RenderFields("<p>$ID $ANIMALNAME</p>", row))
+
+    def test_render_fields_shipped_reports(self):
+        # The body of every shipped report renders the same as replacing each field in turn
+        r = asm3.reports.Report(base.get_dbo())
+        for fname in glob.glob(base.PATH + "../reports/*.rep"):
+            with open(fname, "r") as f:
+                for rp in f.read().split("&&&"):
+                    b = rp.split("###")
+                    if len(b) < 7 or b[6].find("$$BODY") == -1: continue
+                    body = b[6][b[6].find("$$BODY")+6:b[6].find("BODY$$")]
+                    row = ResultRow()
+                    for i, t in enumerate(re.findall(r"\$([A-Za-z0-9_]+)", body)):
+                        row[t.upper()] = "v%d" % i
+                    expected = body
+                    for k, v in row.items():
+                        expected = r._ReplaceFields(expected, k, r._DisplayValue(k, v))
+                    self.assertEqual(expected, r._RenderFields(body, row), b[0].strip())
+
+    def test_group_aggregates(self):
+        sql = "SELECT ID, CASE WHEN ID < 5 THEN 'a' ELSE 'b' END AS Grp FROM lksmovementtype ORDER BY Grp, ID"
+        html = "$$HEADER HEADER$$ " \
+            "$$GROUP_Grp $$HEAD <h>$GRP {COUNT.ID}</h> $$FOOT <f>$GRP {SUM.ID.0} {MIN.ID} {MAX.ID} {AVG.ID.1}</f> GROUP$$ " \
+            "$$BODY BODY$$ $$FOOTER <t>{COUNT.ID} {SUM.ID.0} {PCT.Grp.a.0}</t> FOOTER$$"
+        s = asm3.reports.execute_sql(base.get_dbo(), "Test", sql, html, headerfooter=False)
+        self.assertIn("<h>a 5</h>", s)
+        self.assertIn("<f>a 10 0 4 2.0</f>", s)
+        self.assertIn("<h>b 9</h>", s)
+        self.assertIn("<f>b 81 5 13 9.0</f>", s)
+        self.assertIn("<t>14 91 36</t>", s)
@@ -0,0 +1,102 @@
+
+import unittest
+import base
+
+import asm3.animal
+import asm3.person
+import asm3.searchindex
+import asm3.utils
+
+class TestSearchIndex(unittest.TestCase):
+
+    nid = 0
+
+    def setUp(self):
+        data = {
+            "animalname": "Searchindexio",
+            "estimatedage": "1",
+            "animaltype": "1",
+            "entryreason": "1",
+            "species": "1"
+        }
+        post = asm3.utils.PostedData(data, "en")
+        self.nid, self.code = asm3.animal.insert_animal_from_form(base.get_dbo(), post, "test")
+
+    def tearDown(self):
+        asm3.animal.delete_animal(base.get_dbo(), "test", self.nid)
+
+    def find(self, dbo, q):
+        clause, values = asm3.searchindex.clause("animal", "a.ID", q)
+        return dbo.query_list("SELECT a.ID FROM animal a WHERE %s" % clause, values)
+
+    def test_get_tokens(self):
+        self.assertEqual(["bob"], asm3.searchindex.get_tokens("OWNERNAME", "Bob"))
+        self.assertEqual(["brien", "ien", "o", "rien"], sorted(asm3.searchindex.get_tokens("OWNERNAME", "O'Brien")))
+        phone = asm3.searchindex.get_tokens("HOMETELEPHONE", "01234 567890")
+        self.assertIn("#01234567890", phone)
+        self.assertIn("#567890", phone)
+        self.assertNotIn("#67890", phone)
+        self.assertEqual([], asm3.searchindex.get_tokens("HOMETELEPHONE", None))
+
+    def test_phone(self):
+        dbo = base.get_dbo()
+        post = asm3.utils.PostedData({ "surname": "Phoneindexio", "ownertype": "1", "hometelephone": "(555) 012-3456" }, "en")
+        oid = asm3.person.insert_person_from_form(dbo, post, "test", geocode=False)
+        try:
+            def find(q):
+                clause, values = asm3.searchindex.clause("owner", "o.ID", q)
+                return dbo.query_list("SELECT o.ID FROM owner o WHERE %s" % clause, values)
+            self.assertIn(oid, find("5550123456"))
+            self.assertIn(oid, find("0123456"))
+            self.assertIn(oid, find("phoneindexio"))
+            self.assertNotIn(oid, find("555"))
+            self.assertNotIn(oid, find("23456"))
+        finally:
+            asm3.person.delete_person(dbo, "test", oid)
+
+    def test_refresh(self):
+        dbo = base.get_dbo()
+        self.assertIn(self.nid, self.find(dbo, "searchindex"))
+        self.assertIn(self.nid, self.find(dbo, "INDEXIO"))
+        self.assertNotIn(self.nid, self.find(dbo, "searchindex other"))
+        dbo.update("animal", self.nid, { "AnimalName": "Indexed Searchio" }, "test")
+        self.assertNotIn(self.nid, self.find(dbo, "searchindexio"))
+        self.assertIn(self.nid, self.find(dbo, "searchio indexed"))
+        dbo.delete("animal", self.nid, "test")
+        self.assertEqual(0, dbo.query_int("SELECT COUNT(*) FROM searchindex WHERE SubjectTable='animal' AND LinkID=?", [self.nid]))
+
+    def test_batch(self):
+        dbo = base.get_dbo()
+        with asm3.searchindex.batch():
+            dbo.update("animal", self.nid, { "AnimalName": "Batchindexio" }, "test")
+            self.assertNotIn(self.nid, self.find(dbo, "batchindexio"))
+        self.assertIn(self.nid, self.find(dbo, "batchindexio"))
+
+    def test_get_subjects(self):
+        dbo = base.get_dbo()
+        self.assertIn(("owner", 5), asm3.searchindex.get_subjects(dbo, "owner", "ID=5"))
+        self.assertEqual([], asm3.searchindex.get_subjects(dbo, "log", "ID=5"))
+        self.assertEqual([ ("owner", 5) ], asm3.searchindex.get_subjects(dbo, "owner", "ID=5", [ "OwnerAddress" ]))
+
+    def test_dependents(self):
+        dbo = base.get_dbo()
+        lid = dbo.insert("internallocation", { "LocationName": "Kennelindexio" })
+        try:
+            dbo.update("animal", self.nid, { "ShelterLocation": lid }, "test")
+            self.assertIn(self.nid, self.find(dbo, "kennelindexio"))
+            dbo.update("internallocation", lid, { "LocationName": "Cattery Renamedio" })
+            self.assertNotIn(self.nid, self.find(dbo, "kennelindexio"))
+            self.assertIn(self.nid, self.find(dbo, "renamedio"))
+        finally:
+            dbo.update("animal", self.nid, { "ShelterLocation": 1 }, "test")
+            dbo.delete("internallocation", lid)
+        self.assertEqual([ ("animal", 5) ], asm3.searchindex.get_additional_subjects(0, 5))
+
+    def test_rebuild(self):
+        dbo = base.get_dbo()
+        dbo.execute("DELETE FROM searchindex WHERE SubjectTable='animal' AND LinkID=?", [self.nid])
+        dbo.insert("searchindex", { "SubjectTable": "animal", "LinkID": 999999, "Token": "orphanio" }, generateID=False, writeAudit=False)
+        asm3.searchindex.rebuild(dbo)
+        self.assertEqual([], self.find(dbo, "orphanio"))
+        self.assertIn(self.nid, self.find(dbo, "searchindexio"))
+        self.assertEqual(1, len(asm3.animal.get_animal_find_simple(dbo, "searchindexio")))
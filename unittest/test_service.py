@@ -15,6 +15,18 @@ class TestService(unittest.TestCase):
         s = asm3.service.safe_cache_key("animal_image", "?animalid=52&cache=bust")
         self.assertEqual(-1, s.find("cache"))
 
+    def test_method_output_generator(self):
+        dbo = base.get_dbo()
+        sql = "SELECT * FROM lksmovementtype ORDER BY ID"
+        for method in ( "csv_report", "json_report" ):
+            expected = asm3.service.method_output(method, "en", dbo.query(sql))
+            if isinstance(expected, str): expected = expected.encode("utf-8")
+            chunks = list(asm3.service.method_output_generator(method, "en", dbo.query_generator(sql, batchsize=4), 4))
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual(expected, b"".join(chunks))
+            empty = asm3.service.method_output_generator(method, "en", dbo.query_generator(sql + " LIMIT 0"), 4)
+            self.assertEqual(asm3.service.method_output(method, "en", []).encode("utf-8"), b"".join(empty))
+
     def test_sign_document_page(self):
         self.assertNotEqual(0, len(asm3.service.sign_document_page(base.get_dbo(), 0, "test@example.com")))
 
@@ -0,0 +1,62 @@
+
+import unittest
+import base
+
+import asm3.animal
+import asm3.timeline
+import asm3.utils
+
+class TestTimeline(unittest.TestCase):
+
+    nid = 0
+
+    def setUp(self):
+        data = {
+            "animalname": "Timelineio",
+            "estimatedage": "1",
+            "animaltype": "1",
+            "entryreason": "1",
+            "species": "1"
+        }
+        post = asm3.utils.PostedData(data, "en")
+        self.nid, self.code = asm3.animal.insert_animal_from_form(base.get_dbo(), post, "test")
+
+    def tearDown(self):
+        asm3.animal.delete_animal(base.get_dbo(), "test", self.nid)
+
+    def events(self, dbo):
+        return dbo.query("SELECT * FROM timeline WHERE SubjectTable='animal' AND LinkID=?", [self.nid])
+
+    def test_refresh(self):
+        dbo = base.get_dbo()
+        self.assertTrue("ENTERED" in [ x.CATEGORY for x in self.events(dbo) ])
+        dbo.update("animal", self.nid, { "AnimalName": "Timelineio2" }, "test")
+        self.assertEqual("Timelineio2", [ x for x in self.events(dbo) if x.CATEGORY == "ENTERED" ][0].TEXT2)
+        dbo.delete("animal", self.nid, "test")
+        self.assertEqual(0, len(self.events(dbo)))
+
+    def test_get_subjects(self):
+        dbo = base.get_dbo()
+        self.assertEqual([ ("animal", 5) ], asm3.timeline.get_subjects(dbo, "animal", "ID=5"))
+        self.assertEqual([], asm3.timeline.get_subjects(dbo, "owner", "ID=5", [ "OwnerTitle" ]))
+        self.assertEqual([], asm3.timeline.get_subjects(dbo, "lksex", "ID=1"))
+
+    def test_refresh_dependents(self):
+        dbo = base.get_dbo()
+        dbo.update("animal", self.nid, { "DeceasedDate": dbo.today(), "PTSReasonID": 1 }, "test")
+        name = dbo.query_string("SELECT ReasonName FROM deathreason WHERE ID=1")
+        try:
+            self.assertTrue(("animal", self.nid) in asm3.timeline.get_subjects(dbo, "deathreason", "ID=1", [ "ReasonName" ]))
+            dbo.update("deathreason", 1, { "ReasonName": "Timelineio reason" })
+            self.assertTrue("Timelineio reason" in [ x.TEXT3 for x in self.events(dbo) ])
+        finally:
+            dbo.update("deathreason", 1, { "ReasonName": name })
+
+    def test_rebuild(self):
+        dbo = base.get_dbo()
+        dbo.execute("DELETE FROM timeline WHERE SubjectTable='animal' AND LinkID=?", [self.nid])
+        dbo.execute("INSERT INTO timeline (SubjectTable, LinkID, LinkTarget, Category, EventDate) VALUES ('animal', 999999, 'animal', 'ENTERED', ?)", [dbo.today()])
+        asm3.timeline.rebuild(dbo)
+        self.assertTrue("ENTERED" in [ x.CATEGORY for x in self.events(dbo) ])
+        self.assertEqual(0, dbo.query_int("SELECT COUNT(*) FROM timeline WHERE SubjectTable='animal' AND LinkID=999999"))
+        self.assertNotEqual(0, len(asm3.timeline.get_events(dbo, 10)))
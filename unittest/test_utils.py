@@ -2,6 +2,7 @@
 import datetime, unittest
 import base
 
+import asm3.asynctask
 import asm3.utils
 
 class TestUtils(unittest.TestCase):
@@ -23,6 +24,18 @@ class TestUtils(unittest.TestCase):
         rows = [ { "OWNERNAME": "test", "OWNERADDRESS": "test", "OWNERCOUNTY": "test", "OWNERTOWN": "test", "OWNERPOSTCODE": "test" } ]
         asm3.utils.generate_label_pdf(base.get_dbo(), "en", rows, "A4", "cm", 10, 1.0, 1.0, 5.0, 5.0, 0, 0, 2, 3)
 
+    def test_generate_label_pdf_progress(self):
+        dbo = base.get_dbo()
+        rows = [ { "OWNERNAME": "Test %d" % i, "OWNERADDRESS": "", "OWNERTOWN": "", "OWNERCOUNTY": "", "OWNERPOSTCODE": "" } for i in range(13) ]
+        asm3.asynctask.reset(dbo)
+        asm3.asynctask.set_task_name(dbo, "test")
+        asm3.asynctask.set_progress_value(dbo, 0)
+        p = asm3.asynctask.ProgressTracker(dbo, 1)
+        asm3.utils.generate_label_pdf(dbo, "en", rows, "A4", "cm", 10, 1.0, 1.0, 5.0, 5.0, 0, 0, 2, 3, progress=p)
+        self.assertEqual(3, asm3.asynctask.get_progress_max(dbo))
+        self.assertEqual(3, asm3.asynctask.get_progress_value(dbo))
+        asm3.asynctask.reset(dbo)
+
     def test_csv(self):
         data = [ { "FIELD1": "VAL1&#2019;", "FIELD2": "Test" }, { "FIELD1": "MORE&#euro;", "FIELD2": "OK" } ]
         c = asm3.utils.csv("en", data)
@@ -54,3 +67,33 @@ class TestUtils(unittest.TestCase):
         self.assertNotEqual(plain.find("1. item 1"), -1)
         self.assertNotEqual(plain.find("cell 1"), -1)
 
+
+    def test_substitute_tags(self):
+        tags = { "NAME": "<b>Rex</b>\nJr", "SEX": "Male", "URL": "http://example.com/?a=1&b=2" }
+        s = asm3.utils.substitute_tags("&lt;&lt;Name&gt;&gt; &lt;&lt;sex&gt;&gt;/&lt;&lt;Sex&gt;&gt; &lt;&lt;Url&gt;&gt; &lt;&lt;Missing&gt;&gt;!", tags)
+        self.assertEqual("&lt;b&gt;Rex&lt;/b&gt;<br>Jr Male/Male http://example.com/?a=1&b=2 !", s)
+        s = asm3.utils.substitute_tags("<<Name>> and <<Sex>>", tags, False, "<<", ">>", cr_to_br=False)
+        self.assertEqual("<b>Rex</b>\nJr and Male", s)
+        # Unterminated tags are left alone
+        self.assertEqual("Male &lt;&lt;Sex", asm3.utils.substitute_tags("&lt;&lt;Sex&gt;&gt; &lt;&lt;Sex", tags))
+        # Values that contain tags are substituted too
+        self.assertEqual("Male", asm3.utils.substitute_tags("$$A$$", { "A": "$$SEX$$", "SEX": "Male" }, True, "$$", "$$"))
+
+    def test_substitute_tags_keep_unmatched(self):
+        tags = { "NAME": "Rex", "SEX": "Male" }
+        s = asm3.utils.substitute_tags("&lt;&lt;<text:span a=\"1\">Name</text:span>&gt;&gt; " \
+            "&lt;&lt;<text:span/>Sex&gt;&gt; &lt;&lt;Missing&gt;&gt; &lt;&lt;NAME&gt;&gt;", tags, remove_unmatched=False)
+        self.assertEqual("<text:span a=\"1\">Rex</text:span> <text:span/>Male Missing Rex", s)
+        # Numbers, escaping and line breaks are the same as substituting one tag at a time
+        tags = { "TAG1": 5, "TAG2": "A & <b>\nB" }
+        s = asm3.utils.substitute_tags("&lt;&lt;<text:span text:style-name=\"T1\"/>Tag1&gt;&gt; &lt;&lt;Tag2&gt;&gt; &lt;&lt;Tag9&gt;&gt;", 
+            tags, cr_to_br=False, remove_unmatched=False)
+        self.assertEqual("<text:span text:style-name=\"T1\"/>5 A &amp; &lt;b&gt;\nB Tag9", s)
+        s = asm3.utils.substitute_tags("<p>&lt;&lt;Tag2&gt;&gt; &lt;&lt;tag1&gt;&gt;&lt;&lt;Tag1&gt;&gt; &lt;&lt;Tag9&gt;&gt;</p>", tags)
+        self.assertEqual("<p>A &amp; &lt;b&gt;<br>B 55 </p>", s)
+
+    def test_tag_template(self):
+        t = asm3.utils.TagTemplate("Dear &lt;&lt;Name&gt;&gt;, &lt;&lt;Missing&gt;&gt;&lt;&lt;Address&gt;&gt; &lt;&lt;Name&gt;&gt;")
+        for tags in ( { "NAME": "A & B", "ADDRESS": "1 Street\nTown" }, { "NAME": "C" }, { "NAME": "$$X$$", "ADDRESS": "&lt;&lt;NAME&gt;&gt;" } ):
+            self.assertEqual(asm3.utils.substitute_tags(t.template, tags), t.render(tags))
+        self.assertEqual("Dear C,  C", t.render({ "NAME": "C" }))
@@ -476,3 +476,28 @@ class TestTemplate(unittest.TestCase):
         asm3.waitinglist.delete_waitinglist(base.get_dbo(), "test", wid)
         asm3.template.delete_document_template(base.get_dbo(), "test", tid)
 
+
+    def test_get_tokens(self):
+        tokens = asm3.wordprocessor.get_tokens("<p>&lt;&lt;AnimalName&gt;&gt; &lt;&lt;<span>Sex</span>&gt;&gt;</p>")
+        self.assertIn("ANIMALNAME", tokens)
+        self.assertIn("SEX", tokens)
+        self.assertEqual([ "SHELTERCODE" ], asm3.wordprocessor.get_tokens("$$ShelterCode$$", "$$", "$$"))
+
+    def test_animal_tags_tokens(self):
+        dbo = base.get_dbo()
+        a = asm3.animal.get_animal(dbo, self.aid)
+        alltags = asm3.wordprocessor.animal_tags(dbo, a)
+        self.assertEqual(alltags, asm3.wordprocessor.animal_tags(dbo, a, tokens=list(alltags.keys())))
+        tags = asm3.wordprocessor.animal_tags(dbo, a, tokens=["ANIMALNAME"])
+        self.assertEqual("Testio", tags["ANIMALNAME"])
+        self.assertNotIn("ANIMALISVACCINATED", tags)
+        self.assertNotIn("TOTALCOSTS", tags)
+
+    def test_person_tags_tokens(self):
+        dbo = base.get_dbo()
+        p = asm3.person.get_person(dbo, self.oid)
+        alltags = asm3.wordprocessor.person_tags(dbo, p)
+        self.assertEqual(alltags, asm3.wordprocessor.person_tags(dbo, p, tokens=list(alltags.keys())))
+        tags = asm3.wordprocessor.person_tags(dbo, p, tokens=["NAME"])
+        self.assertEqual("Mr Unit Testing", tags["OWNERNAME"])
+        self.assertNotIn("OWNERLOOKINGFOR", tags)